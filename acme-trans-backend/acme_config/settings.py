@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,6 +53,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Solo se activa con ACME_SQL_INSTRUMENTACION (ver más abajo)
+    'api.middleware.SQLInstrumentacionMiddleware',
 ]
 
 ROOT_URLCONF = 'acme_config.urls'
@@ -81,7 +84,109 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Sin ATOMIC_REQUESTS: las vistas que escriben abren su propia
+        # transacción (api/db.py), y ahí mismo se ajustan los contadores del
+        # dashboard (api/signals.py); las lecturas no pagan BEGIN/COMMIT.
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: cada transacción toma el lock de escritura al
+            # empezar, esperando hasta busy_timeout (ver api/db.py)
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+}
+
+# Perfil de producción para SQLite con varios workers (gunicorn/uvicorn).
+# Activar con ACME_DB_PERFIL=produccion en el entorno. Los PRAGMA se
+# ejecutan en cada conexión nueva:
+# - WAL: las lecturas no esperan a las escrituras (ni al revés)
+# - synchronous=NORMAL: con WAL no se corrompe; un corte de luz puede
+#   perder solo las últimas transacciones confirmadas
+# - mmap_size / cache_size: 256 MB mapeados y 64 MB de páginas en memoria
+# - busy_timeout: espera hasta 5 s el lock de escritura en vez de fallar
+# Las escrituras usan BEGIN IMMEDIATE y se reintentan (api/db.py), y las
+# conexiones se reutilizan entre requests (CONN_MAX_AGE; runserver abre
+# un hilo por request, por eso no va en desarrollo).
+ACME_SQLITE_PRODUCCION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=268435456;'
+            'PRAGMA cache_size=-65536;'
+            'PRAGMA busy_timeout=5000;'
+            'PRAGMA temp_store=MEMORY'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+if os.environ.get('ACME_DB_PERFIL') == 'produccion':
+    DATABASES['default'].update(ACME_SQLITE_PRODUCCION)
+
+# Reintentos de las transacciones de escritura ante 'database is locked'
+# (api/db.py), con espera exponencial
+ACME_DB_REINTENTOS = 4
+ACME_DB_REINTENTO_ESPERA = 0.05  # segundos (se duplica en cada intento)
+
+# Réplica de solo lectura (api/replica.py): listados, dropdowns, dashboard
+# y exportaciones leen de ella; escrituras y detalles, de 'default'. En
+# local es una copia del archivo SQLite que mantiene al día
+# `python manage.py sincronizar_replica --cada 30`. Activar con
+# ACME_DB_REPLICA=<ruta de la copia> en el entorno. Sin CONN_MAX_AGE:
+# cada request abre la copia más reciente.
+ACME_DB_REPLICA = os.environ.get('ACME_DB_REPLICA')
+if ACME_DB_REPLICA:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ACME_DB_REPLICA,
+        'OPTIONS': {'init_command': 'PRAGMA query_only=1'},
+        'TEST': {'MIRROR': 'default'},
     }
+DATABASE_ROUTERS = ['api.replica.ReplicaRouter']
+# Segundos que las lecturas de un usuario siguen en 'default' después de
+# que escribe (así ve enseguida el pedido que acaba de crear)
+ACME_DB_REPLICA_VENTANA = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Por defecto en memoria local (por proceso). Con varios workers conviene
+# un backend compartido (Redis/Memcached/DatabaseCache) para que las
+# invalidaciones de api/cache.py lleguen a todos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'acmetrans',
+    }
+}
+
+# Alias de CACHES que usa la cache de respuestas (api/cache.py)
+ACME_CACHE_ALIAS = 'default'
+ACME_CACHE_TIMEOUT = 300  # segundos
+# Vida de las versiones de la cache. Con LocMem cada worker tiene su propia
+# cache y no ve las invalidaciones de los otros: lo más que puede servir
+# datos viejos es este tiempo. Con una cache compartida (Redis/Memcached)
+# puede ser None. None con LocMem es un error de configuración (api.E001).
+ACME_CACHE_VERSION_TIMEOUT = 30  # segundos
+
+# Instrumentación de SQL por request (api/middleware.py): Server-Timing y
+# una línea JSON por request en el logger 'acme.sql'. Activar con
+# ACME_SQL_INSTRUMENTACION=1 en el entorno.
+ACME_SQL_INSTRUMENTACION = os.environ.get('ACME_SQL_INSTRUMENTACION') == '1'
+# Veces que puede repetirse una misma consulta antes de marcarla como N+1
+ACME_SQL_N1_UMBRAL = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'acme.sql': {'handlers': ['console'], 'level': 'INFO'},
+    },
 }
 
 
@@ -133,7 +238,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # Le decimos a DRF que use JWT como método principal de autenticación
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # (sin consultar la base: el usuario sale de los claims del token)
+        'api.authentication.JWTClaimsAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         # Por defecto, bloqueamos todo a menos que el usuario esté autenticado
@@ -141,6 +247,72 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Tarifas de la cotización automática (api/cotizacion.py), en CLP
+ACME_TARIFAS = {
+    'base': 120000,             # Cargo fijo por pedido
+    'por_km': 900,              # Camión vacío, por km
+    'por_ton_km': 85,           # Por tonelada cobrable y km
+    'kg_por_m3': 250,           # Peso volumétrico: 1 m³ se cobra como 250 kg
+    'margen': 0.30,             # precio = costo * (1 + margen)
+    'redondeo_precio': 1000,
+    'factor_carga': {
+        'Alimentos Perecibles': 1.25,       # Refrigeración
+        'Maquinaria Agrícola': 1.15,
+        'Materiales de Construcción': 1.10,
+    },
+    'km_por_defecto': 600,      # Destinos en ciudades que no están en api/data/ciudades.csv
+    # Ciudad de la sucursal -> ciudad de destino: km por carretera conocidos,
+    # reemplazan la estimación de api/geo.py
+    'distancias_km': {
+        'Osorno': {'Valparaíso': 1030, 'Rancagua': 830, 'Talca': 660, 'Concepción': 480,
+                   'Temuco': 250, 'Puerto Montt': 105, 'La Serena': 1400, 'Antofagasta': 2180},
+        'Santiago': {'Valparaíso': 120, 'Rancagua': 87, 'Talca': 255, 'Concepción': 500,
+                     'Temuco': 680, 'Puerto Montt': 1030, 'La Serena': 470, 'Antofagasta': 1360},
+        'Coquimbo': {'Valparaíso': 450, 'Rancagua': 560, 'Talca': 720, 'Concepción': 960,
+                     'Temuco': 1140, 'Puerto Montt': 1490, 'La Serena': 15, 'Antofagasta': 870},
+    },
+}
+
+# Matriz de distancias sucursal -> ciudad (api/geo.py), para los pares
+# sin km en ACME_TARIFAS['distancias_km']
+ACME_GEO = {
+    'factor_ruta': 1.25,        # km por carretera / km en línea recta
+    'velocidad_kmh': 65,        # Promedio de un camión, con paradas
+}
+
+# Orden de paradas de los camiones con varios pedidos (api/rutas.py)
+ACME_RUTAS = {
+    'minutos_por_parada': 45,     # Descarga en cada ciudad
+    'presupuesto_ms': 50,         # Tiempo para mejorar una ruta (2-opt / or-opt)
+    'presupuesto_max_ms': 1000,   # Tope de ?presupuesto_ms por request
+    'cache_segundos': 86400,      # Se recalcula antes si cambian los pedidos del camión
+}
+
+# Calendario de camiones y conductores (api/reservas.py)
+ACME_RESERVAS = {
+    'dias_por_viaje': 1,          # Días que reserva la asignación de un camión a un pedido
+}
+
+# Paginación por cursor de los listados de pedidos (api/pagination.py)
+PEDIDOS_PAGE_SIZE = 50
+PEDIDOS_MAX_PAGE_SIZE = 500
+# Máximo de ítems por request en el PATCH masivo (admin/pedidos/bulk/)
+PEDIDOS_BULK_MAX = 500
+
+# Eventos en vivo (SSE, api/eventos.py). El backend en memoria solo reparte
+# dentro del proceso: sirve si un único proceso (uvicorn, un worker) atiende
+# todo, escrituras incluidas. Si escriben otros procesos (gunicorn + uvicorn,
+# varios workers, comandos), BaseDatosBackend pasa los eventos por la tabla
+# api_eventopublicado; el perfil de producción lo activa.
+ACME_EVENTOS_BACKEND = 'api.eventos.MemoriaBackend'
+if os.environ.get('ACME_DB_PERFIL') == 'produccion':
+    ACME_EVENTOS_BACKEND = 'api.eventos.BaseDatosBackend'
+ACME_EVENTOS_SONDEO = 1         # Segundos entre lecturas de eventos nuevos (BaseDatosBackend)
+ACME_EVENTOS_HISTORIAL = 1000   # Eventos guardados para reanudar con Last-Event-ID
+ACME_EVENTOS_PING = 15          # Segundos entre comentarios keep-alive
+ACME_EVENTOS_DURACION = 300     # Segundos por conexión (luego el navegador reconecta)
+ACME_EVENTOS_TICKET_SEGUNDOS = 30  # Vida de los tickets de un solo uso para abrir un stream
+
 # Configuración de Simple JWT (Opcional, pero recomendado)
 # Aquí puedes cambiar cuánto duran los tokens
 from datetime import timedelta
@@ -150,6 +322,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),    # Token de refresco largo
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': False,
+    # request.user es un api.authentication.UsuarioToken (rol y perfiles en claims)
+    'TOKEN_USER_CLASS': 'api.authentication.UsuarioToken',
 }
 
 CORS_ALLOWED_ORIGINS = [
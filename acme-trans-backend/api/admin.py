@@ -1,8 +1,32 @@
 # api/admin.py
 
 from django.contrib import admin
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
 # 1. IMPORTA EL MODELO 'Pedido'
-from .models import Sucursal, Cliente, Empleado, Camion, Pedido
+from .models import Sucursal, Cliente, Empleado, Camion, Pedido, TransicionPedido, ResumenDiario, Reserva
+from . import busqueda, transiciones
+
+
+class BusquedaFTSMixin:
+    """
+    La caja de búsqueda (y el autocompletar) usa el índice FTS5 de
+    api/busqueda.py en vez de LIKE '%término%' sobre search_fields, que
+    recorre la tabla entera. Cada palabra se busca como prefijo. En otros
+    motores, la búsqueda normal de Django.
+    """
+    entidad_busqueda = None
+
+    def get_search_results(self, request, queryset, search_term):
+        expresion = busqueda.consulta(search_term, entidades=[self.entidad_busqueda])
+        if expresion is None or connections[router.db_for_read(self.model)].vendor != 'sqlite':
+            return super().get_search_results(request, queryset, search_term)
+        coincidencias = Q(pk__in=RawSQL(*busqueda.ids(self.entidad_busqueda, search_term)))
+        if search_term.strip().isdigit():
+            # Un número también busca por id (como 'id' en search_fields)
+            coincidencias |= Q(pk=int(search_term))
+        return queryset.filter(coincidencias), False
 
 # --- 1. Admin para Sucursal (Corregido) ---
 @admin.register(Sucursal)
@@ -13,7 +37,8 @@ class SucursalAdmin(admin.ModelAdmin):
 
 # --- 2. Admin para Camion (Corregido) ---
 @admin.register(Camion)
-class CamionAdmin(admin.ModelAdmin):
+class CamionAdmin(BusquedaFTSMixin, admin.ModelAdmin):
+    entidad_busqueda = 'camion'
     # Añadimos 'id'
     list_display = ('id', 'matricula', 'get_capacidad_display', 'sucursal_base', 'conductor_asignado')
     list_filter = ('capacidad', 'sucursal_base')
@@ -22,7 +47,8 @@ class CamionAdmin(admin.ModelAdmin):
 
 # --- 3. Admin para Empleado (Corregido) ---
 @admin.register(Empleado)
-class EmpleadoAdmin(admin.ModelAdmin):
+class EmpleadoAdmin(BusquedaFTSMixin, admin.ModelAdmin):
+    entidad_busqueda = 'empleado'
     # Añadimos 'id'
     list_display = ('id', 'user', 'get_cargo_display', 'sucursal')
     list_filter = ('cargo', 'sucursal')
@@ -31,7 +57,8 @@ class EmpleadoAdmin(admin.ModelAdmin):
 
 # --- 4. Admin para Cliente (Corregido) ---
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(BusquedaFTSMixin, admin.ModelAdmin):
+    entidad_busqueda = 'cliente'
     # Añadimos 'id'
     list_display = ('id', 'user', 'nombre_empresa', 'telefono')
     search_fields = ('user__username', 'nombre_empresa')
@@ -39,9 +66,55 @@ class ClienteAdmin(admin.ModelAdmin):
 
 # --- 5. Admin para Pedido (¡AÑADIDO!) ---
 @admin.register(Pedido)
-class PedidoAdmin(admin.ModelAdmin):
+class PedidoAdmin(BusquedaFTSMixin, admin.ModelAdmin):
+    entidad_busqueda = 'pedido'
     list_display = ('id', 'cliente', 'sucursal_origen', 'destino', 'estado', 'fecha_solicitud')
     list_filter = ('estado', 'sucursal_origen')
     search_fields = ('id', 'cliente__user__username', 'destino')
     # Añadimos autocompletar para que sea más fácil de usar
-    autocomplete_fields = ['cliente', 'sucursal_origen', 'camion_asignado']
\ No newline at end of file
+    autocomplete_fields = ['cliente', 'sucursal_origen', 'camion_asignado']
+
+    def save_model(self, request, obj, form, change):
+        # El cambio de estado queda en el historial a nombre del admin
+        with transiciones.actor(request.user.id):
+            super().save_model(request, obj, form, change)
+
+# --- 6. Historial de estados (solo lectura) ---
+@admin.register(TransicionPedido)
+class TransicionPedidoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'pedido', 'desde', 'hacia', 'fecha', 'actor_id')
+    list_filter = ('hacia',)
+    list_select_related = ('pedido__cliente__user', 'pedido__sucursal_origen')
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# --- 7. Resúmenes diarios (los calcula actualizar_resumenes) ---
+@admin.register(ResumenDiario)
+class ResumenDiarioAdmin(admin.ModelAdmin):
+    list_display = ('dia', 'sucursal', 'pedidos_creados', 'pedidos_completados', 'pedidos_cancelados', 'ingresos', 'costos')
+    list_filter = ('sucursal',)
+    list_select_related = ('sucursal',)
+    date_hierarchy = 'dia'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# --- 8. Calendario de reservas (el formulario valida que no se crucen) ---
+@admin.register(Reserva)
+class ReservaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'camion', 'empleado', 'tipo', 'inicio', 'fin')
+    list_filter = ('tipo',)
+    list_select_related = ('camion', 'empleado__user')
+    date_hierarchy = 'inicio'
+    autocomplete_fields = ['camion', 'empleado']
@@ -0,0 +1,243 @@
+# api/asignacion.py
+
+from collections import Counter
+
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache, contadores, eventos, reservas
+from .db import transaccion_escritura
+from .models import Empleado, Camion, Pedido
+
+# Carga máxima por tipo de camión. Un pedido va en un solo camión.
+CAPACIDAD_MAXIMA = {
+    'MC': {'peso_kg': 12000, 'volumen_m3': 45},
+    'GC': {'peso_kg': 28000, 'volumen_m3': 95},
+}
+# De menor a mayor: cada pedido usa el camión más chico en que cabe
+ORDEN_CAPACIDAD = ('MC', 'GC')
+
+
+class AsignacionError(Exception):
+    """ El calendario cambió mientras se asignaba (se deshace todo el lote) """
+
+
+def cabe_en(pedido, capacidad):
+    maximo = CAPACIDAD_MAXIMA[capacidad]
+    return pedido.peso_kg <= maximo['peso_kg'] and pedido.volumen_m3 <= maximo['volumen_m3']
+
+def capacidades_posibles(pedido):
+    """ Capacidades en que cabe el pedido, de menor a mayor """
+    return [c for c in ORDEN_CAPACIDAD if cabe_en(pedido, c)]
+
+
+# --- Selección ---
+
+def pedidos_pendientes(sucursal_id, pedido_ids=None, hasta=None):
+    """ Pedidos CONFIRMADO de la sucursal que aún no tienen camión """
+    pedidos = Pedido.objects.filter(sucursal_origen_id=sucursal_id, estado='CONFIRMADO',
+                                    camion_asignado__isnull=True)
+    if pedido_ids is not None:
+        pedidos = pedidos.filter(pk__in=pedido_ids)
+    if hasta is not None:
+        pedidos = pedidos.filter(fecha_deseada__lte=hasta)
+    return pedidos.only('id', 'peso_kg', 'volumen_m3', 'fecha_deseada', 'cliente', 'sucursal_origen',
+                        'ciudad_destino').order_by('fecha_deseada', 'id')
+
+def camiones_disponibles(sucursal_id):
+    """
+    Camiones de la sucursal con conductor. Si pueden salir el día de cada
+    pedido lo decide el calendario (libre_segun_reservas), no su estado.
+    """
+    return Camion.objects.filter(sucursal_base_id=sucursal_id, conductor_asignado__cargo='CON') \
+                         .only('id', 'capacidad', 'estado', 'conductor_asignado_id') \
+                         .annotate(sucursal_conductor=F('conductor_asignado__sucursal_id'),
+                                   estado_conductor=F('conductor_asignado__estado')).order_by('id')
+
+
+def emparejar(pedidos, camiones, orden=lambda p: (p.fecha_deseada, p.id), libre=None):
+    """
+    Empareja en una pasada (sin consultas). Devuelve
+    (asignaciones [(pedido, camion)], sin_camion, sin_capacidad).
+
+    Primero los pedidos que solo caben en un camión grande, así no se
+    quedan sin él por pedidos chicos que podían ir en uno mediano. Dentro
+    de cada grupo se atiende según 'orden' (por defecto fecha_deseada: los
+    más urgentes primero). Sirve también para cargas consolidadas (api/
+    consolidacion.py): basta que tengan peso_kg, volumen_m3 y fecha_deseada.
+
+    libre(camion, dia): si el camión puede salir ese día (ver
+    libre_segun_reservas); por defecto, todos pueden.
+    """
+    libres = {capacidad: [] for capacidad in ORDEN_CAPACIDAD}
+    for camion in camiones:
+        libres[camion.capacidad].append(camion)
+    for lista in libres.values():
+        lista.reverse()  # pop() saca el de menor id
+
+    sin_capacidad = []
+    por_grupo = {capacidad: [] for capacidad in ORDEN_CAPACIDAD}
+    for pedido in pedidos:
+        posibles = capacidades_posibles(pedido)
+        if posibles:
+            por_grupo[posibles[0]].append(pedido)
+        else:
+            sin_capacidad.append(pedido)
+
+    # Un conductor figura en más de un camión: solo puede salir con uno
+    conductores_ocupados = set()
+    def tomar(capacidades, dia):
+        for capacidad in capacidades:
+            lista = libres[capacidad]
+            # Los reservados ese día se saltan, pero quedan para otras fechas
+            for i in range(len(lista) - 1, -1, -1):
+                camion = lista[i]
+                if camion.conductor_asignado_id in conductores_ocupados:
+                    del lista[i]
+                elif libre is None or libre(camion, dia):
+                    del lista[i]
+                    conductores_ocupados.add(camion.conductor_asignado_id)
+                    return camion
+        return None
+
+    asignaciones, sin_camion = [], []
+    for minima in reversed(ORDEN_CAPACIDAD):
+        utiles = ORDEN_CAPACIDAD[ORDEN_CAPACIDAD.index(minima):]
+        for pedido in sorted(por_grupo[minima], key=orden):
+            camion = tomar(utiles, pedido.fecha_deseada)
+            if camion is None:
+                sin_camion.append(pedido)
+            else:
+                asignaciones.append((pedido, camion))
+    return asignaciones, sin_camion, sin_capacidad
+
+
+def libre_segun_reservas():
+    """
+    libre(camion, dia) para emparejar(): el camión y su conductor sin
+    reservas (mantención, licencia, otro viaje...) en los días del viaje.
+    Usa un solo calendario en memoria para todo el lote (api/reservas.py).
+    El estado de hoy (un camión en ruta o en el taller, un conductor con
+    licencia) solo cuenta para los viajes que salen hoy o están atrasados.
+    """
+    vigente = reservas.calendario()
+    hoy = timezone.localdate()
+    def libre(camion, dia):
+        if dia <= hoy and (camion.estado != 'DIS' or camion.estado_conductor != 'DIS'):
+            return False
+        return reservas.camion_libre(camion.id, camion.conductor_asignado_id, *reservas.viaje(dia), vigente)
+    return libre
+
+
+# --- Asignación ---
+
+def asignar(sucursal_id, pedido_ids=None, hasta=None, simular=False):
+    """
+    Asigna camiones a los pedidos confirmados de una sucursal en una sola
+    transacción: un bulk_update de pedidos y un bulk_create de reservas.
+    Solo usa camiones libres el día del pedido según las reservas, y
+    reserva el viaje; el estado de la flota cambia recién cuando el pedido
+    sale (ver despachos()).
+
+    Devuelve {'asignados': [(pedido_id, camion_id)], 'sin_camion': [...],
+    'sin_capacidad': [...]}. Con simular=True no escribe nada.
+    """
+    with transaccion_escritura():
+        pedidos = list(pedidos_pendientes(sucursal_id, pedido_ids, hasta).select_for_update())
+        camiones = list(camiones_disponibles(sucursal_id).select_for_update())
+        asignaciones, sin_camion, sin_capacidad = emparejar(pedidos, camiones, libre=libre_segun_reservas())
+
+        if asignaciones and not simular:
+            guardar(sucursal_id, asignaciones)
+
+    return {
+        'asignados': [(pedido.id, camion.id) for pedido, camion in asignaciones],
+        'sin_camion': [pedido.id for pedido in sin_camion],
+        'sin_capacidad': [pedido.id for pedido in sin_capacidad],
+    }
+
+def guardar(sucursal_id, asignaciones):
+    """
+    Escribe las asignaciones [(pedido, camion)]; un camión puede llevar
+    varios pedidos (cargas consolidadas, todas del mismo día). Reserva el
+    viaje del camión y su conductor; su estado no cambia. Como
+    bulk_update() no emite señales, la cache y los eventos van aquí.
+    """
+    usados = list({camion.id: camion for _, camion in asignaciones}.values())
+    dias = {camion.id: pedido.fecha_deseada for pedido, camion in asignaciones}
+    # El calendario se relee: protege de reservas hechas entre la lectura y
+    # la escritura (en bases cuya transacción no toma el lock al empezar)
+    vigente = reservas.calendario()
+    for camion in usados:
+        if not reservas.camion_libre(camion.id, camion.conductor_asignado_id, *reservas.viaje(dias[camion.id]),
+                                     vigente):
+            raise AsignacionError('Un camión o conductor dejó de estar libre; reintente la asignación.')
+
+    for pedido, camion in asignaciones:
+        pedido.camion_asignado_id = camion.id
+    Pedido.objects.bulk_update([pedido for pedido, _ in asignaciones], ['camion_asignado'], batch_size=500)
+    reservas.reservar_viajes((camion.id, camion.conductor_asignado_id, dias[camion.id]) for camion in usados)
+    cache.invalidar('pedido')
+    eventos.publicar(
+        eventos.evento('pedido', 'actualizado', pedido.id, sucursal_id,
+                       {'camion_asignado_id': camion.id}, pedido.cliente_id)
+        for pedido, camion in asignaciones
+    )
+
+
+# --- Salida y regreso ---
+
+def despachos(cambios):
+    """
+    Estado de la flota según los pedidos ya guardados, cambios [(camion_id,
+    estado anterior, estado nuevo)]: el camión y su conductor quedan 'En
+    Ruta' cuando sale un pedido (EN_RUTA), y 'Disponible' cuando ya no
+    llevan ninguno en ruta. Asignar un camión solo lo reserva.
+    """
+    salen = {camion_id for camion_id, anterior, nuevo in cambios
+             if camion_id is not None and anterior != 'EN_RUTA' and nuevo == 'EN_RUTA'}
+    vuelven = {camion_id for camion_id, anterior, nuevo in cambios
+               if camion_id is not None and anterior == 'EN_RUTA' and nuevo != 'EN_RUTA'} - salen
+    if vuelven:
+        vuelven -= set(Pedido.objects.filter(camion_asignado_id__in=vuelven, estado='EN_RUTA')
+                       .values_list('camion_asignado_id', flat=True))
+    _mover_flota(salen, 'DIS', 'RUT')
+    _mover_flota(vuelven, 'RUT', 'DIS')
+
+def _mover_flota(camion_ids, desde, hacia):
+    """
+    Pasa de 'desde' a 'hacia' los camiones y conductores que estén en
+    'desde' (uno en mantención o con licencia no se toca). update() no
+    emite señales: los contadores, la cache y los eventos se ajustan aquí.
+    """
+    if not camion_ids:
+        return
+    filas = Camion.objects.filter(pk__in=camion_ids).values_list(
+        'id', 'sucursal_base_id', 'estado', 'conductor_asignado_id', 'conductor_asignado__sucursal_id',
+        'conductor_asignado__cargo', 'conductor_asignado__estado')
+    camiones, conductores = [], []
+    for camion_id, sucursal_id, estado, conductor_id, sucursal_conductor, cargo, estado_conductor in filas:
+        if estado == desde:
+            camiones.append((camion_id, sucursal_id))
+        if conductor_id is not None and estado_conductor == desde:
+            conductores.append((conductor_id, sucursal_conductor, cargo))
+    if not camiones and not conductores:
+        return
+
+    Camion.objects.filter(pk__in=[camion_id for camion_id, _ in camiones], estado=desde).update(estado=hacia)
+    Empleado.objects.filter(pk__in=[conductor_id for conductor_id, _, _ in conductores],
+                            estado=desde).update(estado=hacia)
+
+    deltas = Counter()
+    anuncios = []
+    for camion_id, sucursal_id in camiones:
+        deltas[contadores.clave_camion(sucursal_id, desde)] -= 1
+        deltas[contadores.clave_camion(sucursal_id, hacia)] += 1
+        anuncios.append(eventos.evento('camion', 'actualizado', camion_id, sucursal_id, {'estado': hacia}))
+    for conductor_id, sucursal_id, cargo in conductores:
+        deltas[contadores.clave_empleado(sucursal_id, cargo, desde)] -= 1
+        deltas[contadores.clave_empleado(sucursal_id, cargo, hacia)] += 1
+        anuncios.append(eventos.evento('empleado', 'actualizado', conductor_id, sucursal_id, {'estado': hacia}))
+    contadores.ajustar(deltas)
+    cache.invalidar('camion', 'empleado')
+    eventos.publicar(anuncios)
@@ -0,0 +1,137 @@
+# api/authentication.py
+
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+
+from .models import Cliente, Empleado
+
+# Claims propios que viajan en el token (además de username / is_superuser)
+CLAIM_ROL = 'rol'
+CLAIMS_PERFIL = ('cliente_id', 'empleado_id', 'sucursal_id')
+
+
+def claims_de(user):
+    """
+    Rol y perfiles del usuario, para guardarlos en el token al iniciar
+    sesión (dos consultas en el login, ninguna en cada request).
+    """
+    cliente_id = Cliente.objects.filter(user=user).values_list('id', flat=True).first()
+    empleado = Empleado.objects.filter(user=user).values('id', 'sucursal_id').first() or {}
+    if user.is_superuser:
+        rol = 'admin'
+    elif cliente_id is not None:
+        rol = 'cliente'
+    elif empleado:
+        rol = 'empleado'
+    else:
+        rol = 'usuario'
+    return {
+        CLAIM_ROL: rol,
+        'cliente_id': cliente_id,
+        'empleado_id': empleado.get('id'),
+        'sucursal_id': empleado.get('sucursal_id'),
+    }
+
+
+class UsuarioToken(TokenUser):
+    """
+    Usuario construido solo con los claims del token (no toca la base).
+    Ojo: los datos son los del momento del login; un cambio de rol o de
+    sucursal se ve recién con un token nuevo (ACCESS_TOKEN_LIFETIME).
+    """
+    @cached_property
+    def rol(self):
+        return self.token.get(CLAIM_ROL)
+
+    @cached_property
+    def cliente_id(self):
+        return self.token.get('cliente_id')
+
+    @cached_property
+    def empleado_id(self):
+        return self.token.get('empleado_id')
+
+    @cached_property
+    def sucursal_id(self):
+        return self.token.get('sucursal_id')
+
+
+class JWTClaimsAuthentication(JWTStatelessUserAuthentication):
+    """
+    Autenticación JWT sin consultar auth_user ni los perfiles: el usuario
+    de la request es un UsuarioToken (SIMPLE_JWT['TOKEN_USER_CLASS']).
+    """
+    def get_user(self, validated_token):
+        # Tokens emitidos antes de agregar los claims: hay que volver a entrar
+        if CLAIM_ROL not in validated_token:
+            raise InvalidToken('El token no incluye el rol; inicie sesión nuevamente.')
+        return super().get_user(validated_token)
+
+
+# --- Tickets para streams de eventos ---
+# EventSource no permite enviar headers: en vez del token de acceso (que no
+# debe quedar en URLs, logs ni historial), el stream recibe ?ticket=, firmado,
+# de vida corta y de un solo uso, que se pide con un POST autenticado.
+
+TICKET_SALT = 'acme.eventos.ticket'
+# Claims del token de acceso que no pasan al ticket (tiene los suyos)
+CLAIMS_NO_TICKET = ('exp', 'iat', 'jti', 'token_type')
+
+
+def _ticket_segundos():
+    return getattr(settings, 'ACME_EVENTOS_TICKET_SEGUNDOS', 30)
+
+def _clave_ticket(jti):
+    return f'acme:eventos:ticket:{jti}'
+
+
+def emitir_ticket(token):
+    """ Ticket para abrir un stream con los claims del token de acceso 'token' """
+    claims = {clave: valor for clave, valor in token.payload.items() if clave not in CLAIMS_NO_TICKET}
+    claims['jti'] = secrets.token_urlsafe(16)
+    return signing.dumps(claims, salt=TICKET_SALT, compress=True)
+
+
+def usuario_de_ticket(ticket):
+    """
+    UsuarioToken del ticket, o None si es inválido, venció o ya se usó. El
+    uso se marca en la cache de respuestas (ACME_CACHE_ALIAS): con una
+    cache por proceso (LocMem) vale por worker, como el backend de eventos.
+    """
+    try:
+        claims = signing.loads(ticket, salt=TICKET_SALT, max_age=_ticket_segundos())
+    except signing.BadSignature:
+        return None
+    cache = caches[getattr(settings, 'ACME_CACHE_ALIAS', 'default')]
+    if not cache.add(_clave_ticket(claims.get('jti')), 1, timeout=_ticket_segundos()):
+        return None
+    return UsuarioToken(claims)
+
+
+def usuario_de_request(request):
+    """
+    UsuarioToken de una request de Django (vistas async, fuera de DRF), o
+    None. Acepta 'Authorization: Bearer <token>' o ?ticket=<ticket> (ver
+    emitir_ticket), porque EventSource no permite enviar headers. El token
+    de acceso nunca se acepta en la URL.
+    """
+    autenticacion = JWTClaimsAuthentication()
+    header = autenticacion.get_header(request)
+    if not header:
+        ticket = request.GET.get('ticket')
+        return usuario_de_ticket(ticket) if ticket else None
+    try:
+        crudo = autenticacion.get_raw_token(header)
+        if not crudo:
+            return None
+        return autenticacion.get_user(autenticacion.get_validated_token(crudo))
+    except (InvalidToken, AuthenticationFailed):
+        return None
@@ -0,0 +1,328 @@
+# api/busqueda.py
+
+import re
+
+from django.core import checks
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Q
+
+from .models import Camion, Cliente, Empleado, Pedido
+
+# Índice de texto completo (FTS5 de SQLite) de pedidos, clientes, camiones
+# y empleados, en una sola tabla virtual. Lo mantienen al día triggers de
+# SQLite en la misma transacción que el cambio: también bulk_create,
+# bulk_update y update(), que no emiten señales.
+#
+# OJO: en SQLite, una migración que altera api_pedido, api_cliente,
+# api_camion, api_empleado o auth_user recrea la tabla y se lleva sus
+# triggers. Esa migración debe volver a crearlos con su propia copia del SQL
+# (como 0006_busqueda.py, que no importa este módulo). Si faltan, el check
+# api.W002 avisa (manage.py check --database default, y migrate).
+#
+# Columnas:
+# - entidad, objeto_id, sucursal_id, estado: para armar el resultado (no se indexan)
+# - titulo, texto: lo que se busca (el título pesa más en el ranking)
+# - etiquetas: tokens para filtrar dentro del índice ("entpedido suc3
+#   estadoenruta"), así los filtros no recorren todas las coincidencias
+TABLA = 'api_busqueda'
+
+# rowid = id * 4 + código de la entidad: cada objeto tiene una fila fija y
+# los triggers la reemplazan por rowid (sin recorrer la tabla)
+CODIGOS = {'pedido': 0, 'cliente': 1, 'camion': 2, 'empleado': 3}
+
+_CREAR_TABLA = f"""
+    CREATE VIRTUAL TABLE {TABLA} USING fts5(
+        entidad UNINDEXED, objeto_id UNINDEXED, sucursal_id UNINDEXED, estado UNINDEXED,
+        titulo, texto, etiquetas,
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+def _etiquetas(entidad, sucursal, estado):
+    """ Expresión SQL de la columna 'etiquetas' """
+    return (f"'ent{entidad}'"
+            f" || coalesce(' suc' || {sucursal}, '')"
+            f" || coalesce(' estado' || lower(replace({estado}, '_', '')), '')")
+
+def _nombre(usuario):
+    return f"trim(coalesce({usuario}.first_name, '') || ' ' || coalesce({usuario}.last_name, ''))"
+
+# SELECT de las filas del índice de cada entidad; {donde} filtra cuáles
+_FILAS = {
+    'pedido': f"""
+        SELECT p.id * 4, 'pedido', p.id, p.sucursal_origen_id, p.estado,
+               p.destino,
+               p.tipo_carga || ' ' || coalesce(p.detalles_carga, '') || ' ' || coalesce(c.nombre_empresa, '')
+                   || ' ' || u.username || ' ' || {_nombre('u')},
+               {_etiquetas('pedido', 'p.sucursal_origen_id', 'p.estado')}
+        FROM api_pedido p
+        JOIN api_cliente c ON c.id = p.cliente_id
+        JOIN auth_user u ON u.id = c.user_id
+        WHERE {{donde}}
+    """,
+    'cliente': f"""
+        SELECT c.id * 4 + 1, 'cliente', c.id, NULL, NULL,
+               coalesce(nullif(c.nombre_empresa, ''), u.username),
+               u.username || ' ' || {_nombre('u')} || ' ' || coalesce(c.rut_empresa, ''),
+               {_etiquetas('cliente', 'NULL', 'NULL')}
+        FROM api_cliente c
+        JOIN auth_user u ON u.id = c.user_id
+        WHERE {{donde}}
+    """,
+    'camion': f"""
+        SELECT k.id * 4 + 2, 'camion', k.id, k.sucursal_base_id, k.estado,
+               k.matricula,
+               coalesce(u.username || ' ' || {_nombre('u')}, ''),
+               {_etiquetas('camion', 'k.sucursal_base_id', 'k.estado')}
+        FROM api_camion k
+        LEFT JOIN api_empleado e ON e.id = k.conductor_asignado_id
+        LEFT JOIN auth_user u ON u.id = e.user_id
+        WHERE {{donde}}
+    """,
+    'empleado': f"""
+        SELECT e.id * 4 + 3, 'empleado', e.id, e.sucursal_id, e.estado,
+               {_nombre('u')},
+               u.username,
+               {_etiquetas('empleado', 'e.sucursal_id', 'e.estado')}
+        FROM api_empleado e
+        JOIN auth_user u ON u.id = e.user_id
+        WHERE {{donde}}
+    """,
+}
+# Tabla y alias de cada entidad en _FILAS
+_TABLAS = {'pedido': ('api_pedido', 'p'), 'cliente': ('api_cliente', 'c'),
+           'camion': ('api_camion', 'k'), 'empleado': ('api_empleado', 'e')}
+
+def _refrescar(entidad, donde):
+    """ Sentencias que rehacen las filas de 'entidad' que cumplen 'donde' """
+    tabla, alias = _TABLAS[entidad]
+    return (
+        f"DELETE FROM {TABLA} WHERE rowid IN "
+        f"(SELECT {alias}.id * 4 + {CODIGOS[entidad]} FROM {tabla} {alias} WHERE {donde});\n"
+        f"INSERT INTO {TABLA}(rowid, entidad, objeto_id, sucursal_id, estado, titulo, texto, etiquetas) "
+        f"{_FILAS[entidad].format(donde=donde)};"
+    )
+
+def _borrar(entidad):
+    return f"DELETE FROM {TABLA} WHERE rowid = old.id * 4 + {CODIGOS[entidad]};"
+
+def _cambio(*columnas):
+    """ WHEN de un trigger UPDATE: solo si cambió alguna columna indexada """
+    return ' OR '.join(f'old.{c} IS NOT new.{c}' for c in columnas)
+
+# (nombre, evento, cuerpo). Los UPDATE llevan WHEN: save() escribe todas
+# las columnas, y un cambio de precio no debe reescribir el índice.
+_TRIGGERS = [
+    ('pedido_ai', 'AFTER INSERT ON api_pedido', _refrescar('pedido', 'p.id = new.id')),
+    ('pedido_au', 'AFTER UPDATE ON api_pedido WHEN '
+                  + _cambio('destino', 'tipo_carga', 'detalles_carga', 'cliente_id', 'sucursal_origen_id', 'estado'),
+     _refrescar('pedido', 'p.id = new.id')),
+    ('pedido_ad', 'AFTER DELETE ON api_pedido', _borrar('pedido')),
+
+    ('cliente_ai', 'AFTER INSERT ON api_cliente', _refrescar('cliente', 'c.id = new.id')),
+    ('cliente_au', 'AFTER UPDATE ON api_cliente WHEN ' + _cambio('nombre_empresa', 'rut_empresa', 'user_id'),
+     _refrescar('cliente', 'c.id = new.id') + _refrescar('pedido', 'p.cliente_id = new.id')),
+    ('cliente_ad', 'AFTER DELETE ON api_cliente', _borrar('cliente')),
+
+    ('camion_ai', 'AFTER INSERT ON api_camion', _refrescar('camion', 'k.id = new.id')),
+    ('camion_au', 'AFTER UPDATE ON api_camion WHEN '
+                  + _cambio('matricula', 'sucursal_base_id', 'estado', 'conductor_asignado_id'),
+     _refrescar('camion', 'k.id = new.id')),
+    ('camion_ad', 'AFTER DELETE ON api_camion', _borrar('camion')),
+
+    ('empleado_ai', 'AFTER INSERT ON api_empleado', _refrescar('empleado', 'e.id = new.id')),
+    ('empleado_au', 'AFTER UPDATE ON api_empleado WHEN ' + _cambio('sucursal_id', 'estado', 'user_id'),
+     _refrescar('empleado', 'e.id = new.id')),
+    ('empleado_ad', 'AFTER DELETE ON api_empleado', _borrar('empleado')),
+
+    # Los nombres de usuario aparecen en clientes, sus pedidos, empleados y
+    # los camiones que conducen
+    ('usuario_au', 'AFTER UPDATE ON auth_user WHEN ' + _cambio('username', 'first_name', 'last_name'),
+     _refrescar('cliente', 'c.user_id = new.id')
+     + _refrescar('pedido', 'p.cliente_id IN (SELECT id FROM api_cliente WHERE user_id = new.id)')
+     + _refrescar('empleado', 'e.user_id = new.id')
+     + _refrescar('camion', 'k.conductor_asignado_id IN (SELECT id FROM api_empleado WHERE user_id = new.id)')),
+]
+
+
+# --- Instalación (migraciones) ---
+
+def sql_triggers():
+    """ {nombre: CREATE TRIGGER} de cada trigger del índice """
+    return {
+        f'{TABLA}_{nombre}': f"CREATE TRIGGER {TABLA}_{nombre} {evento} BEGIN\n{cuerpo}\nEND"
+        for nombre, evento, cuerpo in _TRIGGERS
+    }
+
+def triggers_instalados(connection):
+    """ {nombre: CREATE TRIGGER} de los triggers del índice que hay en la base """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                       [f'{TABLA}_%'])
+        return dict(cursor.fetchall())
+
+@checks.register(checks.Tags.database)
+def revisar_triggers(app_configs, databases=None, **kwargs):
+    """ Índice instalado pero sin sus triggers (ej: una migración recreó api_pedido): deja de actualizarse """
+    if DEFAULT_DB_ALIAS not in (databases or ()):
+        return []
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'sqlite' or TABLA not in connection.introspection.table_names():
+        return []
+    faltan = sorted(set(sql_triggers()) - set(triggers_instalados(connection)))
+    if not faltan:
+        return []
+    return [checks.Warning(
+        f"Faltan triggers del índice de búsqueda: {', '.join(faltan)}. El índice no refleja los cambios.",
+        hint="Vuelva a crearlos en una migración (ver 0006_busqueda.py) o con busqueda.instalar(connection).",
+        id='api.W002',
+    )]
+
+def instalar(connection):
+    """
+    (Re)crea la tabla FTS5 y sus triggers, y la llena con los datos
+    actuales. Solo SQLite: en otros motores no hace nada (y buscar()
+    recorre las tablas con icontains). Lo llaman las migraciones.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    desinstalar(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(_CREAR_TABLA)
+        for sql in sql_triggers().values():
+            cursor.execute(sql)
+    reconstruir(connection)
+
+def desinstalar(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nombre, _, _ in _TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TABLA}_{nombre}")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLA}")
+
+def reconstruir(connection):
+    """ Vuelve a llenar el índice desde las tablas y lo compacta """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA}")
+        for entidad in _FILAS:
+            cursor.execute(
+                f"INSERT INTO {TABLA}(rowid, entidad, objeto_id, sucursal_id, estado, titulo, texto, etiquetas) "
+                + _FILAS[entidad].format(donde='1')
+            )
+        cursor.execute(f"INSERT INTO {TABLA}({TABLA}) VALUES ('optimize')")
+
+
+# --- Consultas ---
+
+def _terminos(texto):
+    """ Palabras de 'texto' (letras y dígitos), como las separa el tokenizer """
+    return re.findall(r'[^\W_]+', texto)
+
+def consulta(texto, entidades=None, sucursal_id=None, estados=None):
+    """
+    Expresión MATCH de FTS5: todas las palabras de 'texto', cada una como
+    prefijo ("osor" encuentra Osorno), en el título o el texto; los
+    filtros van como etiquetas. None si 'texto' no tiene palabras.
+    """
+    terminos = _terminos(texto)
+    if not terminos:
+        return None
+    partes = ['{titulo texto} : (' + ' '.join(f'"{t}"*' for t in terminos) + ')']
+    if entidades:
+        partes.append('etiquetas : (' + ' OR '.join(f'ent{e}' for e in entidades) + ')')
+    if sucursal_id is not None:
+        partes.append(f'etiquetas : suc{int(sucursal_id)}')
+    if estados:
+        partes.append('etiquetas : (' + ' OR '.join('estado' + ''.join(_terminos(e)).lower() for e in estados) + ')')
+    return ' AND '.join(partes)
+
+_SQL_BUSCAR = f"""
+    SELECT entidad, objeto_id, sucursal_id, estado, titulo,
+           snippet({TABLA}, 5, '[', ']', '…', 10)
+    FROM {TABLA}
+    WHERE {TABLA} MATCH %s
+    ORDER BY bm25({TABLA}, 0, 0, 0, 0, 10.0, 1.0, 0)
+    LIMIT %s
+"""
+
+def buscar(texto, entidades=None, sucursal_id=None, estados=None, limite=20):
+    """
+    Busca en pedidos, clientes, camiones y empleados. Devuelve hasta
+    'limite' resultados, los más relevantes primero (bm25; una
+    coincidencia en el título vale 10 en el texto):
+    [{'entidad', 'id', 'sucursal_id', 'estado', 'titulo', 'detalle'}].
+    """
+    expresion = consulta(texto, entidades, sucursal_id, estados)
+    if expresion is None:
+        return []
+    # Lee de donde leería el ORM (réplica incluida)
+    connection = connections[router.db_for_read(Pedido)]
+    if connection.vendor != 'sqlite':
+        return _buscar_orm(_terminos(texto), entidades, sucursal_id, estados, limite)
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_BUSCAR, [expresion, limite])
+        filas = cursor.fetchall()
+    return [
+        {'entidad': entidad, 'id': objeto_id, 'sucursal_id': sucursal, 'estado': estado,
+         'titulo': titulo, 'detalle': detalle}
+        for entidad, objeto_id, sucursal, estado, titulo, detalle in filas
+    ]
+
+# Sin FTS5 (otros motores): icontains sobre los mismos campos del índice.
+# (modelo, campo sucursal, campo estado, campos del título, campos del texto);
+# si el título queda vacío se usa el primer campo del texto.
+_CAMPOS_ORM = {
+    'pedido': (Pedido, 'sucursal_origen_id', 'estado', ['destino'],
+               ['tipo_carga', 'detalles_carga', 'cliente__nombre_empresa', 'cliente__user__username',
+                'cliente__user__first_name', 'cliente__user__last_name']),
+    'cliente': (Cliente, None, None, ['nombre_empresa'],
+                ['user__username', 'user__first_name', 'user__last_name', 'rut_empresa']),
+    'camion': (Camion, 'sucursal_base_id', 'estado', ['matricula'],
+               ['conductor_asignado__user__username', 'conductor_asignado__user__first_name',
+                'conductor_asignado__user__last_name']),
+    'empleado': (Empleado, 'sucursal_id', 'estado', ['user__first_name', 'user__last_name'], ['user__username']),
+}
+
+def _buscar_orm(terminos, entidades, sucursal_id, estados, limite):
+    """
+    buscar() sin índice: cada palabra debe aparecer (en cualquier parte, sin
+    ignorar acentos) en el título o el texto. Sin ranking: los más nuevos
+    primero. Recorre las tablas, así que es solo para motores sin FTS5.
+    """
+    resultados = []
+    for entidad in entidades or _CAMPOS_ORM:
+        modelo, campo_sucursal, campo_estado, titulo, texto = _CAMPOS_ORM[entidad]
+        if (sucursal_id is not None or estados) and campo_sucursal is None:
+            continue  # Como en el índice: los clientes no tienen sucursal ni estado
+        queryset = modelo.objects.all()
+        for termino in terminos:
+            coincide = Q()
+            for campo in titulo + texto:
+                coincide |= Q(**{f'{campo}__icontains': termino})
+            queryset = queryset.filter(coincide)
+        if sucursal_id is not None:
+            queryset = queryset.filter(**{campo_sucursal: sucursal_id})
+        if estados:
+            queryset = queryset.filter(**{f'{campo_estado}__in': estados})
+        columnas = ['id', campo_sucursal, campo_estado] if campo_sucursal else ['id']
+        for fila in queryset.order_by('-id').values(*columnas, *titulo, *texto)[:limite - len(resultados)]:
+            partes_titulo = [fila[c] for c in titulo if fila[c]]
+            partes_texto = [fila[c] for c in texto if fila[c]]
+            resultados.append({
+                'entidad': entidad, 'id': fila['id'],
+                'sucursal_id': fila.get(campo_sucursal), 'estado': fila.get(campo_estado),
+                'titulo': ' '.join(partes_titulo) or (partes_texto[0] if partes_texto else ''),
+                'detalle': ' '.join(partes_texto),
+            })
+        if len(resultados) >= limite:
+            break
+    return resultados
+
+def ids(entidad, texto):
+    """
+    Subconsulta (sql, params) con los ids de 'entidad' que coinciden con
+    'texto', para filtrar un queryset: pk__in=RawSQL(*ids(...)).
+    """
+    return (f"SELECT objeto_id FROM {TABLA} WHERE {TABLA} MATCH %s",
+            [consulta(texto, entidades=[entidad])])
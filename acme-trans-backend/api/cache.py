@@ -0,0 +1,175 @@
+# api/cache.py
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe, parse_etags
+from rest_framework.response import Response
+
+from . import replica
+
+# Grupos de datos con versión propia. Cada escritura sobre uno de estos
+# modelos "sube" su versión, lo que invalida de golpe todas las respuestas
+# cacheadas que dependían de él (sin tener que buscarlas ni borrarlas).
+GRUPOS = ('sucursal', 'camion', 'empleado', 'pedido', 'resumen', 'reserva')
+
+
+# Backends que guardan en la memoria de cada proceso (cada worker tiene la suya)
+BACKENDS_LOCALES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def _alias():
+    return getattr(settings, 'ACME_CACHE_ALIAS', 'default')
+
+def _cache():
+    return caches[_alias()]
+
+def _clave_version(grupo):
+    return f'acme:version:{grupo}'
+
+def _timeout_version():
+    """
+    Vida de una versión. invalidar() solo sube la versión en la cache del
+    proceso que escribió: con una cache por proceso (LocMem), los demás
+    workers conservan la vieja hasta que expira y entonces empiezan una
+    nueva, así lo más que sirven datos viejos es este tiempo. Con una
+    cache compartida (Redis, Memcached) puede ser None (sin expiración).
+    """
+    return getattr(settings, 'ACME_CACHE_VERSION_TIMEOUT', 30)
+
+
+@checks.register(checks.Tags.caches)
+def revisar_backend(app_configs, **kwargs):
+    """ Versiones sin expiración en una cache por proceso: los otros workers nunca se enteran de los cambios """
+    backend = settings.CACHES.get(_alias(), {}).get('BACKEND')
+    if backend in BACKENDS_LOCALES and _timeout_version() is None:
+        return [checks.Error(
+            f"ACME_CACHE_VERSION_TIMEOUT=None con '{backend}': cada worker tiene su propia cache y "
+            "vería sus versiones viejas para siempre.",
+            hint="Use un backend compartido (Redis, Memcached) o un ACME_CACHE_VERSION_TIMEOUT en segundos.",
+            id='api.E001',
+        )]
+    return []
+
+
+# --- Versiones ---
+
+def versiones(grupos):
+    """
+    Versión actual de cada grupo. La versión es una marca de tiempo en
+    nanosegundos, así también sirve como fecha de última modificación.
+    """
+    cache = _cache()
+    claves = {grupo: _clave_version(grupo) for grupo in grupos}
+    guardadas = cache.get_many(list(claves.values()))
+
+    resultado = {}
+    for grupo, clave in claves.items():
+        version = guardadas.get(clave)
+        if version is None:
+            # Sin versión (cache nueva o desalojada): empezamos una
+            version = time.time_ns()
+            if not cache.add(clave, version, timeout=_timeout_version()):
+                version = cache.get(clave, version)
+        resultado[grupo] = version
+    return resultado
+
+def _subir_version(grupos):
+    cache = _cache()
+    ahora = time.time_ns()
+    anteriores = cache.get_many([_clave_version(g) for g in grupos])
+    cache.set_many({
+        _clave_version(g): max(ahora, anteriores.get(_clave_version(g), 0) + 1)
+        for g in grupos
+    }, timeout=_timeout_version())
+
+def invalidar(*grupos):
+    """
+    Sube la versión de los grupos cuando la transacción en curso haga
+    commit. Si se subiera antes, otra request podría volver a cachear los
+    datos viejos bajo la versión nueva.
+    """
+    transaction.on_commit(lambda: _subir_version(grupos))
+
+
+# --- Respuestas condicionales ---
+
+def _etag(ruta, versiones_actuales):
+    firma = ruta + '|' + '|'.join(f'{g}:{v}' for g, v in sorted(versiones_actuales.items()))
+    return hashlib.sha1(firma.encode('utf-8')).hexdigest()
+
+def _no_modificado(request, etag, ultima_modificacion):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or f'"{etag}"' in etags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and ultima_modificacion <= if_modified_since
+
+
+NO_MODIFICADO = object()
+
+def consultar(request, grupos):
+    """
+    (etag, ultima_modificacion, cacheado) de una request GET: 'cacheado' es
+    NO_MODIFICADO si el cliente ya tiene la versión actual, el cuerpo
+    guardado para esta ruta y versiones, o None si hay que calcularlo.
+    """
+    versiones_actuales = versiones(grupos)
+    etag = _etag(request.get_full_path(), versiones_actuales)
+    ultima_modificacion = max(versiones_actuales.values()) // 1_000_000_000 if versiones_actuales else 0
+    if _no_modificado(request, etag, ultima_modificacion):
+        return etag, ultima_modificacion, NO_MODIFICADO
+    return etag, ultima_modificacion, _cache().get(f'acme:respuesta:{etag}')
+
+def guardar(etag, data):
+    # Nunca más que la versión con que se calculó (si expira, la clave cambia igual)
+    timeout = getattr(settings, 'ACME_CACHE_TIMEOUT', 300)
+    if _timeout_version() is not None:
+        timeout = min(timeout, _timeout_version())
+    _cache().set(f'acme:respuesta:{etag}', data, timeout=timeout)
+
+def marcar(response, etag, ultima_modificacion):
+    response['ETag'] = f'"{etag}"'
+    response['Last-Modified'] = http_date(ultima_modificacion)
+    # El navegador puede guardar la respuesta pero debe revalidarla siempre
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class RespuestaCacheadaMixin:
+    """
+    Mixin para vistas GET de solo lectura (dashboard y datos de referencia).
+
+    - ETag/Last-Modified se calculan solo con las versiones de
+      'cache_grupos', que viven en la cache: si el cliente ya tiene la
+      versión actual responde 304 sin tocar el ORM.
+    - Si no, reutiliza el cuerpo cacheado para esa combinación de ruta y
+      versiones, o lo calcula (vista normal) y lo guarda.
+
+    La autenticación y los permisos se siguen evaluando en cada request.
+    Las vistas que calculan su propia respuesta implementan get_sin_cache()
+    en vez de get().
+    """
+    cache_grupos = ()
+
+    def get_sin_cache(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        etag, ultima_modificacion, cacheado = consultar(request, self.cache_grupos)
+        if cacheado is NO_MODIFICADO:
+            response = Response(status=304)
+        elif cacheado is not None:
+            response = Response(cacheado)
+        else:
+            response = self.get_sin_cache(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if replica.al_dia(ultima_modificacion):
+                guardar(etag, response.data)
+        return marcar(response, etag, ultima_modificacion)
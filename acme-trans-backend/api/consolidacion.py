@@ -0,0 +1,158 @@
+# api/consolidacion.py
+
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from .asignacion import (CAPACIDAD_MAXIMA, ORDEN_CAPACIDAD, pedidos_pendientes, camiones_disponibles, emparejar,
+                         guardar, libre_segun_reservas)
+from .db import transaccion_escritura
+
+# Los cálculos van en centésimas enteras (kg y m³ tienen 2 decimales):
+# sumas exactas y comparaciones de enteros, sin Decimal en el ciclo
+CAPACIDAD = {
+    capacidad: (int(maximo['peso_kg'] * 100), int(maximo['volumen_m3'] * 100))
+    for capacidad, maximo in CAPACIDAD_MAXIMA.items()
+}
+MAYOR = ORDEN_CAPACIDAD[-1]
+
+# Pedidos que viajan juntos en un camión. peso_kg y volumen_m3 son los
+# totales (Decimal), así emparejar() las trata como un pedido más.
+Carga = namedtuple('Carga', 'sucursal_id ciudad_destino fecha_deseada capacidad pedidos peso_kg volumen_m3')
+
+
+def _centesimas(valor):
+    return int(valor * 100)
+
+def _menor_capacidad(peso, volumen):
+    """ El camión más chico en que cabe la carga (centésimas) """
+    for capacidad in ORDEN_CAPACIDAD:
+        maximo_peso, maximo_volumen = CAPACIDAD[capacidad]
+        if peso <= maximo_peso and volumen <= maximo_volumen:
+            return capacidad
+    return None
+
+
+# --- Empaquetado ---
+
+def empaquetar(items):
+    """
+    Reparte items [(pedido, peso, volumen)] (centésimas, todos caben en el
+    camión mayor) en la menor cantidad de camiones que encuentre: First
+    Fit Decreasing en dos dimensiones. Los items se ordenan por su mayor
+    fracción de un camión grande (peso o volumen) y cada uno entra en la
+    primera carga abierta donde cabe en ambas. Al final cada carga baja al
+    camión más chico que la admite.
+
+    Las cargas a las que ya no les cabe ni el item más liviano (o el de
+    menos volumen) que queda se cierran: la búsqueda recorre solo las que
+    pueden recibir algo. Devuelve [(capacidad, [pedidos], peso, volumen)].
+    """
+    maximo_peso, maximo_volumen = CAPACIDAD[MAYOR]
+    items = sorted(items, key=lambda i: (-max(i[1] / maximo_peso, i[2] / maximo_volumen), i[0].id))
+
+    # Mínimos de lo que falta por ubicar (de atrás hacia adelante)
+    minimos = [None] * len(items)
+    minimo_peso = minimo_volumen = float('inf')
+    for n in range(len(items) - 1, -1, -1):
+        minimo_peso, minimo_volumen = min(minimo_peso, items[n][1]), min(minimo_volumen, items[n][2])
+        minimos[n] = (minimo_peso, minimo_volumen)
+
+    abiertas, cerradas = [], []  # [peso libre, volumen libre, pedidos]
+    for n, (pedido, peso, volumen) in enumerate(items):
+        for carga in abiertas:
+            if peso <= carga[0] and volumen <= carga[1]:
+                carga[0] -= peso
+                carga[1] -= volumen
+                carga[2].append(pedido)
+                break
+        else:
+            abiertas.append([maximo_peso - peso, maximo_volumen - volumen, [pedido]])
+        if n + 1 < len(items):
+            minimo_peso, minimo_volumen = minimos[n + 1]
+            if any(c[0] < minimo_peso or c[1] < minimo_volumen for c in abiertas):
+                cerradas += [c for c in abiertas if c[0] < minimo_peso or c[1] < minimo_volumen]
+                abiertas = [c for c in abiertas if c[0] >= minimo_peso and c[1] >= minimo_volumen]
+
+    resultado = []
+    for libre_peso, libre_volumen, pedidos in cerradas + abiertas:
+        peso, volumen = maximo_peso - libre_peso, maximo_volumen - libre_volumen
+        resultado.append((_menor_capacidad(peso, volumen), pedidos, peso, volumen))
+    return resultado
+
+
+def planificar(pedidos):
+    """
+    Agrupa los pedidos por (sucursal_origen, ciudad_destino, fecha_deseada)
+    y empaqueta cada grupo. Sin consultas: recibe pedidos ya leídos.
+    Los pedidos sin ciudad reconocida (api/geo.py) no se sabe con quién
+    pueden viajar: van solos. Devuelve (cargas, sin_capacidad), con las
+    cargas ordenadas por fecha, sucursal y ciudad.
+    """
+    maximo_peso, maximo_volumen = CAPACIDAD[MAYOR]
+    grupos = defaultdict(list)
+    sin_capacidad = []
+    for pedido in pedidos:
+        peso, volumen = _centesimas(pedido.peso_kg), _centesimas(pedido.volumen_m3)
+        if peso > maximo_peso or volumen > maximo_volumen:
+            sin_capacidad.append(pedido)
+            continue
+        solo = None if pedido.ciudad_destino else pedido.id
+        grupos[pedido.sucursal_origen_id, pedido.ciudad_destino, pedido.fecha_deseada, solo].append(
+            (pedido, peso, volumen))
+
+    cargas = []
+    for (sucursal_id, ciudad, fecha, _), items in grupos.items():
+        for capacidad, incluidos, peso, volumen in empaquetar(items):
+            incluidos.sort(key=lambda p: p.id)
+            cargas.append(Carga(sucursal_id, ciudad, fecha, capacidad, incluidos,
+                                Decimal(peso).scaleb(-2), Decimal(volumen).scaleb(-2)))
+    cargas.sort(key=lambda c: (c.fecha_deseada, c.sucursal_id, c.ciudad_destino or '', c.pedidos[0].id))
+    return cargas, sin_capacidad
+
+
+def describir(carga, capacidad=None, camion_id=None):
+    """ La carga como dict para la API: llenado (0-1) respecto de 'capacidad' (por defecto, la planificada) """
+    capacidad = capacidad or carga.capacidad
+    maximo = CAPACIDAD_MAXIMA[capacidad]
+    return {
+        'camion': camion_id,
+        'capacidad': capacidad,
+        'ciudad_destino': carga.ciudad_destino,
+        'fecha_deseada': carga.fecha_deseada,
+        'pedidos': [pedido.id for pedido in carga.pedidos],
+        'peso_kg': str(carga.peso_kg),
+        'volumen_m3': str(carga.volumen_m3),
+        'llenado_peso': round(float(carga.peso_kg) / maximo['peso_kg'], 3),
+        'llenado_volumen': round(float(carga.volumen_m3) / maximo['volumen_m3'], 3),
+    }
+
+
+# --- Consolidación ---
+
+def consolidar(sucursal_id, pedido_ids=None, hasta=None, simular=False):
+    """
+    Consolida los pedidos CONFIRMADO sin camión de una sucursal: los arma
+    en cargas (planificar) y a cada carga le asigna un camión disponible
+    con emparejar(), como si fuera un pedido, en una sola transacción. Los
+    pedidos de una carga quedan con el mismo camion_asignado.
+
+    Devuelve {'cargas': [describir()], 'sin_camion': [describir()],
+    'sin_capacidad': [pedido_id], 'camiones_ahorrados': n}, donde el ahorro
+    se mide contra un camión por pedido. Con simular=True no escribe nada.
+    """
+    with transaccion_escritura():
+        pedidos = list(pedidos_pendientes(sucursal_id, pedido_ids, hasta).select_for_update())
+        cargas, sin_capacidad = planificar(pedidos)
+        camiones = list(camiones_disponibles(sucursal_id).select_for_update())
+        asignaciones, sin_camion, _ = emparejar(
+            cargas, camiones, orden=lambda c: (c.fecha_deseada, c.pedidos[0].id), libre=libre_segun_reservas())
+
+        if asignaciones and not simular:
+            guardar(sucursal_id, [(pedido, camion) for carga, camion in asignaciones for pedido in carga.pedidos])
+
+    return {
+        'cargas': [describir(carga, camion.capacidad, camion.id) for carga, camion in asignaciones],
+        'sin_camion': [describir(carga) for carga in sin_camion],
+        'sin_capacidad': [pedido.id for pedido in sin_capacidad],
+        'camiones_ahorrados': len(pedidos) - len(sin_capacidad) - len(cargas),
+    }
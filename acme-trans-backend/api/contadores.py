@@ -0,0 +1,149 @@
+# api/contadores.py
+
+import asyncio
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Empleado, Camion, Pedido, ContadorSucursal
+
+
+# --- Claves de contador ---
+# Cada objeto "cuenta" en exactamente una clave (sucursal_id, entidad, estado),
+# o en ninguna (ej: un empleado que no es conductor).
+
+def clave_pedido(sucursal_id, estado):
+    return (sucursal_id, 'PED', estado)
+
+def clave_camion(sucursal_id, estado):
+    return (sucursal_id, 'CAM', estado)
+
+def clave_empleado(sucursal_id, cargo, estado):
+    if cargo != 'CON':
+        return None
+    return (sucursal_id, 'CON', estado)
+
+def clave_de(instance):
+    """ Clave actual de una instancia de Pedido, Camion o Empleado """
+    if isinstance(instance, Pedido):
+        return clave_pedido(instance.sucursal_origen_id, instance.estado)
+    if isinstance(instance, Camion):
+        return clave_camion(instance.sucursal_base_id, instance.estado)
+    if isinstance(instance, Empleado):
+        return clave_empleado(instance.sucursal_id, instance.cargo, instance.estado)
+    return None
+
+
+# --- Escritura ---
+
+def ajustar(deltas):
+    """
+    Aplica {clave: delta} a la tabla de contadores con UPDATE ... SET
+    total = total + delta (atómico a nivel de fila). Debe llamarse dentro
+    de la transacción que hizo el cambio.
+    """
+    for (sucursal_id, entidad, estado), delta in deltas.items():
+        if not delta:
+            continue
+        filtro = {'sucursal_id': sucursal_id, 'entidad': entidad, 'estado': estado}
+        if ContadorSucursal.objects.filter(**filtro).update(total=F('total') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                ContadorSucursal.objects.create(total=delta, **filtro)
+        except IntegrityError:
+            # Otra transacción creó la fila entre el UPDATE y el INSERT
+            ContadorSucursal.objects.filter(**filtro).update(total=F('total') + delta)
+
+def mover(clave_anterior, clave_nueva):
+    """ Registra que un objeto pasó de una clave a otra (None = no cuenta) """
+    if clave_anterior == clave_nueva:
+        return
+    deltas = Counter()
+    if clave_anterior:
+        deltas[clave_anterior] -= 1
+    if clave_nueva:
+        deltas[clave_nueva] += 1
+    ajustar(deltas)
+
+
+# --- Reconstrucción y verificación ---
+
+def calcular(sucursal_id=None):
+    """ Cuenta desde cero (GROUP BY sobre las tablas reales) """
+    pedidos = Pedido.objects.all()
+    camiones = Camion.objects.all()
+    conductores = Empleado.objects.filter(cargo='CON')
+    if sucursal_id is not None:
+        pedidos = pedidos.filter(sucursal_origen_id=sucursal_id)
+        camiones = camiones.filter(sucursal_base_id=sucursal_id)
+        conductores = conductores.filter(sucursal_id=sucursal_id)
+
+    conteo = {}
+    for fila in pedidos.values('sucursal_origen_id', 'estado').annotate(n=Count('id')).order_by():
+        conteo[clave_pedido(fila['sucursal_origen_id'], fila['estado'])] = fila['n']
+    for fila in camiones.values('sucursal_base_id', 'estado').annotate(n=Count('id')).order_by():
+        conteo[clave_camion(fila['sucursal_base_id'], fila['estado'])] = fila['n']
+    for fila in conductores.values('sucursal_id', 'estado').annotate(n=Count('id')).order_by():
+        conteo[clave_empleado(fila['sucursal_id'], 'CON', fila['estado'])] = fila['n']
+    return conteo
+
+def almacenados(sucursal_id=None):
+    """ Contadores guardados, sin las filas en cero """
+    contadores = ContadorSucursal.objects.exclude(total=0)
+    if sucursal_id is not None:
+        contadores = contadores.filter(sucursal_id=sucursal_id)
+    return {
+        (c['sucursal_id'], c['entidad'], c['estado']): c['total']
+        for c in contadores.values('sucursal_id', 'entidad', 'estado', 'total')
+    }
+
+def diferencias(sucursal_id=None):
+    """ {clave: (guardado, real)} para cada contador que no cuadra """
+    real = calcular(sucursal_id)
+    guardado = almacenados(sucursal_id)
+    return {
+        clave: (guardado.get(clave, 0), real.get(clave, 0))
+        for clave in set(real) | set(guardado)
+        if guardado.get(clave, 0) != real.get(clave, 0)
+    }
+
+@transaction.atomic
+def reconstruir(sucursal_id=None):
+    """ Reemplaza los contadores por un conteo desde cero. Devuelve el conteo. """
+    conteo = calcular(sucursal_id)
+    existentes = ContadorSucursal.objects.all()
+    if sucursal_id is not None:
+        existentes = existentes.filter(sucursal_id=sucursal_id)
+    existentes.delete()
+    ContadorSucursal.objects.bulk_create([
+        ContadorSucursal(sucursal_id=suc, entidad=entidad, estado=estado, total=total)
+        for (suc, entidad, estado), total in conteo.items()
+    ])
+    return conteo
+
+
+# --- Lectura para el dashboard ---
+
+def por_sucursal(sucursal_id):
+    """ {entidad: {estado: total}} de una sucursal (una sola consulta) """
+    resultado = {'PED': {}, 'CAM': {}, 'CON': {}}
+    filas = ContadorSucursal.objects.filter(sucursal_id=sucursal_id, total__gt=0) \
+                                    .order_by('entidad', 'estado') \
+                                    .values_list('entidad', 'estado', 'total')
+    for entidad, estado, total in filas:
+        resultado[entidad][estado] = total
+    return resultado
+
+async def _aentidad(sucursal_id, entidad):
+    filas = ContadorSucursal.objects.filter(sucursal_id=sucursal_id, entidad=entidad, total__gt=0) \
+                                    .order_by('estado') \
+                                    .values_list('estado', 'total')
+    return {estado: total async for estado, total in filas}
+
+async def apor_sucursal(sucursal_id):
+    """ Como por_sucursal(), con el ORM async: una consulta por entidad, lanzadas juntas """
+    entidades = ('PED', 'CAM', 'CON')
+    totales = await asyncio.gather(*(_aentidad(sucursal_id, entidad) for entidad in entidades))
+    return dict(zip(entidades, totales))
@@ -0,0 +1,108 @@
+# api/cotizacion.py
+
+from decimal import Decimal
+
+from django.conf import settings
+
+from . import cache, contadores, eventos, geo, transiciones
+from .db import transaccion_escritura
+from .models import Pedido
+
+
+# --- Cálculo por columnas ---
+
+def _columna(claves, resolver):
+    """
+    Resuelve 'resolver' una vez por valor distinto y expande el resultado
+    a toda la columna (hay pocas ciudades y tipos de carga, miles de filas).
+    """
+    resueltos = {clave: resolver(clave) for clave in set(claves)}
+    return list(map(resueltos.__getitem__, claves))
+
+def calcular(pesos, volumenes, tipos_carga, km, tarifas=None):
+    """
+    Costo y precio (CLP) de un lote de pedidos, columna por columna.
+    Recibe listas paralelas (km: distancia de cada pedido, ver
+    distancias()) y devuelve (costos, precios) como listas de Decimal, en
+    el mismo orden.
+
+        peso cobrable = max(peso_kg, volumen_m3 * kg_por_m3)
+        costo = (base + km * por_km + peso cobrable / 1000 * km * por_ton_km) * factor_carga
+        precio = costo * (1 + margen), redondeado a redondeo_precio
+    """
+    t = tarifas or settings.ACME_TARIFAS
+    factores = t['factor_carga']
+
+    factor = _columna(tipos_carga, lambda tipo: factores.get(tipo, 1.0))
+    cobrable = [max(float(p), float(v) * t['kg_por_m3']) for p, v in zip(pesos, volumenes)]
+
+    base, por_km, por_ton_km = t['base'], t['por_km'], t['por_ton_km']
+    costos = [
+        (base + k * por_km + c / 1000 * k * por_ton_km) * f
+        for c, k, f in zip(cobrable, km, factor)
+    ]
+
+    redondeo = t['redondeo_precio']
+    margen = 1 + t['margen']
+    precios = [round(costo * margen / redondeo) * redondeo for costo in costos]
+    return [Decimal(round(costo)) for costo in costos], [Decimal(precio) for precio in precios]
+
+
+def distancias(sucursal_id, ciudades, tarifas=None):
+    """
+    Km desde la sucursal a cada ciudad (código guardado en el pedido), de
+    la matriz de api/geo.py; km_por_defecto si el destino no se reconoció.
+    """
+    t = tarifas or settings.ACME_TARIFAS
+    matriz = geo.matriz()
+    return _columna(ciudades, lambda ciudad: matriz.km(sucursal_id, ciudad, t['km_por_defecto']))
+
+
+# --- Cotización de un lote ---
+
+def cotizar(sucursal_id, pedido_ids=None, simular=False):
+    """
+    Cotiza los pedidos SOLICITADO de una sucursal: una consulta para leer
+    las columnas, un cálculo por columnas y bulk_update en la misma
+    transacción (pasan a COTIZADO). Como bulk_update() no emite señales,
+    los contadores, el historial, la cache y los eventos en vivo se
+    ajustan aquí.
+
+    Devuelve [(pedido_id, costo_estimado, precio_cotizado)].
+    Con simular=True no escribe nada.
+    """
+    with transaccion_escritura():
+        pedidos = Pedido.objects.filter(sucursal_origen_id=sucursal_id, estado='SOLICITADO')
+        if pedido_ids is not None:
+            pedidos = pedidos.filter(pk__in=pedido_ids)
+        filas = list(pedidos.select_for_update(of=('self',)).order_by('id').values_list(
+            'id', 'peso_kg', 'volumen_m3', 'tipo_carga', 'ciudad_destino', 'cliente_id'
+        ))
+        if not filas:
+            return []
+
+        ids, pesos, volumenes, tipos_carga, ciudades, clientes = zip(*filas)
+        costos, precios = calcular(pesos, volumenes, tipos_carga, distancias(sucursal_id, ciudades))
+
+        if not simular:
+            # El estado es el mismo para todos: un UPDATE simple, fuera del
+            # bulk_update (cada campo ahí es un CASE con una rama por fila)
+            Pedido.objects.bulk_update(
+                [Pedido(id=i, costo_estimado=c, precio_cotizado=p) for i, c, p in zip(ids, costos, precios)],
+                ['costo_estimado', 'precio_cotizado'], batch_size=500,
+            )
+            for i in range(0, len(ids), 500):
+                Pedido.objects.filter(pk__in=ids[i:i + 500]).update(estado='COTIZADO')
+            contadores.ajustar({
+                contadores.clave_pedido(sucursal_id, 'SOLICITADO'): -len(ids),
+                contadores.clave_pedido(sucursal_id, 'COTIZADO'): len(ids),
+            })
+            transiciones.registrar((i, 'SOLICITADO', 'COTIZADO') for i in ids)
+            cache.invalidar('pedido')
+            eventos.publicar(
+                eventos.evento('pedido', 'actualizado', i, sucursal_id,
+                               {'estado': 'COTIZADO', 'precio_cotizado': p}, cliente_id)
+                for i, p, cliente_id in zip(ids, precios, clientes)
+            )
+
+    return list(zip(ids, costos, precios))
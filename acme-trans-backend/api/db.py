@@ -0,0 +1,103 @@
+# api/db.py
+
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.db import DEFAULT_DB_ALIAS, OperationalError, transaction
+
+from . import replica, transiciones
+
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+
+def bloqueada(error):
+    """ ¿Es el 'database is locked' de SQLite (busy_timeout agotado)? """
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def transaccion_escritura(using=None):
+    """
+    transaction.atomic() para escribir. En SQLite empieza con BEGIN
+    IMMEDIATE (OPTIONS['transaction_mode'] de la base, ver settings.py):
+    toma el lock de escritura al entrar, esperando hasta busy_timeout si
+    otro proceso lo tiene. Con un BEGIN normal el lock se pide recién en el
+    primer INSERT/UPDATE, y si otra transacción ya escribe SQLite falla al
+    instante con 'database is locked' (no espera: sería un deadlock).
+    Es también el equivalente de select_for_update(), que SQLite ignora.
+
+    Dentro de otra transacción es un atomic() común (un savepoint).
+    """
+    return transaction.atomic(using=using)
+
+
+@checks.register()
+def revisar_transaction_mode(app_configs, **kwargs):
+    """ Sin BEGIN IMMEDIATE las escrituras concurrentes fallan en vez de esperar el lock """
+    datos = settings.DATABASES.get(DEFAULT_DB_ALIAS, {})
+    if 'sqlite3' not in datos.get('ENGINE', '') or datos.get('OPTIONS', {}).get('transaction_mode') == 'IMMEDIATE':
+        return []
+    return [checks.Warning(
+        "La base SQLite 'default' no usa OPTIONS['transaction_mode']='IMMEDIATE': las transacciones "
+        "de escritura concurrentes pueden fallar con 'database is locked' en vez de esperar.",
+        id='api.W001',
+    )]
+
+
+def reintentar_bloqueo(funcion):
+    """
+    Ejecuta 'funcion' en una transaccion_escritura(). Si SQLite responde
+    'database is locked' la transacción se revierte (sus on_commit se
+    descartan) y se reintenta con espera exponencial y jitter, hasta
+    ACME_DB_REINTENTOS veces. Dentro de otra transacción no reintenta:
+    el error sube para que la revierta quien la abrió.
+    """
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        reintentos = getattr(settings, 'ACME_DB_REINTENTOS', 4)
+        espera = getattr(settings, 'ACME_DB_REINTENTO_ESPERA', 0.05)
+        for intento in range(reintentos + 1):
+            try:
+                with transaccion_escritura():
+                    return funcion(*args, **kwargs)
+            except OperationalError as e:
+                if not bloqueada(e) or intento == reintentos or transaction.get_connection().in_atomic_block:
+                    raise
+            time.sleep(espera * 2 ** intento * random.uniform(0.5, 1.5))
+    return envoltura
+
+
+class EscrituraReintentableMixin:
+    """
+    Mixin para vistas que escriben (POST/PUT/PATCH/DELETE): cada request
+    corre en una transaccion_escritura() con reintentos (reintentar_bloqueo),
+    que incluye los ajustes de contadores de api/signals.py. Los GET no
+    abren transacción: con WAL las lecturas nunca se bloquean.
+    Tras una escritura exitosa, las lecturas del usuario quedan un rato en
+    la base primaria (replica.fijar_primaria). Los cambios de estado de
+    pedidos quedan en el historial a nombre del usuario (transiciones).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._token_actor = transiciones.fijar_actor(getattr(request.user, 'id', None))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_token_actor', None)
+        if token is not None:
+            self._token_actor = None
+            transiciones.soltar_actor(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in METODOS_LECTURA:
+            return super().dispatch(request, *args, **kwargs)
+        # El cuerpo queda en memoria: cada intento lo vuelve a parsear
+        request.body
+        response = reintentar_bloqueo(super().dispatch)(request, *args, **kwargs)
+        if response.status_code < 400:
+            # Sus próximas lecturas, en la primaria (ver api/replica.py)
+            replica.fijar_primaria(self.request.user)
+        return response
@@ -0,0 +1,309 @@
+# api/eventos.py
+
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.module_loading import import_string
+
+from .models import EventoPublicado
+
+# Campos que viajan en los eventos de save() de cada modelo (compactos: el
+# cliente actualiza su fila o, si le falta algo, vuelve a pedir la lista).
+# El pedido no lleva costo_estimado: también lo recibe el canal del cliente.
+CAMPOS = {
+    'pedido': ('estado', 'precio_cotizado', 'camion_asignado_id'),
+    'camion': ('estado', 'conductor_asignado_id'),
+    'empleado': ('estado', 'cargo'),
+}
+
+_encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+# --- Canales y eventos ---
+
+def canal_sucursal(sucursal_id):
+    return f'sucursal:{sucursal_id}'
+
+def canal_cliente(cliente_id):
+    return f'cliente:{cliente_id}'
+
+def evento(entidad, accion, id, sucursal_id, datos, cliente_id=None):
+    """
+    (canales, evento) listo para publicar. Los pedidos van también al canal
+    de su cliente; camiones y empleados solo al de su sucursal.
+    """
+    canales = {canal_sucursal(sucursal_id)}
+    if cliente_id is not None:
+        canales.add(canal_cliente(cliente_id))
+    return frozenset(canales), {
+        'entidad': entidad, 'accion': accion, 'id': id, 'sucursal_id': sucursal_id, 'datos': datos,
+    }
+
+def de_instancia(instance, accion):
+    """ Evento de un Pedido, Camion o Empleado recién guardado o eliminado """
+    entidad = instance._meta.model_name
+    diferidos = instance.get_deferred_fields()
+    datos = {} if accion == 'eliminado' else {
+        campo: getattr(instance, campo) for campo in CAMPOS[entidad] if campo not in diferidos
+    }
+    if entidad == 'pedido':
+        return evento(entidad, accion, instance.pk, instance.sucursal_origen_id, datos, instance.cliente_id)
+    if entidad == 'camion':
+        return evento(entidad, accion, instance.pk, instance.sucursal_base_id, datos)
+    return evento(entidad, accion, instance.pk, instance.sucursal_id, datos)
+
+def publicar(eventos):
+    """
+    Publica [(canales, evento)] cuando la transacción en curso haga commit
+    (si se revierte, no se anuncia nada). bulk_update()/update() no emiten
+    señales: quien los use debe llamar aquí, como con contadores.ajustar().
+    """
+    eventos = list(eventos)
+    if eventos:
+        # robust: si no se puede publicar, la escritura (ya confirmada) no falla
+        transaction.on_commit(lambda: backend().publicar(eventos), robust=True)
+
+
+# --- Backend en memoria ---
+
+class Suscripcion:
+    """ Cola de un stream SSE; recibe eventos desde cualquier hilo """
+
+    def __init__(self, backend, canales, maximo):
+        self.backend = backend
+        self.canales = canales
+        self.maximo = maximo
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue()
+        self.desbordada = False
+
+    def entregar(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self._poner, item)
+        except RuntimeError:
+            # El loop del stream ya se cerró sin pasar por cerrar()
+            self.backend.desuscribir(self)
+
+    def _poner(self, item):
+        if self.desbordada:
+            return
+        if self.cola.qsize() >= self.maximo:
+            # Cliente lento: se corta el stream y al reconectar (Last-Event-ID)
+            # recupera lo que falte del historial
+            self.desbordada = True
+            item = None
+        self.cola.put_nowait(item)
+
+    async def siguiente(self, timeout):
+        """ (id, evento), None si hay que cortar, o TimeoutError """
+        return await asyncio.wait_for(self.cola.get(), timeout)
+
+    def cerrar(self):
+        self.backend.desuscribir(self)
+
+
+class MemoriaBackend:
+    """
+    Broadcaster del proceso actual: historial circular para Last-Event-ID
+    y una cola por stream abierto. Con varios procesos (workers) cada uno
+    solo ve sus propios eventos: ahí va BaseDatosBackend, con la misma
+    interfaz (publicar / suscribir / desuscribir) (ACME_EVENTOS_BACKEND).
+
+    Los ids son "<época>-<n>": la época cambia en cada arranque, así un
+    Last-Event-ID de antes de un reinicio no se confunde con uno nuevo.
+    """
+
+    def __init__(self, historial=1000, cola=1000):
+        self._lock = threading.Lock()
+        self._historial = deque(maxlen=historial)
+        self._suscripciones = set()
+        self._maximo_cola = cola
+        self._epoca = format(time.time_ns(), 'x')
+        self._ultimo = 0
+
+    def publicar(self, eventos):
+        with self._lock:
+            for canales, datos in eventos:
+                self._ultimo += 1
+                item = (f'{self._epoca}-{self._ultimo}', datos)
+                self._historial.append((self._ultimo, canales, item))
+                for suscripcion in list(self._suscripciones):
+                    if suscripcion.canales & canales:
+                        suscripcion.entregar(item)
+
+    def suscribir(self, canales, ultimo_id=None):
+        """
+        Abre una suscripción (desde el event loop del stream). Si viene
+        'ultimo_id', primero encola lo publicado después de él; si ya no
+        está en el historial, encola un evento 'reset' (hay que recargar).
+        """
+        suscripcion = Suscripcion(self, frozenset(canales), self._maximo_cola)
+        with self._lock:
+            if ultimo_id:
+                for item in self._pendientes(suscripcion.canales, ultimo_id):
+                    suscripcion.cola.put_nowait(item)
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    async def asuscribir(self, canales, ultimo_id=None):
+        return self.suscribir(canales, ultimo_id)
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def _pendientes(self, canales, ultimo_id):
+        epoca, _, numero = ultimo_id.partition('-')
+        primero = self._historial[0][0] if self._historial else self._ultimo + 1
+        if epoca != self._epoca or not numero.isdigit() or int(numero) > self._ultimo \
+                or int(numero) < primero - 1:
+            return [(f'{self._epoca}-{self._ultimo}', None)]
+        return [item for n, c, item in self._historial if n > int(numero) and c & canales]
+
+
+# --- Backend entre procesos ---
+
+class BaseDatosBackend:
+    """
+    Eventos a través de la base (tabla api_eventopublicado): publicar()
+    inserta, en el proceso que escribió (un worker WSGI, un comando...), y
+    cada proceso que sirve streams lee las filas nuevas cada
+    ACME_EVENTOS_SONDEO segundos, con una sola tarea para todas sus
+    conexiones, y las reparte. La tabla es también el historial de
+    Last-Event-ID (ids "bd-<id de la fila>", que sobreviven a reinicios).
+
+    Los ids de las filas tienen que confirmarse en orden: vale en SQLite,
+    donde las escrituras van de a una. Los eventos llegan con hasta un
+    intervalo de sondeo de retraso.
+    """
+    PREFIJO = 'bd'
+
+    def __init__(self, historial=1000, cola=1000, intervalo=None):
+        self._historial = historial
+        self._maximo_cola = cola
+        self._intervalo = intervalo if intervalo is not None else getattr(settings, 'ACME_EVENTOS_SONDEO', 1)
+        self._suscripciones = set()
+        self._tarea = None
+        self._ultimo = None  # Último id visto por el sondeo de este proceso
+
+    def publicar(self, eventos):
+        filas = EventoPublicado.objects.bulk_create(
+            EventoPublicado(canales=' '.join(sorted(canales)), datos=datos) for canales, datos in eventos
+        )
+        ultimo = filas[-1].pk if filas else None
+        # Cada ~100 eventos se borra lo que ya salió del historial
+        if ultimo is not None and ultimo % 100 < len(filas):
+            EventoPublicado.objects.filter(pk__lte=ultimo - self._historial).delete()
+
+    def suscribir(self, canales, ultimo_id=None):
+        """ Como MemoriaBackend.suscribir(); lo pendiente llega en el próximo sondeo (ver asuscribir()) """
+        suscripcion = Suscripcion(self, frozenset(canales), self._maximo_cola)
+        # visto: último id entregado (None: desde ahora; -1: id desconocido, reset)
+        suscripcion.visto = None
+        if ultimo_id:
+            prefijo, _, numero = ultimo_id.partition('-')
+            suscripcion.visto = int(numero) if prefijo == self.PREFIJO and numero.isdigit() else -1
+        self._suscripciones.add(suscripcion)
+        if self._tarea is None or self._tarea.done() or self._tarea.get_loop() is not suscripcion.loop:
+            self._tarea = suscripcion.loop.create_task(self._sondear())
+        return suscripcion
+
+    async def asuscribir(self, canales, ultimo_id=None):
+        """ Sin ultimo_id, la posición de partida es el último evento ya publicado (no se pierde nada) """
+        if not ultimo_id and self._ultimo is None:
+            _, self._ultimo, _ = await sync_to_async(self._leer)(None)
+        suscripcion = self.suscribir(canales, ultimo_id)
+        if suscripcion.visto is None:
+            suscripcion.visto = self._ultimo
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        self._suscripciones.discard(suscripcion)
+        if not self._suscripciones and self._tarea is not None:
+            try:
+                self._tarea.cancel()
+            except RuntimeError:
+                pass  # Su loop ya se cerró
+
+    def _leer(self, desde):
+        """ (primer id, último id, filas después de 'desde') de la tabla """
+        rango = EventoPublicado.objects.aggregate(primero=Min('id'), ultimo=Max('id'))
+        filas = []
+        if desde is not None and desde < (rango['ultimo'] or 0):
+            filas = list(EventoPublicado.objects.filter(pk__gt=desde).order_by('pk')
+                                                .values_list('pk', 'canales', 'datos')[:self._historial])
+        return rango['primero'], rango['ultimo'] or 0, filas
+
+    async def _sondear(self):
+        leer = sync_to_async(self._leer)
+        while self._suscripciones:
+            suscripciones = list(self._suscripciones)
+            conocidos = [s.visto for s in suscripciones if s.visto is not None and s.visto >= 0]
+            primero, ultimo, filas = await leer(min(conocidos, default=None))
+            self._ultimo = ultimo
+            for suscripcion in suscripciones:
+                visto = suscripcion.visto
+                if visto is None:
+                    suscripcion.visto = ultimo
+                elif visto < 0 or visto > ultimo or (primero is not None and visto < primero - 1):
+                    # Fuera del historial (o de antes de vaciar la tabla): hay que recargar
+                    suscripcion._poner((f'{self.PREFIJO}-{ultimo}', None))
+                    suscripcion.visto = ultimo
+            for numero, canales, datos in filas:
+                canales = frozenset(canales.split())
+                for suscripcion in suscripciones:
+                    if numero > suscripcion.visto:
+                        if suscripcion.canales & canales:
+                            suscripcion._poner((f'{self.PREFIJO}-{numero}', datos))
+                        suscripcion.visto = numero
+            if len(filas) < self._historial:
+                await asyncio.sleep(self._intervalo)
+
+
+@functools.lru_cache(maxsize=None)
+def backend():
+    clase = import_string(getattr(settings, 'ACME_EVENTOS_BACKEND', 'api.eventos.MemoriaBackend'))
+    return clase(historial=getattr(settings, 'ACME_EVENTOS_HISTORIAL', 1000))
+
+
+# --- Formato SSE ---
+
+def formatear(item):
+    id, datos = item
+    if datos is None:
+        return f'id: {id}\nevent: reset\ndata: {{}}\n\n'
+    return f'id: {id}\ndata: {_encoder.encode(datos)}\n\n'
+
+async def stream(canales, ultimo_id=None):
+    """
+    Cuerpo de un StreamingHttpResponse (ASGI). La suscripción se abre al
+    empezar a enviar, en el loop que consume el stream. Cada ACME_EVENTOS_PING
+    segundos va un comentario para mantener viva la conexión, y a los
+    ACME_EVENTOS_DURACION segundos se corta: el navegador reconecta solo
+    (con Last-Event-ID) y las conexiones no quedan abiertas para siempre.
+    """
+    ping = getattr(settings, 'ACME_EVENTOS_PING', 15)
+    loop = asyncio.get_running_loop()
+    fin = loop.time() + getattr(settings, 'ACME_EVENTOS_DURACION', 300)
+    suscripcion = await backend().asuscribir(canales, ultimo_id)
+    try:
+        yield 'retry: 3000\n\n'
+        while (restante := fin - loop.time()) > 0:
+            try:
+                item = await suscripcion.siguiente(min(ping, restante))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if item is None:
+                break
+            yield formatear(item)
+    finally:
+        suscripcion.cerrar()
@@ -0,0 +1,147 @@
+# api/exports.py
+
+import csv
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Empleado, Camion, Pedido
+
+# Filas que se piden a la base por viaje y que se envían por chunk
+CHUNK_SIZE = 2000
+
+
+# --- Definición de cada exportación ---
+# columnas: (encabezado, campo para .values()); 'sucursal' y 'fecha' son
+# los campos sobre los que se aplican los filtros ?sucursal_id y ?desde/?hasta.
+
+EXPORTACIONES = {
+    'pedidos': {
+        'queryset': lambda: Pedido.objects.all(),
+        'sucursal': 'sucursal_origen_id',
+        'fecha': 'fecha_solicitud',
+        'columnas': [
+            ('id', 'id'),
+            ('fecha_solicitud', 'fecha_solicitud'),
+            ('estado', 'estado'),
+            ('sucursal_origen', 'sucursal_origen__nombre'),
+            ('cliente', 'cliente__user__username'),
+            ('empresa', 'cliente__nombre_empresa'),
+            ('destino', 'destino'),
+            ('tipo_carga', 'tipo_carga'),
+            ('peso_kg', 'peso_kg'),
+            ('volumen_m3', 'volumen_m3'),
+            ('fecha_deseada', 'fecha_deseada'),
+            ('costo_estimado', 'costo_estimado'),
+            ('precio_cotizado', 'precio_cotizado'),
+            ('camion', 'camion_asignado__matricula'),
+        ],
+    },
+    'camiones': {
+        'queryset': lambda: Camion.objects.all(),
+        'sucursal': 'sucursal_base_id',
+        'fecha': None,
+        'columnas': [
+            ('id', 'id'),
+            ('matricula', 'matricula'),
+            ('capacidad', 'capacidad'),
+            ('estado', 'estado'),
+            ('sucursal_base', 'sucursal_base__nombre'),
+            ('conductor', 'conductor_asignado__user__username'),
+        ],
+    },
+    'empleados': {
+        'queryset': lambda: Empleado.objects.all(),
+        'sucursal': 'sucursal_id',
+        'fecha': None,
+        'columnas': [
+            ('id', 'id'),
+            ('username', 'user__username'),
+            ('nombre', 'user__first_name'),
+            ('apellido', 'user__last_name'),
+            ('email', 'user__email'),
+            ('cargo', 'cargo'),
+            ('estado', 'estado'),
+            ('sucursal', 'sucursal__nombre'),
+        ],
+    },
+}
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+def filtrar(entidad, sucursal_id=None, estados=None, desde=None, hasta=None):
+    """
+    Queryset de .values_list() de la exportación, ordenado por id (recorre
+    la clave primaria: no hay que ordenar antes de entregar la primera fila).
+    """
+    definicion = EXPORTACIONES[entidad]
+    queryset = definicion['queryset']()
+    if sucursal_id is not None:
+        queryset = queryset.filter(**{definicion['sucursal']: sucursal_id})
+    if estados:
+        queryset = queryset.filter(estado__in=estados)
+    # Rango de días como [desde 00:00, hasta+1 00:00) para no envolver la
+    # columna en una función (así puede usar índices)
+    if definicion['fecha']:
+        if desde is not None:
+            queryset = queryset.filter(**{f"{definicion['fecha']}__gte": _inicio_del_dia(desde)})
+        if hasta is not None:
+            queryset = queryset.filter(**{f"{definicion['fecha']}__lt": _inicio_del_dia(hasta + timedelta(days=1))})
+    campos = [campo for _, campo in definicion['columnas']]
+    return queryset.order_by('id').values_list(*campos)
+
+
+# --- Formatos ---
+
+class _Eco:
+    """ "Archivo" que devuelve lo escrito, para usar csv.writer sin buffer """
+    def write(self, valor):
+        return valor
+
+def _por_chunks(filas, formatear):
+    """ Junta las líneas de CHUNK_SIZE filas en un solo string por envío """
+    chunk = []
+    for fila in filas:
+        chunk.append(formatear(fila))
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def csv_stream(entidad, queryset):
+    writer = csv.writer(_Eco())
+    # El encabezado sale antes de ejecutar la consulta
+    yield writer.writerow([encabezado for encabezado, _ in EXPORTACIONES[entidad]['columnas']])
+    yield from _por_chunks(queryset.iterator(chunk_size=CHUNK_SIZE), writer.writerow)
+
+def ndjson_stream(entidad, queryset):
+    encabezados = [encabezado for encabezado, _ in EXPORTACIONES[entidad]['columnas']]
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    def linea(fila):
+        return encoder.encode(dict(zip(encabezados, fila))) + '\n'
+    yield from _por_chunks(queryset.iterator(chunk_size=CHUNK_SIZE), linea)
+
+async def en_async(generador):
+    """
+    Un generador de arriba como iterador async, para servirlo bajo ASGI:
+    con uno sync, StreamingHttpResponse junta todo el cuerpo en memoria
+    antes de enviar el primer byte. Pide de a un chunk por vez en el hilo
+    del ORM (sync_to_async), donde vive el cursor de .iterator().
+    """
+    fin = object()
+    siguiente = sync_to_async(next)
+    try:
+        while (chunk := await siguiente(generador, fin)) is not fin:
+            yield chunk
+    finally:
+        await sync_to_async(generador.close)()
+
+FORMATOS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_stream, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,179 @@
+# api/geo.py
+
+import csv
+import math
+import re
+import unicodedata
+from array import array
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Sucursal
+
+# --- Ciudades (tabla offline, api/data/ciudades.csv) ---
+
+Ciudad = namedtuple('Ciudad', 'codigo nombre region latitud longitud')
+
+def _cargar():
+    with open(Path(__file__).parent / 'data' / 'ciudades.csv', encoding='utf-8') as archivo:
+        return [
+            Ciudad(fila['codigo'], fila['nombre'], fila['region'], float(fila['latitud']), float(fila['longitud']))
+            for fila in csv.DictReader(archivo)
+        ]
+
+CIUDADES = {ciudad.codigo: ciudad for ciudad in _cargar()}
+
+# Formas abreviadas que aparecen en los destinos escritos a mano
+ALIAS = {
+    'stgo': 'santiago', 'santiago de chile': 'santiago',
+    'valpo': 'valparaiso', 'vina': 'vina-del-mar',
+    'conce': 'concepcion', 'pto montt': 'puerto-montt', 'pto varas': 'puerto-varas',
+    'pta arenas': 'punta-arenas', 'coihaique': 'coyhaique',
+}
+
+
+def normalizar(texto):
+    """ "  Viña del  Mar " -> "vina del mar" (sin acentos ni signos) """
+    sin_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', sin_acentos.lower()))
+
+_POR_NOMBRE = {normalizar(ciudad.nombre): ciudad.codigo for ciudad in CIUDADES.values()}
+_POR_NOMBRE.update(ALIAS)
+_MAX_PALABRAS = max(len(nombre.split()) for nombre in _POR_NOMBRE)
+
+
+def ciudad_de(destino):
+    """
+    Código de la ciudad de un destino escrito a mano, o None si no la
+    reconoce: "Calle 123, Temuco" -> 'temuco'. Busca de la última parte
+    (separadas por coma) a la primera, y en cada una el nombre más largo
+    con que termina ("Av. Alemania 200 Puerto Montt").
+    """
+    for parte in reversed((destino or '').split(',')):
+        palabras = normalizar(parte).split()
+        for n in range(min(len(palabras), _MAX_PALABRAS), 0, -1):
+            codigo = _POR_NOMBRE.get(' '.join(palabras[-n:]))
+            if codigo:
+                return codigo
+    return None
+
+
+# --- Matriz de distancias sucursal -> ciudad ---
+
+def _haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a.latitud, a.longitud, b.latitud, b.longitud))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+class MatrizDistancias:
+    """
+    Kilómetros por carretera y horas de viaje de cada sucursal a cada
+    ciudad, en dos array('f') planos (una fila por sucursal, una columna
+    por ciudad): consultar un par son dos lookups en dicts y un índice,
+    sin consultas ni parseo. Se arma una vez por proceso (ver matriz()).
+
+    Sin ruta conocida, km = línea recta * factor_ruta (Chile es largo y
+    angosto: la carretera sigue casi la línea recta); las distancias de
+    ACME_TARIFAS['distancias_km'] la reemplazan.
+    """
+    __slots__ = ('_filas', '_columnas', '_km', '_horas')
+
+    def __init__(self, sucursales, distancias_km=None, parametros=None):
+        parametros = parametros or settings.ACME_GEO
+        ciudades = list(CIUDADES.values())
+        self._columnas = {ciudad.codigo: j for j, ciudad in enumerate(ciudades)}
+        self._filas = {}
+        self._km = array('f')
+        conocidas = {
+            (ciudad_de(origen), ciudad_de(destino)): km
+            for origen, destinos in (distancias_km or {}).items()
+            for destino, km in destinos.items()
+        }
+        for sucursal_id, ciudad_sucursal in sucursales:
+            origen = CIUDADES.get(ciudad_de(ciudad_sucursal))
+            if origen is None:
+                continue  # Sucursal en una ciudad que no está en la tabla
+            self._filas[sucursal_id] = len(self._filas)
+            self._km.extend(
+                conocidas.get((origen.codigo, ciudad.codigo), _haversine_km(origen, ciudad) * parametros['factor_ruta'])
+                for ciudad in ciudades
+            )
+        velocidad = parametros['velocidad_kmh']
+        self._horas = array('f', (km / velocidad for km in self._km))
+
+    def _indice(self, sucursal_id, ciudad):
+        fila = self._filas.get(sucursal_id)
+        columna = self._columnas.get(ciudad)
+        if fila is None or columna is None:
+            return None
+        return fila * len(self._columnas) + columna
+
+    def km(self, sucursal_id, ciudad, defecto=None):
+        """ Km de la sucursal a la ciudad (código), o 'defecto' si no se conoce alguna """
+        i = self._indice(sucursal_id, ciudad)
+        return defecto if i is None else self._km[i]
+
+    def horas(self, sucursal_id, ciudad, defecto=None):
+        i = self._indice(sucursal_id, ciudad)
+        return defecto if i is None else self._horas[i]
+
+
+class MatrizCiudades:
+    """
+    Km por carretera entre cada par de ciudades de la tabla, en un
+    array('f') de n x n (simétrica): las distancias entre paradas de una
+    ruta (api/rutas.py). Misma estimación y correcciones que
+    MatrizDistancias, en ambos sentidos.
+    """
+    __slots__ = ('_indices', '_km')
+
+    def __init__(self, distancias_km=None, parametros=None):
+        parametros = parametros or settings.ACME_GEO
+        ciudades = list(CIUDADES.values())
+        self._indices = {ciudad.codigo: i for i, ciudad in enumerate(ciudades)}
+        conocidas = {}
+        for origen, destinos in (distancias_km or {}).items():
+            for destino, km in destinos.items():
+                a, b = ciudad_de(origen), ciudad_de(destino)
+                conocidas[a, b] = conocidas[b, a] = km
+        self._km = array('f', (
+            conocidas.get((a.codigo, b.codigo), _haversine_km(a, b) * parametros['factor_ruta'])
+            for a in ciudades for b in ciudades
+        ))
+
+    def km(self, origen, destino, defecto=None):
+        """ Km entre dos ciudades (códigos), o 'defecto' si alguna no está en la tabla """
+        i, j = self._indices.get(origen), self._indices.get(destino)
+        if i is None or j is None:
+            return defecto
+        return self._km[i * len(self._indices) + j]
+
+
+_matriz = {'clave': None, 'matriz': None}
+_ciudades = {'clave': None, 'matriz': None}
+
+def matriz():
+    """
+    La matriz de las sucursales actuales. Cuesta una consulta chica (las
+    ciudades de las sucursales) por llamada, no por par consultado; se
+    rearma solo si cambiaron las sucursales, las tarifas o ACME_GEO.
+    """
+    sucursales = tuple(Sucursal.objects.order_by('id').values_list('id', 'ciudad'))
+    tarifas, parametros = settings.ACME_TARIFAS, settings.ACME_GEO
+    anterior = _matriz['clave']
+    if anterior is None or anterior[0] != sucursales or anterior[1] is not tarifas or anterior[2] is not parametros:
+        _matriz['matriz'] = MatrizDistancias(sucursales, tarifas.get('distancias_km'), parametros)
+        _matriz['clave'] = (sucursales, tarifas, parametros)
+    return _matriz['matriz']
+
+def matriz_ciudades():
+    """ La MatrizCiudades vigente; se rearma solo si cambian las tarifas o ACME_GEO """
+    clave = (settings.ACME_TARIFAS, settings.ACME_GEO)
+    anterior = _ciudades['clave']
+    if anterior is None or anterior[0] is not clave[0] or anterior[1] is not clave[1]:
+        _ciudades['matriz'] = MatrizCiudades(clave[0].get('distancias_km'), clave[1])
+        _ciudades['clave'] = clave
+    return _ciudades['matriz']
@@ -0,0 +1,155 @@
+# api/imports.py
+
+import csv
+from collections import Counter
+from itertools import islice
+
+from django.db import IntegrityError
+from rest_framework.exceptions import ValidationError
+
+from . import cache, contadores, eventos, geo, transiciones
+from .db import transaccion_escritura
+from .models import Sucursal, Empleado, Camion, Pedido
+from .serializers import CamionImportSerializer, PedidoImportSerializer
+
+# Filas por lote: se validan juntas y se insertan en una transacción
+TAMANO_LOTE = 1000
+
+
+class ImportacionError(Exception):
+    """ El archivo no se puede procesar (ej: faltan columnas obligatorias) """
+
+
+# --- Definición de cada importación ---
+
+def _contexto_camiones(filas):
+    conductor_ids = {fila['conductor_asignado'] for fila in filas if fila.get('conductor_asignado', '').isdigit()}
+    return {'conductores': Empleado.objects.filter(cargo='CON').in_bulk(map(int, conductor_ids))}
+
+def _repetidos_camiones(validos):
+    """ Matrículas que ya existen en la base (una consulta por lote) """
+    matriculas = [datos['matricula'] for _, datos in validos]
+    return set(Camion.objects.filter(matricula__in=matriculas).values_list('matricula', flat=True))
+
+IMPORTACIONES = {
+    'camiones': {
+        'modelo': Camion,
+        'serializer': CamionImportSerializer,
+        'obligatorias': ('matricula', 'capacidad', 'sucursal_base'),
+        'contexto': _contexto_camiones,
+        # Campo único: se rechazan duplicados contra la base y dentro del archivo
+        'unico': 'matricula',
+        'existentes': _repetidos_camiones,
+        'clave_contador': lambda c: contadores.clave_camion(c.sucursal_base_id, c.estado),
+        'grupo_cache': 'camion',
+    },
+    'pedidos': {
+        'modelo': Pedido,
+        'serializer': PedidoImportSerializer,
+        'obligatorias': ('sucursal_origen', 'destino', 'tipo_carga', 'peso_kg', 'volumen_m3', 'fecha_deseada'),
+        'contexto': lambda filas: {},
+        'unico': None,
+        'existentes': None,
+        'clave_contador': lambda p: contadores.clave_pedido(p.sucursal_origen_id, p.estado),
+        'grupo_cache': 'pedido',
+    },
+}
+
+
+# --- Importación ---
+
+def importar(entidad, lineas, cliente_id=None, simular=False, tamano_lote=TAMANO_LOTE):
+    """
+    Lee un CSV (cualquier iterable de líneas) de a 'tamano_lote' filas.
+    Cada lote se valida con las reglas del serializer de la entidad (con las
+    relaciones precargadas: pocas consultas por lote, no por fila) y sus
+    filas válidas se insertan con bulk_create en una transacción propia.
+    Un lote con errores no detiene el resto del archivo.
+
+    Los pedidos se crean a nombre del cliente 'cliente_id', como en "Mis pedidos".
+    Devuelve {'filas', 'creados', 'lotes', 'errores': [{'fila', 'errores'}]}.
+    """
+    definicion = IMPORTACIONES[entidad]
+    if entidad == 'pedidos' and cliente_id is None:
+        raise ImportacionError('Los pedidos se importan a nombre de un cliente.')
+
+    lector = csv.DictReader(lineas)
+    faltantes = [c for c in definicion['obligatorias'] if c not in (lector.fieldnames or [])]
+    if faltantes:
+        raise ImportacionError(f"Faltan columnas obligatorias: {', '.join(faltantes)}.")
+
+    # Un serializer para todo el archivo (sus campos se construyen una vez)
+    serializer = definicion['serializer'](context={'sucursales': Sucursal.objects.in_bulk()})
+    reporte = {'filas': 0, 'creados': 0, 'lotes': 0, 'errores': []}
+    vistos = set()
+    numero = 1  # La fila 1 es el encabezado
+
+    while True:
+        lote = list(islice(lector, tamano_lote))
+        if not lote:
+            break
+        primera = numero + 1
+        reporte['lotes'] += 1
+        reporte['filas'] += len(lote)
+        serializer.context.update(definicion['contexto'](lote))
+
+        validos, errores = [], []
+        for fila in lote:
+            numero += 1
+            # Celdas vacías = columna no informada (usa el valor por defecto)
+            datos = {campo: valor for campo, valor in fila.items() if campo and valor not in ('', None)}
+            try:
+                validos.append((numero, serializer.run_validation(datos)))
+            except ValidationError as e:
+                errores.append({'fila': numero, 'errores': e.detail})
+
+        validos = _sin_repetidos(definicion, validos, errores, vistos)
+        reporte['errores'].extend(sorted(errores, key=lambda e: e['fila']))
+        if validos and not simular:
+            reporte['creados'] += _insertar(definicion, [datos for _, datos in validos], cliente_id, reporte,
+                                           (primera, numero))
+        elif validos:
+            reporte['creados'] += len(validos)
+
+    return reporte
+
+def _sin_repetidos(definicion, validos, errores, vistos):
+    """ Descarta filas cuyo campo único ya existe (en la base o antes en el archivo) """
+    campo = definicion['unico']
+    if not campo or not validos:
+        return validos
+    existentes = definicion['existentes'](validos)
+    resultado = []
+    for numero, datos in validos:
+        valor = datos[campo]
+        if valor in existentes or valor in vistos:
+            errores.append({'fila': numero, 'errores': {campo: [f'Ya existe: {valor}.']}})
+        else:
+            vistos.add(valor)
+            resultado.append((numero, datos))
+    return resultado
+
+def _insertar(definicion, validos, cliente_id, reporte, filas):
+    modelo = definicion['modelo']
+    extra = {'cliente_id': cliente_id} if modelo is Pedido else {}
+    objetos = [modelo(**datos, **extra) for datos in validos]
+    if modelo is Pedido:
+        # bulk_create no emite pre_save: la ciudad del destino, a mano
+        for pedido in objetos:
+            pedido.ciudad_destino = geo.ciudad_de(pedido.destino)
+    try:
+        with transaccion_escritura():
+            modelo.objects.bulk_create(objetos, batch_size=500)
+            # bulk_create no emite señales: contadores, historial, cache y eventos a mano
+            contadores.ajustar(Counter(filter(None, map(definicion['clave_contador'], objetos))))
+            if modelo is Pedido:
+                transiciones.registrar((pedido.pk, None, pedido.estado) for pedido in objetos)
+            cache.invalidar(definicion['grupo_cache'])
+            eventos.publicar(eventos.de_instancia(objeto, 'creado') for objeto in objetos)
+    except IntegrityError as e:
+        # Ej: otra request creó la misma matrícula entre la validación y el INSERT
+        reporte['errores'].append({'fila': filas[0], 'errores': {
+            'lote': [f'No se pudo insertar el lote (filas {filas[0]}-{filas[1]}): {e}']
+        }})
+        return 0
+    return len(objetos)
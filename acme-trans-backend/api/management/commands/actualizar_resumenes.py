@@ -0,0 +1,35 @@
+# acme-trans-backend/api/management/commands/actualizar_resumenes.py
+
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from api import resumenes
+
+
+class Command(BaseCommand):
+    help = ('Pone al día los resúmenes diarios por sucursal (analítica): solo recalcula los días que '
+            'cambiaron desde la última corrida, o todo el rango de --desde/--hasta')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat,
+                            help='Recalcular todo desde este día (AAAA-MM-DD), aunque no haya cambios')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Hasta este día (AAAA-MM-DD; por defecto, hoy)')
+        parser.add_argument('--todo', action='store_true', help='Reconstruir desde el primer pedido')
+        parser.add_argument('--cada', type=float, help='Repetir cada N segundos (hasta Ctrl+C)')
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            if options['todo'] or options['desde'] or options['hasta']:
+                recalculado = f"{resumenes.reconstruir(options['desde'], options['hasta'])} día(s)"
+            else:
+                recalculado = f'{resumenes.actualizar()} tramo(s)'
+            milisegundos = (time.perf_counter() - inicio) * 1000
+            self.stdout.write(self.style.SUCCESS(f'Resúmenes al día: {recalculado} recalculados en {milisegundos:.0f} ms.'))
+            if not options['cada']:
+                break
+            # Con --cada, las siguientes vueltas son incrementales
+            options['todo'] = options['desde'] = options['hasta'] = None
+            time.sleep(options['cada'])
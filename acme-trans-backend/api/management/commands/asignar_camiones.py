@@ -0,0 +1,43 @@
+# acme-trans-backend/api/management/commands/asignar_camiones.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.asignacion import asignar, AsignacionError
+from api.models import Sucursal
+
+
+class Command(BaseCommand):
+    help = 'Asigna camiones disponibles a los pedidos CONFIRMADO sin camión (un lote por sucursal)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', type=int, help='Solo esta sucursal (id); por defecto, todas')
+        parser.add_argument('--hasta', type=date.fromisoformat,
+                            help='Solo pedidos con fecha deseada hasta este día (AAAA-MM-DD)')
+        parser.add_argument('--simular', action='store_true', help='Mostrar el resultado sin guardar')
+
+    def handle(self, *args, **options):
+        sucursales = Sucursal.objects.order_by('id')
+        if options['sucursal']:
+            sucursales = sucursales.filter(pk=options['sucursal'])
+            if not sucursales:
+                raise CommandError(f"No existe la sucursal {options['sucursal']}.")
+
+        total = 0
+        for sucursal in sucursales:
+            try:
+                resultado = asignar(sucursal.id, hasta=options['hasta'], simular=options['simular'])
+            except AsignacionError as e:
+                raise CommandError(f'{sucursal.nombre}: {e}')
+
+            asignados = len(resultado['asignados'])
+            total += asignados
+            self.stdout.write(
+                f"  {sucursal.nombre}: {asignados} asignados, "
+                f"{len(resultado['sin_camion'])} sin camión disponible, "
+                f"{len(resultado['sin_capacidad'])} exceden la capacidad de la flota"
+            )
+
+        accion = 'se asignarían' if options['simular'] else 'asignados'
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total} pedidos {accion}.'))
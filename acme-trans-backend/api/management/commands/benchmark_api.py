@@ -0,0 +1,366 @@
+# acme-trans-backend/api/management/commands/benchmark_api.py
+
+import io
+import json
+import statistics
+import time
+import warnings
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from api import urls as api_urls
+from api.models import Sucursal, Empleado, Camion, Pedido, Reserva
+
+ADMIN_USERNAME = 'bench_admin'
+ADMIN_PASSWORD = 'bench-pass-123'
+CLIENTE_USERNAME = 'cliente'     # Creado por populate_db
+CLIENTE_PASSWORD = 'pass123'
+
+# Endpoints que hashean contraseñas (PBKDF2): pocas iteraciones o dominan el tiempo total
+ITERACIONES_PBKDF2 = 5
+# Pedidos por request en el escenario del PATCH masivo
+PEDIDOS_LOTE = 100
+
+
+# --- Escenarios ---
+# Uno o más por ruta de api/urls.py: (nombre, ruta, método, rol, kwargs, cuerpo, máx. iteraciones).
+# 'kwargs' y 'cuerpo' reciben (i, ctx); ctx tiene ids de ejemplo de la sucursal medida.
+
+def _sin_kwargs(i, ctx):
+    return {}
+
+def _pk(clave):
+    return lambda i, ctx: {'pk': ctx[clave]}
+
+def _csv(nombre, filas):
+    archivo = io.BytesIO('\n'.join(filas).encode('utf-8'))
+    archivo.name = nombre
+    return archivo
+
+def _csv_pedidos(ctx, n):
+    filas = [f'{ctx["sucursal"]},"Calle {j}, Temuco",Retail,1500.00,12.50,{ctx["fecha_deseada"]}' for j in range(n)]
+    return _csv('pedidos.csv', ['sucursal_origen,destino,tipo_carga,peso_kg,volumen_m3,fecha_deseada'] + filas)
+
+def _csv_camiones(ctx, i, n):
+    filas = [f'BI{i % 100:02d}{j:04d},MC,DIS,{ctx["sucursal"]},' for j in range(n)]
+    return _csv('camiones.csv', ['matricula,capacidad,estado,sucursal_base,conductor_asignado'] + filas)
+
+ESCENARIOS = [
+    # --- AUTENTICACIÓN Y REGISTRO ---
+    ('register', 'register', 'post', None, _sin_kwargs,
+     lambda i, ctx: {'username': f'bench_reg_{ctx["corrida"]}_{i}', 'email': f'reg{i}@bench.cl', 'password': 'pass123'},
+     ITERACIONES_PBKDF2),
+    ('token', 'token_obtain_pair', 'post', None, _sin_kwargs,
+     lambda i, ctx: {'username': CLIENTE_USERNAME, 'password': CLIENTE_PASSWORD}, ITERACIONES_PBKDF2),
+    ('token_refresh', 'token_refresh', 'post', None, _sin_kwargs,
+     lambda i, ctx: {'refresh': ctx['refresh_cliente']}, None),
+
+    # --- RUTAS DE CLIENTE ---
+    ('mis_pedidos_list', 'mis-pedidos', 'get', 'cliente', _sin_kwargs, None, None),
+    ('mis_pedidos_importar', 'mis-pedidos-importar', 'post', 'cliente', _sin_kwargs,
+     lambda i, ctx: {'archivo': _csv_pedidos(ctx, PEDIDOS_LOTE)}, None),
+    ('mis_pedidos_create', 'mis-pedidos', 'post', 'cliente', _sin_kwargs,
+     lambda i, ctx: {'sucursal_origen': ctx['sucursal'], 'destino': f'Calle {i}, Temuco', 'tipo_carga': 'Retail',
+                     'peso_kg': '1500.00', 'volumen_m3': '12.50', 'fecha_deseada': ctx['fecha_deseada']}, None),
+    ('eventos_ticket', 'eventos-ticket', 'post', 'cliente', _sin_kwargs, None, None),
+    ('mis_pedidos_eventos', 'mis-pedidos-eventos', 'get', 'cliente', _sin_kwargs, None, None),
+
+    # --- DASHBOARD ---
+    ('dashboard', 'admin-sucursal-dashboard', 'get', 'admin', _pk('sucursal'), None, None),
+    ('dashboard_async', 'admin-sucursal-dashboard-async', 'get', 'admin', _pk('sucursal'), None, None),
+
+    # --- RUTAS DE ADMIN (CRUD) ---
+    ('camiones_list', 'admin-camiones-list', 'get', 'admin', _sin_kwargs, None, None),
+    ('camiones_create', 'admin-camiones-list', 'post', 'admin', _sin_kwargs,
+     lambda i, ctx: {'matricula': f'BN{ctx["corrida"] % 100:02d}{i:04d}', 'capacidad': 'MC', 'estado': 'DIS',
+                     'sucursal_base': ctx['sucursal']}, None),
+    ('camion_detail', 'admin-camion-detail', 'get', 'admin', _pk('camion'), None, None),
+    ('camion_ruta', 'admin-camion-ruta', 'get', 'admin', _pk('camion'), None, None),
+    ('camion_update', 'admin-camion-detail', 'patch', 'admin', _pk('camion'),
+     lambda i, ctx: {'estado': 'MAN' if i % 2 else 'DIS'}, None),
+    ('reservas_list', 'admin-reservas-list', 'get', 'admin', _sin_kwargs, None, None),
+    # Una mantención por iteración, cada una en un día distinto (no chocan)
+    ('reservas_create', 'admin-reservas-list', 'post', 'admin', _sin_kwargs,
+     lambda i, ctx: {'camion': ctx['camion'], 'tipo': 'MAN',
+                     'inicio': (ctx['dia_reservas'] + timedelta(days=i + 1)).isoformat(),
+                     'fin': (ctx['dia_reservas'] + timedelta(days=i + 2)).isoformat()}, None),
+    ('reserva_detail', 'admin-reserva-detail', 'get', 'admin', _pk('reserva'), None, None),
+    ('empleados_list', 'admin-empleados-list', 'get', 'admin', _sin_kwargs, None, None),
+    ('empleados_create', 'admin-empleados-list', 'post', 'admin', _sin_kwargs,
+     lambda i, ctx: {'user': {'username': f'bench_emp_{ctx["corrida"]}_{i}', 'email': f'emp{i}@bench.cl',
+                              'password': 'pass123'},
+                     'cargo': 'AUX', 'estado': 'DIS', 'sucursal': ctx['sucursal']}, ITERACIONES_PBKDF2),
+    ('empleado_detail', 'admin-empleado-detail', 'get', 'admin', _pk('empleado'), None, None),
+    ('empleado_update', 'admin-empleado-detail', 'patch', 'admin', _pk('empleado'),
+     lambda i, ctx: {'estado': 'VAC' if i % 2 else 'DIS'}, None),
+    ('pedidos_list', 'admin-pedidos-list', 'get', 'admin', _sin_kwargs, None, None),
+    ('pedido_detail', 'admin-pedido-detail', 'get', 'admin', _pk('pedido'), None, None),
+    ('pedido_update', 'admin-pedido-detail', 'patch', 'admin', _pk('pedido'),
+     lambda i, ctx: {'estado': 'COTIZADO' if i % 2 else 'SOLICITADO'}, None),
+    ('pedidos_bulk', 'admin-pedidos-bulk', 'patch', 'admin', _sin_kwargs,
+     lambda i, ctx: [{'id': pk, 'estado': 'COTIZADO' if i % 2 else 'SOLICITADO'} for pk in ctx['pedidos_lote']],
+     None),
+    ('pedidos_tiempos', 'admin-pedidos-tiempos', 'get', 'admin', _sin_kwargs, None, None),
+    ('analitica_pedidos', 'admin-analitica-pedidos', 'get', 'admin', _sin_kwargs, None, None),
+    ('asignar_camiones', 'admin-sucursal-asignar', 'post', 'admin', _pk('sucursal'),
+     lambda i, ctx: {'simular': True}, None),
+    ('consolidar_cargas', 'admin-sucursal-consolidar', 'post', 'admin', _pk('sucursal'),
+     lambda i, ctx: {'simular': True}, None),
+    ('cotizar_pedidos', 'admin-sucursal-cotizar', 'post', 'admin', _pk('sucursal'),
+     lambda i, ctx: {'simular': True}, None),
+    # Streams SSE: con ACME_EVENTOS_DURACION=0 se mide abrir la conexión (auth + suscripción)
+    ('sucursal_eventos', 'admin-sucursal-eventos', 'get', 'admin', _pk('sucursal'), None, None),
+
+    # --- BÚSQUEDA ---
+    ('buscar', 'admin-buscar', 'get', 'admin', _sin_kwargs, None, None),
+
+    # --- EXPORTACIONES ---
+    ('exportar_pedidos', 'admin-exportar', 'get', 'admin', lambda i, ctx: {'entidad': 'pedidos'}, None, 10),
+    ('importar_camiones', 'admin-importar', 'post', 'admin', lambda i, ctx: {'entidad': 'camiones'},
+     lambda i, ctx: {'archivo': _csv_camiones(ctx, i, PEDIDOS_LOTE)}, None),
+    ('exportar_empleados', 'admin-exportar', 'get', 'admin', lambda i, ctx: {'entidad': 'empleados'}, None, None),
+
+    # --- RUTAS PARA DROPDOWNS Y DATOS ---
+    ('sucursales_list', 'data-sucursales', 'get', 'admin', _sin_kwargs, None, None),
+    ('sucursal_detail', 'data-sucursal-detail', 'get', 'admin', _pk('sucursal'), None, None),
+    ('conductores_list', 'data-conductores', 'get', 'admin', _sin_kwargs, None, None),
+    ('camiones_dropdown', 'data-camiones', 'get', 'admin', _sin_kwargs, None, None),
+]
+
+# Parámetros de consulta por escenario (filtros que usa el frontend)
+QUERY_PARAMS = {
+    'camiones_list': lambda ctx: {'sucursal_id': ctx['sucursal']},
+    'camiones_dropdown': lambda ctx: {'sucursal_id': ctx['sucursal'], 'libre_desde': ctx['fecha_deseada']},
+    'reservas_list': lambda ctx: {'desde': ctx['fecha_deseada']},
+    'empleados_list': lambda ctx: {'sucursal_id': ctx['sucursal']},
+    'pedidos_list': lambda ctx: {'sucursal_id': ctx['sucursal']},
+    'mis_pedidos_importar': lambda ctx: {'simular': 1},
+    'importar_camiones': lambda ctx: {'simular': 1},
+    'exportar_empleados': lambda ctx: {'formato': 'ndjson', 'sucursal_id': ctx['sucursal']},
+    'analitica_pedidos': lambda ctx: {'granularidad': 'semana', 'desde': '2000-01-01'},
+    'buscar': lambda ctx: {'q': 'tem ret', 'entidad': 'pedido', 'sucursal_id': ctx['sucursal']},
+}
+
+
+def percentil(ordenados, p):
+    """ Percentil p (0-100) por interpolación lineal sobre una lista ordenada """
+    if len(ordenados) == 1:
+        return ordenados[0]
+    posicion = (len(ordenados) - 1) * p / 100
+    abajo = int(posicion)
+    arriba = min(abajo + 1, len(ordenados) - 1)
+    return ordenados[abajo] + (ordenados[arriba] - ordenados[abajo]) * (posicion - abajo)
+
+
+class Command(BaseCommand):
+    help = ('Mide latencia (p50/p95/p99), throughput, consultas SQL y tamaño de respuesta de cada ruta '
+            'de api/urls.py sobre una base de prueba poblada con populate_db')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10, help='Escala para populate_db')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla para populate_db')
+        parser.add_argument('--iteraciones', type=int, default=50, help='Requests medidos por escenario')
+        parser.add_argument('--solo', nargs='*', default=None, help='Medir solo estos escenarios')
+        parser.add_argument('--output', default='benchmark_api.json', help='Archivo JSON de resultados')
+        parser.add_argument('--baseline', help='JSON de una corrida anterior para comparar')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento permitido de p95 contra el baseline (0.25 = +25%%)')
+        parser.add_argument('--db-archivo', help='Usar una base SQLite en disco (por defecto, en memoria)')
+        parser.add_argument('--base-actual', action='store_true',
+                            help='Medir sobre la base configurada, ya poblada (no crea una de prueba ni la puebla)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        if options['db_archivo']:
+            settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = options['db_archivo']
+
+        if options['base_actual']:
+            resultados = self._medir(options)
+        else:
+            setup_test_environment()
+            nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.stdout.write(f"Poblando base de prueba (escala {options['scale']})...")
+                call_command('populate_db', scale=options['scale'], seed=options['seed'], stdout=io.StringIO())
+                resultados = self._medir(options)
+            finally:
+                connection.creation.destroy_test_db(nombre_original, verbosity=0)
+                teardown_test_environment()
+
+        reporte = {
+            'meta': {
+                'fecha': timezone.now().isoformat(),
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'iteraciones': options['iteraciones'],
+                'django': django.get_version(),
+                'db': settings.DATABASES['default']['ENGINE'],
+            },
+            'endpoints': resultados,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False)
+        self._imprimir(resultados)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+        if baseline:
+            self._comparar(resultados, baseline['endpoints'], options['tolerancia'])
+
+    # --- Preparación ---
+
+    def _contexto(self):
+        sucursal = Sucursal.objects.order_by('id').first()
+        User.objects.create_superuser(ADMIN_USERNAME, 'bench@acmetrans.cl', ADMIN_PASSWORD)
+        client = Client()
+        tokens = {}
+        for rol, (username, password) in {'admin': (ADMIN_USERNAME, ADMIN_PASSWORD),
+                                          'cliente': (CLIENTE_USERNAME, CLIENTE_PASSWORD)}.items():
+            response = client.post(reverse('token_obtain_pair'), {'username': username, 'password': password})
+            if response.status_code != 200:
+                raise CommandError(f'No se pudo obtener el token de {rol}: {response.status_code}')
+            tokens[rol] = response.json()
+
+        return {
+            'corrida': int(time.time()),
+            'sucursal': sucursal.id,
+            'camion': Camion.objects.filter(sucursal_base=sucursal).order_by('id').values_list('id', flat=True).first(),
+            'empleado': Empleado.objects.filter(sucursal=sucursal).order_by('id').values_list('id', flat=True).first(),
+            'pedido': Pedido.objects.filter(sucursal_origen=sucursal).order_by('id').values_list('id', flat=True).first(),
+            'pedidos_lote': list(Pedido.objects.filter(sucursal_origen=sucursal).order_by('id')
+                                 .values_list('id', flat=True)[:PEDIDOS_LOTE]),
+            'fecha_deseada': (date.today() + timedelta(days=7)).isoformat(),
+            'reserva': Reserva.objects.order_by('id').values_list('id', flat=True).first(),
+            # Lejos de las mantenciones y vacaciones de populate_db
+            'dia_reservas': date.today() + timedelta(days=3650),
+            'refresh_cliente': tokens['cliente']['refresh'],
+            'auth': {rol: f"Bearer {t['access']}" for rol, t in tokens.items()},
+        }
+
+    # --- Medición ---
+
+    def _medir(self, options):
+        # Los streams SSE se cortan enseguida; el test client (WSGI) los
+        # consume enteros y avisa que son async
+        with override_settings(ACME_EVENTOS_DURACION=0), warnings.catch_warnings():
+            warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume asynchronous')
+            return self._medir_escenarios(options)
+
+    def _medir_escenarios(self, options):
+        caches[getattr(settings, 'ACME_CACHE_ALIAS', 'default')].clear()
+        ctx = self._contexto()
+
+        rutas = {p.name for p in api_urls.urlpatterns}
+        sin_escenario = rutas - {ruta for _, ruta, *_ in ESCENARIOS}
+        for ruta in sorted(sin_escenario):
+            self.stdout.write(self.style.WARNING(f'  Ruta sin escenario de benchmark: {ruta}'))
+
+        resultados = {}
+        for nombre, ruta, metodo, rol, kwargs, cuerpo, maximo in ESCENARIOS:
+            if options['solo'] and nombre not in options['solo']:
+                continue
+            iteraciones = min(options['iteraciones'], maximo or options['iteraciones'])
+            self.stdout.write(f'  {nombre} ({metodo.upper()} x{iteraciones})...')
+            resultados[nombre] = self._medir_escenario(ctx, ruta, metodo, rol, kwargs, cuerpo, iteraciones,
+                                                       QUERY_PARAMS.get(nombre))
+        return resultados
+
+    def _medir_escenario(self, ctx, ruta, metodo, rol, kwargs, cuerpo, iteraciones, query_params):
+        client = Client()
+        headers = {'HTTP_AUTHORIZATION': ctx['auth'][rol]} if rol else {}
+
+        consultas = [0]
+        def contar(execute, sql, params, many, context):
+            consultas[0] += 1
+            return execute(sql, params, many, context)
+
+        def request(i):
+            url = reverse(ruta, kwargs=kwargs(i, ctx))
+            if metodo == 'get':
+                return url, client.get(url, query_params(ctx) if query_params else None, **headers)
+            if query_params:
+                url = f'{url}?{urlencode(query_params(ctx))}'
+            data = cuerpo(i, ctx) if cuerpo else ''
+            if isinstance(data, dict) and 'archivo' in data:
+                # Subida de archivo: multipart (lo arma el test client)
+                return url, client.post(url, data, **headers)
+            return url, getattr(client, metodo)(url, json.dumps(data), content_type='application/json', **headers)
+
+        # Calentamiento (imports perezosos, caches)
+        request(-1)
+
+        latencias, tamanos, por_request = [], [], []
+        estados = set()
+        inicio_total = time.perf_counter()
+        with connection.execute_wrapper(contar):
+            for i in range(iteraciones):
+                consultas[0] = 0
+                inicio = time.perf_counter()
+                url, response = request(i)
+                contenido = b''.join(response) if response.streaming else response.content
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                tamanos.append(len(contenido))
+                por_request.append(consultas[0])
+                estados.add(response.status_code)
+        duracion = time.perf_counter() - inicio_total
+
+        ordenadas = sorted(latencias)
+        return {
+            'metodo': metodo.upper(),
+            'url': url,
+            'rol': rol,
+            'status': sorted(estados),
+            'iteraciones': iteraciones,
+            'p50_ms': round(percentil(ordenadas, 50), 3),
+            'p95_ms': round(percentil(ordenadas, 95), 3),
+            'p99_ms': round(percentil(ordenadas, 99), 3),
+            'media_ms': round(statistics.fmean(latencias), 3),
+            'rps': round(iteraciones / duracion, 1),
+            'queries': max(por_request),
+            'bytes': max(tamanos),
+        }
+
+    # --- Reporte ---
+
+    def _imprimir(self, resultados):
+        self.stdout.write('')
+        self.stdout.write(f"{'escenario':<20} {'status':<10} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8} {'SQL':>5} {'bytes':>10}")
+        for nombre, r in resultados.items():
+            status = ','.join(str(s) for s in r['status'])
+            self.stdout.write(
+                f"{nombre:<20} {status:<10} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                f"{r['rps']:>8.1f} {r['queries']:>5} {r['bytes']:>10}"
+            )
+
+    def _comparar(self, resultados, anteriores, tolerancia):
+        """ Falla si algún escenario empeora p95 más allá de la tolerancia o hace más consultas """
+        fallas = []
+        for nombre, actual in resultados.items():
+            anterior = anteriores.get(nombre)
+            if not anterior:
+                continue
+            if actual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+                fallas.append(f"{nombre}: p95 {anterior['p95_ms']:.2f}ms -> {actual['p95_ms']:.2f}ms")
+            if actual['queries'] > anterior['queries']:
+                fallas.append(f"{nombre}: consultas {anterior['queries']} -> {actual['queries']}")
+
+        if fallas:
+            for falla in fallas:
+                self.stdout.write(self.style.ERROR(f'  {falla}'))
+            raise CommandError(f'{len(fallas)} regresión(es) contra el baseline.')
+        self.stdout.write(self.style.SUCCESS('Sin regresiones contra el baseline.'))
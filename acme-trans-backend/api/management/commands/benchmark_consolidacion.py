@@ -0,0 +1,75 @@
+# acme-trans-backend/api/management/commands/benchmark_consolidacion.py
+
+import random
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from api.asignacion import capacidades_posibles
+from api.consolidacion import describir, planificar
+from api.models import Pedido
+
+CIUDADES = ['valparaiso', 'rancagua', 'talca', 'concepcion', 'temuco', 'puerto-montt', 'la-serena', 'antofagasta']
+
+
+class Command(BaseCommand):
+    help = ('Mide el planificador de consolidación (api/consolidacion.py) sobre pedidos generados en '
+            'memoria, sin base de datos: tiempo de planificar() y camiones ahorrados frente a uno por pedido')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=50000)
+        parser.add_argument('--sucursales', type=int, default=3)
+        parser.add_argument('--dias', type=int, default=30, help='Fechas deseadas distintas')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se informa la mejor de N corridas')
+
+    def handle(self, *args, **options):
+        pedidos = self._pedidos(options)
+        mejor = None
+        for _ in range(options['repeticiones']):
+            inicio = time.perf_counter()
+            cargas, sin_capacidad = planificar(pedidos)
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+
+        # Sin consolidar: cada pedido en el camión más chico en que cabe
+        antes = Counter(capacidades_posibles(p)[0] for p in pedidos if capacidades_posibles(p))
+        ahora = Counter(carga.capacidad for carga in cargas)
+        grupos = len({(c.sucursal_id, c.ciudad_destino, c.fecha_deseada) for c in cargas})
+        descritas = [describir(carga) for carga in cargas]
+        llenado = sum(max(c['llenado_peso'], c['llenado_volumen']) for c in descritas) / len(descritas)
+
+        self.stdout.write(f"{len(pedidos)} pedidos en {grupos} grupos (sucursal, ciudad, fecha); "
+                          f"{len(sin_capacidad)} exceden el camión mayor")
+        self.stdout.write(f"planificar(): {mejor * 1000:.1f} ms (mejor de {options['repeticiones']})")
+        self.stdout.write(f"{'':<14} {'MC':>7} {'GC':>7} {'total':>7}")
+        for nombre, camiones in (('uno por pedido', antes), ('consolidado', ahora)):
+            self.stdout.write(f"{nombre:<14} {camiones['MC']:>7} {camiones['GC']:>7} {sum(camiones.values()):>7}")
+        ahorrados = sum(antes.values()) - sum(ahora.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Camiones ahorrados: {ahorrados} ({ahorrados / sum(antes.values()):.0%}); llenado medio {llenado:.0%}"
+        ))
+
+    def _pedidos(self, options):
+        """
+        Pedidos sin guardar (Pedido con id): la mayoría chicos, con una
+        cola de cargas pesadas o voluminosas, como en la operación real
+        """
+        rng = random.Random(options['seed'])
+        hoy = date.today()
+        pedidos = []
+        for i in range(1, options['pedidos'] + 1):
+            peso = min(rng.expovariate(1 / 3500), 30000)
+            volumen = min(peso / rng.uniform(150, 600), 100)
+            pedidos.append(Pedido(
+                id=i,
+                sucursal_origen_id=rng.randint(1, options['sucursales']),
+                ciudad_destino=rng.choice(CIUDADES),
+                fecha_deseada=hoy + timedelta(days=rng.randrange(options['dias'])),
+                peso_kg=Decimal(round(peso * 100)).scaleb(-2),
+                volumen_m3=Decimal(round(volumen * 100)).scaleb(-2),
+            ))
+        return pedidos
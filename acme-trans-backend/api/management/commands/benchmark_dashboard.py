@@ -0,0 +1,136 @@
+# acme-trans-backend/api/management/commands/benchmark_dashboard.py
+
+import asyncio
+import io
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from api.models import Sucursal
+from api.serializers import MyTokenObtainPairSerializer
+from .benchmark_api import percentil
+
+VISTAS = {
+    'sync': 'admin-sucursal-dashboard',
+    'async': 'admin-sucursal-dashboard-async',
+}
+
+
+async def _get(app, path, token):
+    """ Una request GET directo a la aplicación ASGI (sin red ni servidor) """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    enviado = False
+    async def receive():
+        nonlocal enviado
+        if not enviado:
+            enviado = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # El cliente no se desconecta: Django cancela esta espera al responder
+        await asyncio.Future()
+
+    estado = []
+    async def send(mensaje):
+        if mensaje['type'] == 'http.response.start':
+            estado.append(mensaje['status'])
+
+    await app(scope, receive, send)
+    return estado[0]
+
+
+class Command(BaseCommand):
+    help = ('Compara el dashboard sync y async bajo ASGI (en proceso): latencia p50/p95 '
+            'y throughput con N requests concurrentes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10, help='Escala para populate_db')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--concurrencia', type=int, nargs='+', default=[1, 16, 64])
+        parser.add_argument('--requests', type=int, default=20, help='Requests por cliente concurrente')
+        parser.add_argument('--con-cache', action='store_true',
+                            help='Usar la cache de respuestas (por defecto se mide el cálculo)')
+        parser.add_argument('--output', help='Guardar los resultados en este JSON')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Poblando base de prueba (escala {options['scale']})...")
+            call_command('populate_db', scale=options['scale'], seed=options['seed'], stdout=io.StringIO())
+            admin = User.objects.create_superuser('bench_admin', 'bench@acmetrans.cl', 'bench-pass-123')
+            token = str(MyTokenObtainPairSerializer.get_token(admin).access_token)
+            sucursal = Sucursal.objects.order_by('id').values_list('id', flat=True).first()
+
+            cache = {}
+            if not options['con_cache']:
+                # Cache que nunca guarda: cada request calcula el dashboard
+                cache = {
+                    'CACHES': {**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                    'ACME_CACHE_ALIAS': 'benchmark',
+                }
+            with override_settings(**cache):
+                resultados = asyncio.run(self._medir(token, sucursal, options))
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        self._imprimir(resultados)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, indent=2)
+
+    async def _medir(self, token, sucursal, options):
+        app = get_asgi_application()
+        resultados = []
+        for vista, ruta in VISTAS.items():
+            path = reverse(ruta, kwargs={'pk': sucursal})
+            await _get(app, path, token)  # Calentamiento
+            for concurrencia in options['concurrencia']:
+                latencias, estados = [], set()
+
+                async def cliente():
+                    for _ in range(options['requests']):
+                        inicio = time.perf_counter()
+                        estados.add(await _get(app, path, token))
+                        latencias.append((time.perf_counter() - inicio) * 1000)
+
+                inicio = time.perf_counter()
+                await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+                duracion = time.perf_counter() - inicio
+
+                ordenadas = sorted(latencias)
+                resultados.append({
+                    'vista': vista,
+                    'concurrencia': concurrencia,
+                    'requests': len(latencias),
+                    'status': sorted(estados),
+                    'p50_ms': round(percentil(ordenadas, 50), 3),
+                    'p95_ms': round(percentil(ordenadas, 95), 3),
+                    'media_ms': round(statistics.fmean(latencias), 3),
+                    'rps': round(len(latencias) / duracion, 1),
+                })
+                self.stdout.write(f'  {vista} x{concurrencia}...')
+        return resultados
+
+    def _imprimir(self, resultados):
+        self.stdout.write('')
+        self.stdout.write(f"{'vista':<6} {'conc.':>6} {'status':<8} {'p50':>8} {'p95':>8} {'rps':>8}")
+        for r in resultados:
+            status = ','.join(str(s) for s in r['status'])
+            self.stdout.write(
+                f"{r['vista']:<6} {r['concurrencia']:>6} {status:<8} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['rps']:>8.1f}"
+            )
@@ -0,0 +1,77 @@
+# acme-trans-backend/api/management/commands/benchmark_listados.py
+
+import io
+import json
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api.models import Empleado, Camion, Pedido
+from api.serializers import (
+    CamionReadSerializer, EmpleadoReadSerializer, PedidoAdminSerializer,
+    CamionListadoSerializer, EmpleadoListadoSerializer, PedidoAdminListadoSerializer,
+)
+
+# (nombre, serializer de instancias, queryset con select_related, listado rápido, queryset base)
+LISTADOS = [
+    ('camiones', CamionReadSerializer,
+     lambda: Camion.objects.select_related('sucursal_base', 'conductor_asignado__user'),
+     CamionListadoSerializer, lambda: Camion.objects.all()),
+    ('empleados', EmpleadoReadSerializer,
+     lambda: Empleado.objects.select_related('user', 'sucursal'),
+     EmpleadoListadoSerializer, lambda: Empleado.objects.all()),
+    ('pedidos_admin', PedidoAdminSerializer,
+     lambda: Pedido.objects.select_related('cliente__user', 'camion_asignado__conductor_asignado__user',
+                                           'sucursal_origen'),
+     PedidoAdminListadoSerializer, lambda: Pedido.objects.all()),
+]
+
+
+class Command(BaseCommand):
+    help = ('Compara los listados rápidos (.values() + dicts) con los ModelSerializer '
+            'equivalentes: tiempo de consulta + serialización + JSON, en una base de prueba aislada')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=200, help='Escala de populate_db (200 = 10k pedidos)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--filas', type=int, default=10000, help='Máximo de filas por listado')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se informa la mejor de N corridas')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Poblando base de prueba (escala {options['scale']})...")
+            call_command('populate_db', scale=options['scale'], seed=options['seed'], stdout=io.StringIO())
+            self._medir(options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+    def _mejor(self, funcion, repeticiones):
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        return mejor, resultado
+
+    def _medir(self, options):
+        limite, repeticiones = options['filas'], options['repeticiones']
+        self.stdout.write(f"\n{'listado':<15} {'filas':>7} {'antes ms':>10} {'ahora ms':>10} {'x':>6}  iguales")
+        for nombre, serializer, queryset, listado, base in LISTADOS:
+            antes, json_antes = self._mejor(
+                lambda: json.dumps(serializer(queryset().order_by('id')[:limite], many=True).data), repeticiones)
+            ahora, json_ahora = self._mejor(
+                lambda: json.dumps(listado(listado.filas(base().order_by('id'))[:limite], many=True).data),
+                repeticiones)
+            filas = min(limite, base().count())
+            iguales = 'sí' if json_antes == json_ahora else 'NO'
+            estilo = self.style.SUCCESS if iguales == 'sí' else self.style.ERROR
+            self.stdout.write(estilo(
+                f"{nombre:<15} {filas:>7} {antes * 1000:>10.1f} {ahora * 1000:>10.1f} {antes / ahora:>6.1f}  {iguales}"
+            ))
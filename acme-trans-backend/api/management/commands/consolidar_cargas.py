@@ -0,0 +1,49 @@
+# acme-trans-backend/api/management/commands/consolidar_cargas.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.asignacion import AsignacionError
+from api.consolidacion import consolidar
+from api.models import Sucursal
+
+
+class Command(BaseCommand):
+    help = ('Junta en un mismo camión los pedidos CONFIRMADO sin camión que salen el mismo día '
+            'hacia la misma ciudad, y asigna un camión disponible a cada carga (un lote por sucursal)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', type=int, help='Solo esta sucursal (id); por defecto, todas')
+        parser.add_argument('--hasta', type=date.fromisoformat,
+                            help='Solo pedidos con fecha deseada hasta este día (AAAA-MM-DD)')
+        parser.add_argument('--simular', action='store_true', help='Mostrar el resultado sin guardar')
+
+    def handle(self, *args, **options):
+        sucursales = Sucursal.objects.order_by('id')
+        if options['sucursal']:
+            sucursales = sucursales.filter(pk=options['sucursal'])
+            if not sucursales:
+                raise CommandError(f"No existe la sucursal {options['sucursal']}.")
+
+        total = 0
+        for sucursal in sucursales:
+            try:
+                resultado = consolidar(sucursal.id, hasta=options['hasta'], simular=options['simular'])
+            except AsignacionError as e:
+                raise CommandError(f'{sucursal.nombre}: {e}')
+
+            cargas = resultado['cargas']
+            total += resultado['camiones_ahorrados']
+            # Llenado de cada camión: la dimensión que lo limita (peso o volumen)
+            llenado = sum(max(c['llenado_peso'], c['llenado_volumen']) for c in cargas) / len(cargas) if cargas else 0
+            self.stdout.write(
+                f"  {sucursal.nombre}: {len(cargas)} cargas con camión "
+                f"({sum(len(c['pedidos']) for c in cargas)} pedidos, llenado medio {llenado:.0%}), "
+                f"{len(resultado['sin_camion'])} sin camión disponible, "
+                f"{len(resultado['sin_capacidad'])} pedidos exceden la capacidad de la flota, "
+                f"{resultado['camiones_ahorrados']} camiones ahorrados"
+            )
+
+        accion = 'se ahorrarían' if options['simular'] else 'ahorrados'
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total} camiones {accion} frente a uno por pedido.'))
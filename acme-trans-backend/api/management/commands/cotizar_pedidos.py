@@ -0,0 +1,37 @@
+# acme-trans-backend/api/management/commands/cotizar_pedidos.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cotizacion import cotizar
+from api.models import Sucursal
+
+
+class Command(BaseCommand):
+    help = 'Cotiza (costo y precio) los pedidos SOLICITADO y los pasa a COTIZADO (un lote por sucursal)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', type=int, help='Solo esta sucursal (id); por defecto, todas')
+        parser.add_argument('--simular', action='store_true', help='Mostrar el resultado sin guardar')
+
+    def handle(self, *args, **options):
+        sucursales = Sucursal.objects.order_by('id')
+        if options['sucursal']:
+            sucursales = sucursales.filter(pk=options['sucursal'])
+            if not sucursales:
+                raise CommandError(f"No existe la sucursal {options['sucursal']}.")
+
+        total = 0
+        for sucursal in sucursales:
+            inicio = time.perf_counter()
+            cotizados = cotizar(sucursal.id, simular=options['simular'])
+            total += len(cotizados)
+            monto = sum(precio for _, _, precio in cotizados)
+            self.stdout.write(
+                f"  {sucursal.nombre}: {len(cotizados):,} pedidos, ${monto:,.0f} cotizados "
+                f"({time.perf_counter() - inicio:.2f}s)"
+            )
+
+        accion = 'se cotizarían' if options['simular'] else 'cotizados'
+        self.stdout.write(self.style.SUCCESS(f'Listo: {total:,} pedidos {accion}.'))
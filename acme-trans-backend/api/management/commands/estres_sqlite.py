@@ -0,0 +1,157 @@
+# acme-trans-backend/api/management/commands/estres_sqlite.py
+
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from api.db import bloqueada
+from api.models import Cliente, Pedido, Sucursal
+from api.serializers import MyTokenObtainPairSerializer
+from .benchmark_api import percentil
+
+# Perfil 'base': la configuración de siempre (BEGIN diferido, sin reintentos)
+PERFILES = {
+    'base': ({'OPTIONS': {}, 'CONN_MAX_AGE': 0},
+             {'ACME_DB_REINTENTOS': 0}),
+    'produccion': (settings.ACME_SQLITE_PRODUCCION, {}),
+}
+
+
+def _trabajador(args):
+    """
+    Un "worker de gunicorn": proceso propio con su conexión, que mezcla
+    altas de pedidos, PATCH de un pedido, PATCH masivo y el listado admin.
+    """
+    numero, ctx, requests = args
+    # Los 'database is locked' se cuentan; sin el traceback de cada uno
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    azar = random.Random(numero)
+    client = Client()
+    admin = {'HTTP_AUTHORIZATION': ctx['admin']}
+    cliente = {'HTTP_AUTHORIZATION': ctx['clientes'][numero % len(ctx['clientes'])]}
+    resultado = Counter()
+    latencias = []
+
+    def operacion(i):
+        tipo = i % 4
+        if tipo == 0:
+            cuerpo = {'sucursal_origen': ctx['sucursal'], 'destino': f'Calle {i}, Temuco', 'tipo_carga': 'Retail',
+                      'peso_kg': '1500.00', 'volumen_m3': '12.50', 'fecha_deseada': ctx['fecha_deseada']}
+            return client.post(ctx['url_mis_pedidos'], json.dumps(cuerpo), content_type='application/json', **cliente)
+        estado = azar.choice(('SOLICITADO', 'CONFIRMADO'))
+        if tipo == 1:
+            url = ctx['url_pedido'].format(azar.choice(ctx['pedidos']))
+            return client.patch(url, json.dumps({'estado': estado}), content_type='application/json', **admin)
+        if tipo == 2:
+            lote = [{'id': p, 'estado': estado} for p in azar.sample(ctx['pedidos'], 20)]
+            return client.patch(ctx['url_bulk'], json.dumps(lote), content_type='application/json', **admin)
+        return client.get(ctx['url_listado'], **admin)
+
+    for i in range(requests):
+        inicio = time.perf_counter()
+        try:
+            response = operacion(i)
+            resultado[str(response.status_code)] += 1
+        except OperationalError as e:
+            resultado['locked' if bloqueada(e) else 'error_db'] += 1
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    connections.close_all()
+    return resultado, latencias
+
+
+class Command(BaseCommand):
+    help = ('Prueba de estrés de escrituras concurrentes sobre SQLite en disco: N procesos '
+            'simultáneos contra la API, con la configuración base y con el perfil de producción')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfil', choices=['base', 'produccion', 'ambos'], default='ambos')
+        parser.add_argument('--workers', type=int, default=8, help='Procesos concurrentes')
+        parser.add_argument('--requests', type=int, default=60, help='Requests por worker')
+        parser.add_argument('--scale', type=int, default=2, help='Escala para populate_db')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Esta prueba es para SQLite.')
+        perfiles = ['base', 'produccion'] if options['perfil'] == 'ambos' else [options['perfil']]
+        resultados = [(perfil, self._correr(perfil, options)) for perfil in perfiles]
+
+        self.stdout.write(f"\n{'perfil':<11} {'requests':>8} {'locked':>7} {'5xx':>5} {'p50 ms':>8} {'p95 ms':>8} {'rps':>7}")
+        for perfil, (estados, latencias, duracion) in resultados:
+            ordenadas = sorted(latencias)
+            errores_5xx = sum(n for estado, n in estados.items() if estado.startswith('5'))
+            estilo = self.style.ERROR if estados['locked'] or errores_5xx else self.style.SUCCESS
+            self.stdout.write(estilo(
+                f"{perfil:<11} {len(latencias):>8} {estados['locked']:>7} {errores_5xx:>5} "
+                f"{percentil(ordenadas, 50):>8.1f} {percentil(ordenadas, 95):>8.1f} {len(latencias) / duracion:>7.1f}"
+            ))
+            self.stdout.write(f"            status: {dict(sorted(estados.items()))}")
+
+    def _correr(self, perfil, options):
+        base_datos, ajustes = PERFILES[perfil]
+        directorio = tempfile.mkdtemp(prefix='acme-estres-')
+        settings_dict = connection.settings_dict
+        original = {clave: settings_dict.get(clave) for clave in ('OPTIONS', 'CONN_MAX_AGE', 'TEST')}
+        settings_dict['TEST'] = {**(settings_dict.get('TEST') or {}), 'NAME': os.path.join(directorio, 'estres.sqlite3')}
+        settings_dict.update(base_datos)
+
+        setup_test_environment()
+        connection.close()
+        nombre_original = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"[{perfil}] Poblando base en disco (escala {options['scale']})...")
+            call_command('populate_db', scale=options['scale'], seed=options['seed'], stdout=io.StringIO())
+            ctx = self._contexto()
+            # Los workers abren sus propias conexiones
+            connections.close_all()
+            self.stdout.write(f"[{perfil}] {options['workers']} workers x {options['requests']} requests...")
+            with override_settings(**ajustes):
+                inicio = time.perf_counter()
+                with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                    partes = pool.map(_trabajador, [(n, ctx, options['requests']) for n in range(options['workers'])])
+                duracion = time.perf_counter() - inicio
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+            settings_dict.update(original)
+            shutil.rmtree(directorio, ignore_errors=True)
+
+        estados, latencias = Counter(), []
+        for conteo, tiempos in partes:
+            estados.update(conteo)
+            latencias.extend(tiempos)
+        return estados, latencias, duracion
+
+    def _contexto(self):
+        sucursal = Sucursal.objects.order_by('id').first()
+        admin = User.objects.create_superuser('estres_admin', 'estres@acmetrans.cl', 'estres-pass-123')
+        bearer = lambda user: f'Bearer {MyTokenObtainPairSerializer.get_token(user).access_token}'
+        clientes = Cliente.objects.select_related('user').order_by('id')[:20]
+        return {
+            'sucursal': sucursal.id,
+            'pedidos': list(Pedido.objects.filter(sucursal_origen=sucursal).values_list('id', flat=True)[:500]),
+            'fecha_deseada': (date.today() + timedelta(days=7)).isoformat(),
+            'admin': bearer(admin),
+            'clientes': [bearer(cliente.user) for cliente in clientes],
+            'url_mis_pedidos': reverse('mis-pedidos'),
+            'url_pedido': reverse('admin-pedido-detail', kwargs={'pk': 0}).replace('/0/', '/{}/'),
+            'url_bulk': reverse('admin-pedidos-bulk'),
+            'url_listado': reverse('admin-pedidos-list') + f'?sucursal_id={sucursal.id}',
+        }
@@ -0,0 +1,52 @@
+# acme-trans-backend/api/management/commands/importar_csv.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import IMPORTACIONES, TAMANO_LOTE, ImportacionError, importar
+from api.models import Cliente
+
+# Errores que se muestran en consola (el resto solo se cuenta)
+MAX_ERRORES_MOSTRADOS = 50
+
+
+class Command(BaseCommand):
+    help = 'Importa camiones o pedidos desde un CSV, validando y guardando por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('entidad', choices=sorted(IMPORTACIONES))
+        parser.add_argument('archivo', help='Ruta del CSV (UTF-8, con encabezado)')
+        parser.add_argument('--cliente', help='Username del cliente dueño de los pedidos')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por lote')
+        parser.add_argument('--simular', action='store_true', help='Solo validar, sin guardar')
+
+    def handle(self, *args, **options):
+        cliente_id = None
+        if options['entidad'] == 'pedidos':
+            if not options['cliente']:
+                raise CommandError('Los pedidos requieren --cliente.')
+            cliente_id = Cliente.objects.filter(user__username=options['cliente']).values_list('id', flat=True).first()
+            if cliente_id is None:
+                raise CommandError(f"No existe el cliente '{options['cliente']}'.")
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as lineas:
+                reporte = importar(options['entidad'], lineas, cliente_id=cliente_id,
+                                   simular=options['simular'], tamano_lote=options['lote'])
+        except (OSError, ImportacionError) as e:
+            raise CommandError(str(e))
+        duracion = time.perf_counter() - inicio
+
+        for error in reporte['errores'][:MAX_ERRORES_MOSTRADOS]:
+            detalle = '; '.join(f'{campo}: {" ".join(map(str, mensajes))}' for campo, mensajes in error['errores'].items())
+            self.stdout.write(self.style.WARNING(f"  Fila {error['fila']}: {detalle}"))
+        if len(reporte['errores']) > MAX_ERRORES_MOSTRADOS:
+            self.stdout.write(self.style.WARNING(f"  ... y {len(reporte['errores']) - MAX_ERRORES_MOSTRADOS} errores más"))
+
+        accion = 'válidas (simulación)' if options['simular'] else 'creadas'
+        self.stdout.write(self.style.SUCCESS(
+            f"{reporte['filas']:,} filas en {reporte['lotes']} lotes: {reporte['creados']:,} {accion}, "
+            f"{len(reporte['errores']):,} con errores ({reporte['filas'] / duracion:,.0f} filas/s)."
+        ))
@@ -1,18 +1,28 @@
 # acme-trans-backend/api/management/commands/populate_db.py
 
+import math
 import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import cycle, islice
+
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
 from faker import Faker
-from decimal import Decimal
 
 # Importamos TODOS los modelos
-from api.models import Sucursal, Cliente, Empleado, Camion, Pedido
+from api.models import (Sucursal, Cliente, Empleado, Camion, Pedido, ContadorSucursal, TransicionPedido,
+                        ResumenDiario, MarcaResumen, Reserva, MarcaReserva)
+from api import cache, contadores, geo, reservas, resumenes
 
 fake = Faker('es_ES') # Usar local de español para nombres y direcciones
 
-# --- Configuración de la Población ---
+# --- Configuración de la Población (valores para --scale 1) ---
 NUM_CLIENTES = 5
 NUM_EMPLEADOS_POR_SUCURSAL = {
     'Osorno': 15,
@@ -29,31 +39,87 @@ NUM_PEDIDOS = 50
 PASSWORD_CLIENTE = "pass123"
 PASSWORD_EMPLEADO = "pass123"
 
+# --- Escalado ---
+# Pedidos y clientes crecen linealmente con --scale; la flota y el personal
+# crecen 1x cada ESCALA_POR_FLOTA (una sucursal no tiene 1 camión cada 2 pedidos).
+ESCALA_POR_FLOTA = 100
+# Días de historia de pedidos: 30 por unidad de escala, hasta 2 años
+DIAS_HISTORIA_POR_ESCALA = 30
+DIAS_HISTORIA_MAX = 730
+
+CIUDADES_DESTINO = ["Valparaíso", "Rancagua", "Talca", "Concepción", "Temuco", "Puerto Montt", "La Serena", "Antofagasta"]
+TIPOS_CARGA = ["Alimentos Perecibles", "Retail", "Maquinaria Agrícola", "Carga Seca", "Materiales de Construcción"]
+# Estados de pedidos cuya fecha deseada aún no llega (pesos relativos)
+ESTADOS_ABIERTOS = (['SOLICITADO', 'COTIZADO', 'CONFIRMADO', 'EN_RUTA'], [40, 20, 20, 20])
+# Historial de estados: etapas en orden y horas que dura cada una (mín, máx).
+# Los CANCELADO se cancelan antes de salir a ruta.
+CAMINO_ESTADOS = ['SOLICITADO', 'COTIZADO', 'CONFIRMADO', 'EN_RUTA', 'COMPLETADO']
+HORAS_POR_ETAPA = {'SOLICITADO': (1, 48), 'COTIZADO': (2, 72), 'CONFIRMADO': (12, 120), 'EN_RUTA': (4, 60)}
+# Letras usadas en patentes chilenas (sin vocales ni letras confundibles)
+LETRAS_PATENTE = "BCDFGHJKLPRSTVWXYZ"
+# Calendario: fracción de camiones con una mantención y de conductores con
+# vacaciones en los próximos DIAS_RESERVAS días, y su duración (mín, máx)
+RESERVAS = {'MAN': (0.2, (1, 3)), 'VAC': (0.1, (5, 15))}
+DIAS_RESERVAS = 30
+
+
+@contextmanager
+def fecha_solicitud_manual():
+    """
+    'fecha_solicitud' es auto_now_add: bulk_create la pisaría con "ahora"
+    en todas las filas. Mientras dure el bloque respetamos la fecha que
+    trae cada objeto, para poder generar historia.
+    """
+    campo = Pedido._meta.get_field('fecha_solicitud')
+    campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        campo.auto_now_add = True
+
+
 class Command(BaseCommand):
-    help = 'Pobla la base de datos con datos de prueba realistas de ACMETRANS'
+    help = 'Pobla la base de datos con datos de prueba realistas de ACMETRANS (escalable con --scale)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                            help=f'Factor de escala: {NUM_PEDIDOS} pedidos y {NUM_CLIENTES} clientes por unidad '
+                                 f'(ej: --scale 20000 = 1M pedidos)')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Semilla para generar siempre los mismos datos')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Filas por transacción al insertar')
 
-    @transaction.atomic # Si algo falla, se revierte todo
-    def handle(self, *args, **kwargs):
-        self.stdout.write(self.style.SUCCESS('Iniciando población de la base de datos...'))
+    def handle(self, *args, **options):
+        self.scale = max(1, options['scale'])
+        self.batch_size = max(1, options['batch_size'])
+        self.flota = math.ceil(self.scale / ESCALA_POR_FLOTA)
+        self.rng = random.Random(options['seed'])
+        if options['seed'] is not None:
+            fake.seed_instance(options['seed'])
+
+        # Hasheamos cada contraseña UNA vez (PBKDF2 es lento a propósito)
+        # y todas las cuentas de prueba comparten el hash.
+        self.hash_cliente = make_password(PASSWORD_CLIENTE)
+        self.hash_empleado = make_password(PASSWORD_EMPLEADO)
+        self._crear_pools()
+
+        self.filas_insertadas = 0
+        inicio = time.perf_counter()
+        self.stdout.write(self.style.SUCCESS(f'Iniciando población de la base de datos (escala {self.scale})...'))
 
         # 0. Limpiar datos antiguos (¡Cuidado en producción!)
-        self.stdout.write('Limpiando datos antiguos...')
-        User.objects.filter(is_superuser=False).delete()
-        Sucursal.objects.all().delete()
-        Camion.objects.all().delete()
-        Empleado.objects.all().delete()
-        Cliente.objects.all().delete()
-        Pedido.objects.all().delete()
+        self._limpiar()
 
         # 1. Crear Sucursales
         sucursales = self._create_sucursales()
-        
+
         # 2. Crear Clientes
         clientes = self._create_clientes()
-        
+
         # 3. Crear Empleados (Conductores, Mecánicos, etc.)
         empleados = self._create_empleados(sucursales)
-        
+
         # 4. Crear Camiones y asignarles conductores
         # (Se crean después de empleados para poder asignar conductores)
         camiones = self._create_camiones(sucursales, empleados)
@@ -61,10 +127,90 @@ class Command(BaseCommand):
         # 5. Crear Pedidos de ejemplo
         self._create_pedidos(clientes, sucursales, camiones)
 
-        self.stdout.write(self.style.SUCCESS(f'\n¡Población completada con éxito!'))
+        # 5b. Mantenciones y vacaciones a futuro (calendario de reservas)
+        self._create_reservas(camiones, empleados)
+
+        # 6. bulk_create no emite señales: recalculamos lo derivado
+        self._actualizar_derivados()
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'\n¡Población completada con éxito! {self.filas_insertadas:,} filas en {duracion:.1f}s '
+            f'({self.filas_insertadas / duracion:,.0f} filas/s)'
+        ))
         self.stdout.write(self.style.WARNING(f'Usuario Cliente: cliente / {PASSWORD_CLIENTE}'))
         self.stdout.write(self.style.WARNING(f'Usuarios Empleados: (ej: p.rojas) / {PASSWORD_EMPLEADO}'))
 
+    # --- Utilidades ---
+
+    def _crear_pools(self):
+        """ Valores de Faker pre-generados: llamarlo por fila es lo más lento """
+        self.nombres = [fake.first_name() for _ in range(200)]
+        self.apellidos = [fake.last_name().split(' ')[0] for _ in range(200)]
+        self.calles = [fake.street_address() for _ in range(500)]
+        self.empresas = [fake.company() for _ in range(200)]
+        self.telefonos = [fake.phone_number() for _ in range(200)]
+        self.dominios = [fake.free_email_domain() for _ in range(20)]
+        self.palabras = [fake.word() for _ in range(100)]
+
+    def _insertar_en_lotes(self, modelo, objetos, total, etiqueta, conservar=False, despues=None):
+        """
+        Inserta 'objetos' (puede ser un generador) con bulk_create, una
+        transacción por lote, informando el avance y la velocidad.
+        'despues(lote)' corre en la misma transacción, ya con los ids.
+        """
+        creados = []
+        hechos = 0
+        inicio = time.perf_counter()
+        objetos = iter(objetos)
+        while True:
+            lote = list(islice(objetos, self.batch_size))
+            if not lote:
+                break
+            with transaction.atomic():
+                modelo.objects.bulk_create(lote, batch_size=self.batch_size)
+                if despues:
+                    despues(lote)
+            if conservar:
+                creados.extend(lote)
+            hechos += len(lote)
+            if total > self.batch_size:
+                velocidad = hechos / (time.perf_counter() - inicio)
+                self.stdout.write(f'  {etiqueta}: {hechos:,}/{total:,} ({velocidad:,.0f} filas/s)')
+        self.filas_insertadas += hechos
+        return creados
+
+    def _matricula(self, n):
+        """ Patente única y determinista a partir de un número (BBBB12) """
+        letras = ''
+        resto, digitos = divmod(n, 100)
+        for _ in range(4):
+            resto, i = divmod(resto, len(LETRAS_PATENTE))
+            letras += LETRAS_PATENTE[i]
+        return f"{letras}{digitos:02d}"
+
+    def _limpiar(self):
+        self.stdout.write('Limpiando datos antiguos...')
+        with transaction.atomic():
+            # Tablas grandes: DELETE directo (el ORM cargaría y emitiría
+            # señales fila por fila), en orden de dependencias.
+            with connection.cursor() as cursor:
+                for modelo in (ResumenDiario, MarcaResumen, Reserva, MarcaReserva, TransicionPedido, Pedido, Camion,
+                               Empleado, Cliente, ContadorSucursal):
+                    cursor.execute(f'DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}')
+            User.objects.filter(is_superuser=False).delete()
+            Sucursal.objects.all().delete()
+
+    def _actualizar_derivados(self):
+        self.stdout.write('Recalculando contadores del dashboard...')
+        contadores.reconstruir()
+        self.stdout.write('Calculando resúmenes diarios...')
+        resumenes.reconstruir()
+        reservas.tocar()
+        cache.invalidar(*cache.GRUPOS)
+
+    # --- Creación de datos ---
+
     def _create_sucursales(self):
         self.stdout.write('Creando sucursales...')
         sucursales_data = [
@@ -72,246 +218,236 @@ class Command(BaseCommand):
             {"nombre": "Santiago", "direccion": "Panamericana Norte 456", "ciudad": "Santiago"},
             {"nombre": "Coquimbo", "direccion": "Ruta 5 Norte 789", "ciudad": "Coquimbo"},
         ]
-        sucursales = {}
-        for data in sucursales_data:
-            suc = Sucursal.objects.create(**data)
-            sucursales[suc.nombre] = suc
+        creadas = self._insertar_en_lotes(Sucursal, (Sucursal(**data) for data in sucursales_data),
+                                          len(sucursales_data), 'Sucursales', conservar=True)
+        sucursales = {suc.nombre: suc for suc in creadas}
+        for suc in creadas:
             self.stdout.write(f'  Creada sucursal: {suc.nombre}')
         return sucursales
 
     def _create_clientes(self):
         self.stdout.write('Creando clientes de prueba...')
-        clientes = []
-        
-        # Cliente 1 (Fijo para pruebas)
-        user_cliente = User.objects.create_user(
-            username="cliente",
-            password=PASSWORD_CLIENTE,
-            first_name="Juan",
-            last_name="Pérez",
-            email="cliente@empresa.com",
-            is_staff=False
-        )
-        cliente = Cliente.objects.create(
-            user=user_cliente,
-            nombre_empresa="Empresa XYZ",
-            rut_empresa="76.123.456-K",
-            telefono="+56912345678"
-        )
-        clientes.append(cliente)
-
-        # Clientes aleatorios
-        for _ in range(NUM_CLIENTES - 1):
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            username = f"{first_name[0].lower()}{last_name.lower().split(' ')[0]}"
-            user = User.objects.create_user(
-                username=username,
-                password=PASSWORD_CLIENTE,
-                first_name=first_name,
-                last_name=last_name,
-                email=f"{username}@{fake.free_email_domain()}",
-                is_staff=False
-            )
-            cliente = Cliente.objects.create(
-                user=user,
-                nombre_empresa=fake.company(),
-                rut_empresa=f"{random.randint(70, 99)}.{random.randint(100, 999)}.{random.randint(100, 999)}-{random.randint(0, 9)}",
-                telefono=fake.phone_number()
-            )
-            clientes.append(cliente)
-        
-        self.stdout.write(f'  Creados {len(clientes)} clientes.')
+        total = NUM_CLIENTES * self.scale
+
+        def usuarios():
+            # Cliente 1 (Fijo para pruebas)
+            yield User(username="cliente", password=self.hash_cliente, first_name="Juan", last_name="Pérez",
+                       email="cliente@empresa.com", is_staff=False)
+            # Clientes aleatorios
+            for i in range(1, total):
+                first_name = self.rng.choice(self.nombres)
+                last_name = self.rng.choice(self.apellidos)
+                username = f"{first_name[0].lower()}{last_name.lower()}{i}"
+                yield User(username=username, password=self.hash_cliente, first_name=first_name,
+                           last_name=last_name, email=f"{username}@{self.rng.choice(self.dominios)}",
+                           is_staff=False)
+
+        users = self._insertar_en_lotes(User, usuarios(), total, 'Usuarios cliente', conservar=True)
+
+        def perfiles():
+            yield Cliente(user=users[0], nombre_empresa="Empresa XYZ", rut_empresa="76.123.456-K",
+                          telefono="+56912345678")
+            for user in users[1:]:
+                rut = f"{self.rng.randint(70, 99)}.{self.rng.randint(100, 999)}.{self.rng.randint(100, 999)}-{self.rng.randint(0, 9)}"
+                yield Cliente(user=user, nombre_empresa=self.rng.choice(self.empresas), rut_empresa=rut,
+                              telefono=self.rng.choice(self.telefonos))
+
+        clientes = self._insertar_en_lotes(Cliente, perfiles(), total, 'Clientes', conservar=True)
+        self.stdout.write(f'  Creados {len(clientes):,} clientes.')
         return clientes
 
     def _create_empleados(self, sucursales):
         self.stdout.write('Creando empleados...')
-        empleados = {'CON': [], 'MEC': [], 'ADM': []}
-        
-        # Crear a Pedro Rojas (Jefe de Operaciones/Mecánico en Santiago)
-        user_pedro = User.objects.create_user(
-            username="p.rojas",
-            password=PASSWORD_EMPLEADO,
-            first_name="Pedro",
-            last_name="Rojas",
-            email="pedro.rojas@acmetrans.cl",
-            is_staff=True # Puede entrar al admin
-        )
-        pedro = Empleado.objects.create(
-            user=user_pedro,
-            cargo='MEC',
-            estado='DIS', 
-            sucursal=sucursales['Santiago']
-        )
-        empleados['MEC'].append(pedro)
+        # (user, sucursal, cargo) de cada empleado
+        plan = []
 
-        # Crear empleados aleatorios por sucursal
-        for nombre_sucursal, num in NUM_EMPLEADOS_POR_SUCURSAL.items():
+        # Pedro Rojas (Jefe de Operaciones/Mecánico en Santiago)
+        plan.append((User(username="p.rojas", password=self.hash_empleado, first_name="Pedro", last_name="Rojas",
+                          email="pedro.rojas@acmetrans.cl", is_staff=True), sucursales['Santiago'], 'MEC'))
+
+        # Empleados aleatorios por sucursal
+        for nombre_sucursal, num_base in NUM_EMPLEADOS_POR_SUCURSAL.items():
             sucursal = sucursales[nombre_sucursal]
+            num = num_base * self.flota
             for i in range(num):
-                first_name = fake.first_name()
-                last_name = fake.last_name()
-                username = f"{first_name[0].lower()}.{last_name.lower().split(' ')[0]}{i}"
-                user = User.objects.create_user(
-                    username=username,
-                    password=PASSWORD_EMPLEADO,
-                    first_name=first_name,
-                    last_name=last_name,
-                    email=f"{username}@acmetrans.cl",
-                    is_staff=True # Todos los empleados son staff
-                )
-                
+                first_name = self.rng.choice(self.nombres)
+                last_name = self.rng.choice(self.apellidos)
+                username = f"{first_name[0].lower()}.{last_name.lower()}{len(plan)}"
+
                 # Definir cargos (mayoría conductores)
                 if i < (num * 0.6): # 60% Conductores
                     cargo = 'CON'
                 elif i < (num * 0.8): # 20% Mecánicos
                     cargo = 'MEC'
                 else: # 20% Administradores/Auxiliares
-                    cargo = random.choice(['ADM', 'AUX'])
-                
-                empleado = Empleado.objects.create(
-                    user=user,
-                    cargo=cargo,
-                    estado='DIS', # Todos inician 'Disponibles'
-                    sucursal=sucursal
-                )
-                
-                if cargo == 'CON':
-                    empleados['CON'].append(empleado)
-                elif cargo == 'MEC':
-                    empleados['MEC'].append(empleado)
-                else:
-                    empleados['ADM'].append(empleado)
+                    cargo = self.rng.choice(['ADM', 'AUX'])
 
-        self.stdout.write(f'  Creados {len(empleados["CON"])} Conductores, {len(empleados["MEC"])} Mecánicos, y {len(empleados["ADM"])} Admin/Aux.')
+                user = User(username=username, password=self.hash_empleado, first_name=first_name,
+                            last_name=last_name, email=f"{username}@acmetrans.cl",
+                            is_staff=True) # Todos los empleados son staff
+                plan.append((user, sucursal, cargo))
+
+        self._insertar_en_lotes(User, (user for user, _, _ in plan), len(plan), 'Usuarios empleado')
+        creados = self._insertar_en_lotes(
+            Empleado,
+            (Empleado(user=user, cargo=cargo, estado='DIS', sucursal=sucursal) for user, sucursal, cargo in plan),
+            len(plan), 'Empleados', conservar=True,
+        )
+
+        empleados = {'CON': [], 'MEC': [], 'ADM': []}
+        for empleado in creados:
+            empleados['ADM' if empleado.cargo in ('ADM', 'AUX') else empleado.cargo].append(empleado)
+
+        self.stdout.write(f'  Creados {len(empleados["CON"]):,} Conductores, {len(empleados["MEC"]):,} Mecánicos, y {len(empleados["ADM"]):,} Admin/Aux.')
         return empleados
 
 
     def _create_camiones(self, sucursales, empleados):
         self.stdout.write('Creando flota de camiones...')
-        camiones = []
-        conductores_disponibles = list(empleados['CON']) 
 
-        for nombre_sucursal, capacidades in NUM_CAMIONES_POR_SUCURSAL.items():
-            sucursal = sucursales[nombre_sucursal]
-            
-            # Crear Camiones GC
-            for _ in range(capacidades['GC']):
-                camion = Camion.objects.create(
-                    matricula=fake.license_plate().replace(' ', ''),
-                    capacidad='GC',
-                    estado='DIS', 
-                    sucursal_base=sucursal,
-                    conductor_asignado=None 
-                )
-                camiones.append(camion)
-            
-            # Crear Camiones MC
-            for _ in range(capacidades['MC']):
-                camion = Camion.objects.create(
-                    matricula=fake.license_plate().replace(' ', ''),
-                    capacidad='MC',
-                    estado='DIS', 
-                    sucursal_base=sucursal,
-                    conductor_asignado=None
-                )
-                camiones.append(camion)
-        
-        # Asignar algunos conductores a camiones (solo los de la misma sucursal)
-        self.stdout.write('Asignando algunos conductores disponibles a camiones...')
-        camiones_sin_conductor = list(Camion.objects.filter(conductor_asignado__isnull=True))
-        
-        for cond in conductores_disponibles:
-            if not camiones_sin_conductor:
-                break 
-            
-            # Buscar un camión libre EN LA MISMA SUCURSAL del conductor
-            camion_para_asignar = next((c for c in camiones_sin_conductor if c.sucursal_base == cond.sucursal), None)
-            
-            if camion_para_asignar:
-                camion_para_asignar.conductor_asignado = cond
-                camion_para_asignar.save()
-                camiones_sin_conductor.remove(camion_para_asignar)
-
-        self.stdout.write(f'  Creados {len(camiones)} camiones.')
+        # Conductores disponibles por sucursal: se asignan a los primeros camiones de su misma sucursal
+        conductores_por_sucursal = {}
+        for cond in empleados['CON']:
+            conductores_por_sucursal.setdefault(cond.sucursal_id, []).append(cond)
+
+        def flota():
+            n = 0
+            for nombre_sucursal, capacidades in NUM_CAMIONES_POR_SUCURSAL.items():
+                sucursal = sucursales[nombre_sucursal]
+                conductores = iter(conductores_por_sucursal.get(sucursal.id, []))
+                for capacidad in ('GC', 'MC'):
+                    for _ in range(capacidades[capacidad] * self.flota):
+                        yield Camion(
+                            matricula=self._matricula(n),
+                            capacidad=capacidad,
+                            estado='DIS',
+                            sucursal_base=sucursal,
+                            conductor_asignado=next(conductores, None),
+                        )
+                        n += 1
+
+        total = sum(sum(c.values()) for c in NUM_CAMIONES_POR_SUCURSAL.values()) * self.flota
+        camiones = self._insertar_en_lotes(Camion, flota(), total, 'Camiones', conservar=True)
+        self.stdout.write(f'  Creados {len(camiones):,} camiones.')
         return camiones
 
 
     def _create_pedidos(self, clientes, sucursales, camiones):
         self.stdout.write('Creando pedidos de ejemplo...')
-        
-        tipos_carga_comunes = ["Alimentos Perecibles", "Retail", "Maquinaria Agrícola", "Carga Seca", "Materiales de Construcción"]
-        
-        for i in range(NUM_PEDIDOS):
-            sucursal_origen = random.choice(list(sucursales.values()))
-            destino_ciudad = random.choice(["Valparaíso", "Rancagua", "Talca", "Concepción", "Temuco", "Puerto Montt", "La Serena", "Antofagasta"])
-            
-            if i < NUM_PEDIDOS * 0.4:
-                estado_pedido = 'COMPLETADO'
-            elif i < NUM_PEDIDOS * 0.7:
-                estado_pedido = 'SOLICITADO'
-            elif i < NUM_PEDIDOS * 0.8:
-                estado_pedido = 'COTIZADO'
-            elif i < NUM_PEDIDOS * 0.9:
-                estado_pedido = 'EN_RUTA'
-            else:
-                estado_pedido = 'CONFIRMADO'
-
-            camion_asignado = None
-            precio = None
-            costo = None
-
-            if estado_pedido in ['CONFIRMADO', 'EN_RUTA', 'COMPLETADO']:
-                camion = Camion.objects.filter(
-                    sucursal_base=sucursal_origen, 
-                    estado='DIS', 
-                    conductor_asignado__isnull=False 
-                ).first()
-                
-                if camion:
-                    camion_asignado = camion
-                    precio = fake.pydecimal(left_digits=7, right_digits=0, positive=True, min_value=500000, max_value=3000000)
-                    costo = precio * Decimal(random.uniform(0.6, 0.8))
-                    
-                    if estado_pedido in ['CONFIRMADO', 'EN_RUTA']:
-                        camion.estado = 'RUT' 
-                        camion.save()
-                        
-                        if camion.conductor_asignado:
-                            conductor = camion.conductor_asignado
-                            conductor.estado = 'RUT' 
-                            conductor.save()
-            
-            # --- ¡CORRECCIÓN APLICADA AQUÍ! ---
-            # left_digits=4 cambiado a left_digits=5
-            peso = fake.pydecimal(
-                left_digits=5, # Permitir hasta 5 dígitos (ej: 25000)
-                right_digits=2, 
-                positive=True, 
-                min_value=100, 
-                max_value=25000
-            )
-            volumen = fake.pydecimal(
-                left_digits=2, 
-                right_digits=2, 
-                positive=True, 
-                min_value=1, 
-                max_value=90
-            )
-            
-            Pedido.objects.create(
-                cliente=random.choice(clientes),
-                sucursal_origen=sucursal_origen,
-                destino=f"{fake.street_address()}, {destino_ciudad}",
-                tipo_carga=random.choice(tipos_carga_comunes),
-                peso_kg=peso,
-                volumen_m3=volumen,
-                detalles_carga=f"Carga {fake.word()}. {random.randint(1, 20)} pallets.",
-                fecha_deseada=fake.future_date(end_date="+30d"),
-                estado=estado_pedido,
-                costo_estimado=costo,
-                precio_cotizado=precio,
-                camion_asignado=camion_asignado
-            )
-        
-        self.stdout.write(f'  Creados {NUM_PEDIDOS} pedidos.')
\ No newline at end of file
+        total = NUM_PEDIDOS * self.scale
+        rng = self.rng
+
+        lista_sucursales = list(sucursales.values())
+        clientes_ids = [cliente.id for cliente in clientes]
+        # Camiones con conductor de cada sucursal: los pedidos activos los
+        # toman por turnos y los completados usan cualquiera (historia)
+        camiones_con_conductor = {suc.id: [] for suc in lista_sucursales}
+        for camion in camiones:
+            if camion.conductor_asignado_id:
+                camiones_con_conductor[camion.sucursal_base_id].append(camion)
+        turnos = {suc_id: cycle(lista) for suc_id, lista in camiones_con_conductor.items() if lista}
+        self.camiones_ocupados = set()
+
+        ahora = timezone.now().replace(minute=0, second=0, microsecond=0)
+        hoy = ahora.date()
+        segundos_historia = min(DIAS_HISTORIA_MAX, DIAS_HISTORIA_POR_ESCALA * self.scale) * 86400
+        # bulk_create no pasa por la señal que la completa (api/geo.py)
+        codigos_destino = {ciudad: geo.ciudad_de(ciudad) for ciudad in CIUDADES_DESTINO}
+
+        def pedidos():
+            for _ in range(total):
+                sucursal_origen = rng.choice(lista_sucursales)
+                fecha_solicitud = ahora - timedelta(seconds=rng.randint(0, segundos_historia))
+                fecha_deseada = fecha_solicitud.date() + timedelta(days=rng.randint(1, 30))
+
+                # Lo que ya debió ocurrir está cerrado; lo futuro, en curso
+                if fecha_deseada < hoy:
+                    estado_pedido = 'COMPLETADO' if rng.random() < 0.9 else 'CANCELADO'
+                else:
+                    estado_pedido = rng.choices(*ESTADOS_ABIERTOS)[0]
+
+                camion_asignado = None
+                precio = None
+                costo = None
+
+                if estado_pedido in ['COTIZADO', 'CONFIRMADO', 'EN_RUTA', 'COMPLETADO']:
+                    precio = rng.randint(500000, 3000000)
+                    # Costo entre 60% y 80% del precio, en centavos
+                    costo = Decimal(precio * rng.randint(6000, 8000)).scaleb(-4)
+                    precio = Decimal(precio)
+
+                if estado_pedido in Pedido.ESTADOS_CON_CAMION and sucursal_origen.id in turnos:
+                    camion_asignado = next(turnos[sucursal_origen.id])
+                    if estado_pedido == 'EN_RUTA':
+                        self.camiones_ocupados.add(camion_asignado.id)
+                elif estado_pedido == 'COMPLETADO' and camiones_con_conductor[sucursal_origen.id]:
+                    camion_asignado = rng.choice(camiones_con_conductor[sucursal_origen.id])
+
+                cliente_id = rng.choice(clientes_ids)
+                calle, ciudad = rng.choice(self.calles), rng.choice(CIUDADES_DESTINO)
+                yield Pedido(
+                    cliente_id=cliente_id,
+                    sucursal_origen_id=sucursal_origen.id,
+                    destino=f"{calle}, {ciudad}",
+                    ciudad_destino=codigos_destino[ciudad],
+                    tipo_carga=rng.choice(TIPOS_CARGA),
+                    peso_kg=Decimal(rng.randint(10000, 2500000)).scaleb(-2),
+                    volumen_m3=Decimal(rng.randint(100, 9000)).scaleb(-2),
+                    detalles_carga=f"Carga {rng.choice(self.palabras)}. {rng.randint(1, 20)} pallets.",
+                    fecha_deseada=fecha_deseada,
+                    fecha_solicitud=fecha_solicitud,
+                    estado=estado_pedido,
+                    costo_estimado=costo,
+                    precio_cotizado=precio,
+                    camion_asignado_id=camion_asignado.id if camion_asignado else None,
+                )
+
+        def historial(lote):
+            """ Transiciones de estado de cada pedido, desde su fecha de solicitud """
+            filas = []
+            for pedido in lote:
+                if pedido.estado == 'CANCELADO':
+                    camino = CAMINO_ESTADOS[:rng.randint(1, 3)] + ['CANCELADO']
+                else:
+                    camino = CAMINO_ESTADOS[:CAMINO_ESTADOS.index(pedido.estado) + 1]
+                fecha, desde = pedido.fecha_solicitud, None
+                for hacia in camino:
+                    filas.append(TransicionPedido(pedido_id=pedido.pk, desde=desde, hacia=hacia,
+                                                  fecha=min(fecha, ahora)))
+                    if hacia in HORAS_POR_ETAPA:
+                        fecha += timedelta(hours=rng.uniform(*HORAS_POR_ETAPA[hacia]))
+                    desde = hacia
+            TransicionPedido.objects.bulk_create(filas, batch_size=self.batch_size)
+            self.filas_insertadas += len(filas)
+
+        with fecha_solicitud_manual():
+            self._insertar_en_lotes(Pedido, pedidos(), total, 'Pedidos', despues=historial)
+
+        # Los camiones con pedidos que ya salieron (y sus conductores) quedan 'En Ruta'
+        ocupados = sorted(self.camiones_ocupados)
+        conductores = [c.conductor_asignado_id for c in camiones if c.id in self.camiones_ocupados]
+        with transaction.atomic():
+            for i in range(0, len(ocupados), 500):
+                Camion.objects.filter(pk__in=ocupados[i:i + 500]).update(estado='RUT')
+                Empleado.objects.filter(pk__in=conductores[i:i + 500]).update(estado='RUT')
+
+        self.stdout.write(f'  Creados {total:,} pedidos.')
+
+    def _create_reservas(self, camiones, empleados):
+        self.stdout.write('Creando reservas (mantenciones y vacaciones)...')
+        hoy = timezone.localdate()
+        recursos = {'MAN': [('camion_id', c.id) for c in camiones],
+                    'VAC': [('empleado_id', e.id) for e in empleados['CON']]}
+
+        def calendario():
+            # Una reserva por recurso: no se cruzan entre sí
+            for tipo, (fraccion, (minimo, maximo)) in RESERVAS.items():
+                for campo, recurso_id in recursos[tipo]:
+                    if self.rng.random() < fraccion:
+                        inicio = hoy + timedelta(days=self.rng.randint(1, DIAS_RESERVAS))
+                        fin = inicio + timedelta(days=self.rng.randint(minimo, maximo))
+                        yield Reserva(tipo=tipo, inicio=inicio, fin=fin, **{campo: recurso_id})
+
+        creadas = list(calendario())
+        self._insertar_en_lotes(Reserva, creadas, len(creadas), 'Reservas')
+        self.stdout.write(f'  Creadas {len(creadas):,} reservas.')
@@ -0,0 +1,36 @@
+# acme-trans-backend/api/management/commands/reconstruir_contadores.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import contadores
+
+ENTIDADES = {'PED': 'Pedidos', 'CAM': 'Camiones', 'CON': 'Conductores'}
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero los contadores del dashboard, o solo verifica si hay desfase (--check)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', type=int, help='Limitar a una sucursal (id)')
+        parser.add_argument('--check', action='store_true',
+                            help='Solo comparar contra un conteo real; falla si hay diferencias')
+
+    def handle(self, *args, **options):
+        sucursal_id = options['sucursal']
+        diferencias = contadores.diferencias(sucursal_id)
+
+        for (suc, entidad, estado), (guardado, real) in sorted(diferencias.items()):
+            self.stdout.write(self.style.WARNING(
+                f'  Sucursal {suc} / {ENTIDADES[entidad]} / {estado}: guardado={guardado}, real={real}'
+            ))
+
+        if options['check']:
+            if diferencias:
+                raise CommandError(f'{len(diferencias)} contador(es) con desfase.')
+            self.stdout.write(self.style.SUCCESS('Contadores al día, sin desfase.'))
+            return
+
+        conteo = contadores.reconstruir(sucursal_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores reconstruidos: {len(conteo)} claves ({len(diferencias)} corregidas).'
+        ))
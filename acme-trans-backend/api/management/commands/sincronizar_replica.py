@@ -0,0 +1,57 @@
+# acme-trans-backend/api/management/commands/sincronizar_replica.py
+
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api import replica
+
+
+def copiar(origen, destino):
+    """
+    Copia la base SQLite 'origen' en 'destino' con la API de backup (una
+    foto consistente, aunque haya escrituras en curso) y reemplaza el
+    archivo de una vez: las conexiones nuevas ven la copia completa.
+    La fecha del archivo queda en el inicio de la copia (replica.al_dia).
+    """
+    inicio = time.time_ns()
+    temporal = f'{destino}.tmp'
+    fuente = sqlite3.connect(f'file:{origen}?mode=ro', uri=True)
+    copia = sqlite3.connect(temporal)
+    try:
+        fuente.backup(copia)
+        # La copia es de solo lectura: sin los archivos -wal/-shm de WAL
+        copia.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        copia.close()
+        fuente.close()
+    os.utime(temporal, ns=(inicio, inicio))
+    os.replace(temporal, destino)
+    return (time.time_ns() - inicio) / 1_000_000
+
+
+class Command(BaseCommand):
+    help = 'Copia la base primaria (SQLite) en la réplica de lectura (ACME_DB_REPLICA)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, help='Repetir cada N segundos (hasta Ctrl+C)')
+
+    def handle(self, *args, **options):
+        if not replica.configurada():
+            raise CommandError('No hay réplica configurada: defina ACME_DB_REPLICA.')
+        primaria = connections[DEFAULT_DB_ALIAS].settings_dict
+        if primaria['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('La copia de archivo es solo para SQLite; en otros motores use su replicación.')
+        origen, destino = str(primaria['NAME']), str(connections.settings[replica.ALIAS]['NAME'])
+        if not os.path.exists(origen):
+            raise CommandError(f'No existe la base primaria: {origen}')
+
+        while True:
+            milisegundos = copiar(origen, destino)
+            self.stdout.write(self.style.SUCCESS(f'Réplica sincronizada en {milisegundos:.0f} ms: {destino}'))
+            if not options['cada']:
+                break
+            time.sleep(options['cada'])
@@ -0,0 +1,160 @@
+# api/middleware.py
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('acme.sql')
+
+# "IN (%s, %s, %s)" -> "IN (...)": la misma consulta con listas de distinto largo
+_LISTA_IN = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_ESPACIOS = re.compile(r'\s+')
+
+
+def forma_sql(sql):
+    """
+    Forma normalizada de una sentencia. Los valores ya viajan como
+    parámetros, así que basta con colapsar espacios y listas IN.
+    """
+    return _LISTA_IN.sub('IN (...)', _ESPACIOS.sub(' ', sql).strip())
+
+
+class _Registro:
+    """ Sentencias ejecutadas durante una request (todas las conexiones) """
+
+    def __init__(self):
+        self.total = 0
+        self.duracion = 0.0
+        self.lenta = (0.0, None)
+        self.formas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.total += 1
+            self.duracion += duracion
+            if duracion > self.lenta[0]:
+                self.lenta = (duracion, sql)
+            self.formas[forma_sql(sql)] += 1
+
+    def repetidas(self, umbral):
+        """ {forma: veces} de las formas que se repiten más de 'umbral' veces """
+        return {forma: veces for forma, veces in self.formas.most_common() if veces > umbral}
+
+
+# El registro de la request en curso. Es una variable de contexto y no un
+# wrapper por request: sync_to_async copia el contexto, así las consultas del
+# ORM async (que corren en otro hilo, con otra conexión) caen en él.
+_registro_actual = ContextVar('acme_sql_registro', default=None)
+
+def _registrar(execute, sql, params, many, context):
+    registro = _registro_actual.get()
+    if registro is None:
+        return execute(sql, params, many, context)
+    return registro(execute, sql, params, many, context)
+
+def _instalar():
+    """ Pone _registrar en las conexiones del hilo actual (una vez por conexión) """
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if _registrar not in wrappers:
+            wrappers.append(_registrar)
+
+
+class SQLInstrumentacionMiddleware:
+    """
+    Instrumentación de SQL por request (opt-in con ACME_SQL_INSTRUMENTACION).
+
+    Cuenta las consultas, el tiempo total en la base, la sentencia más lenta
+    y las formas de SQL repetidas. Lo expone en el header Server-Timing
+    (visible en la pestaña Network del navegador) y en una línea JSON en el
+    logger 'acme.sql'. Si una misma forma se repite más de
+    ACME_SQL_N1_UMBRAL veces se marca como posible N+1 (nivel WARNING).
+
+    Funciona en modo sync y async: bajo ASGI no obliga a pasar las vistas
+    async (dashboard async, SSE) a un hilo, y cuenta sus consultas. En
+    respuestas streaming solo se mide lo ejecutado antes de empezar a
+    enviar el cuerpo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ACME_SQL_INSTRUMENTACION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral = getattr(settings, 'ACME_SQL_N1_UMBRAL', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _instalar()
+        registro = _Registro()
+        token = _registro_actual.set(registro)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _registro_actual.reset(token)
+        return self._reportar(request, response, registro, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        # El ORM async y las vistas sync corren en el hilo de sync_to_async
+        # de esta request: los wrappers van en sus conexiones
+        await sync_to_async(_instalar)()
+        registro = _Registro()
+        token = _registro_actual.set(registro)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _registro_actual.reset(token)
+        return self._reportar(request, response, registro, time.perf_counter() - inicio)
+
+    def _reportar(self, request, response, registro, total):
+        repetidas = registro.repetidas(self.umbral)
+        self._server_timing(response, registro, total, repetidas)
+        self._log(request, response, registro, total, repetidas)
+        return response
+
+    def _server_timing(self, response, registro, total, repetidas):
+        metricas = [
+            f'db;dur={registro.duracion * 1000:.2f};desc="{registro.total} consultas"',
+            f'db-lenta;dur={registro.lenta[0] * 1000:.2f}',
+            f'app;dur={total * 1000:.2f}',
+        ]
+        if repetidas:
+            metricas.append(f'n1;desc="{len(repetidas)} formas repetidas, max {max(repetidas.values())}"')
+        if response.has_header('Server-Timing'):
+            metricas.insert(0, response['Server-Timing'])
+        response['Server-Timing'] = ', '.join(metricas)
+
+    def _log(self, request, response, registro, total, repetidas):
+        linea = {
+            'metodo': request.method,
+            'ruta': request.path,
+            'status': response.status_code,
+            'consultas': registro.total,
+            'db_ms': round(registro.duracion * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'lenta_ms': round(registro.lenta[0] * 1000, 2),
+            'lenta_sql': registro.lenta[1],
+        }
+        if repetidas:
+            linea['posible_n1'] = [{'sql': forma, 'veces': veces} for forma, veces in repetidas.items()]
+            logger.warning(json.dumps(linea, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(linea, ensure_ascii=False))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='camion',
+            index=models.Index(fields=['sucursal_base', 'estado'], name='camion_suc_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='empleado',
+            index=models.Index(fields=['sucursal', 'cargo', 'estado'], name='empleado_suc_cargo_est_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['sucursal_origen', 'estado'], name='pedido_suc_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['sucursal_origen', '-fecha_solicitud', '-id'], name='pedido_suc_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', '-fecha_solicitud', '-id'], name='pedido_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('estado__in', ('SOLICITADO', 'COTIZADO', 'CONFIRMADO', 'EN_RUTA'))), fields=['sucursal_origen', '-fecha_solicitud', '-id'], name='pedido_activo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('estado__in', ('CONFIRMADO', 'EN_RUTA'))), fields=['camion_asignado'], name='pedido_camion_ocupado_idx'),
+        ),
+    ]
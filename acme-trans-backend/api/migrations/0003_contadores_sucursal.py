@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_contadores(apps, schema_editor):
+    """ Carga inicial de los contadores desde los datos existentes """
+    Pedido = apps.get_model('api', 'Pedido')
+    Camion = apps.get_model('api', 'Camion')
+    Empleado = apps.get_model('api', 'Empleado')
+    ContadorSucursal = apps.get_model('api', 'ContadorSucursal')
+
+    filas = []
+    for fila in Pedido.objects.values('sucursal_origen_id', 'estado').annotate(n=Count('id')).order_by():
+        filas.append(ContadorSucursal(sucursal_id=fila['sucursal_origen_id'], entidad='PED', estado=fila['estado'], total=fila['n']))
+    for fila in Camion.objects.values('sucursal_base_id', 'estado').annotate(n=Count('id')).order_by():
+        filas.append(ContadorSucursal(sucursal_id=fila['sucursal_base_id'], entidad='CAM', estado=fila['estado'], total=fila['n']))
+    for fila in Empleado.objects.filter(cargo='CON').values('sucursal_id', 'estado').annotate(n=Count('id')).order_by():
+        filas.append(ContadorSucursal(sucursal_id=fila['sucursal_id'], entidad='CON', estado=fila['estado'], total=fila['n']))
+    ContadorSucursal.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorSucursal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', models.CharField(choices=[('PED', 'Pedido'), ('CAM', 'Camión'), ('CON', 'Conductor')], max_length=3)),
+                ('estado', models.CharField(max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contadores', to='api.sucursal')),
+            ],
+            options={
+                'verbose_name_plural': 'Contadores de sucursal',
+                'constraints': [models.UniqueConstraint(fields=('sucursal', 'entidad', 'estado'), name='contador_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
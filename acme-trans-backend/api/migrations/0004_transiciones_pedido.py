@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_contadores_sucursal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.CharField(max_length=20, null=True)),
+                ('hacia', models.CharField(max_length=20)),
+                ('fecha', models.DateTimeField()),
+                ('actor', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('pedido', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='api.pedido')),
+            ],
+            options={
+                'verbose_name_plural': 'Transiciones de pedidos',
+                'indexes': [models.Index(fields=['fecha'], name='transicion_fecha_idx'), models.Index(fields=['pedido', 'fecha'], name='transicion_pedido_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_transiciones_pedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_transicion', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('pedidos_creados', models.IntegerField(default=0)),
+                ('pedidos_completados', models.IntegerField(default=0)),
+                ('pedidos_cancelados', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('costos', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('peso_kg', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('sucursal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='api.sucursal')),
+            ],
+            options={
+                'verbose_name_plural': 'Resúmenes diarios',
+                'indexes': [models.Index(fields=['dia'], name='resumen_dia_idx')],
+                'constraints': [models.UniqueConstraint(fields=('sucursal', 'dia'), name='resumen_sucursal_dia_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,166 @@
+from django.db import migrations
+
+# Copia congelada del SQL de api/busqueda.py al crear esta migración: si el
+# índice cambia después, se reinstala en una migración nueva con su propia
+# copia (así esta migración siempre crea lo mismo).
+
+TABLA = 'api_busqueda'
+
+# rowid = id * 4 + código de la entidad: cada objeto tiene una fila fija y
+# los triggers la reemplazan por rowid (sin recorrer la tabla)
+CODIGOS = {'pedido': 0, 'cliente': 1, 'camion': 2, 'empleado': 3}
+
+_CREAR_TABLA = f"""
+    CREATE VIRTUAL TABLE {TABLA} USING fts5(
+        entidad UNINDEXED, objeto_id UNINDEXED, sucursal_id UNINDEXED, estado UNINDEXED,
+        titulo, texto, etiquetas,
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+def _etiquetas(entidad, sucursal, estado):
+    """ Expresión SQL de la columna 'etiquetas' """
+    return (f"'ent{entidad}'"
+            f" || coalesce(' suc' || {sucursal}, '')"
+            f" || coalesce(' estado' || lower(replace({estado}, '_', '')), '')")
+
+def _nombre(usuario):
+    return f"trim(coalesce({usuario}.first_name, '') || ' ' || coalesce({usuario}.last_name, ''))"
+
+# SELECT de las filas del índice de cada entidad; {donde} filtra cuáles
+_FILAS = {
+    'pedido': f"""
+        SELECT p.id * 4, 'pedido', p.id, p.sucursal_origen_id, p.estado,
+               p.destino,
+               p.tipo_carga || ' ' || coalesce(p.detalles_carga, '') || ' ' || coalesce(c.nombre_empresa, '')
+                   || ' ' || u.username || ' ' || {_nombre('u')},
+               {_etiquetas('pedido', 'p.sucursal_origen_id', 'p.estado')}
+        FROM api_pedido p
+        JOIN api_cliente c ON c.id = p.cliente_id
+        JOIN auth_user u ON u.id = c.user_id
+        WHERE {{donde}}
+    """,
+    'cliente': f"""
+        SELECT c.id * 4 + 1, 'cliente', c.id, NULL, NULL,
+               coalesce(nullif(c.nombre_empresa, ''), u.username),
+               u.username || ' ' || {_nombre('u')} || ' ' || coalesce(c.rut_empresa, ''),
+               {_etiquetas('cliente', 'NULL', 'NULL')}
+        FROM api_cliente c
+        JOIN auth_user u ON u.id = c.user_id
+        WHERE {{donde}}
+    """,
+    'camion': f"""
+        SELECT k.id * 4 + 2, 'camion', k.id, k.sucursal_base_id, k.estado,
+               k.matricula,
+               coalesce(u.username || ' ' || {_nombre('u')}, ''),
+               {_etiquetas('camion', 'k.sucursal_base_id', 'k.estado')}
+        FROM api_camion k
+        LEFT JOIN api_empleado e ON e.id = k.conductor_asignado_id
+        LEFT JOIN auth_user u ON u.id = e.user_id
+        WHERE {{donde}}
+    """,
+    'empleado': f"""
+        SELECT e.id * 4 + 3, 'empleado', e.id, e.sucursal_id, e.estado,
+               {_nombre('u')},
+               u.username,
+               {_etiquetas('empleado', 'e.sucursal_id', 'e.estado')}
+        FROM api_empleado e
+        JOIN auth_user u ON u.id = e.user_id
+        WHERE {{donde}}
+    """,
+}
+# Tabla y alias de cada entidad en _FILAS
+_TABLAS = {'pedido': ('api_pedido', 'p'), 'cliente': ('api_cliente', 'c'),
+           'camion': ('api_camion', 'k'), 'empleado': ('api_empleado', 'e')}
+
+def _refrescar(entidad, donde):
+    """ Sentencias que rehacen las filas de 'entidad' que cumplen 'donde' """
+    tabla, alias = _TABLAS[entidad]
+    return (
+        f"DELETE FROM {TABLA} WHERE rowid IN "
+        f"(SELECT {alias}.id * 4 + {CODIGOS[entidad]} FROM {tabla} {alias} WHERE {donde});\n"
+        f"INSERT INTO {TABLA}(rowid, entidad, objeto_id, sucursal_id, estado, titulo, texto, etiquetas) "
+        f"{_FILAS[entidad].format(donde=donde)};"
+    )
+
+def _borrar(entidad):
+    return f"DELETE FROM {TABLA} WHERE rowid = old.id * 4 + {CODIGOS[entidad]};"
+
+def _cambio(*columnas):
+    """ WHEN de un trigger UPDATE: solo si cambió alguna columna indexada """
+    return ' OR '.join(f'old.{c} IS NOT new.{c}' for c in columnas)
+
+# (nombre, evento, cuerpo). Los UPDATE llevan WHEN: save() escribe todas
+# las columnas, y un cambio de precio no debe reescribir el índice.
+_TRIGGERS = [
+    ('pedido_ai', 'AFTER INSERT ON api_pedido', _refrescar('pedido', 'p.id = new.id')),
+    ('pedido_au', 'AFTER UPDATE ON api_pedido WHEN '
+                  + _cambio('destino', 'tipo_carga', 'detalles_carga', 'cliente_id', 'sucursal_origen_id', 'estado'),
+     _refrescar('pedido', 'p.id = new.id')),
+    ('pedido_ad', 'AFTER DELETE ON api_pedido', _borrar('pedido')),
+
+    ('cliente_ai', 'AFTER INSERT ON api_cliente', _refrescar('cliente', 'c.id = new.id')),
+    ('cliente_au', 'AFTER UPDATE ON api_cliente WHEN ' + _cambio('nombre_empresa', 'rut_empresa', 'user_id'),
+     _refrescar('cliente', 'c.id = new.id') + _refrescar('pedido', 'p.cliente_id = new.id')),
+    ('cliente_ad', 'AFTER DELETE ON api_cliente', _borrar('cliente')),
+
+    ('camion_ai', 'AFTER INSERT ON api_camion', _refrescar('camion', 'k.id = new.id')),
+    ('camion_au', 'AFTER UPDATE ON api_camion WHEN '
+                  + _cambio('matricula', 'sucursal_base_id', 'estado', 'conductor_asignado_id'),
+     _refrescar('camion', 'k.id = new.id')),
+    ('camion_ad', 'AFTER DELETE ON api_camion', _borrar('camion')),
+
+    ('empleado_ai', 'AFTER INSERT ON api_empleado', _refrescar('empleado', 'e.id = new.id')),
+    ('empleado_au', 'AFTER UPDATE ON api_empleado WHEN ' + _cambio('sucursal_id', 'estado', 'user_id'),
+     _refrescar('empleado', 'e.id = new.id')),
+    ('empleado_ad', 'AFTER DELETE ON api_empleado', _borrar('empleado')),
+
+    # Los nombres de usuario aparecen en clientes, sus pedidos, empleados y
+    # los camiones que conducen
+    ('usuario_au', 'AFTER UPDATE ON auth_user WHEN ' + _cambio('username', 'first_name', 'last_name'),
+     _refrescar('cliente', 'c.user_id = new.id')
+     + _refrescar('pedido', 'p.cliente_id IN (SELECT id FROM api_cliente WHERE user_id = new.id)')
+     + _refrescar('empleado', 'e.user_id = new.id')
+     + _refrescar('camion', 'k.conductor_asignado_id IN (SELECT id FROM api_empleado WHERE user_id = new.id)')),
+]
+
+
+def instalar_busqueda(apps, schema_editor):
+    """ Tabla FTS5, triggers y carga inicial; solo en SQLite """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    desinstalar_busqueda(apps, schema_editor)
+    with connection.cursor() as cursor:
+        cursor.execute(_CREAR_TABLA)
+        for nombre, evento, cuerpo in _TRIGGERS:
+            cursor.execute(f"CREATE TRIGGER {TABLA}_{nombre} {evento} BEGIN\n{cuerpo}\nEND")
+        for entidad in _FILAS:
+            cursor.execute(
+                f"INSERT INTO {TABLA}(rowid, entidad, objeto_id, sucursal_id, estado, titulo, texto, etiquetas) "
+                + _FILAS[entidad].format(donde='1')
+            )
+        cursor.execute(f"INSERT INTO {TABLA}({TABLA}) VALUES ('optimize')")
+
+
+def desinstalar_busqueda(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nombre, _, _ in _TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {TABLA}_{nombre}")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLA}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_resumenes_diarios'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        # Índice FTS5 y sus triggers (ver api/busqueda.py); solo en SQLite
+        migrations.RunPython(instalar_busqueda, desinstalar_busqueda),
+    ]
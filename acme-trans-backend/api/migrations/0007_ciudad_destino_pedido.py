@@ -0,0 +1,97 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:32
+
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Copia congelada del reconocedor de ciudades de api/geo.py (y de
+# api/data/ciudades.csv) al crear esta migración: los cambios posteriores
+# a la tabla o al parser no cambian cómo se completaron los pedidos.
+
+# (código, nombre) de api/data/ciudades.csv
+CIUDADES = [
+    ('arica', 'Arica'), ('iquique', 'Iquique'), ('alto-hospicio', 'Alto Hospicio'),
+    ('pozo-almonte', 'Pozo Almonte'), ('tocopilla', 'Tocopilla'), ('calama', 'Calama'),
+    ('san-pedro-de-atacama', 'San Pedro de Atacama'), ('mejillones', 'Mejillones'),
+    ('antofagasta', 'Antofagasta'), ('taltal', 'Taltal'), ('chanaral', 'Chañaral'), ('caldera', 'Caldera'),
+    ('copiapo', 'Copiapó'), ('vallenar', 'Vallenar'), ('la-serena', 'La Serena'), ('coquimbo', 'Coquimbo'),
+    ('vicuna', 'Vicuña'), ('ovalle', 'Ovalle'), ('illapel', 'Illapel'), ('los-vilos', 'Los Vilos'),
+    ('la-ligua', 'La Ligua'), ('san-felipe', 'San Felipe'), ('la-calera', 'La Calera'),
+    ('los-andes', 'Los Andes'), ('quillota', 'Quillota'), ('vina-del-mar', 'Viña del Mar'),
+    ('valparaiso', 'Valparaíso'), ('quilpue', 'Quilpué'), ('villa-alemana', 'Villa Alemana'),
+    ('san-antonio', 'San Antonio'), ('colina', 'Colina'), ('santiago', 'Santiago'), ('maipu', 'Maipú'),
+    ('puente-alto', 'Puente Alto'), ('san-bernardo', 'San Bernardo'), ('talagante', 'Talagante'),
+    ('melipilla', 'Melipilla'), ('buin', 'Buin'), ('rancagua', 'Rancagua'), ('pichilemu', 'Pichilemu'),
+    ('rengo', 'Rengo'), ('san-fernando', 'San Fernando'), ('santa-cruz', 'Santa Cruz'), ('curico', 'Curicó'),
+    ('constitucion', 'Constitución'), ('talca', 'Talca'), ('linares', 'Linares'), ('cauquenes', 'Cauquenes'),
+    ('parral', 'Parral'), ('san-carlos', 'San Carlos'), ('chillan', 'Chillán'), ('talcahuano', 'Talcahuano'),
+    ('concepcion', 'Concepción'), ('coronel', 'Coronel'), ('lota', 'Lota'), ('los-angeles', 'Los Ángeles'),
+    ('lebu', 'Lebu'), ('angol', 'Angol'), ('victoria', 'Victoria'), ('temuco', 'Temuco'), ('pucon', 'Pucón'),
+    ('villarrica', 'Villarrica'), ('panguipulli', 'Panguipulli'), ('valdivia', 'Valdivia'),
+    ('la-union', 'La Unión'), ('osorno', 'Osorno'), ('puerto-varas', 'Puerto Varas'),
+    ('puerto-montt', 'Puerto Montt'), ('ancud', 'Ancud'), ('castro', 'Castro'), ('quellon', 'Quellón'),
+    ('puerto-aysen', 'Puerto Aysén'), ('coyhaique', 'Coyhaique'), ('puerto-natales', 'Puerto Natales'),
+    ('punta-arenas', 'Punta Arenas'), ('porvenir', 'Porvenir'),
+]
+
+ALIAS = {
+    'stgo': 'santiago', 'santiago de chile': 'santiago',
+    'valpo': 'valparaiso', 'vina': 'vina-del-mar',
+    'conce': 'concepcion', 'pto montt': 'puerto-montt', 'pto varas': 'puerto-varas',
+    'pta arenas': 'punta-arenas', 'coihaique': 'coyhaique',
+}
+
+
+def normalizar(texto):
+    sin_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', sin_acentos.lower()))
+
+_POR_NOMBRE = {normalizar(nombre): codigo for codigo, nombre in CIUDADES}
+_POR_NOMBRE.update(ALIAS)
+_MAX_PALABRAS = max(len(nombre.split()) for nombre in _POR_NOMBRE)
+
+
+def ciudad_de(destino):
+    """ Como geo.ciudad_de(): de la última parte del destino a la primera, el nombre más largo """
+    for parte in reversed((destino or '').split(',')):
+        palabras = normalizar(parte).split()
+        for n in range(min(len(palabras), _MAX_PALABRAS), 0, -1):
+            codigo = _POR_NOMBRE.get(' '.join(palabras[-n:]))
+            if codigo:
+                return codigo
+    return None
+
+
+def completar_ciudades(apps, schema_editor):
+    """ Parsea una vez el destino de los pedidos existentes (UPDATE por ciudad, de a 500) """
+    Pedido = apps.get_model('api', 'Pedido')
+    por_ciudad = defaultdict(list)
+    for pedido_id, destino in Pedido.objects.values_list('id', 'destino').iterator(chunk_size=2000):
+        codigo = ciudad_de(destino)
+        if codigo:
+            por_ciudad[codigo].append(pedido_id)
+    for codigo, ids in por_ciudad.items():
+        for i in range(0, len(ids), 500):
+            Pedido.objects.filter(pk__in=ids[i:i + 500]).update(ciudad_destino=codigo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='ciudad_destino',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['sucursal_origen', 'ciudad_destino'], name='pedido_suc_ciudad_idx'),
+        ),
+        migrations.RunPython(completar_ciudades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_ciudad_destino_pedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaReserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('VIA', 'Viaje'), ('MAN', 'Mantención'), ('REP', 'Reparación'), ('LIC', 'Licencia'), ('VAC', 'Vacaciones'), ('PER', 'Permiso')], max_length=3)),
+                ('inicio', models.DateField()),
+                ('fin', models.DateField(help_text='Primer día libre (no incluido en la reserva)')),
+                ('nota', models.CharField(blank=True, max_length=255)),
+                ('camion', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='api.camion')),
+                ('empleado', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='api.empleado')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['camion', 'inicio'], name='reserva_camion_inicio_idx'), models.Index(fields=['empleado', 'inicio'], name='reserva_empleado_inicio_idx'), models.Index(fields=['fin'], name='reserva_fin_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('camion__isnull', False), ('empleado__isnull', True)), models.Q(('camion__isnull', True), ('empleado__isnull', False)), _connector='OR'), name='reserva_un_recurso'), models.CheckConstraint(condition=models.Q(('fin__gt', models.F('inicio'))), name='reserva_rango_valido')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:22
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_reservas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoPublicado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canales', models.CharField(help_text='Canales separados por espacios', max_length=255)),
+                ('datos', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+        ),
+    ]
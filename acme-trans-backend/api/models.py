@@ -1,6 +1,9 @@
 # api/models.py
 
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.expressions import RawSQL
 from django.contrib.auth.models import User
 
 # --- 1. Modelo Sucursal ---
@@ -27,8 +30,39 @@ class Cliente(models.Model):
     def __str__(self):
         return self.user.username
 
+# --- Valores leídos de la base (contadores del dashboard) ---
+class ValoresLeidosMixin:
+    """
+    Recuerda los valores de 'campos_leidos' tal como se leyeron de la base
+    (o como quedaron al guardar): api/signals.py arma con ellos la clave de
+    contador anterior sin volver a consultar la fila en cada save().
+    'campos_contador' son los que forman esa clave, en orden.
+    """
+    campos_leidos = ()
+    campos_contador = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.recordar_valores()
+        return instance
+
+    def recordar_valores(self, nombres=None):
+        """ Toma los valores actuales; 'nombres' (campos o attnames) limita a esos campos """
+        diferidos = self.get_deferred_fields()
+        valores = self.__dict__.setdefault('_valores_leidos', {})
+        for campo in self.campos_leidos:
+            if nombres is not None and campo not in nombres and campo.removesuffix('_id') not in nombres:
+                continue
+            if campo not in diferidos:
+                valores[campo] = getattr(self, campo)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.recordar_valores(fields)
+
 # --- 3. Modelo Empleado (¡MODIFICADO!) ---
-class Empleado(models.Model):
+class Empleado(ValoresLeidosMixin, models.Model):
     
     CARGO_CHOICES = [
         ('ADM', 'Administrador'),
@@ -63,12 +97,21 @@ class Empleado(models.Model):
         related_name="empleados"
     )
 
+    # Clave de contador (api/signals.py)
+    campos_contador = campos_leidos = ('sucursal_id', 'cargo', 'estado')
+
+    class Meta:
+        indexes = [
+            # Dashboard: conductores por sucursal agrupados por estado
+            models.Index(fields=['sucursal', 'cargo', 'estado'], name='empleado_suc_cargo_est_idx'),
+        ]
+
     def __str__(self):
         # Muestra "username (Cargo) - Estado"
         return f"{self.user.username} ({self.get_cargo_display()}) - {self.get_estado_display()}"
 
 # --- 4. Modelo Camion (¡MODIFICADO!) ---
-class Camion(models.Model):
+class Camion(ValoresLeidosMixin, models.Model):
 
     CAPACIDAD_CHOICES = [
         ('MC', 'Mediana Capacidad'),
@@ -108,10 +151,43 @@ class Camion(models.Model):
         limit_choices_to={'cargo': 'CON'}
     )
 
+    # Clave de contador (api/signals.py)
+    campos_contador = campos_leidos = ('sucursal_base_id', 'estado')
+
+    class Meta:
+        indexes = [
+            # Listado/dashboard de flota por sucursal (y por estado)
+            models.Index(fields=['sucursal_base', 'estado'], name='camion_suc_estado_idx'),
+        ]
+
     def __str__(self):
         return f"Matrícula: {self.matricula} ({self.get_estado_display()})"
     
-class Pedido(models.Model):
+# Estados "vivos" de un pedido (aún no cerrados). El orden importa: SQLite
+# solo usa los índices parciales si el IN (...) de la consulta es idéntico.
+PEDIDO_ESTADOS_ACTIVOS = ('SOLICITADO', 'COTIZADO', 'CONFIRMADO', 'EN_RUTA')
+# Estados en los que el pedido mantiene ocupado a su camión
+PEDIDO_ESTADOS_CON_CAMION = ('CONFIRMADO', 'EN_RUTA')
+
+def _estado_in_sql(estados):
+    return '"api_pedido"."estado" IN (%s)' % ', '.join(f"'{e}'" for e in estados)
+
+class PedidoQuerySet(models.QuerySet):
+    """
+    Filtros por grupo de estados que aprovechan los índices parciales.
+
+    SQLite solo elige un índice parcial si su condición aparece LITERAL en
+    la consulta; con estado__in=... Django envía parámetros (?) y el
+    planificador lo descarta. Por eso aquí la condición va como SQL fijo
+    (construido desde constantes, nunca desde datos del usuario).
+    """
+    def activos(self):
+        return self.filter(RawSQL(_estado_in_sql(PEDIDO_ESTADOS_ACTIVOS), (), output_field=models.BooleanField()))
+
+    def con_camion(self):
+        return self.filter(RawSQL(_estado_in_sql(PEDIDO_ESTADOS_CON_CAMION), (), output_field=models.BooleanField()))
+
+class Pedido(ValoresLeidosMixin, models.Model):
     ESTADO_CHOICES = [
         ('SOLICITADO', 'Solicitado'), 
         ('COTIZADO', 'Cotizado'),     
@@ -121,6 +197,9 @@ class Pedido(models.Model):
         ('CANCELADO', 'Cancelado'),
     ]
 
+    ESTADOS_ACTIVOS = PEDIDO_ESTADOS_ACTIVOS
+    ESTADOS_CON_CAMION = PEDIDO_ESTADOS_CON_CAMION
+
     # Quién lo pidió
     cliente = models.ForeignKey(Cliente, on_delete=models.PROTECT, related_name="pedidos")
     
@@ -131,6 +210,8 @@ class Pedido(models.Model):
         related_name="pedidos_originados",default=None
     )
     destino = models.CharField(max_length=255)
+    # Código de la ciudad del destino (api/geo.py), o None si no se reconoce
+    ciudad_destino = models.CharField(max_length=40, null=True, blank=True, editable=False)
     tipo_carga = models.CharField(max_length=100, help_text="Ej: Alimentos, Retail, Agrícola")
     
     # --- ¡NUEVOS CAMPOS AÑADIDOS! ---
@@ -164,6 +245,238 @@ class Pedido(models.Model):
         blank=True,
         related_name="pedidos_asignados"
     )
+
+    # Clave de contador (api/signals.py), y el viaje que reserva el pedido (api/reservas.py)
+    campos_contador = ('sucursal_origen_id', 'estado')
+    campos_leidos = campos_contador + ('camion_asignado_id', 'fecha_deseada')
+
+    objects = PedidoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Dashboard: conteo por estado de cada sucursal
+            models.Index(fields=['sucursal_origen', 'estado'], name='pedido_suc_estado_idx'),
+            # Listado admin por sucursal (paginación por cursor)
+            models.Index(fields=['sucursal_origen', '-fecha_solicitud', '-id'], name='pedido_suc_fecha_idx'),
+            # "Mis pedidos" del cliente (paginación por cursor)
+            models.Index(fields=['cliente', '-fecha_solicitud', '-id'], name='pedido_cliente_fecha_idx'),
+            # Parciales: solo cubren pedidos no cerrados, que son una
+            # fracción pequeña y estable del historial
+            models.Index(
+                fields=['sucursal_origen', '-fecha_solicitud', '-id'],
+                condition=models.Q(estado__in=PEDIDO_ESTADOS_ACTIVOS),
+                name='pedido_activo_fecha_idx',
+            ),
+            models.Index(
+                fields=['camion_asignado'],
+                condition=models.Q(estado__in=PEDIDO_ESTADOS_CON_CAMION),
+                name='pedido_camion_ocupado_idx',
+            ),
+            # Pedidos de una sucursal hacia una ciudad (cotización, consolidación)
+            models.Index(fields=['sucursal_origen', 'ciudad_destino'], name='pedido_suc_ciudad_idx'),
+        ]
    
     def __str__(self):
-        return f"Pedido {self.id} de {self.cliente.user.username} ({self.sucursal_origen.nombre} -> {self.destino})"
\ No newline at end of file
+        return f"Pedido {self.id} de {self.cliente.user.username} ({self.sucursal_origen.nombre} -> {self.destino})"
+
+# --- 6. Contadores del Dashboard ---
+class ContadorSucursal(models.Model):
+    """
+    Conteo pre-calculado de pedidos, camiones y conductores por sucursal y
+    estado. Lo mantienen las señales de api/signals.py en la misma
+    transacción que el cambio, así el dashboard no recorre el historial.
+    """
+    ENTIDAD_CHOICES = [
+        ('PED', 'Pedido'),
+        ('CAM', 'Camión'),
+        ('CON', 'Conductor'),
+    ]
+
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name="contadores")
+    entidad = models.CharField(max_length=3, choices=ENTIDAD_CHOICES)
+    estado = models.CharField(max_length=20)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Contadores de sucursal"
+        constraints = [
+            models.UniqueConstraint(fields=['sucursal', 'entidad', 'estado'], name='contador_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.sucursal_id}/{self.entidad}/{self.estado}: {self.total}"
+
+# --- 7. Historial de estados de Pedidos ---
+class TransicionPedido(models.Model):
+    """
+    Un cambio de estado de un pedido (desde=None: el pedido se creó).
+    Solo se agregan filas, en la misma transacción que el cambio (ver
+    api/transiciones.py): así los tiempos de cada etapa salen de esta
+    tabla y no del estado actual de los pedidos.
+    """
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name="transiciones", db_index=False)
+    desde = models.CharField(max_length=20, null=True)
+    hacia = models.CharField(max_length=20)
+    fecha = models.DateTimeField()
+    # Sin FK real: el historial sobrevive a que se elimine el usuario
+    actor = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name="+")
+
+    class Meta:
+        verbose_name_plural = "Transiciones de pedidos"
+        indexes = [
+            # Tiempos por etapa en un rango de fechas
+            models.Index(fields=['fecha'], name='transicion_fecha_idx'),
+            # Historial de un pedido (reemplaza el índice de la FK)
+            models.Index(fields=['pedido', 'fecha'], name='transicion_pedido_fecha_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("El historial de transiciones no se modifica: agregue una nueva.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Pedido {self.pedido_id}: {self.desde or '-'} -> {self.hacia} ({self.fecha:%Y-%m-%d %H:%M})"
+
+# --- 8. Resúmenes diarios (analítica) ---
+class ResumenDiario(models.Model):
+    """
+    Totales de pedidos de una sucursal en un día: creados (por
+    fecha_solicitud) y cerrados (por la fecha de su transición a COMPLETADO
+    o CANCELADO). Ingresos, costos y peso son los de los completados. Los
+    recalcula `manage.py actualizar_resumenes` (api/resumenes.py), solo
+    para los días que cambiaron, y la analítica lee de aquí.
+    """
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name="resumenes")
+    dia = models.DateField()
+    pedidos_creados = models.IntegerField(default=0)
+    pedidos_completados = models.IntegerField(default=0)
+    pedidos_cancelados = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    costos = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    peso_kg = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Resúmenes diarios"
+        constraints = [
+            models.UniqueConstraint(fields=['sucursal', 'dia'], name='resumen_sucursal_dia_unico'),
+        ]
+        indexes = [
+            # Series de todas las sucursales en un rango de días
+            models.Index(fields=['dia'], name='resumen_dia_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sucursal_id}/{self.dia}: {self.pedidos_creados} creados, {self.pedidos_completados} completados"
+
+class MarcaResumen(models.Model):
+    """
+    Hasta qué transición del historial (TransicionPedido.id) están al día
+    los resúmenes diarios. Una sola fila.
+    """
+    ultima_transicion = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Resúmenes al día hasta la transición {self.ultima_transicion}"
+
+# --- 9. Reservas de camiones y conductores (calendario) ---
+class ReservaQuerySet(models.QuerySet):
+
+    def choque(self, inicio, fin, camion_id=None, empleado_id=None, excluir=None):
+        """
+        La reserva del recurso que se cruza con [inicio, fin), o None. Las
+        reservas de un recurso no se cruzan entre sí, así basta mirar la
+        última que empieza antes de 'fin' (una búsqueda en el índice
+        recurso + inicio, sin recorrer su historia).
+        """
+        reservas = self.filter(camion_id=camion_id) if camion_id is not None else self.filter(empleado_id=empleado_id)
+        if excluir is not None:
+            reservas = reservas.exclude(pk=excluir)
+        anterior = reservas.filter(inicio__lt=fin).order_by('-inicio').first()
+        return anterior if anterior is not None and anterior.fin > inicio else None
+
+class Reserva(models.Model):
+    """
+    Un camión o un conductor ocupado en los días [inicio, fin): un viaje
+    (lo crea la asignación de camiones), una mantención, una licencia...
+    Las reservas de un mismo recurso no se cruzan. api/reservas.py guarda
+    en memoria los límites ordenados de cada recurso para responder
+    disponibilidad sin consultas.
+    """
+    TIPO_CHOICES = [
+        ('VIA', 'Viaje'),
+        ('MAN', 'Mantención'),
+        ('REP', 'Reparación'),
+        ('LIC', 'Licencia'),
+        ('VAC', 'Vacaciones'),
+        ('PER', 'Permiso'),
+    ]
+
+    camion = models.ForeignKey(Camion, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name="reservas", db_index=False)
+    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name="reservas", db_index=False)
+    tipo = models.CharField(max_length=3, choices=TIPO_CHOICES)
+    inicio = models.DateField()
+    fin = models.DateField(help_text="Primer día libre (no incluido en la reserva)")
+    nota = models.CharField(max_length=255, blank=True)
+
+    objects = ReservaQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Exactamente un recurso
+            models.CheckConstraint(
+                condition=models.Q(camion__isnull=False, empleado__isnull=True)
+                | models.Q(camion__isnull=True, empleado__isnull=False),
+                name='reserva_un_recurso',
+            ),
+            models.CheckConstraint(condition=models.Q(fin__gt=models.F('inicio')), name='reserva_rango_valido'),
+        ]
+        indexes = [
+            # Choques y calendario de cada recurso (reemplazan los índices de las FK)
+            models.Index(fields=['camion', 'inicio'], name='reserva_camion_inicio_idx'),
+            models.Index(fields=['empleado', 'inicio'], name='reserva_empleado_inicio_idx'),
+            # Reservas vigentes (las que se cargan en memoria)
+            models.Index(fields=['fin'], name='reserva_fin_idx'),
+        ]
+
+    def clean(self):
+        if (self.camion_id is None) == (self.empleado_id is None):
+            raise ValidationError("La reserva es de un camión o de un empleado (uno de los dos).")
+        if self.inicio and self.fin and self.fin <= self.inicio:
+            raise ValidationError({'fin': "Debe ser posterior al inicio."})
+        if self.inicio and self.fin:
+            otra = Reserva.objects.choque(self.inicio, self.fin, self.camion_id, self.empleado_id, excluir=self.pk)
+            if otra is not None:
+                raise ValidationError(f"Se cruza con otra reserva: {otra}.")
+
+    def __str__(self):
+        recurso = f"Camión {self.camion_id}" if self.camion_id else f"Empleado {self.empleado_id}"
+        return f"{recurso}: {self.get_tipo_display()} {self.inicio} -> {self.fin}"
+
+class MarcaReserva(models.Model):
+    """
+    Versión de las reservas: sube en la misma transacción que cada cambio.
+    Una sola fila; leerla es la única consulta para saber si el calendario
+    en memoria (api/reservas.py) sigue vigente.
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Reservas, versión {self.version}"
+
+# --- 10. Eventos en vivo entre procesos ---
+class EventoPublicado(models.Model):
+    """
+    Un evento de api/eventos.py publicado por cualquier proceso, para
+    BaseDatosBackend: cada proceso que sirve streams lee las filas nuevas
+    (por id) y las reparte a sus conexiones. Solo se guardan las últimas
+    ACME_EVENTOS_HISTORIAL.
+    """
+    canales = models.CharField(max_length=255, help_text="Canales separados por espacios")
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"Evento {self.pk} ({self.canales})"
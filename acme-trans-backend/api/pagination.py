@@ -0,0 +1,115 @@
+# api/pagination.py
+
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PedidoKeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre (fecha_solicitud, id), de más
+    reciente a más antiguo.
+
+    En vez de OFFSET usamos el último (fecha_solicitud, id) visto como
+    cursor opaco, así cada página es una búsqueda por índice y el costo no
+    crece con el número de página. Los pedidos nuevos quedan "arriba" del
+    cursor, por lo que no desplazan ni duplican filas en las páginas
+    siguientes (scroll infinito estable).
+
+    Respuesta: {"next": <url o null>, "results": [...]}
+    Parámetros: ?cursor=<opaco>&page_size=<n>
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-fecha_solicitud', '-id')
+
+    @property
+    def page_size(self):
+        return getattr(settings, 'PEDIDOS_PAGE_SIZE', 50)
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'PEDIDOS_MAX_PAGE_SIZE', 500)
+
+    def get_page_size(self, request):
+        valor = request.query_params.get(self.page_size_query_param)
+        if valor:
+            try:
+                tamano = int(valor)
+            except ValueError:
+                tamano = 0
+            if tamano > 0:
+                return min(tamano, self.max_page_size)
+        return self.page_size
+
+    # --- Codificación del cursor ---
+
+    def encode_cursor(self, pedido):
+        # Instancia o fila de .values() (listado rápido del admin)
+        if isinstance(pedido, dict):
+            fecha, pk = pedido['fecha_solicitud'], pedido['id']
+        else:
+            fecha, pk = pedido.fecha_solicitud, pedido.pk
+        crudo = f"{fecha.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(crudo.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        valor = request.query_params.get(self.cursor_query_param)
+        if not valor:
+            return None
+        try:
+            crudo = base64.urlsafe_b64decode(valor.encode('ascii')).decode('ascii')
+            fecha, pk = crudo.rsplit('|', 1)
+            return datetime.fromisoformat(fecha), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound("Cursor inválido.")
+
+    # --- API de DRF ---
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        tamano = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request)
+        if cursor:
+            fecha, pk = cursor
+            queryset = queryset.filter(
+                Q(fecha_solicitud__lt=fecha) | Q(fecha_solicitud=fecha, id__lt=pk)
+            )
+
+        # Pedimos una fila extra para saber si hay página siguiente sin COUNT(*)
+        pagina = list(queryset[:tamano + 1])
+        self.has_next = len(pagina) > tamano
+        pagina = pagina[:tamano]
+
+        self.next_cursor = self.encode_cursor(pagina[-1]) if self.has_next else None
+        return pagina
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
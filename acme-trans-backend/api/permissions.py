@@ -5,8 +5,8 @@ class IsSuperUser(BasePermission):
     Permiso personalizado para permitir solo a superusuarios.
     """
     def has_permission(self, request, view):
-        # request.user es el usuario decodificado del token JWT
-        return request.user and request.user.is_superuser
+        # request.user es el usuario decodificado del token JWT (claim 'is_superuser')
+        return bool(request.user and request.user.is_superuser)
 
 class IsCliente(BasePermission):
     """
@@ -15,5 +15,5 @@ class IsCliente(BasePermission):
     """
     def has_permission(self, request, view):
         # 1. ¿Está logueado?
-        # 2. ¿Tiene el atributo 'cliente_profile'? (Lo creamos en models.py)
-        return request.user and request.user.is_authenticated and hasattr(request.user, 'cliente_profile')
\ No newline at end of file
+        # 2. ¿El token trae el claim 'cliente_id'? (ver api/authentication.py)
+        return bool(request.user and request.user.is_authenticated and getattr(request.user, 'cliente_id', None))
\ No newline at end of file
@@ -0,0 +1,121 @@
+# api/replica.py
+
+import contextvars
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Alias de DATABASES de la réplica de solo lectura (ver ACME_DB_REPLICA en
+# settings.py). Sin ese alias todo sigue yendo a 'default'.
+ALIAS = 'replica'
+
+# Si la request en curso lee de la réplica (lo consulta ReplicaRouter).
+# Es una ContextVar: vale para el hilo o la tarea async de la request, y
+# sync_to_async la copia a los hilos del pool.
+_leer_replica = contextvars.ContextVar('acme_leer_replica', default=False)
+
+
+def configurada():
+    return ALIAS in connections.settings
+
+
+# --- Lectura después de escribir ---
+
+def _cache():
+    return caches[getattr(settings, 'ACME_CACHE_ALIAS', 'default')]
+
+def _clave_primaria(user):
+    return f'acme:primaria:{user.id}'
+
+def fijar_primaria(user):
+    """
+    Después de una escritura del usuario, sus lecturas van a la primaria
+    durante ACME_DB_REPLICA_VENTANA segundos: la réplica puede no tener
+    todavía lo que acaba de guardar.
+    """
+    if configurada() and getattr(user, 'id', None) is not None:
+        _cache().set(_clave_primaria(user), True, timeout=getattr(settings, 'ACME_DB_REPLICA_VENTANA', 10))
+
+def alias_lectura(user=None):
+    """ Alias para las lecturas de 'user': la réplica salvo que haya escrito hace poco """
+    if not configurada():
+        return DEFAULT_DB_ALIAS
+    if getattr(user, 'id', None) is not None and _cache().get(_clave_primaria(user)):
+        return DEFAULT_DB_ALIAS
+    return ALIAS
+
+
+# --- Lecturas de la request ---
+
+@contextmanager
+def lectura(alias=ALIAS):
+    """ Las lecturas de este bloque van a 'alias' (ver alias_lectura()) """
+    token = _leer_replica.set(alias == ALIAS and configurada())
+    try:
+        yield
+    finally:
+        _leer_replica.reset(token)
+
+def en_uso():
+    return _leer_replica.get()
+
+def al_dia(ultima_modificacion):
+    """
+    ¿La réplica ya incluye los cambios hasta 'ultima_modificacion' (segundos,
+    la de api/cache.py)? La fecha del archivo es la del inicio de la última
+    copia (sincronizar_replica). Si no, lo leído de la réplica no debe
+    quedar en la cache de respuestas bajo las versiones nuevas.
+    """
+    if not en_uso():
+        return True
+    try:
+        sincronizada = os.stat(connections.settings[ALIAS]['NAME']).st_mtime_ns
+    except OSError:
+        return False
+    return sincronizada // 1_000_000_000 > ultima_modificacion
+
+
+class LecturaReplicaMixin:
+    """
+    Mixin para vistas DRF de lectura (listados, dropdowns, dashboard): los
+    GET, ya autenticados, consultan alias_lectura(request.user). Lo que se
+    evalúe después de que la vista retorna (ej: un StreamingHttpResponse)
+    queda fuera: ahí hay que usar .using(alias_lectura(user)).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self._token_replica = _leer_replica.set(alias_lectura(request.user) == ALIAS)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_token_replica', None)
+        if token is not None:
+            self._token_replica = None
+            _leer_replica.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaRouter:
+    """
+    Router de DATABASE_ROUTERS: las lecturas marcadas con lectura() van a
+    la réplica; todo lo demás (y toda escritura) a 'default'. La réplica
+    es una copia: no se migra.
+    """
+
+    def db_for_read(self, model, **hints):
+        return ALIAS if en_uso() else None
+
+    def db_for_write(self, model, **hints):
+        # Aunque la instancia se haya leído de la réplica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Son la misma base: un objeto leído de la réplica puede asignarse a otro de la primaria
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ALIAS} or None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == ALIAS else None
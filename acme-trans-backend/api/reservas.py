@@ -0,0 +1,201 @@
+# api/reservas.py
+
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache
+from .models import Camion, Pedido, Reserva, MarcaReserva
+
+# Recursos: ('camion', id) o ('empleado', id)
+CAMION, EMPLEADO = 'camion', 'empleado'
+
+
+# --- Versión (tabla api_marcareserva) ---
+
+def version():
+    return MarcaReserva.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+def tocar():
+    """
+    Marca que las reservas cambiaron, en la misma transacción que el
+    cambio: los calendarios en memoria de todos los procesos se rearman en
+    su próxima consulta. La versión es una marca de tiempo (como las de
+    api/cache.py), así no se repite aunque una transacción se revierta.
+    """
+    ahora = time.time_ns()
+    if not MarcaReserva.objects.filter(pk=1).update(version=ahora):
+        MarcaReserva.objects.create(pk=1, version=ahora)
+    cache.invalidar('reserva')
+
+
+# --- Calendario en memoria ---
+
+class Calendario:
+    """
+    Límites de las reservas vigentes (fin > desde) de cada recurso: dos
+    listas de ordinales de fecha, inicios y fines. Como las reservas de un
+    recurso no se cruzan, las dos quedan ordenadas y saber si [inicio, fin)
+    choca con alguna es una búsqueda binaria: O(log n), sin consultas.
+    """
+    __slots__ = ('desde', '_limites')
+
+    def __init__(self, desde, filas):
+        """ filas: (camion_id, empleado_id, inicio, fin), ordenadas por inicio """
+        self.desde = desde
+        self._limites = {}
+        for camion_id, empleado_id, inicio, fin in filas:
+            recurso = (CAMION, camion_id) if camion_id is not None else (EMPLEADO, empleado_id)
+            inicios, fines = self._limites.setdefault(recurso, ([], []))
+            inicios.append(inicio.toordinal())
+            fines.append(fin.toordinal())
+
+    def ocupado(self, recurso, inicio, fin):
+        limites = self._limites.get(recurso)
+        if limites is None:
+            return False
+        inicios, fines = limites
+        # La primera reserva que termina después de 'inicio': choca si empieza antes de 'fin'
+        i = bisect_right(fines, inicio.toordinal())
+        return i < len(inicios) and inicios[i] < fin.toordinal()
+
+
+_calendario = {'clave': None, 'calendario': None}
+
+def calendario():
+    """
+    El calendario de las reservas que terminan después de hoy. Cuesta una
+    consulta por llamada (la versión); se rearma si cambió o cambió el día.
+    """
+    hoy = timezone.localdate()
+    clave = (version(), hoy)
+    if _calendario['clave'] != clave:
+        filas = Reserva.objects.filter(fin__gt=hoy).order_by('inicio').values_list(
+            'camion_id', 'empleado_id', 'inicio', 'fin')
+        _calendario['calendario'] = Calendario(hoy, filas)
+        _calendario['clave'] = clave
+    return _calendario['calendario']
+
+
+# --- Disponibilidad ---
+
+def ocupado(recurso, inicio, fin, vigente=None):
+    """
+    ¿Tiene el recurso alguna reserva en [inicio, fin)? Rangos desde hoy:
+    el calendario en memoria ('vigente', o el actual). Rangos que empiezan
+    antes: una búsqueda en el índice de la tabla (Reserva.objects.choque).
+    """
+    vigente = vigente or calendario()
+    if inicio >= vigente.desde:
+        return vigente.ocupado(recurso, inicio, fin)
+    tipo, recurso_id = recurso
+    return Reserva.objects.choque(inicio, fin, **{f'{tipo}_id': recurso_id}) is not None
+
+def viaje(dia):
+    """ Días [inicio, fin) que ocupa un viaje que sale el día 'dia' """
+    return dia, dia + timedelta(days=settings.ACME_RESERVAS['dias_por_viaje'])
+
+def camion_libre(camion_id, conductor_id, inicio, fin, vigente=None):
+    """ El camión y su conductor (si tiene) sin reservas en [inicio, fin) """
+    if ocupado((CAMION, camion_id), inicio, fin, vigente):
+        return False
+    return conductor_id is None or not ocupado((EMPLEADO, conductor_id), inicio, fin, vigente)
+
+def reservar_viajes(viajes):
+    """
+    Reserva camión y conductor para cada viaje [(camion_id, conductor_id,
+    dia)] (bulk_create: sin señales, la versión se sube aquí). Quien llama
+    ya comprobó que estaban libres, en la misma transacción.
+    """
+    reservas = []
+    for camion_id, conductor_id, dia in viajes:
+        inicio, fin = viaje(dia)
+        reservas.append(Reserva(camion_id=camion_id, tipo='VIA', inicio=inicio, fin=fin))
+        if conductor_id is not None:
+            reservas.append(Reserva(empleado_id=conductor_id, tipo='VIA', inicio=inicio, fin=fin))
+    if reservas:
+        Reserva.objects.bulk_create(reservas, batch_size=500)
+        tocar()
+
+
+# --- Viajes de los pedidos ---
+# Un viaje es (camion_id, dia): una reserva 'VIA' del camión y otra de su
+# conductor, compartidas por todos los pedidos que el camión lleva ese día.
+
+def viaje_de(camion_id, dia, estado):
+    """ El viaje que ocupa un pedido, o None si no tiene camión o está cancelado """
+    return (camion_id, dia) if camion_id is not None and estado != 'CANCELADO' else None
+
+def _reservados(viajes):
+    """ De los viajes [(camion_id, dia)], los que el camión ya tiene reservados """
+    return set(Reserva.objects.filter(tipo='VIA', camion_id__in={camion_id for camion_id, _ in viajes},
+                                      inicio__in={dia for _, dia in viajes}).values_list('camion_id', 'inicio')
+               ) & set(viajes)
+
+def viajes_ocupados(viajes):
+    """
+    De los viajes [(camion_id, dia)] que se quieren asignar, los que chocan
+    con otra reserva del camión o de su conductor, o entre sí. Un viaje ya
+    reservado no choca: el pedido se suma a esa carga. Dos consultas y el
+    calendario en memoria, sin importar cuántos sean.
+    """
+    viajes = sorted(set(viajes))
+    if not viajes:
+        return set()
+    conductores = dict(Camion.objects.filter(pk__in={camion_id for camion_id, _ in viajes})
+                       .values_list('id', 'conductor_asignado_id'))
+    reservados = _reservados(viajes)
+    vigente = calendario()
+    tomados = defaultdict(list)  # Lo que ya ocupan los viajes aceptados del lote
+    ocupados = set()
+    for camion_id, dia in viajes:
+        if (camion_id, dia) in reservados:
+            continue
+        inicio, fin = viaje(dia)
+        recursos = [(CAMION, camion_id)]
+        if conductores.get(camion_id) is not None:
+            recursos.append((EMPLEADO, conductores[camion_id]))
+        if any(ocupado(recurso, inicio, fin, vigente) or any(a < fin and inicio < b for a, b in tomados[recurso])
+               for recurso in recursos):
+            ocupados.add((camion_id, dia))
+        else:
+            for recurso in recursos:
+                tomados[recurso].append((inicio, fin))
+    return ocupados
+
+def mover_viajes(quitados, agregados):
+    """
+    Ajusta las reservas 'VIA' a los pedidos ya guardados: 'quitados' y
+    'agregados' son viajes que algún pedido dejó o tomó (otro camión, otro
+    día, cancelado). Se borra el viaje que ya no lleva ningún pedido y se
+    reserva el que aún no lo estaba; quien llama ya comprobó con
+    viajes_ocupados() que está libre. asignacion.guardar() reserva por su
+    cuenta (bulk_update no emite señales).
+    """
+    quitados, agregados = set(quitados) - set(agregados), set(agregados) - set(quitados)
+    if quitados:
+        quitados -= set(Pedido.objects.filter(camion_asignado_id__in={camion_id for camion_id, _ in quitados},
+                                              fecha_deseada__in={dia for _, dia in quitados})
+                        .exclude(estado='CANCELADO').values_list('camion_asignado_id', 'fecha_deseada'))
+    if agregados:
+        agregados -= _reservados(agregados)
+    if not quitados and not agregados:
+        return
+    conductores = dict(Camion.objects.filter(pk__in={camion_id for camion_id, _ in quitados | agregados})
+                       .values_list('id', 'conductor_asignado_id'))
+
+    if quitados:
+        filtro = Q()
+        for camion_id, dia in quitados:
+            recurso = Q(camion_id=camion_id)
+            if conductores.get(camion_id) is not None:
+                recurso |= Q(empleado_id=conductores[camion_id])
+            filtro |= Q(tipo='VIA', inicio=dia) & recurso
+        # delete() emite post_delete: la versión del calendario sube sola
+        Reserva.objects.filter(filtro).delete()
+    reservar_viajes((camion_id, conductores.get(camion_id), dia) for camion_id, dia in agregados)
@@ -0,0 +1,201 @@
+# api/resumenes.py
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import cache
+from .db import transaccion_escritura
+from .models import Sucursal, Pedido, TransicionPedido, ResumenDiario, MarcaResumen
+
+# Estados que cierran un pedido: cuentan el día de la transición
+CIERRES = ('COMPLETADO', 'CANCELADO')
+# Días afectados a menos de esta distancia se recalculan en un solo tramo
+# (menos consultas, sin recorrer meses por un pedido viejo)
+HUECO_TRAMO = 7
+CAMPOS = ('pedidos_creados', 'pedidos_completados', 'pedidos_cancelados', 'ingresos', 'costos', 'peso_kg')
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+def _tramos(dias, hueco=HUECO_TRAMO):
+    """ Agrupa días sueltos en rangos (inicio, fin), ambos incluidos """
+    tramos = []
+    for dia in sorted(dias):
+        if tramos and (dia - tramos[-1][1]).days <= hueco:
+            tramos[-1][1] = dia
+        else:
+            tramos.append([dia, dia])
+    return [tuple(tramo) for tramo in tramos]
+
+
+# --- Cálculo ---
+
+def _recalcular(inicio, fin, sucursales):
+    """
+    Recalcula desde cero los resúmenes de 'sucursales' (ids) entre 'inicio'
+    y 'fin' (días, incluidos): los creados con un GROUP BY por sucursal
+    (índice sucursal + fecha) y los cierres con uno solo para todas, que
+    recorre el historial por fecha. Reemplaza las filas del rango.
+    """
+    desde, hasta = _inicio_del_dia(inicio), _inicio_del_dia(fin + timedelta(days=1))
+    filas = defaultdict(dict)
+
+    for sucursal_id in sucursales:
+        creados = (Pedido.objects
+                   .filter(sucursal_origen_id=sucursal_id, fecha_solicitud__gte=desde, fecha_solicitud__lt=hasta)
+                   .annotate(dia=TruncDate('fecha_solicitud'))
+                   .values('dia').annotate(n=Count('id')).order_by())
+        for fila in creados:
+            filas[sucursal_id, fila['dia']]['pedidos_creados'] = fila['n']
+
+    # El cierre vigente de cada pedido es su última transición (si después
+    # se reabrió, ese cierre ya no cuenta)
+    posterior = TransicionPedido.objects.filter(pedido_id=OuterRef('pedido_id'), id__gt=OuterRef('id'))
+    cierres = (TransicionPedido.objects
+               .filter(fecha__gte=desde, fecha__lt=hasta, hacia__in=CIERRES)
+               .filter(~Exists(posterior))
+               .annotate(dia=TruncDate('fecha'))
+               .values('pedido__sucursal_origen_id', 'dia', 'hacia')
+               .annotate(n=Count('id'), ingresos=Sum('pedido__precio_cotizado'),
+                         costos=Sum('pedido__costo_estimado'), peso_kg=Sum('pedido__peso_kg'))
+               .order_by())
+    for fila in cierres:
+        clave = (fila['pedido__sucursal_origen_id'], fila['dia'])
+        if clave[0] not in sucursales:
+            continue
+        if fila['hacia'] == 'COMPLETADO':
+            filas[clave].update(
+                pedidos_completados=fila['n'], ingresos=fila['ingresos'] or 0,
+                costos=fila['costos'] or 0, peso_kg=fila['peso_kg'] or 0,
+            )
+        else:
+            filas[clave]['pedidos_cancelados'] = fila['n']
+
+    ResumenDiario.objects.filter(sucursal_id__in=sucursales, dia__gte=inicio, dia__lte=fin).delete()
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(sucursal_id=sucursal_id, dia=dia, **valores) for (sucursal_id, dia), valores in filas.items()],
+        batch_size=500,
+    )
+
+def _dias_afectados(desde_id, hasta_id):
+    """
+    {(sucursal_id, dia)} cuyos resúmenes cambian con las transiciones
+    (desde_id, hasta_id]: el día de creación de cada pedido tocado y los
+    de todos sus cierres (el nuevo y los que dejó de tener).
+    """
+    pedidos = TransicionPedido.objects.filter(id__gt=desde_id, id__lte=hasta_id).values('pedido_id')
+    creacion = (Pedido.objects.filter(id__in=pedidos)
+                .annotate(dia=TruncDate('fecha_solicitud'))
+                .values_list('sucursal_origen_id', 'dia').order_by().distinct())
+    cierres = (TransicionPedido.objects.filter(pedido_id__in=pedidos, hacia__in=CIERRES)
+               .annotate(dia=TruncDate('fecha'))
+               .values_list('pedido__sucursal_origen_id', 'dia').order_by().distinct())
+    return set(chain(creacion, cierres))
+
+
+# --- Actualización ---
+
+def _marca():
+    marca, _ = MarcaResumen.objects.get_or_create(pk=1)
+    return marca
+
+def _avanzar(marca, hasta_id):
+    marca.ultima_transicion = hasta_id
+    marca.save(update_fields=['ultima_transicion', 'actualizado'])
+    cache.invalidar('resumen')
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Recalcula todos los resúmenes entre 'desde' y 'hasta' (días; por
+    defecto, desde el primer pedido hasta hoy). Para corregir lo que no
+    pasa por el historial: pedidos eliminados, precios editados después
+    del cierre, etc. Sin rango deja la marca al día. Devuelve cuántos
+    días recalculó.
+    """
+    with transaccion_escritura():
+        hasta_id = TransicionPedido.objects.aggregate(m=Max('id'))['m'] or 0
+        completo = desde is None and hasta is None
+        if desde is None:
+            primero = Pedido.objects.aggregate(m=Min('fecha_solicitud'))['m']
+            desde = timezone.localdate(primero) if primero else timezone.localdate()
+        hasta = hasta or timezone.localdate()
+
+        _recalcular(desde, hasta, set(Sucursal.objects.values_list('id', flat=True)))
+        if completo:
+            _avanzar(_marca(), hasta_id)
+        else:
+            cache.invalidar('resumen')
+        return (hasta - desde).days + 1
+
+def actualizar():
+    """
+    Pone al día los resúmenes con las transiciones que llegaron desde la
+    última corrida: solo recalcula los días que tocan los pedidos que
+    cambiaron, en tramos de días cercanos. La primera vez reconstruye
+    todo. Devuelve los tramos recalculados.
+
+    La marca es el id de la última transición procesada: en SQLite las
+    escrituras son de a una, así los ids se confirman en orden.
+    """
+    with transaccion_escritura():
+        marca = _marca()
+        if marca.ultima_transicion == 0:
+            reconstruir()
+            return 1  # Un solo tramo: todos los días
+        hasta_id = TransicionPedido.objects.aggregate(m=Max('id'))['m'] or 0
+        if hasta_id <= marca.ultima_transicion:
+            return 0
+
+        afectados = _dias_afectados(marca.ultima_transicion, hasta_id)
+        tramos = _tramos({dia for _, dia in afectados})
+        for inicio, fin in tramos:
+            sucursales = {sucursal_id for sucursal_id, dia in afectados if inicio <= dia <= fin}
+            _recalcular(inicio, fin, sucursales)
+        _avanzar(marca, hasta_id)
+        return len(tramos)
+
+
+# --- Lectura ---
+
+GRANULARIDADES = {'dia': None, 'semana': TruncWeek, 'mes': TruncMonth}
+
+def serie(desde, hasta, granularidad='dia', sucursal_id=None):
+    """
+    Serie de tiempo por sucursal entre 'desde' y 'hasta' (días, incluidos),
+    sumando los resúmenes diarios por día, semana (lunes) o mes. Devuelve
+    [{'sucursal_id', 'periodo', 'pedidos_creados', 'pedidos_completados',
+    'pedidos_cancelados', 'ingresos', 'costos', 'margen', 'margen_pct',
+    'toneladas'}], ordenada por sucursal y periodo.
+    """
+    truncar = GRANULARIDADES[granularidad]
+    queryset = ResumenDiario.objects.filter(dia__gte=desde, dia__lte=hasta)
+    if sucursal_id is not None:
+        queryset = queryset.filter(sucursal_id=sucursal_id)
+    filas = (queryset
+             .annotate(periodo=truncar('dia') if truncar else F('dia'))
+             .values('sucursal_id', 'periodo')
+             .annotate(**{campo: Sum(campo) for campo in CAMPOS})
+             .order_by('sucursal_id', 'periodo'))
+
+    resultado = []
+    for fila in filas:
+        margen = fila['ingresos'] - fila['costos']
+        resultado.append({
+            'sucursal_id': fila['sucursal_id'],
+            'periodo': fila['periodo'],
+            'pedidos_creados': fila['pedidos_creados'],
+            'pedidos_completados': fila['pedidos_completados'],
+            'pedidos_cancelados': fila['pedidos_cancelados'],
+            'ingresos': f"{fila['ingresos']:.2f}",
+            'costos': f"{fila['costos']:.2f}",
+            'margen': f"{margen:.2f}",
+            'margen_pct': round(float(margen / fila['ingresos']) * 100, 1) if fila['ingresos'] else None,
+            'toneladas': round(float(fila['peso_kg']) / 1000, 2),
+        })
+    return resultado
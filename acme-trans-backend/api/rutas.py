@@ -0,0 +1,187 @@
+# api/rutas.py
+
+import hashlib
+import json
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import geo
+from .models import Pedido
+
+# Mejoras menores a esto (km) no cuentan: evita ciclos por redondeo
+EPSILON = 1e-6
+
+
+def _largo(ruta, d):
+    """ Km de la ruta cerrada (vuelve al depósito, ruta[0]) """
+    return sum(d[a][b] for a, b in zip(ruta, ruta[1:] + ruta[:1]))
+
+
+# --- Secuencia ---
+
+def _vecino_mas_cercano(d):
+    """ Construcción: desde el depósito (0), siempre a la parada pendiente más cercana """
+    ruta, pendientes = [0], set(range(1, len(d)))
+    while pendientes:
+        actual = ruta[-1]
+        siguiente = min(pendientes, key=lambda j: (d[actual][j], j))
+        ruta.append(siguiente)
+        pendientes.remove(siguiente)
+    return ruta
+
+def _dos_opt(ruta, d, fin):
+    """
+    Primera mejora 2-opt: invierte un tramo ruta[i..j] si cambiar los arcos
+    (i-1, i) y (j, j+1) por (i-1, j) y (i, j+1) acorta la ruta. La matriz
+    es simétrica, así el tramo invertido mide lo mismo.
+    """
+    n = len(ruta)
+    for i in range(1, n - 1):
+        if time.perf_counter() > fin:
+            return False
+        a, b = ruta[i - 1], ruta[i]
+        for j in range(i + 1, n):
+            c, e = ruta[j], ruta[(j + 1) % n]
+            if d[a][c] + d[b][e] - d[a][b] - d[c][e] < -EPSILON:
+                ruta[i:j + 1] = reversed(ruta[i:j + 1])
+                return True
+    return False
+
+def _or_opt(ruta, d, fin):
+    """
+    Primera mejora or-opt: saca un tramo de 1 a 3 paradas consecutivas y
+    lo reinserta (en el mismo sentido o invertido) en otro lugar de la ruta.
+    """
+    n = len(ruta)
+    for largo in (1, 2, 3):
+        for i in range(1, n - largo + 1):
+            if time.perf_counter() > fin:
+                return False
+            j = i + largo - 1
+            a, b, c, e = ruta[i - 1], ruta[i], ruta[j], ruta[(j + 1) % n]
+            ahorro = d[a][b] + d[c][e] - d[a][e]
+            if ahorro <= EPSILON:
+                continue
+            tramo, resto = ruta[i:j + 1], ruta[:i] + ruta[j + 1:]
+            for k in range(len(resto)):
+                if k == i - 1:
+                    continue  # Su lugar actual
+                p, q = resto[k], resto[(k + 1) % len(resto)]
+                for primero, ultimo, orden in ((b, c, tramo), (c, b, tramo[::-1])):
+                    if d[p][primero] + d[ultimo][q] - d[p][q] - ahorro < -EPSILON:
+                        ruta[:] = resto[:k + 1] + orden + resto[k + 1:]
+                        return True
+    return False
+
+def secuenciar(d, presupuesto_ms):
+    """
+    Orden de visita de las paradas 1..n-1 de la matriz de km 'd' (0 es el
+    depósito, adonde se vuelve al final): vecino más cercano y luego
+    mejoras 2-opt y or-opt hasta que ninguna acorte la ruta o se acabe el
+    presupuesto de tiempo. Devuelve (ruta, km, iteraciones de mejora).
+    """
+    fin = time.perf_counter() + presupuesto_ms / 1000
+    ruta = _vecino_mas_cercano(d)
+    mejoras = 0
+    while len(ruta) > 3 and (_dos_opt(ruta, d, fin) or _or_opt(ruta, d, fin)):
+        mejoras += 1
+    return ruta, _largo(ruta, d), mejoras
+
+
+# --- Ruta de un camión ---
+
+def _pedidos_del_dia(camion_id, dia):
+    """ [(pedido_id, ciudad_destino)] que el camión lleva ese día (índice parcial por camión) """
+    return list(Pedido.objects
+                .filter(camion_asignado_id=camion_id, estado__in=Pedido.ESTADOS_CON_CAMION, fecha_deseada=dia)
+                .order_by('id').values_list('id', 'ciudad_destino'))
+
+def _firma(origen, pedidos, presupuesto_ms):
+    """
+    Cambia si cambian los pedidos asignados (o sus ciudades), el depósito,
+    el presupuesto de tiempo o la configuración que usa calcular() (la
+    tabla de km conocidos incluida).
+    """
+    texto = repr((origen, pedidos, presupuesto_ms, sorted(settings.ACME_GEO.items()),
+                  settings.ACME_RUTAS['minutos_por_parada'],
+                  json.dumps(settings.ACME_TARIFAS.get('distancias_km'), sort_keys=True)))
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+def calcular(origen, pedidos, presupuesto_ms):
+    """
+    Ruta desde la ciudad 'origen' (código) por las ciudades de 'pedidos'
+    [(pedido_id, ciudad)]: una parada por ciudad. Los pedidos sin ciudad
+    reconocida quedan fuera, en 'sin_ciudad'.
+    """
+    matriz = geo.matriz_ciudades()
+    por_ciudad, sin_ciudad = defaultdict(list), []
+    for pedido_id, ciudad in pedidos:
+        if ciudad in geo.CIUDADES:
+            por_ciudad[ciudad].append(pedido_id)
+        else:
+            sin_ciudad.append(pedido_id)
+
+    ciudades = [origen] + sorted(por_ciudad)
+    d = [[matriz.km(a, b) for b in ciudades] for a in ciudades]
+    inicio = time.perf_counter()
+    ruta, km_total, mejoras = secuenciar(d, presupuesto_ms)
+    duracion = time.perf_counter() - inicio
+
+    velocidad = settings.ACME_GEO['velocidad_kmh']
+    horas_parada = settings.ACME_RUTAS['minutos_por_parada'] / 60
+    paradas, km, horas = [], 0, 0
+    for anterior, actual in zip(ruta, ruta[1:]):
+        tramo = d[anterior][actual]
+        km += tramo
+        horas += tramo / velocidad
+        paradas.append({
+            'orden': len(paradas) + 1,
+            'ciudad': ciudades[actual],
+            'nombre': geo.CIUDADES[ciudades[actual]].nombre,
+            'pedidos': por_ciudad[ciudades[actual]],
+            'km_tramo': round(tramo, 1),
+            'km_acumulado': round(km, 1),
+            'horas_llegada': round(horas, 2),
+        })
+        horas += horas_parada
+    regreso = d[ruta[-1]][0] if len(ruta) > 1 else 0
+
+    return {
+        'origen': origen,
+        'paradas': paradas,
+        'sin_ciudad': sin_ciudad,
+        'km_regreso': round(regreso, 1),
+        'km_total': round(km_total, 1),
+        'horas_total': round(horas + regreso / velocidad, 2),
+        'mejoras': mejoras,
+        'ms_calculo': round(duracion * 1000, 2),
+    }
+
+def de_camion(camion, dia, presupuesto_ms=None):
+    """
+    Ruta del camión el día 'dia' por las ciudades de sus pedidos, desde y
+    hacia su sucursal base. Se guarda en la cache con la firma de los
+    pedidos asignados y del presupuesto: mientras no cambien, se devuelve
+    la guardada (una consulta, sin recalcular). Devuelve None si la sucursal del camión no
+    está en la tabla de ciudades.
+    """
+    parametros = settings.ACME_RUTAS
+    origen = geo.ciudad_de(camion.sucursal_base.ciudad)
+    if origen is None:
+        return None
+    presupuesto = parametros['presupuesto_ms'] if presupuesto_ms is None else presupuesto_ms
+    pedidos = _pedidos_del_dia(camion.pk, dia)
+    firma = _firma(origen, pedidos, presupuesto)
+
+    cache = caches[getattr(settings, 'ACME_CACHE_ALIAS', 'default')]
+    clave = f'acme:ruta:{camion.pk}:{dia.isoformat()}'
+    guardada = cache.get(clave)
+    if guardada is not None and guardada['firma'] == firma:
+        return {**guardada['ruta'], 'cacheada': True}
+
+    resultado = calcular(origen, pedidos, presupuesto)
+    cache.set(clave, {'firma': firma, 'ruta': resultado}, timeout=parametros['cache_segundos'])
+    return {**resultado, 'cacheada': False}
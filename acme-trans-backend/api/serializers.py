@@ -1,11 +1,15 @@
 # api/serializers.py
 
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 # Importa todos tus modelos
-from .models import Sucursal, Cliente, Empleado, Camion, Pedido
+from .models import Sucursal, Cliente, Empleado, Camion, Pedido, Reserva
+from .authentication import claims_de
+from . import reservas
 # api/serializers.py
 
 
@@ -17,6 +21,9 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
         token['username'] = user.username
         token['is_superuser'] = user.is_superuser
+        # Rol y perfiles: los permisos y vistas los leen del token, sin consultas
+        for claim, valor in claims_de(user).items():
+            token[claim] = valor
         return token
 
 class UserSerializer(serializers.ModelSerializer):
@@ -274,10 +281,11 @@ class PedidoAdminSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Pedido
-        
-        # Si aquí tienes una lista de campos, AÑADE 'peso_kg' y 'volumen_m3'
+        # (Antes había un segundo Meta con fields='__all__' que pisaba a este;
+        # la lista es la misma que producía, incluido 'cliente')
         fields = [
             'id', 
+            'cliente',
             'cliente_nombre', 
             'sucursal_origen', 
             'destino', 
@@ -293,15 +301,263 @@ class PedidoAdminSerializer(serializers.ModelSerializer):
             'precio_cotizado', 
             'camion_asignado'
         ]
-    
-    class Meta:
-        model = Pedido
-        fields = '__all__' # Mostramos todo
         
+CAMION_OCUPADO = "El camión o su conductor no está libre ese día."
+
 class PedidoAdminUpdateSerializer(serializers.ModelSerializer):
     """ Serializer para Admins (ACTUALIZAR un pedido) """
     
     # Solo permitimos actualizar estos campos
     class Meta:
         model = Pedido
-        fields = ('estado', 'costo_estimado', 'precio_cotizado', 'camion_asignado')
\ No newline at end of file
+        fields = ('estado', 'costo_estimado', 'precio_cotizado', 'camion_asignado')
+
+    def validate(self, data):
+        # El viaje que toma el pedido (otro camión, o deja de estar cancelado)
+        # debe estar libre ese día; la reserva la crean las señales (api/signals.py)
+        if self.instance is not None:
+            pedido = self.instance
+            camion = data.get('camion_asignado', pedido.camion_asignado)
+            nuevo = reservas.viaje_de(camion.pk if camion else None, pedido.fecha_deseada,
+                                      data.get('estado', pedido.estado))
+            anterior = reservas.viaje_de(pedido.camion_asignado_id, pedido.fecha_deseada, pedido.estado)
+            if nuevo is not None and nuevo != anterior and reservas.viajes_ocupados([nuevo]):
+                raise serializers.ValidationError({'camion_asignado': [CAMION_OCUPADO]})
+        return data
+
+
+# --- SERIALIZERS DE LISTADOS (LECTURA RÁPIDA) ---
+# Misma forma JSON que CamionReadSerializer / EmpleadoReadSerializer /
+# PedidoAdminSerializer, pero cada fila sale de un solo .values() (los joins
+# los hace SQL) y el dict se arma a mano: sin instancias de modelo ni un
+# Field de DRF por columna. Solo lectura, para los listados grandes.
+
+def _decimal(valor):
+    # Como DecimalField de DRF: texto; la base ya lo entrega con sus decimales
+    return None if valor is None else format(valor, 'f')
+
+def _fecha_hora(valor):
+    # Como DateTimeField de DRF: ISO 8601 en la zona actual, 'Z' para UTC
+    if valor is None:
+        return None
+    texto = timezone.localtime(valor).isoformat()
+    return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+
+def _nombre_completo(nombre, apellido, username):
+    # Igual que ConductorSerializer.get_nombre_completo
+    return f"{nombre or ''} {apellido or ''}".strip() or username
+
+def _columnas_sucursal(relacion):
+    """ [(campo de SucursalSerializer, columna de .values())] """
+    return [(campo, f'{relacion}__{campo}') for campo in ('id', 'nombre', 'direccion', 'ciudad')]
+
+def _sucursal(fila, columnas):
+    return {campo: fila[columna] for campo, columna in columnas}
+
+
+class ListadoSerializer(serializers.BaseSerializer):
+    """
+    Base de los listados rápidos: to_representation() recibe una fila
+    (dict) de filas(queryset), no una instancia.
+    """
+    columnas = ()
+
+    @classmethod
+    def filas(cls, queryset):
+        return queryset.values(*cls.columnas)
+
+
+class CamionListadoSerializer(ListadoSerializer):
+    """ GET de la lista de camiones (forma de CamionReadSerializer) """
+    sucursal = _columnas_sucursal('sucursal_base')
+    columnas = ('id', 'matricula', 'capacidad', 'estado', *(c for _, c in sucursal),
+                'conductor_asignado_id', 'conductor_asignado__user__first_name',
+                'conductor_asignado__user__last_name', 'conductor_asignado__user__username')
+    capacidades = dict(Camion.CAPACIDAD_CHOICES)
+    estados = dict(Camion.ESTADO_CAMION_CHOICES)
+
+    def to_representation(self, fila):
+        conductor = None
+        if fila['conductor_asignado_id'] is not None:
+            conductor = {
+                'id': fila['conductor_asignado_id'],
+                'nombre_completo': _nombre_completo(fila['conductor_asignado__user__first_name'],
+                                                    fila['conductor_asignado__user__last_name'],
+                                                    fila['conductor_asignado__user__username']),
+            }
+        return {
+            'id': fila['id'],
+            'matricula': fila['matricula'],
+            'capacidad': fila['capacidad'],
+            'capacidad_display': self.capacidades.get(fila['capacidad'], fila['capacidad']),
+            'sucursal_base': _sucursal(fila, self.sucursal),
+            'conductor_asignado': conductor,
+            'conductor_nombre': conductor['nombre_completo'] if conductor else None,
+            'estado': fila['estado'],
+            'estado_display': self.estados.get(fila['estado'], fila['estado']),
+        }
+
+
+class EmpleadoListadoSerializer(ListadoSerializer):
+    """ GET de la lista de empleados (forma de EmpleadoReadSerializer) """
+    sucursal = _columnas_sucursal('sucursal')
+    columnas = ('id', 'user_id', 'user__username', 'user__email', 'user__first_name', 'user__last_name',
+                'cargo', 'estado', *(c for _, c in sucursal))
+    cargos = dict(Empleado.CARGO_CHOICES)
+    estados = dict(Empleado.ESTADO_EMPLEADO_CHOICES)
+
+    def to_representation(self, fila):
+        return {
+            'id': fila['id'],
+            'user': {
+                'id': fila['user_id'],
+                'username': fila['user__username'],
+                'email': fila['user__email'],
+                'first_name': fila['user__first_name'],
+                'last_name': fila['user__last_name'],
+            },
+            'cargo': fila['cargo'],
+            'cargo_display': self.cargos.get(fila['cargo'], fila['cargo']),
+            'sucursal': _sucursal(fila, self.sucursal),
+            'estado': fila['estado'],
+            'estado_display': self.estados.get(fila['estado'], fila['estado']),
+        }
+
+
+class PedidoAdminListadoSerializer(ListadoSerializer):
+    """ GET de la lista de pedidos del admin (forma de PedidoAdminSerializer) """
+    sucursal = _columnas_sucursal('sucursal_origen')
+    columnas = ('id', 'cliente_id', 'cliente__user__username', *(c for _, c in sucursal),
+                'destino', 'tipo_carga', 'peso_kg', 'volumen_m3', 'detalles_carga', 'fecha_deseada',
+                'fecha_solicitud', 'estado', 'costo_estimado', 'precio_cotizado',
+                'camion_asignado_id', 'camion_asignado__matricula', 'camion_asignado__conductor_asignado_id',
+                'camion_asignado__conductor_asignado__user__first_name',
+                'camion_asignado__conductor_asignado__user__last_name')
+    estados = dict(Pedido.ESTADO_CHOICES)
+
+    def to_representation(self, fila):
+        camion = None
+        if fila['camion_asignado_id'] is not None:
+            # Igual que CamionDropdownSerializer.get_display_text
+            if fila['camion_asignado__conductor_asignado_id'] is not None:
+                texto = (f"{fila['camion_asignado__matricula']} "
+                         f"({fila['camion_asignado__conductor_asignado__user__first_name']} "
+                         f"{fila['camion_asignado__conductor_asignado__user__last_name']})")
+            else:
+                texto = f"{fila['camion_asignado__matricula']} (Sin conductor)"
+            camion = {'id': fila['camion_asignado_id'], 'display_text': texto}
+        return {
+            'id': fila['id'],
+            'cliente': fila['cliente_id'],
+            'cliente_nombre': fila['cliente__user__username'],
+            'sucursal_origen': _sucursal(fila, self.sucursal),
+            'destino': fila['destino'],
+            'tipo_carga': fila['tipo_carga'],
+            'peso_kg': _decimal(fila['peso_kg']),
+            'volumen_m3': _decimal(fila['volumen_m3']),
+            'detalles_carga': fila['detalles_carga'],
+            'fecha_deseada': fila['fecha_deseada'].isoformat(),
+            'fecha_solicitud': _fecha_hora(fila['fecha_solicitud']),
+            'estado': fila['estado'],
+            'estado_display': self.estados.get(fila['estado'], fila['estado']),
+            'costo_estimado': _decimal(fila['costo_estimado']),
+            'precio_cotizado': _decimal(fila['precio_cotizado']),
+            'camion_asignado': camion,
+        }
+
+
+class PrecargadoField(serializers.Field):
+    """
+    Como un PrimaryKeyRelatedField, pero busca el objeto en
+    context[contexto] ({id: objeto}, cargado de una vez para todo el lote)
+    en vez de hacer una consulta por ítem.
+    """
+    default_error_messages = {
+        'does_not_exist': 'Clave primaria "{pk_value}" inválida - objeto no existe.',
+        'incorrect_type': 'Tipo incorrecto. Se esperaba valor de clave primaria y se recibió {data_type}.',
+    }
+
+    def __init__(self, contexto, **kwargs):
+        self.contexto = contexto
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        objeto = self.context[self.contexto].get(pk)
+        if objeto is None:
+            self.fail('does_not_exist', pk_value=pk)
+        return objeto
+
+    def to_representation(self, value):
+        return value.pk
+
+class PedidoBulkItemSerializer(PedidoAdminUpdateSerializer):
+    """
+    Un ítem del PATCH masivo: mismas reglas que PedidoAdminUpdateSerializer,
+    más el id. Sin instancia: la vista revisa los viajes de todo el lote.
+    """
+    id = serializers.IntegerField()
+    camion_asignado = PrecargadoField('camiones', allow_null=True, required=False)
+
+    class Meta(PedidoAdminUpdateSerializer.Meta):
+        fields = ('id',) + PedidoAdminUpdateSerializer.Meta.fields
+
+# --- SERIALIZERS DE IMPORTACIÓN (CSV) ---
+# Mismas reglas que CamionWriteSerializer / PedidoClienteSerializer, con las
+# relaciones precargadas por lote (api/imports.py).
+
+class CamionImportSerializer(CamionWriteSerializer):
+    sucursal_base = PrecargadoField('sucursales')
+    conductor_asignado = PrecargadoField('conductores', allow_null=True, required=False)
+
+    class Meta(CamionWriteSerializer.Meta):
+        # La unicidad de la matrícula se verifica para todo el lote de una vez
+        extra_kwargs = {'matricula': {'validators': []}}
+
+class PedidoImportSerializer(PedidoClienteSerializer):
+    sucursal_origen = PrecargadoField('sucursales')
+
+
+# --- SERIALIZERS DE ASIGNACIÓN DE CAMIONES ---
+
+class AsignacionSerializer(serializers.Serializer):
+    """ Parámetros de la asignación automática (api/asignacion.py) y de la consolidación (api/consolidacion.py) """
+    pedidos = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                    help_text="Limitar a estos pedidos (por defecto, todos los confirmados sin camión)")
+    hasta = serializers.DateField(required=False, help_text="Solo pedidos con fecha_deseada hasta este día")
+    simular = serializers.BooleanField(default=False, help_text="Calcular sin guardar")
+
+
+# --- SERIALIZERS DE COTIZACIÓN ---
+
+class CotizacionSerializer(serializers.Serializer):
+    """ Parámetros de la cotización por lote (api/cotizacion.py) """
+    pedidos = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                    help_text="Limitar a estos pedidos (por defecto, todos los SOLICITADO)")
+    simular = serializers.BooleanField(default=False, help_text="Calcular sin guardar")
+
+
+# --- SERIALIZERS DE RESERVAS (CALENDARIO) ---
+
+class ReservaSerializer(serializers.ModelSerializer):
+    """ Reserva de un camión o un conductor; no puede cruzarse con otra del mismo recurso """
+
+    class Meta:
+        model = Reserva
+        fields = ('id', 'camion', 'empleado', 'tipo', 'inicio', 'fin', 'nota')
+
+    def validate(self, data):
+        # Las reglas (un recurso, rango válido, sin choques) son las de Reserva.clean()
+        reserva = Reserva(pk=self.instance.pk if self.instance else None)
+        for campo in self.Meta.fields[1:]:
+            setattr(reserva, campo, data.get(campo, getattr(self.instance, campo, None)))
+        try:
+            reserva.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.message_dict if hasattr(e, 'error_dict') else e.messages)
+        return data
@@ -0,0 +1,178 @@
+# api/signals.py
+
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import asignacion, cache, contadores, eventos, geo, reservas, transiciones
+from .models import Sucursal, Empleado, Camion, Pedido, Reserva
+
+# Cómo armar la clave de contador de cada modelo con sus 'campos_contador'
+CLAVE_CONTADOR = {
+    Pedido: contadores.clave_pedido,
+    Camion: contadores.clave_camion,
+    Empleado: contadores.clave_empleado,
+}
+
+
+def _clave_consultada(sender, pk):
+    """ Clave de contador según la fila en la base de datos """
+    valores = sender.objects.filter(pk=pk).values_list(*sender.campos_contador).first()
+    return CLAVE_CONTADOR[sender](*valores) if valores else None
+
+def _clave_leida(sender, instance):
+    """
+    Clave de contador anterior al save(), con los valores que la instancia
+    recuerda de su lectura (ValoresLeidosMixin), sin consultar. Las vistas
+    que escriben leen y guardan en una misma transacción de escritura
+    (api/db.py), así esos valores no quedan desactualizados. Solo si la
+    instancia se armó a mano con un pk o se leyó con esos campos diferidos
+    se consulta la fila.
+    """
+    leidos = instance.__dict__.get('_valores_leidos', {})
+    if all(campo in leidos for campo in sender.campos_contador):
+        return CLAVE_CONTADOR[sender](*(leidos[campo] for campo in sender.campos_contador))
+    return _clave_consultada(sender, instance.pk)
+
+
+# --- Contadores del dashboard (api/contadores.py) ---
+# Nota: bulk_create/update()/delete() sobre querysets no emiten estas
+# señales; quien los use debe llamar a contadores.ajustar() o reconstruir().
+# El ajuste va en la transacción del guardado si la hay (vistas con
+# EscrituraReintentableMixin, admin de Django); si no, en su propio
+# UPDATE, y contadores.diferencias() detecta un descuadre.
+
+@receiver(pre_save, sender=Pedido)
+@receiver(pre_save, sender=Camion)
+@receiver(pre_save, sender=Empleado)
+def leer_clave_anterior(sender, instance, **kwargs):
+    if instance.pk is None or instance._state.adding:
+        instance._clave_contador = None
+    else:
+        instance._clave_contador = _clave_leida(sender, instance)
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_save, sender=Camion)
+@receiver(post_save, sender=Empleado)
+def actualizar_contador(sender, instance, created, **kwargs):
+    anterior = None if created else instance._clave_contador
+    contadores.mover(anterior, contadores.clave_de(instance))
+    # Lo guardado es ahora lo que hay en la base
+    instance.recordar_valores(kwargs.get('update_fields'))
+
+@receiver(pre_delete, sender=Pedido)
+@receiver(pre_delete, sender=Camion)
+@receiver(pre_delete, sender=Empleado)
+def leer_clave_eliminada(sender, instance, **kwargs):
+    # Las bajas son pocas y la instancia puede llevar tiempo en memoria: se consulta la fila
+    instance._clave_contador = _clave_consultada(sender, instance.pk)
+
+@receiver(post_delete, sender=Pedido)
+@receiver(post_delete, sender=Camion)
+@receiver(post_delete, sender=Empleado)
+def descontar_contador(sender, instance, **kwargs):
+    contadores.mover(instance._clave_contador, None)
+
+
+# --- Versiones de la cache de respuestas (api/cache.py) ---
+
+GRUPO_CACHE = {
+    Sucursal: 'sucursal',
+    Camion: 'camion',
+    Empleado: 'empleado',
+    Pedido: 'pedido',
+    # Los nombres de conductores salen del User asociado
+    User: 'empleado',
+}
+
+@receiver(post_save, sender=Sucursal)
+@receiver(post_save, sender=Camion)
+@receiver(post_save, sender=Empleado)
+@receiver(post_save, sender=Pedido)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Sucursal)
+@receiver(post_delete, sender=Camion)
+@receiver(post_delete, sender=Empleado)
+@receiver(post_delete, sender=Pedido)
+@receiver(post_delete, sender=User)
+def invalidar_cache(sender, **kwargs):
+    cache.invalidar(GRUPO_CACHE[sender])
+
+
+# --- Eventos en vivo (api/eventos.py) ---
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_save, sender=Camion)
+@receiver(post_save, sender=Empleado)
+def anunciar_guardado(sender, instance, created, **kwargs):
+    eventos.publicar([eventos.de_instancia(instance, 'creado' if created else 'actualizado')])
+
+@receiver(post_delete, sender=Pedido)
+@receiver(post_delete, sender=Camion)
+@receiver(post_delete, sender=Empleado)
+def anunciar_eliminado(sender, instance, **kwargs):
+    eventos.publicar([eventos.de_instancia(instance, 'eliminado')])
+
+
+# --- Historial de estados de pedidos (api/transiciones.py) ---
+
+@receiver(post_save, sender=Pedido)
+def registrar_transicion(sender, instance, created, **kwargs):
+    # El estado anterior es el de la clave de contador leída en pre_save
+    anterior = None if created or instance._clave_contador is None else instance._clave_contador[2]
+    transiciones.registrar([(instance.pk, anterior, instance.estado)])
+
+
+# --- Salida y regreso de camiones (api/asignacion.py) ---
+
+@receiver(post_save, sender=Pedido)
+def despachar_camion(sender, instance, created, **kwargs):
+    anterior = None if created or instance._clave_contador is None else instance._clave_contador[2]
+    if anterior != instance.estado:
+        asignacion.despachos([(instance.camion_asignado_id, anterior, instance.estado)])
+
+
+# --- Ciudad del destino (api/geo.py) ---
+
+@receiver(pre_save, sender=Pedido)
+def completar_ciudad_destino(sender, instance, **kwargs):
+    # Se parsea al guardar, no en cada cotización o listado
+    instance.ciudad_destino = geo.ciudad_de(instance.destino)
+
+
+# --- Calendario de reservas (api/reservas.py) ---
+
+# Lo que define el viaje de un pedido (reservas.viaje_de)
+CAMPOS_VIAJE = ('camion_asignado_id', 'fecha_deseada', 'estado')
+
+@receiver(pre_save, sender=Pedido)
+def leer_viaje_anterior(sender, instance, **kwargs):
+    if instance.pk is None or instance._state.adding:
+        instance._viaje_anterior = None
+        return
+    # Como la clave de contador: lo recordado de la lectura, o la fila
+    leidos = instance.__dict__.get('_valores_leidos', {})
+    if all(campo in leidos for campo in CAMPOS_VIAJE):
+        valores = [leidos[campo] for campo in CAMPOS_VIAJE]
+    else:
+        valores = sender.objects.filter(pk=instance.pk).values_list(*CAMPOS_VIAJE).first()
+    instance._viaje_anterior = reservas.viaje_de(*valores) if valores else None
+
+@receiver(post_save, sender=Pedido)
+def mover_viaje(sender, instance, **kwargs):
+    # Otro camión, otro día o cancelado: la reserva del viaje sigue al pedido
+    nuevo = reservas.viaje_de(instance.camion_asignado_id, instance.fecha_deseada, instance.estado)
+    if nuevo != instance._viaje_anterior:
+        reservas.mover_viajes([instance._viaje_anterior] if instance._viaje_anterior else [],
+                              [nuevo] if nuevo else [])
+
+@receiver(post_delete, sender=Pedido)
+def liberar_viaje(sender, instance, **kwargs):
+    viaje = reservas.viaje_de(instance.camion_asignado_id, instance.fecha_deseada, instance.estado)
+    if viaje:
+        reservas.mover_viajes([viaje], [])
+
+@receiver(post_save, sender=Reserva)
+@receiver(post_delete, sender=Reserva)
+def tocar_reservas(sender, **kwargs):
+    reservas.tocar()
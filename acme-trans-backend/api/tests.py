@@ -1,3 +1,1810 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import (asignacion, busqueda, cache, consolidacion, contadores, cotizacion, db, eventos, geo, replica, reservas,
+               resumenes, rutas, transiciones)
+from .management.commands import benchmark_api
+from .middleware import SQLInstrumentacionMiddleware
+from .pagination import PedidoKeysetPagination
+from .models import (Sucursal, Cliente, Empleado, Camion, Pedido, TransicionPedido, ResumenDiario, Reserva,
+                     EventoPublicado)
+from .serializers import MyTokenObtainPairSerializer, CamionReadSerializer, EmpleadoReadSerializer, PedidoAdminSerializer
+from .views import ConductorListView
+
+
+def _autenticar(client, user):
+    """ Como el frontend: Bearer con el token de acceso del login (con claims) """
+    token = MyTokenObtainPairSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+class PaginacionTests(TestCase):
+    """ Paginación por cursor de los listados de pedidos (api/pagination.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        cls.cliente = Cliente.objects.create(user=User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123'))
+        pedidos = [
+            Pedido.objects.create(
+                cliente=cls.cliente, sucursal_origen=cls.sucursal, destino="Calle 1, Temuco",
+                tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+            )
+            for _ in range(5)
+        ]
+        # Tres pedidos con la misma fecha_solicitud: el desempate es por id
+        ayer = timezone.now() - timedelta(days=1)
+        Pedido.objects.filter(pk__in=[p.pk for p in pedidos[1:4]]).update(fecha_solicitud=ayer)
+        Pedido.objects.filter(pk=pedidos[0].pk).update(fecha_solicitud=ayer - timedelta(hours=1))
+        cls.orden = list(Pedido.objects.order_by('-fecha_solicitud', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        _autenticar(self.client, self.cliente.user)
+
+    def _recorrer(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [pedido['id'] for pedido in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_recorre_todo_sin_repetir(self):
+        for page_size in (1, 2, 3, 5):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self._recorrer(f'/api/mis-pedidos/?page_size={page_size}'), self.orden)
+        # El listado del admin (filas de .values()) arma el mismo cursor
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self._recorrer('/api/admin/pedidos/?page_size=2'), self.orden)
+
+    def test_codificar_cursor(self):
+        paginacion = PedidoKeysetPagination()
+        pedido = Pedido.objects.get(pk=self.orden[2])
+        cursor = paginacion.encode_cursor(pedido)
+        self.assertEqual(cursor, paginacion.encode_cursor({'fecha_solicitud': pedido.fecha_solicitud, 'id': pedido.pk}))
+        request = APIRequestFactory().get('/', {'cursor': cursor})
+        self.assertEqual(paginacion.decode_cursor(Request(request)), (pedido.fecha_solicitud, pedido.pk))
+
+        response = self.client.get('/api/mis-pedidos/', {'cursor': cursor})
+        self.assertEqual([p['id'] for p in response.data['results']], self.orden[3:])
+
+    def test_cursor_invalido(self):
+        adulterados = ['no-es-base64!', base64.urlsafe_b64encode(b'ayer|1').decode(),
+                       base64.urlsafe_b64encode(b'2030-01-01T00:00:00|uno').decode(),
+                       base64.urlsafe_b64encode('2030-01-01|ñ'.encode()).decode()]
+        for cursor in adulterados:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/mis-pedidos/', {'cursor': cursor}).status_code, 404)
+
+    @override_settings(PEDIDOS_PAGE_SIZE=2, PEDIDOS_MAX_PAGE_SIZE=3)
+    def test_tamano_de_pagina(self):
+        casos = {'': 2, '1': 1, '100': 3, '0': 2, '-4': 2, 'abc': 2}
+        for page_size, esperado in casos.items():
+            with self.subTest(page_size=page_size):
+                response = self.client.get('/api/mis-pedidos/', {'page_size': page_size})
+                self.assertEqual(len(response.data['results']), esperado)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Verifica (en SQLite) que las consultas que hacen las vistas de
+    api/views.py usan los índices declarados en los Meta de los modelos.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente, nombre_empresa="Empresa XYZ")
+        user_conductor = User.objects.create_user('conductor', 'c@acmetrans.cl', 'pass123')
+        conductor = Empleado.objects.create(user=user_conductor, cargo='CON', sucursal=cls.sucursal)
+        cls.camion = camion = Camion.objects.create(matricula="AB1234", capacidad='GC', sucursal_base=cls.sucursal,
+                                       conductor_asignado=conductor)
+        for estado, _ in Pedido.ESTADO_CHOICES:
+            Pedido.objects.create(
+                cliente=cls.cliente, sucursal_origen=cls.sucursal, destino="Calle 1, Temuco",
+                tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+                estado=estado, camion_asignado=camion if estado in Pedido.ESTADOS_CON_CAMION else None,
+            )
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Los planes verificados son los de SQLite.")
+
+    def _ejecutadas(self, funcion):
+        """
+        Ejecuta 'funcion' y devuelve el SQL y los parámetros tal como se
+        enviaron: con los valores interpolados SQLite podría elegir otro plan.
+        """
+        ejecutadas = []
+        def capturar(execute, sql, params, many, context):
+            ejecutadas.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capturar):
+            funcion()
+        return ejecutadas
+
+    def _planes(self, funcion, tabla):
+        """ EXPLAIN QUERY PLAN de cada SELECT sobre 'tabla' que hace 'funcion' """
+        planes = [
+            self._explain(sql, params)
+            for sql, params in self._ejecutadas(funcion)
+            if sql.startswith('SELECT') and f'FROM "{tabla}"' in sql
+        ]
+        self.assertTrue(planes, f"No se consultó {tabla}")
+        return planes
+
+    def _planes_vista(self, user, url, tabla):
+        client = APIClient()
+        _autenticar(client, user)
+        def get():
+            self.assertEqual(client.get(url).status_code, 200)
+        return self._planes(get, tabla)
+
+    def _explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return " | ".join(str(fila[-1]) for fila in cursor.fetchall())
+
+    def assertUsaIndice(self, planes, indice):
+        self.assertTrue(any(indice in plan for plan in planes), f"{indice} no aparece en: {planes}")
+
+    def test_listado_admin_por_sucursal(self):
+        planes = self._planes_vista(self.admin, f'/api/admin/pedidos/?sucursal_id={self.sucursal.pk}', 'api_pedido')
+        self.assertUsaIndice(planes, 'pedido_suc_fecha_idx')
+
+    def test_listado_admin_pedidos_activos(self):
+        url = f'/api/admin/pedidos/?sucursal_id={self.sucursal.pk}&estado=ACTIVOS'
+        planes = self._planes_vista(self.admin, url, 'api_pedido')
+        self.assertUsaIndice(planes, 'pedido_activo_fecha_idx')
+
+    def test_mis_pedidos(self):
+        planes = self._planes_vista(self.cliente.user, '/api/mis-pedidos/', 'api_pedido')
+        self.assertUsaIndice(planes, 'pedido_cliente_fecha_idx')
+
+    def test_dashboard(self):
+        url = f'/api/admin/sucursales/{self.sucursal.pk}/dashboard/'
+        # La UniqueConstraint 'contador_unico' es un índice automático en SQLite
+        planes = self._planes_vista(self.admin, url, 'api_contadorsucursal')
+        self.assertUsaIndice(planes, 'sqlite_autoindex_api_contadorsucursal')
+
+    def test_conteo_de_contadores(self):
+        conteo = lambda: contadores.calcular(self.sucursal.pk)
+        self.assertUsaIndice(self._planes(conteo, 'api_pedido'), 'pedido_suc_estado_idx')
+        self.assertUsaIndice(self._planes(conteo, 'api_camion'), 'camion_suc_estado_idx')
+        self.assertUsaIndice(self._planes(conteo, 'api_empleado'), 'empleado_suc_cargo_est_idx')
+
+    def test_camion_ocupado(self):
+        queryset = Pedido.objects.con_camion().filter(camion_asignado=self.camion).values('id')
+        plan = self._explain(*queryset.query.sql_with_params())
+        self.assertIn('pedido_camion_ocupado_idx', plan)
+
+    def test_tiempos_por_etapa(self):
+        # Solo el rango pedido del historial, por el índice de fecha
+        duraciones = lambda: transiciones.duraciones(timezone.now() - timedelta(days=30), timezone.now())
+        (sql, params), = self._ejecutadas(duraciones)  # SQL directo: no pasa el filtro de _planes()
+        self.assertIn('transicion_fecha_idx', self._explain(sql, params))
+
+    def test_recalculo_de_resumenes(self):
+        hoy = timezone.localdate()
+        recalcular = lambda: resumenes._recalcular(hoy - timedelta(days=7), hoy, {self.sucursal.pk})
+        self.assertUsaIndice(self._planes(recalcular, 'api_pedido'), 'pedido_suc_fecha_idx')
+        self.assertUsaIndice(self._planes(recalcular, 'api_transicionpedido'), 'transicion_fecha_idx')
+
+
+class AutenticacionTests(TestCase):
+    """ Rol y perfiles viajan en el JWT: las requests no consultan usuarios ni perfiles """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+        user_conductor = User.objects.create_user('conductor', 'c@acmetrans.cl', 'pass123')
+        cls.conductor = Empleado.objects.create(user=user_conductor, cargo='CON', sucursal=cls.sucursal)
+        Pedido.objects.create(
+            cliente=cls.cliente, sucursal_origen=cls.sucursal, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=1000, volumen_m3=5, fecha_deseada=date(2030, 1, 1),
+        )
+
+    def _login(self, username):
+        response = self.client.post('/api/token/', {'username': username, 'password': 'pass123'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _claims(self, username):
+        return MyTokenObtainPairSerializer.token_class(self._login(username)['refresh']).payload
+
+    def test_claims_de_rol_y_perfil(self):
+        claims = self._claims('cliente')
+        self.assertEqual((claims['rol'], claims['cliente_id'], claims['empleado_id']), ('cliente', self.cliente.pk, None))
+        claims = self._claims('conductor')
+        self.assertEqual((claims['rol'], claims['empleado_id'], claims['sucursal_id']),
+                         ('empleado', self.conductor.pk, self.sucursal.pk))
+
+    def test_mis_pedidos_sin_consultas_de_autenticacion(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self._login('cliente')['access']}")
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get('/api/mis-pedidos/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        tablas = ('"auth_user"', '"api_cliente"', '"api_empleado"')
+        self.assertEqual([q['sql'] for q in consultas if any(t in q['sql'] for t in tablas)], [])
+
+    def test_permisos_por_claims(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self._login('conductor')['access']}")
+        self.assertEqual(client.get('/api/mis-pedidos/').status_code, 403)
+        self.assertEqual(client.get('/api/admin/pedidos/').status_code, 403)
+
+    def test_token_sin_claims_de_rol(self):
+        # Token emitido antes de agregar los claims: se pide iniciar sesión otra vez
+        token = MyTokenObtainPairSerializer.token_class.for_user(self.cliente.user).access_token
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get('/api/mis-pedidos/').status_code, 401)
+
+
+class ContadoresTests(TestCase):
+    """ Los contadores del dashboard siguen a cada alta, cambio y baja """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.osorno = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.santiago = Sucursal.objects.create(nombre="Santiago", direccion="Av. 2", ciudad="Santiago")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def assertSinDesfase(self):
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_pedido_cambia_de_estado(self):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.osorno, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+        )
+        response = self.client.patch(f'/api/admin/pedidos/{pedido.pk}/', {'estado': 'COTIZADO'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(contadores.por_sucursal(self.osorno.pk)['PED'], {'COTIZADO': 1})
+        self.assertSinDesfase()
+
+        pedido.delete()
+        self.assertEqual(contadores.por_sucursal(self.osorno.pk)['PED'], {})
+        self.assertSinDesfase()
+
+    def test_empleado_y_camion(self):
+        response = self.client.post('/api/admin/empleados/', {
+            'user': {'username': 'conductor', 'password': 'pass123', 'email': 'c@acmetrans.cl'},
+            'cargo': 'CON', 'estado': 'DIS', 'sucursal': self.osorno.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        empleado = Empleado.objects.get(user__username='conductor')
+
+        self.client.post('/api/admin/camiones/', {
+            'matricula': 'AB1234', 'capacidad': 'GC', 'estado': 'DIS', 'sucursal_base': self.santiago.pk,
+        }, format='json')
+        camion = Camion.objects.get(matricula='AB1234')
+        self.client.patch(f'/api/admin/camiones/{camion.pk}/', {'sucursal_base': self.osorno.pk, 'estado': 'MAN'}, format='json')
+        self.client.patch(f'/api/admin/empleados/{empleado.pk}/', {'cargo': 'MEC'}, format='json')
+
+        conteo = contadores.por_sucursal(self.osorno.pk)
+        self.assertEqual(conteo['CAM'], {'MAN': 1})
+        self.assertEqual(conteo['CON'], {})
+        self.assertEqual(contadores.por_sucursal(self.santiago.pk)['CAM'], {})
+        self.assertSinDesfase()
+
+    def test_lectura_diferida_no_descuadra(self):
+        camion = Camion.objects.create(matricula='CD5678', capacidad='MC', sucursal_base=self.osorno)
+        diferido = Camion.objects.only('id', 'matricula').get(pk=camion.pk)
+        diferido.estado = 'REP'
+        diferido.save()
+        self.assertEqual(contadores.por_sucursal(self.osorno.pk)['CAM'], {'REP': 1})
+        self.assertSinDesfase()
+
+    def test_guardar_no_relee_la_fila(self):
+        creado = Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.osorno, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+        )
+        pedido = Pedido.objects.get(pk=creado.pk)
+        for estado in ('COTIZADO', 'CONFIRMADO'):
+            pedido.estado = estado
+            with CaptureQueriesContext(connection) as consultas:
+                pedido.save()
+            self.assertEqual([q['sql'] for q in consultas if q['sql'].startswith('SELECT')], [])
+        self.assertEqual(contadores.por_sucursal(self.osorno.pk)['PED'], {'CONFIRMADO': 1})
+
+        # Un cambio por update() (con su ajuste) y luego refresh_from_db: la clave sigue a la base
+        Pedido.objects.filter(pk=pedido.pk).update(estado='EN_RUTA')
+        contadores.mover(contadores.clave_pedido(self.osorno.pk, 'CONFIRMADO'),
+                         contadores.clave_pedido(self.osorno.pk, 'EN_RUTA'))
+        pedido.refresh_from_db(fields=['estado'])
+        pedido.estado = 'COMPLETADO'
+        pedido.save()
+        self.assertEqual(contadores.por_sucursal(self.osorno.pk)['PED'], {'COMPLETADO': 1})
+        self.assertSinDesfase()
+
+    def test_lecturas_sin_transaccion(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/api/admin/pedidos/').status_code, 200)
+        self.assertEqual([q['sql'] for q in consultas if 'SAVEPOINT' in q['sql']], [])
+
+
+class RespuestaCacheadaTests(TestCase):
+    """ ETag / 304 e invalidación por versión de los datos de referencia """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_304_sin_consultas(self):
+        url = f'/api/admin/sucursales/{self.sucursal.pk}/dashboard/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_cambio_invalida_etag(self):
+        url = '/api/data/sucursales/'
+        etag = self.client.get(url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Sucursal.objects.create(nombre="Santiago", direccion="Av. 2", ciudad="Santiago")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), 2)
+
+    @override_settings(CACHES={
+        'worker1': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker1'},
+        'worker2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker2'},
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'acme-test'},
+    }, ACME_CACHE_VERSION_TIMEOUT=30)
+    def test_cache_por_proceso_se_recupera(self):
+        # Dos workers, cada uno con su LocMem: el cambio solo sube la versión en el que escribió
+        url = '/api/data/sucursales/'
+        ahora = time.time()
+        with override_settings(ACME_CACHE_ALIAS='worker1'):
+            self.assertEqual(len(self.client.get(url).data), 1)
+        with override_settings(ACME_CACHE_ALIAS='worker2'), self.captureOnCommitCallbacks(execute=True):
+            Sucursal.objects.create(nombre="Santiago", direccion="Av. 2", ciudad="Santiago")
+
+        with override_settings(ACME_CACHE_ALIAS='worker1'):
+            self.assertEqual(len(self.client.get(url).data), 1)  # Versión vieja, aún vigente
+            with mock.patch('django.core.cache.backends.locmem.time.time', return_value=ahora + 31):
+                self.assertEqual(len(self.client.get(url).data), 2)
+
+    def test_version_sin_expiracion_en_cache_local(self):
+        with self.settings(ACME_CACHE_VERSION_TIMEOUT=None):
+            self.assertEqual([e.id for e in cache.revisar_backend(None)], ['api.E001'])
+        with self.settings(ACME_CACHE_VERSION_TIMEOUT=None, CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'}}):
+            self.assertEqual(cache.revisar_backend(None), [])
+        self.assertEqual(cache.revisar_backend(None), [])
+
+
+class PopulateDbTests(TestCase):
+    """ populate_db con --scale y --seed (datos de prueba reproducibles) """
+
+    def _poblar(self, **opciones):
+        call_command('populate_db', stdout=io.StringIO(), **opciones)
+        # Sin ids ni fechas (dependen de la corrida y del día)
+        return {
+            'usuarios': sorted(User.objects.filter(is_superuser=False).values_list('username', 'email')),
+            'camiones': sorted(Camion.objects.values_list('matricula', 'capacidad', 'estado', 'sucursal_base__nombre')),
+            'pedidos': sorted(Pedido.objects.values_list('destino', 'tipo_carga', 'peso_kg', 'volumen_m3', 'estado',
+                                                         'sucursal_origen__nombre', 'cliente__user__username')),
+        }
+
+    def test_escala_y_semilla(self):
+        datos = self._poblar(scale=2, seed=7, batch_size=40)
+        self.assertEqual(Sucursal.objects.count(), 3)
+        self.assertEqual(Cliente.objects.count(), 2 * 5)
+        self.assertEqual(Pedido.objects.count(), 2 * 50)
+        # La flota crece 1x cada 100 de escala: a escala 2 es la de escala 1
+        self.assertEqual(Camion.objects.count(), 29)
+        self.assertEqual(Empleado.objects.count(), 1 + 15 + 25 + 10)
+        self.assertEqual(TransicionPedido.objects.values('pedido').distinct().count(), 100)
+        self.assertEqual(contadores.diferencias(), {})
+
+        self.assertEqual(self._poblar(scale=2, seed=7, batch_size=40), datos)
+        self.assertNotEqual(self._poblar(scale=2, seed=8, batch_size=40)['pedidos'], datos['pedidos'])
+
+
+class BenchmarkApiTests(TestCase):
+    """ Humo de benchmark_api: cada escenario corre una vez y responde sin error """
+
+    def test_todos_los_escenarios(self):
+        call_command('populate_db', scale=1, seed=1, stdout=io.StringIO())
+        salida = io.StringIO()
+        with tempfile.TemporaryDirectory() as carpeta:
+            archivo = os.path.join(carpeta, 'benchmark.json')
+            call_command('benchmark_api', base_actual=True, iteraciones=1, output=archivo, stdout=salida)
+            with open(archivo, encoding='utf-8') as f:
+                resultados = json.load(f)['endpoints']
+
+        self.assertNotIn('Ruta sin escenario', salida.getvalue())
+        self.assertEqual(set(resultados), {escenario[0] for escenario in benchmark_api.ESCENARIOS})
+        errores = {nombre: r['status'] for nombre, r in resultados.items() if max(r['status']) >= 400}
+        self.assertEqual(errores, {})
+
+
+class DashboardAsyncTests(TestCase):
+    """ Vista async del dashboard (ORM async) """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        self.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        cliente = Cliente.objects.create(user=User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123'))
+        Pedido.objects.create(
+            cliente=cliente, sucursal_origen=self.sucursal, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=1000, volumen_m3=5, fecha_deseada=date(2030, 1, 1),
+        )
+        self.token_admin = str(MyTokenObtainPairSerializer.get_token(self.admin).access_token)
+        self.token_cliente = str(MyTokenObtainPairSerializer.get_token(cliente.user).access_token)
+        self.url = f'/api/admin/sucursales/{self.sucursal.pk}/dashboard/async/'
+
+    def _get(self, url, token, **headers):
+        return async_to_sync(AsyncClient().get)(url, headers={'Authorization': f'Bearer {token}', **headers})
+
+    def test_misma_respuesta_que_la_vista_sync(self):
+        response = self._get(self.url, self.token_admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['kpis']['pedidos_nuevos'], 1)
+        revalidada = self._get(self.url, self.token_admin, **{'If-None-Match': response['ETag']})
+        self.assertEqual(revalidada.status_code, 304)
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        sync = client.get(f'/api/admin/sucursales/{self.sucursal.pk}/dashboard/')
+        self.assertEqual(response.content, sync.content)
+
+    def test_permisos_y_sucursal_inexistente(self):
+        self.assertEqual(self._get(self.url, self.token_cliente).status_code, 403)
+        self.assertEqual(async_to_sync(AsyncClient().get)(self.url).status_code, 401)
+        self.assertEqual(self._get('/api/admin/sucursales/999/dashboard/async/', self.token_admin).status_code, 404)
+
+
+@override_settings(ACME_SQL_INSTRUMENTACION=True, ACME_SQL_N1_UMBRAL=2)
+class SQLInstrumentacionTests(TestCase):
+    """ Server-Timing y detección de N+1 del middleware de api/middleware.py """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        for i in range(4):
+            user = User.objects.create_user(f'conductor{i}', f'c{i}@acmetrans.cl', 'pass123')
+            Empleado.objects.create(user=user, cargo='CON', sucursal=cls.sucursal)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_server_timing(self):
+        with self.assertLogs('acme.sql', level='INFO') as logs:
+            response = self.client.get('/api/data/conductores/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        # Con select_related('user') no hay una consulta por conductor
+        self.assertNotIn('n1;', response['Server-Timing'])
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+
+    def test_marca_posible_n1(self):
+        vista = ConductorListView.as_view(queryset=Empleado.objects.filter(cargo='CON'))
+        with self.assertLogs('acme.sql', level='WARNING') as logs:
+            middleware = SQLInstrumentacionMiddleware(lambda request: vista(request))
+            request = APIRequestFactory().get('/api/data/conductores/')
+            force_authenticate(request, self.admin)
+            response = middleware(request)
+        self.assertIn('n1;', response['Server-Timing'])
+        linea = json.loads(logs.records[0].getMessage())
+        self.assertEqual(linea['posible_n1'][0]['veces'], 4)
+
+    def test_vista_async(self):
+        # El ORM async consulta desde el hilo de sync_to_async: también se cuenta
+        token = str(MyTokenObtainPairSerializer.get_token(self.admin).access_token)
+        with self.assertLogs('acme.sql', level='INFO') as logs:
+            response = async_to_sync(AsyncClient().get)(f'/api/admin/sucursales/{self.sucursal.pk}/dashboard/async/',
+                                                        headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        linea = json.loads(logs.records[0].getMessage())
+        self.assertGreaterEqual(linea['consultas'], 2)
+        self.assertIn(f'desc="{linea["consultas"]} consultas"', response['Server-Timing'])
+
+        async def vista(request):
+            return HttpResponse()
+        # En una cadena async el middleware es async (la vista no pasa a un hilo)
+        self.assertTrue(iscoroutinefunction(SQLInstrumentacionMiddleware(vista)))
+
+
+class ReplicaTests(TransactionTestCase):
+    """
+    Router de lectura (api/replica.py). La "réplica" es otra conexión a la
+    base de prueba, así que ve lo confirmado y se puede contar qué consulta
+    va a cada alias.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        configuracion = mock.patch.dict(connections.settings, {replica.ALIAS: dict(connections.settings['default'])})
+        configuracion.start()
+        self.addCleanup(configuracion.stop)
+        # Conexión abierta a mano: el test solo deja abrir 'default' al vuelo
+        connections[replica.ALIAS].connect()
+        self.addCleanup(lambda: (connections[replica.ALIAS].close(), delattr(connections._connections, replica.ALIAS)))
+
+        self.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        self.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        self.clientes = [
+            Cliente.objects.create(user=User.objects.create_user(f'cliente{i}', f'c{i}@empresa.com', 'pass123'))
+            for i in range(2)
+        ]
+
+    def _consultas(self, client, metodo, url, **kwargs):
+        """ (response, SELECT en la primaria, SELECT en la réplica) """
+        with CaptureQueriesContext(connection) as primaria, \
+                CaptureQueriesContext(connections[replica.ALIAS]) as copia:
+            response = getattr(client, metodo)(url, **kwargs)
+        selects = lambda consultas: sum(c['sql'].startswith('SELECT') for c in consultas.captured_queries)
+        return response, selects(primaria), selects(copia)
+
+    def test_listados_en_la_replica_y_lectura_propia_en_la_primaria(self):
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        response, primaria, copia = self._consultas(admin, 'get', '/api/admin/pedidos/')
+        self.assertEqual((response.status_code, primaria), (200, 0))
+        self.assertGreater(copia, 0)
+
+        # Quien acaba de crear un pedido lo lee de la primaria; otro cliente, de la réplica
+        autor, otro = APIClient(), APIClient()
+        _autenticar(autor, self.clientes[0].user)
+        _autenticar(otro, self.clientes[1].user)
+        response = autor.post('/api/mis-pedidos/', {
+            'sucursal_origen': self.sucursal.pk, 'destino': "Calle 1, Temuco", 'tipo_carga': "Retail",
+            'peso_kg': '1000.00', 'volumen_m3': '5.00', 'fecha_deseada': '2030-01-01',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response, primaria, copia = self._consultas(autor, 'get', '/api/mis-pedidos/')
+        self.assertEqual((len(response.data['results']), copia), (1, 0))
+        self.assertGreater(primaria, 0)
+        _, primaria, copia = self._consultas(otro, 'get', '/api/mis-pedidos/')
+        self.assertEqual(primaria, 0)
+        self.assertGreater(copia, 0)
+
+    def test_escrituras_van_a_la_primaria(self):
+        with replica.lectura():
+            sucursal = Sucursal.objects.get(pk=self.sucursal.pk)
+        self.assertEqual(sucursal._state.db, replica.ALIAS)
+        sucursal.nombre = "Osorno Centro"
+        with CaptureQueriesContext(connection) as primaria:
+            sucursal.save()
+        self.assertTrue(any(c['sql'].startswith('UPDATE') for c in primaria.captured_queries))
+
+    def test_no_cachea_lo_leido_de_una_replica_atrasada(self):
+        # La "réplica" no es un archivo con fecha de copia: no se sabe si está al día
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        url = f'/api/admin/sucursales/{self.sucursal.pk}/dashboard/'
+        for _ in range(2):
+            response, _, copia = self._consultas(admin, 'get', url)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(copia, 0)
+
+
+@override_settings(ACME_DB_REINTENTO_ESPERA=0)
+class EscrituraSQLiteTests(TransactionTestCase):
+    """ BEGIN IMMEDIATE y reintentos ante 'database is locked' (api/db.py) """
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Solo aplica a SQLite.")
+
+    def test_transaccion_escritura_usa_begin_immediate(self):
+        with CaptureQueriesContext(connection) as consultas:
+            with db.transaccion_escritura():
+                Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        begins = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('BEGIN')]
+        self.assertEqual(begins, ['BEGIN IMMEDIATE'])
+        # Viene de OPTIONS: no se toca la conexión en cada transacción
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        self.assertEqual(db.revisar_transaction_mode(None), [])
+        with mock.patch.dict(settings.DATABASES['default'], OPTIONS={}):
+            self.assertEqual([w.id for w in db.revisar_transaction_mode(None)], ['api.W001'])
+
+    def test_reintenta_mientras_otro_hilo_tiene_el_lock(self):
+        tomado = threading.Event()
+
+        def escritor():
+            # Otra conexión (la de este hilo) con el lock de escritura un rato
+            with transaction.atomic():
+                Sucursal.objects.create(nombre="Primero", direccion="Av. 1", ciudad="Osorno")
+                tomado.set()
+                time.sleep(0.3)
+
+        hilo = threading.Thread(target=escritor)
+        hilo.start()
+        tomado.wait(5)
+        crear = db.reintentar_bloqueo(Sucursal.objects.create)
+        with self.settings(ACME_DB_REINTENTOS=8, ACME_DB_REINTENTO_ESPERA=0.02), \
+                mock.patch('api.db.time.sleep', wraps=time.sleep) as esperas:
+            crear(nombre="Segundo", direccion="Av. 1", ciudad="Osorno")
+        hilo.join(5)
+        # BEGIN IMMEDIATE chocó con el lock ('locked') y se reintentó hasta que se liberó
+        self.assertGreater(esperas.call_count, 0)
+        self.assertEqual(sorted(Sucursal.objects.values_list('nombre', flat=True)), ["Primero", "Segundo"])
+
+    def test_reintenta_y_revierte_el_intento_fallido(self):
+        intentos = []
+        @db.reintentar_bloqueo
+        def crear():
+            Sucursal.objects.create(nombre=f"Intento {len(intentos)}", direccion="Av. 1", ciudad="Osorno")
+            intentos.append(1)
+            if len(intentos) < 3:
+                raise OperationalError('database is locked')
+
+        crear()
+        self.assertEqual(list(Sucursal.objects.values_list('nombre', flat=True)), ["Intento 2"])
+
+    def test_no_reintenta_otros_errores_ni_dentro_de_una_transaccion(self):
+        llamadas = []
+        @db.reintentar_bloqueo
+        def fallar(mensaje):
+            llamadas.append(mensaje)
+            raise OperationalError(mensaje)
+
+        with self.assertRaises(OperationalError):
+            fallar('no such table: x')
+        with self.assertRaises(OperationalError), transaction.atomic():
+            fallar('database is locked')
+        self.assertEqual(len(llamadas), 2)
+
+
+class AsignacionTests(TestCase):
+    """ Asignación automática de camiones (api/asignacion.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def _camion(self, matricula, capacidad):
+        user = User.objects.create_user(f'conductor_{matricula}', f'{matricula}@acmetrans.cl', 'pass123')
+        conductor = Empleado.objects.create(user=user, cargo='CON', sucursal=self.sucursal)
+        return Camion.objects.create(matricula=matricula, capacidad=capacidad, sucursal_base=self.sucursal,
+                                     conductor_asignado=conductor)
+
+    def _pedido(self, peso_kg, fecha_deseada=date(2030, 1, 1)):
+        return Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.sucursal, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=peso_kg, volumen_m3=10, fecha_deseada=fecha_deseada,
+            estado='CONFIRMADO',
+        )
+
+    def test_grandes_primero_y_por_fecha(self):
+        mediano = self._camion('MC0001', 'MC')
+        grande = self._camion('GC0001', 'GC')
+        chico_urgente = self._pedido(1000, date(2030, 1, 1))
+        pesado = self._pedido(20000, date(2030, 1, 5))
+        chico_tarde = self._pedido(1000, date(2030, 1, 9))
+        imposible = self._pedido(50000)
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/admin/sucursales/{self.sucursal.pk}/asignar-camiones/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['asignados'], [
+            {'pedido': pesado.pk, 'camion': grande.pk},
+            {'pedido': chico_urgente.pk, 'camion': mediano.pk},
+        ])
+        self.assertEqual(response.data['sin_camion'], [chico_tarde.pk])
+        self.assertEqual(response.data['sin_capacidad'], [imposible.pk])
+
+        # Solo se reservan los viajes: la flota sigue 'Disponible' hasta que salga
+        self.assertEqual(sorted(Reserva.objects.filter(camion__isnull=False).values_list('camion', flat=True)),
+                         [mediano.pk, grande.pk])
+        self.assertEqual(set(Camion.objects.values_list('estado', flat=True)), {'DIS'})
+        self.assertEqual(set(Empleado.objects.values_list('estado', flat=True)), {'DIS'})
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_simular_no_guarda(self):
+        self._camion('MC0001', 'MC')
+        pedido = self._pedido(1000)
+        resultado = asignacion.asignar(self.sucursal.pk, simular=True)
+        self.assertEqual(len(resultado['asignados']), 1)
+        pedido.refresh_from_db()
+        self.assertIsNone(pedido.camion_asignado_id)
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_en_ruta_hoy_se_asigna_otro_dia(self):
+        camion = self._camion('MC0001', 'MC')
+        hoy = timezone.localdate()
+        Camion.objects.filter(pk=camion.pk).update(estado='RUT')
+        de_hoy = self._pedido(1000, hoy)
+        proximo = self._pedido(1000, hoy + timedelta(days=7))
+
+        resultado = asignacion.asignar(self.sucursal.pk)
+        self.assertEqual(resultado['asignados'], [(proximo.pk, camion.pk)])
+        self.assertEqual(resultado['sin_camion'], [de_hoy.pk])
+
+    def test_estado_cambia_al_salir_y_al_volver(self):
+        camion = self._camion('MC0001', 'MC')
+        pedidos = [self._pedido(1000), self._pedido(1000)]
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        def cambiar(pedido, estado):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.patch(f'/api/admin/pedidos/{pedido.pk}/',
+                                        {'estado': estado, 'camion_asignado': camion.pk}, format='json')
+            self.assertEqual(response.status_code, 200)
+            camion.refresh_from_db()
+            return camion.estado, Empleado.objects.get(pk=camion.conductor_asignado_id).estado
+
+        self.assertEqual(cambiar(pedidos[0], 'EN_RUTA'), ('RUT', 'RUT'))
+        self.assertEqual(cambiar(pedidos[1], 'EN_RUTA'), ('RUT', 'RUT'))
+        # Vuelve recién cuando no le queda ningún pedido en ruta
+        self.assertEqual(cambiar(pedidos[0], 'COMPLETADO'), ('RUT', 'RUT'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch('/api/admin/pedidos/bulk/', [{'id': pedidos[1].pk, 'estado': 'COMPLETADO'}],
+                                    format='json')
+        self.assertEqual(response.data['actualizados'], 1)
+        camion.refresh_from_db()
+        self.assertEqual(camion.estado, 'DIS')
+        self.assertEqual(contadores.diferencias(), {})
+
+
+class ConsolidacionTests(TestCase):
+    """ Consolidación de cargas (api/consolidacion.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def _camion(self, matricula, capacidad):
+        user = User.objects.create_user(f'conductor_{matricula}', f'{matricula}@acmetrans.cl', 'pass123')
+        conductor = Empleado.objects.create(user=user, cargo='CON', sucursal=self.sucursal)
+        return Camion.objects.create(matricula=matricula, capacidad=capacidad, sucursal_base=self.sucursal,
+                                     conductor_asignado=conductor)
+
+    def _pedido(self, peso_kg, volumen_m3=10, destino="Calle 1, Temuco", fecha_deseada=date(2030, 1, 1)):
+        return Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.sucursal, destino=destino, tipo_carga="Retail",
+            peso_kg=peso_kg, volumen_m3=volumen_m3, fecha_deseada=fecha_deseada, estado='CONFIRMADO',
+        )
+
+    def test_planificar(self):
+        # Temuco el 1/1: 20 t + 8 t llenan un GC; 6 t + 5 t caben en un MC
+        temuco = [self._pedido(20000), self._pedido(6000), self._pedido(8000), self._pedido(5000)]
+        otro_dia = self._pedido(1000, fecha_deseada=date(2030, 1, 2))
+        # Por volumen: 3 x 40 m³ no caben en un GC (95 m³)
+        voluminosos = [self._pedido(500, 40, "Calle 2, Talca") for _ in range(3)]
+        sin_ciudad = [self._pedido(100, 1, "Parcela 7"), self._pedido(100, 1, "Parcela 8")]
+        imposible = self._pedido(50000)
+
+        cargas, sin_capacidad = consolidacion.planificar(asignacion.pedidos_pendientes(self.sucursal.pk))
+        resumen = sorted((c.fecha_deseada, c.ciudad_destino or '', c.capacidad, [p.id for p in c.pedidos])
+                         for c in cargas)
+        self.assertEqual(resumen, sorted([
+            (date(2030, 1, 1), 'temuco', 'GC', [temuco[0].pk, temuco[2].pk]),
+            (date(2030, 1, 1), 'temuco', 'MC', [temuco[1].pk, temuco[3].pk]),
+            (date(2030, 1, 1), 'talca', 'GC', [voluminosos[0].pk, voluminosos[1].pk]),
+            (date(2030, 1, 1), 'talca', 'MC', [voluminosos[2].pk]),
+            (date(2030, 1, 1), '', 'MC', [sin_ciudad[0].pk]),
+            (date(2030, 1, 1), '', 'MC', [sin_ciudad[1].pk]),
+            (date(2030, 1, 2), 'temuco', 'MC', [otro_dia.pk]),
+        ]))
+        self.assertEqual(sin_capacidad, [imposible])
+
+        gc = next(c for c in cargas if c.pedidos[0] == temuco[0])
+        self.assertEqual((gc.peso_kg, consolidacion.describir(gc)['llenado_peso']), (Decimal('28000.00'), 1.0))
+
+    def test_endpoint_asigna_un_camion_por_carga(self):
+        grande = self._camion('GC0001', 'GC')
+        self._camion('MC0001', 'MC')
+        pedidos = [self._pedido(9000) for _ in range(3)]
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = f'/api/admin/sucursales/{self.sucursal.pk}/consolidar/'
+
+        response = client.post(url, {'simular': True}, format='json')
+        self.assertEqual((response.status_code, response.data['camiones_ahorrados']), (200, 2))
+        self.assertFalse(Pedido.objects.filter(camion_asignado__isnull=False).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(url, {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        carga, = response.data['cargas']
+        self.assertEqual((carga['camion'], carga['capacidad'], carga['peso_kg']), (grande.pk, 'GC', '27000.00'))
+        self.assertEqual(set(Pedido.objects.values_list('camion_asignado', flat=True)), {grande.pk})
+        self.assertEqual(sorted(carga['pedidos']), [p.pk for p in pedidos])
+        viaje = Reserva.objects.get(camion=grande)
+        self.assertEqual((viaje.tipo, viaje.inicio), ('VIA', date(2030, 1, 1)))
+        self.assertFalse(Reserva.objects.filter(camion__matricula='MC0001').exists())
+        self.assertEqual(contadores.diferencias(), {})
+
+
+class RutasTests(TestCase):
+    """ Orden de paradas de un camión (api/rutas.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+        cls.camion = Camion.objects.create(matricula="AB1234", capacidad='GC', sucursal_base=cls.sucursal)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def _pedido(self, destino, fecha_deseada=date(2030, 1, 1)):
+        return Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.sucursal, destino=destino, tipo_carga="Retail",
+            peso_kg=1000, volumen_m3=10, fecha_deseada=fecha_deseada, estado='CONFIRMADO',
+            camion_asignado=self.camion,
+        )
+
+    def test_secuenciar_mejora_el_vecino_mas_cercano(self):
+        # Puntos sobre una recta: la mejor ruta cerrada va al extremo y vuelve (2 x 10 km)
+        puntos = [0, 4, 6, 3, 10, 5, 2, 9, 1]
+        d = [[abs(a - b) for b in puntos] for a in puntos]
+        ruta, km, _ = rutas.secuenciar(d, presupuesto_ms=1000)
+        self.assertEqual(km, 20)
+        self.assertEqual(sorted(ruta), list(range(len(puntos))))
+        # Sin presupuesto queda la construcción inicial
+        self.assertEqual(rutas.secuenciar(d, presupuesto_ms=0)[0], rutas._vecino_mas_cercano(d))
+
+    def test_endpoint_y_cache(self):
+        temuco = [self._pedido("Calle 1, Temuco"), self._pedido("Calle 2, Temuco")]
+        concepcion = self._pedido("Calle 3, Concepción")
+        montt = self._pedido("Calle 4, Puerto Montt")
+        self._pedido("Calle 5, Valdivia", fecha_deseada=date(2030, 1, 2))  # Otro día
+        sin_ciudad = self._pedido("Parcela 7")
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = f'/api/admin/camiones/{self.camion.pk}/ruta/'
+        response = client.get(url, {'fecha': '2030-01-01'})
+        self.assertEqual(response.status_code, 200)
+        paradas = response.data['paradas']
+        self.assertEqual([p['ciudad'] for p in paradas], ['puerto-montt', 'temuco', 'concepcion'])
+        self.assertEqual(paradas[1]['pedidos'], [p.pk for p in temuco])
+        self.assertEqual(paradas[0]['pedidos'], [montt.pk])
+        self.assertEqual(response.data['sin_ciudad'], [sin_ciudad.pk])
+        self.assertEqual(response.data['km_total'], round(paradas[-1]['km_acumulado'] + response.data['km_regreso'], 1))
+        self.assertFalse(response.data['cacheada'])
+
+        # Camión + pedidos del día: la ruta sale de la cache
+        with self.assertNumQueries(2):
+            self.assertTrue(client.get(url, {'fecha': '2030-01-01'}).data['cacheada'])
+
+        # Cambian los pedidos del camión: se recalcula
+        concepcion.camion_asignado = None
+        concepcion.save()
+        response = client.get(url, {'fecha': '2030-01-01'})
+        self.assertFalse(response.data['cacheada'])
+        self.assertEqual([p['ciudad'] for p in response.data['paradas']], ['puerto-montt', 'temuco'])
+
+        # Otro presupuesto u otra tabla de km: no sirve la guardada
+        self.assertTrue(client.get(url, {'fecha': '2030-01-01'}).data['cacheada'])
+        self.assertFalse(client.get(url, {'fecha': '2030-01-01', 'presupuesto_ms': '7'}).data['cacheada'])
+        self.assertTrue(client.get(url, {'fecha': '2030-01-01', 'presupuesto_ms': '7'}).data['cacheada'])
+        tarifas = {**settings.ACME_TARIFAS, 'distancias_km': {'Osorno': {'Temuco': 1}}}
+        with self.settings(ACME_TARIFAS=tarifas):
+            self.assertFalse(client.get(url, {'fecha': '2030-01-01', 'presupuesto_ms': '7'}).data['cacheada'])
+
+        self.assertEqual(client.get(url, {'fecha': '2030-13-01'}).status_code, 400)
+        self.assertEqual(client.get(url, {'presupuesto_ms': '-1'}).status_code, 400)
+
+
+class ReservasTests(TestCase):
+    """ Calendario de reservas de camiones y conductores (api/reservas.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _camion(self, matricula, capacidad='MC'):
+        user = User.objects.create_user(f'conductor_{matricula}', f'{matricula}@acmetrans.cl', 'pass123')
+        conductor = Empleado.objects.create(user=user, cargo='CON', sucursal=self.sucursal)
+        return Camion.objects.create(matricula=matricula, capacidad=capacidad, sucursal_base=self.sucursal,
+                                     conductor_asignado=conductor)
+
+    def _reservar(self, inicio, fin, **recurso):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/admin/reservas/', {'tipo': 'MAN', 'inicio': inicio, 'fin': fin, **recurso},
+                                    format='json')
+
+    def test_calendario(self):
+        d = date(2030, 1, 1)
+        filas = [(1, None, d, d + timedelta(days=2)), (None, 7, d + timedelta(days=1), d + timedelta(days=3)),
+                 (1, None, d + timedelta(days=5), d + timedelta(days=6))]
+        calendario = reservas.Calendario(d, filas)
+        camion = (reservas.CAMION, 1)
+        casos = {(0, 1): True, (2, 5): False, (1, 3): True, (4, 6): True, (6, 9): False, (-3, 0): False}
+        for (a, b), esperado in casos.items():
+            self.assertEqual(calendario.ocupado(camion, d + timedelta(days=a), d + timedelta(days=b)), esperado, (a, b))
+        self.assertTrue(calendario.ocupado((reservas.EMPLEADO, 7), d, d + timedelta(days=2)))
+        self.assertFalse(calendario.ocupado((reservas.CAMION, 7), d, d + timedelta(days=2)))
+
+    def test_pasado_se_consulta_en_la_tabla(self):
+        camion = self._camion('AB1234')
+        hoy = timezone.localdate()
+        Reserva.objects.create(camion=camion, tipo='REP', inicio=hoy - timedelta(days=10), fin=hoy - timedelta(days=8))
+        # El calendario en memoria solo tiene lo vigente
+        self.assertFalse(reservas.calendario().ocupado((reservas.CAMION, camion.pk), hoy - timedelta(days=9), hoy))
+        self.assertTrue(reservas.ocupado((reservas.CAMION, camion.pk), hoy - timedelta(days=9), hoy))
+        self.assertFalse(reservas.ocupado((reservas.CAMION, camion.pk), hoy - timedelta(days=8), hoy))
+
+    def test_api_rechaza_cruces(self):
+        camion = self._camion('AB1234')
+        creada = self._reservar('2030-01-10', '2030-01-13', camion=camion.pk)
+        self.assertEqual(creada.status_code, 201)
+        # fin no está incluido: la siguiente puede empezar ese día
+        self.assertEqual(self._reservar('2030-01-13', '2030-01-14', camion=camion.pk).status_code, 201)
+        self.assertEqual(self._reservar('2030-01-12', '2030-01-20', camion=camion.pk).status_code, 400)
+        self.assertEqual(self._reservar('2030-01-05', '2030-01-05', camion=camion.pk).status_code, 400)
+        self.assertEqual(self._reservar('2030-01-01', '2030-01-02', camion=camion.pk,
+                                        empleado=camion.conductor_asignado_id).status_code, 400)
+        # El conductor tiene su propio calendario
+        self.assertEqual(self._reservar('2030-01-10', '2030-01-13',
+                                        empleado=camion.conductor_asignado_id).status_code, 201)
+
+        url = f"/api/admin/reservas/{creada.data['id']}/"
+        self.assertEqual(self.client.patch(url, {'fin': '2030-01-14'}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(url, {'fin': '2030-01-12'}, format='json').status_code, 200)
+
+        response = self.client.get('/api/admin/reservas/', {'camion': camion.pk, 'desde': '2030-01-13',
+                                                            'hasta': '2030-01-31'})
+        self.assertEqual([r['inicio'] for r in response.data], ['2030-01-13'])
+        self.assertEqual(self.client.get('/api/admin/reservas/', {'desde': '2030-02-30'}).status_code, 400)
+
+    def test_dropdown_solo_libres(self):
+        mantencion = self._camion('AB1234')
+        vacaciones = self._camion('CD5678')
+        libre = self._camion('EF9012')
+        self._reservar('2030-01-10', '2030-01-12', camion=mantencion.pk)
+        self._reservar('2030-01-11', '2030-01-20', empleado=vacaciones.conductor_asignado_id)
+
+        def ids(**params):
+            response = self.client.get('/api/data/camiones/', {'sucursal_id': self.sucursal.pk, **params})
+            return sorted(camion['id'] for camion in response.data)
+
+        self.assertEqual(ids(), [mantencion.pk, vacaciones.pk, libre.pk])
+        self.assertEqual(ids(libre_desde='2030-01-10'), [vacaciones.pk, libre.pk])
+        self.assertEqual(ids(libre_desde='2030-01-11', libre_hasta='2030-01-11'), [libre.pk])
+        self.assertEqual(ids(libre_desde='2030-01-12', libre_hasta='2030-01-12'), [mantencion.pk, libre.pk])
+        self.assertEqual(self.client.get('/api/data/camiones/', {'libre_desde': 'mañana'}).status_code, 400)
+
+    def test_asignar_respeta_y_reserva(self):
+        reservado = self._camion('AB1234')
+        libre = self._camion('CD5678')
+        self._reservar('2030-01-01', '2030-01-02', camion=reservado.pk)
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.sucursal, destino="Calle 1, Temuco", tipo_carga="Retail",
+            peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1), estado='CONFIRMADO',
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = asignacion.asignar(self.sucursal.pk)
+        self.assertEqual(resultado['asignados'], [(pedido.pk, libre.pk)])
+        viajes = Reserva.objects.filter(tipo='VIA').order_by('id').values_list('camion', 'empleado', 'inicio', 'fin')
+        self.assertEqual(list(viajes), [(libre.pk, None, date(2030, 1, 1), date(2030, 1, 2)),
+                                        (None, libre.conductor_asignado_id, date(2030, 1, 1), date(2030, 1, 2))])
+        self.assertFalse(reservas.camion_libre(libre.pk, None, date(2030, 1, 1), date(2030, 1, 2)))
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_asignacion_manual_mueve_el_viaje(self):
+        primero, segundo, ocupado = self._camion('AB1234'), self._camion('CD5678'), self._camion('EF9012')
+        self._reservar('2030-01-01', '2030-01-02', camion=ocupado.pk)
+        pedidos = [
+            Pedido.objects.create(
+                cliente=self.cliente, sucursal_origen=self.sucursal, destino=f"Calle {i}, Temuco",
+                tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1), estado='CONFIRMADO',
+            )
+            for i in range(2)
+        ]
+
+        def viajes():
+            return sorted(Reserva.objects.filter(tipo='VIA').values_list('camion', 'empleado'),
+                          key=lambda fila: (fila[0] or 0, fila[1] or 0))
+
+        def patch(pedido, **datos):
+            with self.captureOnCommitCallbacks(execute=True):
+                return self.client.patch(f'/api/admin/pedidos/{pedido.pk}/', datos, format='json')
+
+        self.assertEqual(patch(pedidos[0], camion_asignado=primero.pk).status_code, 200)
+        self.assertEqual(viajes(), [(None, primero.conductor_asignado_id), (primero.pk, None)])
+        # Otro pedido en el mismo camión y día comparte el viaje
+        self.assertEqual(patch(pedidos[1], camion_asignado=primero.pk).status_code, 200)
+        self.assertEqual(len(viajes()), 2)
+        self.assertEqual(patch(pedidos[1], camion_asignado=ocupado.pk).status_code, 400)
+
+        # El viaje se libera cuando ya no lo usa ningún pedido
+        self.assertEqual(patch(pedidos[0], camion_asignado=segundo.pk).status_code, 200)
+        self.assertEqual(len(viajes()), 4)
+        self.assertEqual(patch(pedidos[1], estado='CANCELADO').status_code, 200)
+        self.assertEqual(viajes(), [(None, segundo.conductor_asignado_id), (segundo.pk, None)])
+
+        # El PATCH masivo también
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/admin/pedidos/bulk/', [{'id': pedidos[0].pk, 'camion_asignado': None}],
+                                         format='json')
+        self.assertEqual(response.data['actualizados'], 1)
+        self.assertEqual(viajes(), [])
+        self.assertTrue(reservas.camion_libre(segundo.pk, segundo.conductor_asignado_id,
+                                              date(2030, 1, 1), date(2030, 1, 2)))
+
+
+class CotizacionTests(TestCase):
+    """ Cotización por lote (api/cotizacion.py) """
+
+    TARIFAS = {
+        'base': 100000, 'por_km': 1000, 'por_ton_km': 100, 'kg_por_m3': 250, 'margen': 0.5,
+        'redondeo_precio': 1000, 'factor_carga': {'Alimentos Perecibles': 2.0},
+        'km_por_defecto': 500, 'distancias_km': {'Osorno': {'Temuco': 250}},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def test_calcular(self):
+        costos, precios = cotizacion.calcular(
+            pesos=[Decimal('10000'), Decimal('1000')], volumenes=[Decimal('10'), Decimal('20')],
+            tipos_carga=['Retail', 'Alimentos Perecibles'], km=[250, 500], tarifas=self.TARIFAS,
+        )
+        # 100000 + 250 * 1000 + 10 t * 250 km * 100
+        self.assertEqual(costos[0], Decimal(600000))
+        # (100000 + 500 * 1000 + 5 t volumétricas * 500 km * 100) * 2
+        self.assertEqual(costos[1], Decimal(1700000))
+        self.assertEqual(precios, [Decimal(900000), Decimal(2550000)])
+
+    def test_distancias(self):
+        with self.settings(ACME_TARIFAS=self.TARIFAS):
+            km = cotizacion.distancias(self.sucursal.pk, ['temuco', None, 'temuco'])
+        self.assertEqual(km, [250, 500, 250])
+
+    def test_endpoint_cotiza_el_lote(self):
+        pedidos = [
+            Pedido.objects.create(
+                cliente=self.cliente, sucursal_origen=self.sucursal, destino=f"Calle {i}, Temuco",
+                tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+            )
+            for i in range(3)
+        ]
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.settings(ACME_TARIFAS=self.TARIFAS):
+            response = client.post(f'/api/admin/sucursales/{self.sucursal.pk}/cotizar/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cotizados'], 3)
+
+        pedidos[0].refresh_from_db()
+        self.assertEqual(pedidos[0].estado, 'COTIZADO')
+        self.assertEqual(pedidos[0].costo_estimado, Decimal(412500))  # 2,5 t volumétricas
+        self.assertEqual(contadores.por_sucursal(self.sucursal.pk)['PED'], {'COTIZADO': 3})
+        self.assertEqual(contadores.diferencias(), {})
+
+
+class PedidoBulkUpdateTests(TestCase):
+    """ PATCH masivo de pedidos (admin/pedidos/bulk/) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+        cls.camion = Camion.objects.create(matricula="AB1234", capacidad='GC', sucursal_base=cls.sucursal)
+        cls.pedidos = [
+            Pedido.objects.create(
+                cliente=cls.cliente, sucursal_origen=cls.sucursal, destino=f"Calle {i}, Temuco",
+                tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+            )
+            for i in range(40)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _patch(self, items):
+        return self.client.patch('/api/admin/pedidos/bulk/', items, format='json')
+
+    def _lote(self, pedidos):
+        return [{'id': p.pk, 'estado': 'CONFIRMADO', 'precio_cotizado': '150000.00',
+                 'camion_asignado': self.camion.pk} for p in pedidos]
+
+    def test_consultas_constantes(self):
+        # El primer lote crea la fila del contador CONFIRMADO y reserva el viaje
+        # del camión (el calendario en memoria se rearma una vez): consultas extra
+        self.assertEqual(self._patch(self._lote(self.pedidos[:5])).status_code, 200)
+        reservas.calendario()
+        with CaptureQueriesContext(connection) as chico:
+            self.assertEqual(self._patch(self._lote(self.pedidos[5:10])).status_code, 200)
+        with CaptureQueriesContext(connection) as grande:
+            self.assertEqual(self._patch(self._lote(self.pedidos[10:])).status_code, 200)
+        self.assertEqual(len(chico), len(grande))
+
+        pedido = Pedido.objects.get(pk=self.pedidos[-1].pk)
+        self.assertEqual((pedido.estado, pedido.precio_cotizado, pedido.camion_asignado_id),
+                         ('CONFIRMADO', Decimal('150000.00'), self.camion.pk))
+        self.assertEqual(contadores.por_sucursal(self.sucursal.pk)['PED'], {'CONFIRMADO': 40})
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_resultados_por_item(self):
+        response = self._patch([
+            {'id': self.pedidos[0].pk, 'estado': 'CANCELADO'},
+            {'id': self.pedidos[1].pk, 'estado': 'PERDIDO'},
+            {'id': self.pedidos[2].pk, 'camion_asignado': 999999},
+            {'id': 999999, 'estado': 'CANCELADO'},
+            {'id': self.pedidos[0].pk, 'estado': 'COTIZADO'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['ok'] for r in response.data['resultados']], [True, False, False, False, False])
+        self.assertIn('estado', response.data['resultados'][1]['errores'])
+        self.assertIn('camion_asignado', response.data['resultados'][2]['errores'])
+        self.assertEqual(Pedido.objects.get(pk=self.pedidos[0].pk).estado, 'CANCELADO')
+        self.assertEqual(Pedido.objects.filter(estado='SOLICITADO').count(), 39)
+
+    def test_camion_ocupado_no_se_asigna(self):
+        Reserva.objects.create(camion=self.camion, tipo='MAN', inicio=date(2030, 1, 1), fin=date(2030, 1, 3))
+        ruta = f'/api/admin/camiones/{self.camion.pk}/ruta/'
+        self.assertEqual(self.client.get(ruta, {'fecha': '2030-01-05'}).data['paradas'], [])
+        response = self._patch([
+            {'id': self.pedidos[0].pk, 'camion_asignado': self.camion.pk},
+            {'id': self.pedidos[1].pk, 'precio_cotizado': '150000.00'},
+        ])
+        self.assertEqual([r['ok'] for r in response.data['resultados']], [False, True])
+        self.assertIn('camion_asignado', response.data['resultados'][0]['errores'])
+        self.assertFalse(Pedido.objects.filter(camion_asignado__isnull=False).exists())
+
+        # Libre otro día: se asigna, se reserva el viaje y la ruta de ese día se recalcula
+        Pedido.objects.filter(pk=self.pedidos[0].pk).update(fecha_deseada=date(2030, 1, 5))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._patch([{'id': self.pedidos[0].pk, 'estado': 'CONFIRMADO',
+                                     'camion_asignado': self.camion.pk}])
+        self.assertTrue(response.data['resultados'][0]['ok'])
+        self.assertTrue(Reserva.objects.filter(camion=self.camion, tipo='VIA', inicio=date(2030, 1, 5)).exists())
+        response = self.client.get(ruta, {'fecha': '2030-01-05'})
+        self.assertEqual((response.data['cacheada'], len(response.data['paradas'])), (False, 1))
+
+
+class ListadosTests(TestCase):
+    """ Los listados rápidos (.values()) devuelven lo mismo que los ModelSerializer """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        cliente = Cliente.objects.create(user=User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123'))
+        user = User.objects.create_user('conductor', 'c@acmetrans.cl', 'pass123', first_name='Ana', last_name='Soto')
+        conductor = Empleado.objects.create(user=user, cargo='CON', sucursal=cls.sucursal)
+        con_conductor = Camion.objects.create(matricula="AB1234", capacidad="GC", sucursal_base=cls.sucursal,
+                                              conductor_asignado=conductor)
+        sin_conductor = Camion.objects.create(matricula="CD5678", capacidad="MC", estado='MAN',
+                                              sucursal_base=cls.sucursal)
+        for i, camion in enumerate([con_conductor, sin_conductor, None]):
+            Pedido.objects.create(
+                cliente=cliente, sucursal_origen=cls.sucursal, destino=f"Calle {i}, Temuco", tipo_carga="Retail",
+                peso_kg=Decimal('1500.5'), volumen_m3=12, fecha_deseada=date(2030, 1, 1),
+                costo_estimado=Decimal('1000') if camion else None, camion_asignado=camion,
+                estado='CONFIRMADO' if camion else 'SOLICITADO',
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_misma_respuesta_que_los_model_serializers(self):
+        casos = [
+            ('/api/admin/camiones/', CamionReadSerializer, Camion.objects.order_by('sucursal_base')),
+            ('/api/admin/empleados/', EmpleadoReadSerializer, Empleado.objects.all()),
+            ('/api/admin/pedidos/', PedidoAdminSerializer, Pedido.objects.order_by('-fecha_solicitud', '-id')),
+        ]
+        for url, serializer, queryset in casos:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                filas = response.data['results'] if 'results' in response.data else response.data
+                self.assertEqual(json.dumps(filas), json.dumps(serializer(queryset, many=True).data))
+
+    def test_una_consulta_y_cursor_con_filas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/admin/pedidos/?page_size=2')
+        self.assertEqual(len([q for q in consultas if q['sql'].startswith('SELECT')]), 1)
+        self.assertIsNotNone(response.data['next'])
+        siguiente = self.client.get(response.data['next'])
+        self.assertEqual(len(siguiente.data['results']), 1)
+
+
+class EventosTests(TestCase):
+    """ Streams SSE por sucursal y por cliente (api/eventos.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        cls.cliente = Cliente.objects.create(user=User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123'))
+        cls.pedido = Pedido.objects.create(
+            cliente=cls.cliente, sucursal_origen=cls.sucursal, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=1000, volumen_m3=5, fecha_deseada=date(2030, 1, 1),
+        )
+        cls.token_admin = str(MyTokenObtainPairSerializer.get_token(admin).access_token)
+        cls.token_cliente = str(MyTokenObtainPairSerializer.get_token(cls.cliente.user).access_token)
+        cls.url = f'/api/admin/sucursales/{cls.sucursal.pk}/eventos/'
+
+    def setUp(self):
+        eventos.backend.cache_clear()
+
+    async def _abrir(self, url, token, **headers):
+        response = await AsyncClient().get(url, headers={'Authorization': f'Bearer {token}', **headers})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        contenido = aiter(response.streaming_content)
+        self.assertEqual(await anext(contenido), b'retry: 3000\n\n')
+        return contenido
+
+    async def _evento(self, contenido):
+        bloque = (await asyncio.wait_for(anext(contenido), 1)).decode()
+        campos = dict(linea.split(': ', 1) for linea in bloque.strip().split('\n'))
+        return campos['id'], campos.get('event', 'message'), json.loads(campos['data'])
+
+    def _guardar(self, estado):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.estado = estado
+            self.pedido.save()
+
+    def _cotizar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cotizacion.cotizar(self.sucursal.pk)
+
+    async def test_sucursal_y_cliente_reciben_cambios(self):
+        sucursal = await self._abrir(self.url, self.token_admin)
+        cliente = await self._abrir('/api/mis-pedidos/eventos/', self.token_cliente)
+        await sync_to_async(self._cotizar)()
+
+        for contenido in (sucursal, cliente):
+            _, _, evento = await self._evento(contenido)
+            self.assertEqual((evento['entidad'], evento['id'], evento['datos']['estado']),
+                             ('pedido', self.pedido.pk, 'COTIZADO'))
+            self.assertIsNotNone(evento['datos']['precio_cotizado'])
+            await contenido.aclose()
+
+    async def test_reanuda_con_last_event_id(self):
+        contenido = await self._abrir(self.url, self.token_admin)
+        await sync_to_async(self._guardar)('CONFIRMADO')
+        ultimo, _, _ = await self._evento(contenido)
+        await contenido.aclose()
+
+        # Lo publicado mientras estaba desconectado llega al reconectar
+        await sync_to_async(self._guardar)('CANCELADO')
+        contenido = await self._abrir(self.url, self.token_admin, **{'Last-Event-ID': ultimo})
+        _, _, evento = await self._evento(contenido)
+        self.assertEqual(evento['datos']['estado'], 'CANCELADO')
+        await contenido.aclose()
+
+        # Un id desconocido (ej: de antes de reiniciar el servidor) pide recargar
+        contenido = await self._abrir(self.url, self.token_admin, **{'Last-Event-ID': 'otra-1'})
+        self.assertEqual((await self._evento(contenido))[1], 'reset')
+        await contenido.aclose()
+
+    async def test_permisos(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get(self.url)).status_code, 401)
+        response = await client.get(self.url, headers={'Authorization': f'Bearer {self.token_cliente}'})
+        self.assertEqual(response.status_code, 403)
+        response = await client.get('/api/mis-pedidos/eventos/', headers={'Authorization': f'Bearer {self.token_admin}'})
+        self.assertEqual(response.status_code, 403)
+
+    async def test_ticket_de_un_solo_uso(self):
+        client = AsyncClient()
+        self.assertEqual((await client.post('/api/eventos/ticket/')).status_code, 401)
+        response = await client.post('/api/eventos/ticket/', headers={'Authorization': f'Bearer {self.token_admin}'})
+        ticket = response.json()['ticket']
+
+        response = await client.get(self.url, {'ticket': ticket})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        await aiter(response.streaming_content).aclose()
+        # Reusado, adulterado, o el token de acceso en la URL: no
+        self.assertEqual((await client.get(self.url, {'ticket': ticket})).status_code, 401)
+        self.assertEqual((await client.get(self.url, {'ticket': ticket[:-1]})).status_code, 401)
+        self.assertEqual((await client.get(self.url, {'token': self.token_admin})).status_code, 401)
+
+    async def test_ticket_vencido(self):
+        response = await AsyncClient().post('/api/eventos/ticket/', headers={'Authorization': f'Bearer {self.token_cliente}'})
+        ticket = response.json()['ticket']
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 31):
+            response = await AsyncClient().get('/api/mis-pedidos/eventos/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(ACME_EVENTOS_BACKEND='api.eventos.BaseDatosBackend', ACME_EVENTOS_SONDEO=0.01)
+class EventosBaseDatosTests(EventosTests):
+    """ Los mismos streams con el backend entre procesos (tabla api_eventopublicado) """
+
+    async def test_eventos_de_otro_proceso(self):
+        contenido = await self._abrir(self.url, self.token_admin)
+        # Otro worker (otra instancia del backend) publica
+        otro = eventos.BaseDatosBackend()
+        await sync_to_async(otro.publicar)([eventos.evento('camion', 'actualizado', 7, self.sucursal.pk, {'estado': 'MAN'})])
+        id, _, evento = await self._evento(contenido)
+        self.assertTrue(id.startswith('bd-'))
+        self.assertEqual((evento['entidad'], evento['id'], evento['datos']), ('camion', 7, {'estado': 'MAN'}))
+        await contenido.aclose()
+
+    def test_historial_acotado(self):
+        backend = eventos.BaseDatosBackend(historial=50)
+        backend.publicar([eventos.evento('camion', 'actualizado', i, self.sucursal.pk, {}) for i in range(120)])
+        self.assertLessEqual(EventoPublicado.objects.count(), 70)
+
+
+class ExportacionTests(TestCase):
+    """ Exportaciones en streaming (api/exports.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.osorno = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.santiago = Sucursal.objects.create(nombre="Santiago", direccion="Av. 2", ciudad="Santiago")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cliente = Cliente.objects.create(user=user_cliente, nombre_empresa="Empresa XYZ")
+        for sucursal, estado in [(cls.osorno, 'COMPLETADO'), (cls.osorno, 'CANCELADO'), (cls.santiago, 'COMPLETADO')]:
+            Pedido.objects.create(
+                cliente=cliente, sucursal_origen=sucursal, destino="Calle 1, Temuco", tipo_carga="Retail",
+                peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1), estado=estado,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _contenido(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_con_filtros(self):
+        contenido = self._contenido(f'/api/admin/exportar/pedidos/?sucursal_id={self.osorno.pk}&estado=COMPLETADO')
+        filas = list(csv.reader(io.StringIO(contenido)))
+        self.assertEqual(filas[0][:3], ['id', 'fecha_solicitud', 'estado'])
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][2:4], ['COMPLETADO', 'Osorno'])
+
+    def test_ndjson_y_rango_de_fechas(self):
+        hoy = timezone.localdate()
+        lineas = self._contenido(f'/api/admin/exportar/pedidos/?formato=ndjson&desde={hoy}&hasta={hoy}').splitlines()
+        self.assertEqual(len(lineas), 3)
+        self.assertEqual(json.loads(lineas[0])['empresa'], 'Empresa XYZ')
+        manana = hoy + timedelta(days=1)
+        self.assertEqual(self._contenido(f'/api/admin/exportar/pedidos/?formato=ndjson&desde={manana}'), '')
+        self.assertEqual(self.client.get('/api/admin/exportar/facturas/').status_code, 404)
+
+    async def test_asgi_envia_de_a_chunks(self):
+        token = await sync_to_async(lambda: str(MyTokenObtainPairSerializer.get_token(self.admin).access_token))()
+        with mock.patch('api.exports.CHUNK_SIZE', 1):
+            response = await AsyncClient().get('/api/admin/exportar/pedidos/?formato=ndjson',
+                                               headers={'Authorization': f'Bearer {token}'})
+            # Iterador async: Django no lo junta en una lista antes de enviarlo
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).decode('utf-8'), await sync_to_async(self._contenido)(
+            '/api/admin/exportar/pedidos/?formato=ndjson'))
+
+
+class ImportacionTests(TestCase):
+    """ Importación de CSV por lotes (api/imports.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        Camion.objects.create(matricula="AB1234", capacidad='GC', sucursal_base=cls.sucursal)
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def _subir(self, url, filas, user):
+        archivo = io.BytesIO('\n'.join(filas).encode('utf-8'))
+        archivo.name = 'datos.csv'
+        client = APIClient()
+        _autenticar(client, user)
+        return client.post(url, {'archivo': archivo}, format='multipart')
+
+    def test_camiones_con_errores_por_fila(self):
+        filas = ['matricula,capacidad,estado,sucursal_base,conductor_asignado',
+                 f'CD0001,MC,DIS,{self.sucursal.pk},',
+                 f'AB1234,GC,DIS,{self.sucursal.pk},',           # ya existe
+                 f'CD0002,XX,DIS,{self.sucursal.pk},',           # capacidad inválida
+                 f'CD0001,GC,,{self.sucursal.pk},',              # repetida en el archivo
+                 f'CD0003,GC,,{self.sucursal.pk},']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self._subir('/api/admin/importar/camiones/', filas, self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creados'], 2)
+        self.assertEqual([e['fila'] for e in response.data['errores']], [3, 4, 5])
+        self.assertEqual(Camion.objects.get(matricula='CD0003').estado, 'DIS')
+        self.assertEqual(contadores.diferencias(), {})
+
+    def test_pedidos_del_cliente_y_simulacion(self):
+        filas = ['sucursal_origen,destino,tipo_carga,peso_kg,volumen_m3,fecha_deseada',
+                 f'{self.sucursal.pk},"Calle 1, Temuco",Retail,1500.50,12,2030-01-01',
+                 f'{self.sucursal.pk},"Calle 2, Temuco",Retail,abc,12,2030-01-01']
+        response = self._subir('/api/mis-pedidos/importar/?simular=1', filas, self.cliente.user)
+        self.assertEqual((response.data['creados'], len(response.data['errores'])), (1, 1))
+        self.assertFalse(Pedido.objects.exists())
+
+        self._subir('/api/mis-pedidos/importar/', filas, self.cliente.user)
+        pedido = Pedido.objects.get()
+        self.assertEqual((pedido.cliente, pedido.estado, pedido.peso_kg), (self.cliente, 'SOLICITADO', Decimal('1500.50')))
+        self.assertEqual(pedido.ciudad_destino, 'temuco')
+
+        response = self._subir('/api/admin/importar/pedidos/', filas, self.admin)
+        self.assertEqual(response.status_code, 400)
+
+
+class TransicionesTests(TestCase):
+    """ Historial de estados de pedidos (api/transiciones.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def _pedido(self):
+        return Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.sucursal, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+        )
+
+    def _historial(self, pedido):
+        return list(TransicionPedido.objects.filter(pedido=pedido).order_by('id').values_list('desde', 'hacia', 'actor_id'))
+
+    def test_cambios_por_api_con_actor(self):
+        pedido = self._pedido()
+        client = APIClient()
+        _autenticar(client, self.admin)
+        client.patch(f'/api/admin/pedidos/{pedido.pk}/', {'estado': 'COTIZADO', 'precio_cotizado': '100000.00'},
+                     format='json')
+        client.patch('/api/admin/pedidos/bulk/', [{'id': pedido.pk, 'estado': 'CONFIRMADO'}], format='json')
+        # Un PATCH sin cambio de estado no agrega nada
+        client.patch(f'/api/admin/pedidos/{pedido.pk}/', {'precio_cotizado': '120000.00'}, format='json')
+        self.assertEqual(self._historial(pedido), [
+            (None, 'SOLICITADO', None),
+            ('SOLICITADO', 'COTIZADO', self.admin.pk),
+            ('COTIZADO', 'CONFIRMADO', self.admin.pk),
+        ])
+
+    def test_cotizacion_registra_el_lote(self):
+        pedidos = [self._pedido() for _ in range(3)]
+        with transiciones.actor(self.admin.pk):
+            cotizacion.cotizar(self.sucursal.pk)
+        self.assertEqual(TransicionPedido.objects.filter(hacia='COTIZADO', actor_id=self.admin.pk).count(), 3)
+        self.assertEqual(self._historial(pedidos[0])[-1], ('SOLICITADO', 'COTIZADO', self.admin.pk))
+
+    def test_solo_se_agregan_filas(self):
+        transicion = TransicionPedido.objects.get(pedido=self._pedido())
+        transicion.hacia = 'COMPLETADO'
+        with self.assertRaises(ValueError):
+            transicion.save()
+
+    def test_duraciones(self):
+        inicio = timezone.now().replace(microsecond=0) - timedelta(days=10)
+        for horas_cotizacion in (2, 4):
+            pedido = self._pedido()
+            TransicionPedido.objects.filter(pedido=pedido).update(fecha=inicio)
+            transiciones.registrar([(pedido.pk, 'SOLICITADO', 'COTIZADO')], fecha=inicio + timedelta(hours=horas_cotizacion))
+            transiciones.registrar([(pedido.pk, 'COTIZADO', 'CONFIRMADO')], fecha=inicio + timedelta(hours=10))
+        # Este pedido entró a SOLICITADO antes del rango: no cuenta
+        pedido = self._pedido()
+        TransicionPedido.objects.filter(pedido=pedido).update(fecha=inicio - timedelta(days=5))
+        transiciones.registrar([(pedido.pk, 'SOLICITADO', 'COTIZADO')], fecha=inicio + timedelta(hours=1))
+
+        etapas = transiciones.duraciones(inicio, inicio + timedelta(days=1), sucursal_id=self.sucursal.pk)
+        self.assertEqual(etapas, [
+            {'sucursal_id': self.sucursal.pk, 'etapa': 'COTIZADO', 'siguiente': 'CONFIRMADO', 'pedidos': 2,
+             'promedio_horas': 7.0, 'minimo_horas': 6.0, 'maximo_horas': 8.0},
+            {'sucursal_id': self.sucursal.pk, 'etapa': 'SOLICITADO', 'siguiente': 'COTIZADO', 'pedidos': 2,
+             'promedio_horas': 3.0, 'minimo_horas': 2.0, 'maximo_horas': 4.0},
+        ])
+        # Mismo resultado sin el SQL del motor
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            self.assertEqual(transiciones.duraciones(inicio, inicio + timedelta(days=1), sucursal_id=self.sucursal.pk),
+                             etapas)
+
+        client = APIClient()
+        _autenticar(client, self.admin)
+        dia = (inicio + timedelta(hours=12)).date()
+        response = client.get('/api/admin/pedidos/tiempos/', {'desde': dia - timedelta(days=1), 'hasta': dia})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['etapas']), 2)
+        self.assertEqual(client.get('/api/admin/pedidos/tiempos/', {'desde': 'ayer'}).status_code, 400)
+
+
+class ResumenesTests(TestCase):
+    """ Resúmenes diarios y serie de tiempo (api/resumenes.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sucursal = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+        cls.lunes = timezone.localdate() - timedelta(days=timezone.localdate().weekday() + 14)
+
+    def _pedido(self, dia, precio=None, costo=None):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.sucursal, destino="Calle 1, Temuco",
+            tipo_carga="Retail", peso_kg=2000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+            precio_cotizado=precio, costo_estimado=costo,
+        )
+        fecha = resumenes._inicio_del_dia(dia) + timedelta(hours=9)
+        Pedido.objects.filter(pk=pedido.pk).update(fecha_solicitud=fecha)
+        TransicionPedido.objects.filter(pedido=pedido).update(fecha=fecha)
+        return pedido
+
+    def _cerrar(self, pedido, estado, dia):
+        with transiciones.actor(None):
+            Pedido.objects.filter(pk=pedido.pk).update(estado=estado)
+            transiciones.registrar([(pedido.pk, 'SOLICITADO', estado)], fecha=resumenes._inicio_del_dia(dia) + timedelta(hours=15))
+
+    def _resumen(self, dia):
+        return ResumenDiario.objects.filter(dia=dia).values_list(
+            'pedidos_creados', 'pedidos_completados', 'pedidos_cancelados', 'ingresos', 'peso_kg').first()
+
+    def test_actualizacion_incremental(self):
+        martes = self.lunes + timedelta(days=1)
+        a = self._pedido(self.lunes, precio=100000, costo=70000)
+        b = self._pedido(self.lunes, precio=50000, costo=40000)
+        self._cerrar(a, 'COMPLETADO', martes)
+        resumenes.actualizar()
+        self.assertEqual(self._resumen(self.lunes), (2, 0, 0, Decimal('0'), Decimal('0')))
+        self.assertEqual(self._resumen(martes), (0, 1, 0, Decimal('100000'), Decimal('2000')))
+
+        # Solo se recalculan los días de los pedidos que cambiaron
+        self.assertEqual(resumenes.actualizar(), 0)
+        viejo = self._pedido(self.lunes - timedelta(days=60))
+        self._cerrar(b, 'CANCELADO', martes)
+        # Dos tramos (el día del pedido viejo y lunes-martes), no los 60 días entre ellos
+        self.assertEqual(resumenes.actualizar(), 2)
+        self.assertEqual(self._resumen(martes), (0, 1, 1, Decimal('100000'), Decimal('2000')))
+        self.assertEqual(self._resumen(self.lunes - timedelta(days=60))[0], 1)
+
+        # Un pedido que deja de estar completado descuenta su día de cierre
+        transiciones.registrar([(a.pk, 'COMPLETADO', 'EN_RUTA')])
+        resumenes.actualizar()
+        self.assertEqual(self._resumen(martes)[:2], (0, 0))
+        # --desde recalcula aunque el cambio no pase por el historial
+        viejo.delete()
+        self.assertEqual(resumenes.reconstruir(self.lunes - timedelta(days=60), self.lunes), 61)
+        self.assertIsNone(self._resumen(self.lunes - timedelta(days=60)))
+
+    def test_serie_por_semana(self):
+        for dias, precio in ((0, 100000), (2, 60000), (7, 40000)):
+            pedido = self._pedido(self.lunes + timedelta(days=dias), precio=precio, costo=precio // 2)
+            self._cerrar(pedido, 'COMPLETADO', self.lunes + timedelta(days=dias))
+        resumenes.actualizar()
+
+        client = APIClient()
+        _autenticar(client, self.admin)
+        response = client.get('/api/admin/analitica/pedidos/', {'granularidad': 'semana', 'desde': self.lunes})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(f['periodo'], f['pedidos_completados'], f['ingresos'], f['margen_pct'], f['toneladas'])
+                          for f in response.data['serie']], [
+            (self.lunes, 2, '160000.00', 50.0, 4.0),
+            (self.lunes + timedelta(days=7), 1, '40000.00', 50.0, 2.0),
+        ])
+        dias = client.get('/api/admin/analitica/pedidos/', {'desde': self.lunes}).data['serie']
+        self.assertEqual([f['periodo'] for f in dias], [self.lunes + timedelta(days=d) for d in (0, 2, 7)])
+        self.assertEqual(client.get('/api/admin/analitica/pedidos/', {'granularidad': 'hora'}).status_code, 400)
+
+
+class BusquedaTests(TestCase):
+    """ Índice FTS5 y búsqueda (api/busqueda.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.osorno = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.santiago = Sucursal.objects.create(nombre="Santiago", direccion="Av. 2", ciudad="Santiago")
+        cls.admin = User.objects.create_superuser('admin', 'admin@acmetrans.cl', 'pass123')
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente, nombre_empresa="Lácteos del Sur")
+        user_conductor = User.objects.create_user('jperez', 'j@acmetrans.cl', 'pass123',
+                                                  first_name='Juan', last_name='Pérez')
+        cls.conductor = Empleado.objects.create(user=user_conductor, cargo='CON', sucursal=cls.osorno)
+        cls.camion = Camion.objects.create(matricula="KXTR21", capacidad='GC', sucursal_base=cls.osorno,
+                                           conductor_asignado=cls.conductor)
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("El índice FTS5 es de SQLite.")
+
+    def _pedido(self, destino, sucursal, estado='SOLICITADO', **extra):
+        return Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=sucursal, destino=destino, tipo_carga="Retail",
+            peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1), estado=estado, **extra,
+        )
+
+    def _ids(self, texto, **filtros):
+        return [(r['entidad'], r['id']) for r in busqueda.buscar(texto, **filtros)]
+
+    def test_prefijos_acentos_y_filtros(self):
+        a = self._pedido("Calle Larga 10, Temuco", self.osorno, detalles_carga="Quesos refrigerados")
+        b = self._pedido("Av. Alemania 200, Temuco", self.santiago, estado='EN_RUTA')
+        self.assertEqual(set(self._ids("temu")), {('pedido', a.pk), ('pedido', b.pk)})
+        # Sin acentos y por el nombre de la empresa del cliente
+        self.assertIn(('pedido', a.pk), self._ids("lacteos queso"))
+        self.assertEqual(self._ids("temuco", sucursal_id=self.santiago.pk), [('pedido', b.pk)])
+        self.assertEqual(self._ids("temuco", estados=['EN_RUTA']), [('pedido', b.pk)])
+        self.assertEqual(self._ids("kxtr"), [('camion', self.camion.pk)])
+        # El conductor aparece por su nombre, y también el camión que conduce
+        self.assertEqual(set(self._ids("perez")), {('empleado', self.conductor.pk), ('camion', self.camion.pk)})
+        self.assertEqual(self._ids("perez", entidades=['empleado']), [('empleado', self.conductor.pk)])
+        self.assertEqual(self._ids("  --  "), [])
+
+    def test_sin_fts5_usa_icontains(self):
+        a = self._pedido("Calle Larga 10, Temuco", self.osorno)
+        b = self._pedido("Av. Alemania 200, Temuco", self.santiago, estado='EN_RUTA')
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertEqual(self._ids("temuco"), [('pedido', b.pk), ('pedido', a.pk)])
+            self.assertEqual(self._ids("emuc", sucursal_id=self.santiago.pk), [('pedido', b.pk)])
+            self.assertEqual(self._ids("temuco", estados=['EN_RUTA']), [('pedido', b.pk)])
+            self.assertEqual(set(self._ids("juan perez")), {('empleado', self.conductor.pk), ('camion', self.camion.pk)})
+            self.assertEqual(self._ids("temuco", limite=1), [('pedido', b.pk)])
+            resultado = busqueda.buscar("kxtr")[0]
+        self.assertEqual((resultado['titulo'], resultado['detalle']), ("KXTR21", "jperez Juan Pérez"))
+
+    def test_sincronizado_con_escrituras_masivas(self):
+        pedido = self._pedido("Calle 1, Temuco", self.osorno)
+        # update() y bulk_update() no emiten señales: los triggers sí corren
+        Pedido.objects.filter(pk=pedido.pk).update(destino="Calle 1, Valdivia", estado='COTIZADO')
+        self.assertEqual(self._ids("temuco"), [])
+        self.assertEqual(self._ids("valdivia", estados=['COTIZADO']), [('pedido', pedido.pk)])
+        # Los nombres de usuario se propagan a clientes y pedidos
+        User.objects.filter(pk=self.cliente.user_id).update(first_name="Ramona")
+        self.assertEqual(set(self._ids("ramona")), {('cliente', self.cliente.pk), ('pedido', pedido.pk)})
+        pedido.delete()
+        self.assertEqual(self._ids("valdivia"), [])
+
+
+    def test_triggers_de_las_migraciones(self):
+        # Después de todas las migraciones están los triggers que define api/busqueda.py, tal cual
+        self.assertEqual(busqueda.triggers_instalados(connection), busqueda.sql_triggers())
+        self.assertEqual(busqueda.revisar_triggers(None, databases=['default']), [])
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER api_busqueda_pedido_au")
+        self.assertEqual([w.id for w in busqueda.revisar_triggers(None, databases=['default'])], ['api.W002'])
+
+    def test_endpoint_y_admin(self):
+        pedido = self._pedido("Calle 1, Temuco", self.osorno)
+        client = APIClient()
+        _autenticar(client, self.admin)
+        response = client.get('/api/admin/buscar/', {'q': 'tem', 'entidad': 'pedido', 'sucursal_id': self.osorno.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(r['entidad'], r['id']) for r in response.data['resultados']], [('pedido', pedido.pk)])
+        self.assertEqual(client.get('/api/admin/buscar/', {'q': 'tem', 'entidad': 'sucursal'}).status_code, 400)
+
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/api/pedido/', {'q': 'temu'})
+        self.assertEqual(list(response.context['cl'].result_list), [pedido])
+        response = self.client.get('/admin/api/pedido/', {'q': str(pedido.pk)})
+        self.assertEqual(list(response.context['cl'].result_list), [pedido])
+
+
+class GeoTests(TestCase):
+    """ Ciudad del destino y matriz de distancias (api/geo.py) """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.osorno = Sucursal.objects.create(nombre="Osorno", direccion="Av. 1", ciudad="Osorno")
+        cls.santiago = Sucursal.objects.create(nombre="Stgo Centro", direccion="Av. 2", ciudad="Santiago")
+        user_cliente = User.objects.create_user('cliente', 'cliente@empresa.com', 'pass123')
+        cls.cliente = Cliente.objects.create(user=user_cliente)
+
+    def test_ciudad_de(self):
+        casos = {
+            "Calle 1, Temuco": 'temuco',
+            "Av. Libertad 120, VIÑA DEL MAR": 'vina-del-mar',
+            "Av. Alemania 200 Puerto Montt": 'puerto-montt',
+            "Pasaje 3, Stgo": 'santiago',
+            "Los Carrera 45, Los Ángeles, Chile": 'los-angeles',
+            "Ruta 5 km 1020": None,
+            "": None,
+        }
+        for destino, codigo in casos.items():
+            self.assertEqual(geo.ciudad_de(destino), codigo, destino)
+
+    def test_pedido_guarda_la_ciudad(self):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, sucursal_origen=self.osorno, destino="Calle 1, Concepción",
+            tipo_carga="Retail", peso_kg=1000, volumen_m3=10, fecha_deseada=date(2030, 1, 1),
+        )
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).ciudad_destino, 'concepcion')
+        pedido.destino = "Calle 1, Ciudad Desconocida"
+        pedido.save()
+        self.assertIsNone(Pedido.objects.get(pk=pedido.pk).ciudad_destino)
+
+    def test_matriz(self):
+        tarifas = {**CotizacionTests.TARIFAS, 'distancias_km': {'Osorno': {'Temuco': 250}}}
+        with self.settings(ACME_TARIFAS=tarifas, ACME_GEO={'factor_ruta': 1.25, 'velocidad_kmh': 50}):
+            matriz = geo.matriz()
+            self.assertIs(geo.matriz(), matriz)
+            # Distancia conocida; estimada (Santiago -> Valparaíso, ~120 km por carretera)
+            self.assertEqual((matriz.km(self.osorno.pk, 'temuco'), matriz.horas(self.osorno.pk, 'temuco')), (250, 5))
+            self.assertTrue(100 < matriz.km(self.santiago.pk, 'valparaiso') < 160)
+            self.assertEqual(matriz.km(self.osorno.pk, 'osorno'), 0)
+            self.assertEqual(matriz.km(self.osorno.pk, None, 600), 600)
+            self.assertIsNone(matriz.km(0, 'temuco'))
+
+            # Una sucursal nueva rearma la matriz
+            nueva = Sucursal.objects.create(nombre="Temuco", direccion="Av. 3", ciudad="Temuco")
+            self.assertIsNot(geo.matriz(), matriz)
+            self.assertEqual(geo.matriz().km(nueva.pk, 'temuco'), 0)
@@ -0,0 +1,139 @@
+# api/transiciones.py
+
+import contextvars
+from contextlib import contextmanager
+from itertools import pairwise
+
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import TransicionPedido
+
+# Usuario (id) al que se atribuyen los cambios de estado de la request o
+# del bloque en curso (ver actor()). None: sistema, comandos, etc.
+_actor = contextvars.ContextVar('acme_actor', default=None)
+
+
+@contextmanager
+def actor(user_id):
+    """ Los cambios de estado de este bloque quedan a nombre de 'user_id' """
+    token = _actor.set(user_id)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+def fijar_actor(user_id):
+    """ Como actor(), para quien no puede usar un bloque with (vistas DRF) """
+    return _actor.set(user_id)
+
+def soltar_actor(token):
+    _actor.reset(token)
+
+
+def registrar(cambios, fecha=None):
+    """
+    Agrega al historial [(pedido_id, desde, hacia)] (desde=None: creación).
+    Debe llamarse dentro de la transacción que cambia el estado: si se
+    revierte, la transición tampoco queda. save() lo hace por señal
+    (api/signals.py); bulk_create/bulk_update/update(), a mano, como con
+    contadores.ajustar().
+    """
+    fecha = fecha or timezone.now()
+    actor_id = _actor.get()
+    filas = [
+        TransicionPedido(pedido_id=pedido_id, desde=desde, hacia=hacia, fecha=fecha, actor_id=actor_id)
+        for pedido_id, desde, hacia in cambios
+        if desde != hacia
+    ]
+    TransicionPedido.objects.bulk_create(filas, batch_size=500)
+
+
+# --- Tiempos por etapa ---
+
+# El rango se materializa antes de la ventana: si no, SQLite prefiere
+# recorrer entero el índice (pedido, fecha), que ya viene en el orden de
+# la ventana, en vez de buscar por fecha con transicion_fecha_idx.
+_SQL_ETAPAS = """
+    WITH rango AS MATERIALIZED (
+        SELECT id, pedido_id, hacia, fecha FROM api_transicionpedido WHERE fecha >= %s
+    )
+    SELECT p.sucursal_origen_id, t.hacia, t.siguiente,
+           COUNT(*), AVG(t.segundos), MIN(t.segundos), MAX(t.segundos)
+    FROM (
+        SELECT pedido_id, hacia, fecha,
+               LEAD(hacia) OVER w AS siguiente,
+               ({segundos}) AS segundos
+        FROM rango
+        WINDOW w AS (PARTITION BY pedido_id ORDER BY fecha, id)
+    ) t
+    JOIN api_pedido p ON p.id = t.pedido_id
+    WHERE t.fecha < %s AND t.siguiente IS NOT NULL {sucursal}
+    GROUP BY p.sucursal_origen_id, t.hacia, t.siguiente
+    ORDER BY p.sucursal_origen_id, t.hacia, t.siguiente
+"""
+
+# Segundos entre 'fecha' y la fecha de la transición siguiente del pedido
+_SEGUNDOS = {
+    'sqlite': "(julianday(LEAD(fecha) OVER w) - julianday(fecha)) * 86400.0",
+    'postgresql': "EXTRACT(EPOCH FROM LEAD(fecha) OVER w - fecha)",
+}
+
+def _etapas_en_python(desde, hasta, sucursal_id=None):
+    """
+    Las filas de _SQL_ETAPAS sin funciones de ventana del motor (ni resta
+    de fechas en SQL): recorre el historial desde 'desde', ordenado por
+    pedido, y empareja cada transición con la siguiente del mismo pedido.
+    """
+    historial = TransicionPedido.objects.filter(fecha__gte=desde)
+    if sucursal_id is not None:
+        historial = historial.filter(pedido__sucursal_origen_id=sucursal_id)
+    historial = historial.order_by('pedido_id', 'fecha', 'id') \
+                         .values_list('pedido_id', 'pedido__sucursal_origen_id', 'hacia', 'fecha')
+
+    etapas = {}
+    for (pedido, sucursal, hacia, fecha), (otro, _, siguiente, fecha_siguiente) in pairwise(historial.iterator()):
+        if pedido != otro or fecha >= hasta:
+            continue
+        segundos = (fecha_siguiente - fecha).total_seconds()
+        n, suma, minimo, maximo = etapas.get((sucursal, hacia, siguiente), (0, 0.0, segundos, segundos))
+        etapas[sucursal, hacia, siguiente] = (n + 1, suma + segundos, min(minimo, segundos), max(maximo, segundos))
+    return [
+        (sucursal, hacia, siguiente, n, suma / n, minimo, maximo)
+        for (sucursal, hacia, siguiente), (n, suma, minimo, maximo) in sorted(etapas.items())
+    ]
+
+def duraciones(desde, hasta, sucursal_id=None):
+    """
+    Cuánto duró cada etapa de los pedidos, por sucursal: para cada
+    transición que entra a una etapa en [desde, hasta), el tiempo hasta la
+    transición siguiente del mismo pedido (LEAD sobre el historial). Solo
+    lee el historial desde 'desde' (índice por fecha) y no toca el estado
+    actual de los pedidos. Las etapas todavía abiertas no cuentan. En
+    motores sin SQL propio en _SEGUNDOS, el cálculo se hace en Python.
+
+    Devuelve [{'sucursal_id', 'etapa', 'siguiente', 'pedidos',
+    'promedio_horas', 'minimo_horas', 'maximo_horas'}].
+    """
+    # SQL directo, pero leyendo de donde leería el ORM (réplica incluida)
+    connection = connections[router.db_for_read(TransicionPedido)]
+    segundos = _SEGUNDOS.get(connection.vendor)
+    if segundos is None:
+        filas = _etapas_en_python(desde, hasta, sucursal_id)
+    else:
+        params = [connection.ops.adapt_datetimefield_value(desde), connection.ops.adapt_datetimefield_value(hasta)]
+        filtro_sucursal = ''
+        if sucursal_id is not None:
+            filtro_sucursal = 'AND p.sucursal_origen_id = %s'
+            params.append(sucursal_id)
+
+        sql = _SQL_ETAPAS.format(segundos=segundos, sucursal=filtro_sucursal)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            filas = cursor.fetchall()
+    horas = lambda s: round(s / 3600, 2)
+    return [
+        {'sucursal_id': sucursal, 'etapa': etapa, 'siguiente': siguiente, 'pedidos': n,
+         'promedio_horas': horas(promedio), 'minimo_horas': horas(minimo), 'maximo_horas': horas(maximo)}
+        for sucursal, etapa, siguiente, n, promedio, minimo, maximo in filas
+    ]
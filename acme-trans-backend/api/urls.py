@@ -6,17 +6,34 @@ from .views import (
     MyTokenObtainPairView,
     CamionListCreateView,
     CamionDetailView,
+    RutaCamionView,
+    ReservaListCreateView,
+    ReservaDetailView,
     EmpleadoListCreateView,
     EmpleadoDetailView,
     MyPedidoListView,
     PedidoAdminListView,
     PedidoAdminDetailView,
+    PedidoAdminBulkUpdateView,
+    AsignarCamionesView,
+    ConsolidarCargasView,
+    CotizarPedidosView,
+    TiemposPedidosView,
+    AnaliticaPedidosView,
+    BuscarView,
+    ExportarView,
+    ImportarAdminView,
+    MisPedidosImportarView,
+    EventosTicketView,
+    SucursalEventosView,
+    MisPedidosEventosView,
     SucursalListView,
     SucursalDetailView, 
     ConductorListView,
     CamionDropdownListView,
     # --- ¡NUEVA VISTA AÑADIDA! ---
-    SucursalDashboardDataView  
+    SucursalDashboardDataView,
+    SucursalDashboardAsyncView
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -28,19 +45,42 @@ urlpatterns = [
 
     # --- RUTAS DE CLIENTE ---
     path('mis-pedidos/', MyPedidoListView.as_view(), name='mis-pedidos'),
+    path('mis-pedidos/importar/', MisPedidosImportarView.as_view(), name='mis-pedidos-importar'),
+    path('eventos/ticket/', EventosTicketView.as_view(), name='eventos-ticket'),
+    path('mis-pedidos/eventos/', MisPedidosEventosView.as_view(), name='mis-pedidos-eventos'),
 
     # --- ¡NUEVA RUTA DEL DASHBOARD AÑADIDA! ---
     path('admin/sucursales/<int:pk>/dashboard/', SucursalDashboardDataView.as_view(), name='admin-sucursal-dashboard'),
+    # Misma respuesta como vista async (servidor ASGI)
+    path('admin/sucursales/<int:pk>/dashboard/async/', SucursalDashboardAsyncView.as_view(), name='admin-sucursal-dashboard-async'),
 
     # --- RUTAS DE ADMIN (CRUD) ---
     path('admin/camiones/', CamionListCreateView.as_view(), name='admin-camiones-list'),
     path('admin/camiones/<int:pk>/', CamionDetailView.as_view(), name='admin-camion-detail'),
+    path('admin/camiones/<int:pk>/ruta/', RutaCamionView.as_view(), name='admin-camion-ruta'),
+
+    path('admin/reservas/', ReservaListCreateView.as_view(), name='admin-reservas-list'),
+    path('admin/reservas/<int:pk>/', ReservaDetailView.as_view(), name='admin-reserva-detail'),
     
     path('admin/empleados/', EmpleadoListCreateView.as_view(), name='admin-empleados-list'),
     path('admin/empleados/<int:pk>/', EmpleadoDetailView.as_view(), name='admin-empleado-detail'),
     
     path('admin/pedidos/', PedidoAdminListView.as_view(), name='admin-pedidos-list'),
     path('admin/pedidos/<int:pk>/', PedidoAdminDetailView.as_view(), name='admin-pedido-detail'),
+    path('admin/pedidos/bulk/', PedidoAdminBulkUpdateView.as_view(), name='admin-pedidos-bulk'),
+    path('admin/pedidos/tiempos/', TiemposPedidosView.as_view(), name='admin-pedidos-tiempos'),
+    path('admin/analitica/pedidos/', AnaliticaPedidosView.as_view(), name='admin-analitica-pedidos'),
+    path('admin/sucursales/<int:pk>/asignar-camiones/', AsignarCamionesView.as_view(), name='admin-sucursal-asignar'),
+    path('admin/sucursales/<int:pk>/consolidar/', ConsolidarCargasView.as_view(), name='admin-sucursal-consolidar'),
+    path('admin/sucursales/<int:pk>/cotizar/', CotizarPedidosView.as_view(), name='admin-sucursal-cotizar'),
+    path('admin/sucursales/<int:pk>/eventos/', SucursalEventosView.as_view(), name='admin-sucursal-eventos'),
+
+    # --- BÚSQUEDA (texto completo) ---
+    path('admin/buscar/', BuscarView.as_view(), name='admin-buscar'),
+
+    # --- EXPORTACIONES (CSV / NDJSON) E IMPORTACIONES (CSV) ---
+    path('admin/exportar/<str:entidad>/', ExportarView.as_view(), name='admin-exportar'),
+    path('admin/importar/<str:entidad>/', ImportarAdminView.as_view(), name='admin-importar'),
 
     # --- RUTAS PARA DROPDOWNS Y DATOS ---
     path('data/sucursales/', SucursalListView.as_view(), name='data-sucursales'),
@@ -1,7 +1,22 @@
 # api/views.py
 
+import asyncio
+import io
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views import View
 from rest_framework import generics
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
 # --- ¡IMPORTACIONES CORREGIDAS! ---
@@ -12,7 +27,7 @@ from django.db.models import Count, Q
 # --- FIN DE IMPORTACIONES CORREGIDAS ---
 
 # Importamos todos los modelos
-from .models import Sucursal, Cliente, Empleado, Camion, Pedido
+from .models import Sucursal, Cliente, Empleado, Camion, Pedido, Reserva
 
 # Importamos todos los Serializers
 from .serializers import (
@@ -28,18 +43,37 @@ from .serializers import (
     PedidoClienteSerializer, 
     PedidoAdminSerializer,
     PedidoAdminUpdateSerializer,
-    CamionDropdownSerializer
+    CamionDropdownSerializer,
+    CamionListadoSerializer,
+    EmpleadoListadoSerializer,
+    PedidoAdminListadoSerializer,
+    AsignacionSerializer,
+    CotizacionSerializer,
+    PedidoBulkItemSerializer,
+    ReservaSerializer,
+    CAMION_OCUPADO,
 )
 
 # Importamos los Permisos
 from .permissions import IsSuperUser, IsCliente
+from .authentication import emitir_ticket, usuario_de_request
+from .pagination import PedidoKeysetPagination
+from .cache import RespuestaCacheadaMixin
+from .db import EscrituraReintentableMixin
+from .replica import LecturaReplicaMixin
+from . import busqueda, cache, contadores, eventos, replica, reservas, resumenes, rutas, transiciones
+from .asignacion import asignar, despachos, AsignacionError
+from .consolidacion import consolidar
+from .cotizacion import cotizar
+from .exports import EXPORTACIONES, FORMATOS, en_async, filtrar
+from .imports import IMPORTACIONES, ImportacionError, importar
 
 # Vistas de Autenticación
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 # --- VISTAS DE AUTENTICACIÓN Y REGISTRO ---
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(EscrituraReintentableMixin, generics.CreateAPIView):
     """
     Endpoint de API para registrar nuevos usuarios (Clientes).
     """
@@ -56,7 +90,7 @@ class MyTokenObtainPairView(TokenObtainPairView):
 
 # --- VISTAS DE ADMIN: CAMIONES ---
 
-class CamionListCreateView(generics.ListCreateAPIView):
+class CamionListCreateView(EscrituraReintentableMixin, LecturaReplicaMixin, generics.ListCreateAPIView):
     """
     Endpoint para Listar (GET) y Crear (POST) camiones.
     Acepta filtro: ?sucursal_id=1
@@ -66,22 +100,19 @@ class CamionListCreateView(generics.ListCreateAPIView):
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CamionWriteSerializer
-        return CamionReadSerializer
+        return CamionListadoSerializer
 
     def get_queryset(self):
-        # Optimizamos la consulta para incluir conductor y su usuario
-        queryset = Camion.objects.select_related(
-            'sucursal_base', 
-            'conductor_asignado__user' 
-        ).order_by('sucursal_base')
+        # Un solo .values() con sucursal y conductor (joins en SQL)
+        queryset = Camion.objects.order_by('sucursal_base')
         
         sucursal_id = self.request.query_params.get('sucursal_id')
         if sucursal_id:
             queryset = queryset.filter(sucursal_base_id=sucursal_id)
         
-        return queryset
+        return CamionListadoSerializer.filas(queryset)
 
-class CamionDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CamionDetailView(EscrituraReintentableMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Endpoint para Ver (GET), Actualizar (PUT/PATCH) y Eliminar (DELETE)
     un camión específico.
@@ -99,9 +130,89 @@ class CamionDetailView(generics.RetrieveUpdateDestroyAPIView):
             return CamionWriteSerializer
         return CamionReadSerializer
 
+class RutaCamionView(LecturaReplicaMixin, APIView):
+    """
+    Endpoint para Admins:
+    - GET: Orden de paradas del camión en un día (una por ciudad de sus
+      pedidos), con km y horas estimadas, desde y hacia su sucursal
+      (api/rutas.py). Se recalcula solo si cambiaron sus pedidos.
+    Acepta: ?fecha=2030-01-31 (por defecto, hoy)&presupuesto_ms=200
+    """
+    permission_classes = [IsSuperUser]
+
+    def get(self, request, pk, format=None):
+        camion = Camion.objects.select_related('sucursal_base').filter(pk=pk).first()
+        if camion is None:
+            return Response({"error": "Camión no encontrado."}, status=404)
+
+        params = request.query_params
+        try:
+            # parse_date: None si no tiene forma de fecha, ValueError si no existe
+            dia = parse_date(params['fecha']) if params.get('fecha') else timezone.localdate()
+        except ValueError:
+            dia = None
+        if dia is None:
+            return Response({"error": "Fecha inválida en 'fecha' (use AAAA-MM-DD)."}, status=400)
+        presupuesto = None
+        if params.get('presupuesto_ms'):
+            presupuesto = _entero(params['presupuesto_ms'])
+            maximo = settings.ACME_RUTAS['presupuesto_max_ms']
+            if presupuesto is None or not 0 <= presupuesto <= maximo:
+                return Response({"error": f"presupuesto_ms debe ser un entero entre 0 y {maximo}."}, status=400)
+
+        resultado = rutas.de_camion(camion, dia, presupuesto)
+        if resultado is None:
+            return Response({"error": "La ciudad de la sucursal del camión no está en la tabla de ciudades."},
+                            status=400)
+        return Response({"camion": camion.pk, "fecha": dia, **resultado})
+
+# --- VISTAS DE ADMIN: RESERVAS (CALENDARIO) ---
+
+class ReservaListCreateView(EscrituraReintentableMixin, LecturaReplicaMixin, generics.ListCreateAPIView):
+    """
+    Endpoint para Listar (GET) y Crear (POST) reservas de camiones y
+    conductores: mantenciones, licencias, vacaciones... (los viajes los
+    reserva la asignación). Una reserva que se cruza con otra del mismo
+    recurso se rechaza.
+    Acepta filtros: ?camion=1 o ?empleado=1, y ?desde=2030-01-01&hasta=2030-01-31
+    (reservas que tocan esos días; basta uno de los dos)
+    """
+    permission_classes = [IsSuperUser]
+    serializer_class = ReservaSerializer
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        queryset = Reserva.objects.order_by('inicio', 'id')
+        for campo in ('camion', 'empleado'):
+            if params.get(campo):
+                recurso_id = _entero(params[campo])
+                if recurso_id is None:
+                    return Response({"error": f"{campo} inválido."}, status=400)
+                queryset = queryset.filter(**{f'{campo}_id': recurso_id})
+        # Reservas que tocan [desde, hasta] (cada extremo es opcional)
+        for nombre, filtro in (('desde', 'fin__gt'), ('hasta', 'inicio__lte')):
+            if params.get(nombre):
+                try:
+                    dia = parse_date(params[nombre])
+                except ValueError:
+                    dia = None
+                if dia is None:
+                    return Response({"error": f"Fecha inválida en '{nombre}' (use AAAA-MM-DD)."}, status=400)
+                queryset = queryset.filter(**{filtro: dia})
+        return Response(ReservaSerializer(queryset, many=True).data)
+
+class ReservaDetailView(EscrituraReintentableMixin, generics.RetrieveUpdateDestroyAPIView):
+    """
+    Endpoint para Ver (GET), Actualizar (PUT/PATCH) y Eliminar (DELETE)
+    una reserva.
+    """
+    permission_classes = [IsSuperUser]
+    queryset = Reserva.objects.all()
+    serializer_class = ReservaSerializer
+
 # --- VISTAS DE ADMIN: EMPLEADOS ---
 
-class EmpleadoListCreateView(generics.ListCreateAPIView):
+class EmpleadoListCreateView(EscrituraReintentableMixin, LecturaReplicaMixin, generics.ListCreateAPIView):
     """
     Endpoint para Listar (GET) y Crear (POST) Empleados.
     Acepta filtro: ?sucursal_id=1
@@ -111,18 +222,18 @@ class EmpleadoListCreateView(generics.ListCreateAPIView):
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return EmpleadoCreateSerializer
-        return EmpleadoReadSerializer
+        return EmpleadoListadoSerializer
     
     def get_queryset(self):
-        queryset = Empleado.objects.select_related('user', 'sucursal')
+        queryset = Empleado.objects.all()
         
         sucursal_id = self.request.query_params.get('sucursal_id')
         if sucursal_id:
             queryset = queryset.filter(sucursal_id=sucursal_id)
         
-        return queryset
+        return EmpleadoListadoSerializer.filas(queryset)
 
-class EmpleadoDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EmpleadoDetailView(EscrituraReintentableMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Endpoint para Ver (GET), Actualizar (PUT/PATCH) y Eliminar (DELETE)
     un Empleado específico.
@@ -136,44 +247,54 @@ class EmpleadoDetailView(generics.RetrieveUpdateDestroyAPIView):
         return EmpleadoReadSerializer
 
 # --- VISTAS DE PEDIDOS (CLIENTE) ---
-class MyPedidoListView(generics.ListCreateAPIView):
+class MyPedidoListView(EscrituraReintentableMixin, LecturaReplicaMixin, generics.ListCreateAPIView):
     """
     Endpoint para Clientes:
-    - GET: Ver (Listar) mis pedidos
+    - GET: Ver (Listar) mis pedidos, paginado por cursor
     - POST: Crear un pedido
     """
     permission_classes = [IsCliente]
     serializer_class = PedidoClienteSerializer
+    pagination_class = PedidoKeysetPagination
 
     def get_queryset(self):
-        # Optimizamos la consulta
-        return Pedido.objects.filter(cliente=self.request.user.cliente_profile).select_related('sucursal_origen').order_by('-fecha_solicitud')
+        # Optimizamos la consulta (el cliente sale del token, sin buscar el perfil)
+        return Pedido.objects.filter(cliente_id=self.request.user.cliente_id).select_related('sucursal_origen').order_by('-fecha_solicitud')
 
     def perform_create(self, serializer):
-        serializer.save(cliente=self.request.user.cliente_profile)
+        serializer.save(cliente_id=self.request.user.cliente_id)
 
 # --- VISTAS DE PEDIDOS (ADMIN) ---
-class PedidoAdminListView(generics.ListAPIView):
+class PedidoAdminListView(LecturaReplicaMixin, generics.ListAPIView):
     """
     Endpoint para Admins:
-    - GET: Ver TODOS los pedidos
-    Acepta filtro: ?sucursal_id=1
+    - GET: Ver TODOS los pedidos, paginado por cursor
+    Acepta filtros: ?sucursal_id=1&estado=CONFIRMADO,EN_RUTA
+    (estado=ACTIVOS equivale a todos los estados no cerrados)
     """
     permission_classes = [IsSuperUser]
-    serializer_class = PedidoAdminSerializer
+    serializer_class = PedidoAdminListadoSerializer
+    pagination_class = PedidoKeysetPagination
 
     def get_queryset(self):
-        queryset = Pedido.objects.all().select_related('cliente__user', 'camion_asignado', 'sucursal_origen')
+        # camion_asignado sale con su conductor (joins en SQL, ver PedidoAdminListadoSerializer)
+        queryset = Pedido.objects.all()
         
         sucursal_id = self.request.query_params.get('sucursal_id')
         
         if sucursal_id:
             queryset = queryset.filter(sucursal_origen_id=sucursal_id)
+
+        estado = self.request.query_params.get('estado')
+        if estado == 'ACTIVOS':
+            queryset = queryset.activos()
+        elif estado:
+            queryset = queryset.filter(estado__in=estado.split(','))
         
-        return queryset.order_by('-fecha_solicitud')
+        return PedidoAdminListadoSerializer.filas(queryset.order_by('-fecha_solicitud'))
 
 
-class PedidoAdminDetailView(generics.RetrieveUpdateAPIView):
+class PedidoAdminDetailView(EscrituraReintentableMixin, generics.RetrieveUpdateAPIView):
     """
     Endpoint para Admins:
     - GET: Ver detalle de un pedido
@@ -181,41 +302,561 @@ class PedidoAdminDetailView(generics.RetrieveUpdateAPIView):
     """
     permission_classes = [IsSuperUser]
     # Optimizamos la consulta (incluyendo sucursal_origen)
-    queryset = Pedido.objects.all().select_related('cliente__user', 'camion_asignado', 'sucursal_origen')
+    queryset = Pedido.objects.all().select_related(
+        'cliente__user', 'camion_asignado__conductor_asignado__user', 'sucursal_origen'
+    )
 
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return PedidoAdminUpdateSerializer
         return PedidoAdminSerializer 
 
+def _entero(valor):
+    """ int(valor), o None si no es un entero válido """
+    if isinstance(valor, bool):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+def _rango_de_dias(params, dias_por_defecto):
+    """
+    (desde, hasta) de ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD; por defecto, los
+    últimos 'dias_por_defecto' días hasta hoy. ValueError si son inválidas.
+    """
+    fechas = {'hasta': timezone.localdate()}
+    fechas['desde'] = fechas['hasta'] - timedelta(days=dias_por_defecto - 1)
+    for nombre in ('desde', 'hasta'):
+        if params.get(nombre):
+            fechas[nombre] = parse_date(params[nombre])
+            if fechas[nombre] is None:
+                raise ValueError(f"Fecha inválida en '{nombre}' (use AAAA-MM-DD).")
+    if fechas['desde'] > fechas['hasta']:
+        raise ValueError("'desde' es posterior a 'hasta'.")
+    return fechas['desde'], fechas['hasta']
+
+def _sucursal_id(params):
+    """ ?sucursal_id como entero (None si no viene). ValueError si es inválido """
+    if not params.get('sucursal_id'):
+        return None
+    sucursal_id = _entero(params['sucursal_id'])
+    if sucursal_id is None:
+        raise ValueError("sucursal_id inválido.")
+    return sucursal_id
+
+class PedidoAdminBulkUpdateView(EscrituraReintentableMixin, APIView):
+    """
+    Endpoint para Admins:
+    - PATCH: Actualiza muchos pedidos en una transacción. Body: lista de
+      {"id", "estado", "costo_estimado", "precio_cotizado", "camion_asignado"}
+      (todos opcionales salvo id, como en el PATCH de un pedido).
+    Responde un resultado por ítem; los ítems inválidos no se aplican, ni
+    los que asignan un camión que no está libre ese día (api/reservas.py).
+    La cantidad de consultas no depende del tamaño del lote.
+    """
+    permission_classes = [IsSuperUser]
+
+    @transaction.atomic
+    def patch(self, request, format=None):
+        items = request.data
+        maximo = getattr(settings, 'PEDIDOS_BULK_MAX', 500)
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Se esperaba una lista de pedidos."}, status=400)
+        if len(items) > maximo:
+            return Response({"error": f"Máximo {maximo} pedidos por request."}, status=400)
+
+        # Pedidos y camiones de todo el lote, en una consulta cada uno
+        validos = [item for item in items if isinstance(item, dict)]
+        ids = {_entero(item.get('id')) for item in validos} - {None}
+        camion_ids = {_entero(item.get('camion_asignado')) for item in validos} - {None}
+        pedidos = Pedido.objects.select_for_update().in_bulk(ids)
+        contexto = {'request': request, 'camiones': Camion.objects.in_bulk(camion_ids)}
+
+        resultados, cambios, vistos = [], {}, set()
+        for item in items:
+            serializer = PedidoBulkItemSerializer(data=item, partial=True, context=contexto)
+            if not serializer.is_valid():
+                resultados.append({"id": item.get('id') if isinstance(item, dict) else None,
+                                   "ok": False, "errores": serializer.errors})
+                continue
+            datos = serializer.validated_data
+            pedido = pedidos.get(datos['id'])
+            if pedido is None or datos['id'] in vistos:
+                error = "Pedido no encontrado." if pedido is None else "Pedido repetido en el lote."
+                resultados.append({"id": datos['id'], "ok": False, "errores": {"id": [error]}})
+                continue
+            vistos.add(pedido.id)
+            cambios[pedido.id] = {campo: valor for campo, valor in datos.items() if campo != 'id'}
+            resultados.append({"id": pedido.id, "ok": True})
+
+        # Los camiones que toman los pedidos deben estar libres ese día (un cálculo para todo el lote)
+        tomados = {pedido_id: self._viaje_tomado(pedidos[pedido_id], datos) for pedido_id, datos in cambios.items()}
+        ocupados = reservas.viajes_ocupados(viaje for viaje in tomados.values() if viaje)
+        for resultado in resultados:
+            if resultado['ok'] and tomados[resultado['id']] in ocupados:
+                resultado.update(ok=False, errores={"camion_asignado": [CAMION_OCUPADO]})
+                del cambios[resultado['id']]
+
+        if cambios:
+            self._aplicar(pedidos, cambios)
+        return Response({
+            "actualizados": len(cambios),
+            "errores": len(resultados) - len(cambios),
+            "resultados": resultados,
+        })
+
+    @staticmethod
+    def _viaje_tomado(pedido, datos):
+        """ El viaje que el pedido pasa a ocupar con 'datos', o None si no toma uno nuevo """
+        camion = datos['camion_asignado'].pk if datos.get('camion_asignado') else None
+        nuevo = reservas.viaje_de(camion if 'camion_asignado' in datos else pedido.camion_asignado_id,
+                                  pedido.fecha_deseada, datos.get('estado', pedido.estado))
+        anterior = reservas.viaje_de(pedido.camion_asignado_id, pedido.fecha_deseada, pedido.estado)
+        return nuevo if nuevo != anterior else None
+
+    def _aplicar(self, pedidos, cambios):
+        """
+        Un UPDATE por cada estado distinto y un bulk_update por campo, solo
+        con los pedidos que cambian ese campo. bulk_update()/update() no
+        emiten señales: contadores, historial, reservas de viaje, salida de
+        camiones, cache y eventos se ajustan aquí. La ruta cacheada de cada
+        camión se recalcula sola: su firma son sus pedidos (api/rutas.py).
+        """
+        por_estado = defaultdict(list)
+        por_campo = defaultdict(list)
+        deltas = defaultdict(int)
+        historial = []
+        quitados, agregados = [], []
+        for pedido_id, datos in cambios.items():
+            pedido = pedidos[pedido_id]
+            anterior = reservas.viaje_de(pedido.camion_asignado_id, pedido.fecha_deseada, pedido.estado)
+            for campo, valor in datos.items():
+                if campo == 'estado':
+                    if valor != pedido.estado:
+                        deltas[contadores.clave_pedido(pedido.sucursal_origen_id, pedido.estado)] -= 1
+                        deltas[contadores.clave_pedido(pedido.sucursal_origen_id, valor)] += 1
+                        por_estado[valor].append(pedido_id)
+                        historial.append((pedido_id, pedido.estado, valor))
+                        pedido.estado = valor
+                else:
+                    setattr(pedido, campo, valor)
+                    por_campo[campo].append(pedido)
+            nuevo = reservas.viaje_de(pedido.camion_asignado_id, pedido.fecha_deseada, pedido.estado)
+            if nuevo != anterior:
+                quitados += [anterior] if anterior else []
+                agregados += [nuevo] if nuevo else []
+
+        for estado, ids in por_estado.items():
+            Pedido.objects.filter(pk__in=ids).update(estado=estado)
+        for campo, objetos in por_campo.items():
+            Pedido.objects.bulk_update(objetos, [campo], batch_size=500)
+        contadores.ajustar(deltas)
+        transiciones.registrar(historial)
+        reservas.mover_viajes(quitados, agregados)
+        despachos([(pedidos[pedido_id].camion_asignado_id, desde, hacia) for pedido_id, desde, hacia in historial])
+        cache.invalidar('pedido')
+        eventos.publicar(eventos.de_instancia(pedidos[pedido_id], 'actualizado') for pedido_id in cambios)
+
+class AsignarCamionesView(EscrituraReintentableMixin, APIView):
+    """
+    Endpoint para Admins:
+    - POST: Asigna camiones disponibles a los pedidos CONFIRMADO (sin camión)
+      de la sucursal, en un solo lote. Body opcional:
+      {"pedidos": [1, 2], "hasta": "2030-01-31", "simular": false}
+    """
+    permission_classes = [IsSuperUser]
+
+    def post(self, request, pk, format=None):
+        if not Sucursal.objects.filter(pk=pk).exists():
+            return Response({"error": "Sucursal no encontrada."}, status=404)
+
+        serializer = AsignacionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        try:
+            resultado = asignar(pk, pedido_ids=datos.get('pedidos'), hasta=datos.get('hasta'),
+                                simular=datos['simular'])
+        except AsignacionError as e:
+            return Response({"error": str(e)}, status=409)
+
+        return Response({
+            "simulado": datos['simular'],
+            "asignados": [{"pedido": p, "camion": c} for p, c in resultado['asignados']],
+            "sin_camion": resultado['sin_camion'],
+            "sin_capacidad": resultado['sin_capacidad'],
+        })
+
+class ConsolidarCargasView(EscrituraReintentableMixin, APIView):
+    """
+    Endpoint para Admins:
+    - POST: Como asignar-camiones, pero junta en un mismo camión los
+      pedidos que salen el mismo día hacia la misma ciudad (api/
+      consolidacion.py). Devuelve las cargas con su llenado (0-1) y los
+      camiones ahorrados frente a un camión por pedido. Body opcional:
+      {"pedidos": [1, 2], "hasta": "2030-01-31", "simular": true}
+    """
+    permission_classes = [IsSuperUser]
+
+    def post(self, request, pk, format=None):
+        if not Sucursal.objects.filter(pk=pk).exists():
+            return Response({"error": "Sucursal no encontrada."}, status=404)
+
+        serializer = AsignacionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        try:
+            resultado = consolidar(pk, pedido_ids=datos.get('pedidos'), hasta=datos.get('hasta'),
+                                   simular=datos['simular'])
+        except AsignacionError as e:
+            return Response({"error": str(e)}, status=409)
+
+        return Response({"simulado": datos['simular'], **resultado})
+
+class CotizarPedidosView(EscrituraReintentableMixin, APIView):
+    """
+    Endpoint para Admins:
+    - POST: Calcula costo_estimado y precio_cotizado de los pedidos
+      SOLICITADO de la sucursal (tarifas en settings.ACME_TARIFAS) y los
+      pasa a COTIZADO. Body opcional: {"pedidos": [1, 2], "simular": false}
+    """
+    permission_classes = [IsSuperUser]
+
+    def post(self, request, pk, format=None):
+        if not Sucursal.objects.filter(pk=pk).exists():
+            return Response({"error": "Sucursal no encontrada."}, status=404)
+
+        serializer = CotizacionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        cotizados = cotizar(pk, pedido_ids=datos.get('pedidos'), simular=datos['simular'])
+
+        return Response({
+            "simulado": datos['simular'],
+            "cotizados": len(cotizados),
+            "pedidos": [
+                {"pedido": p, "costo_estimado": str(costo), "precio_cotizado": str(precio)}
+                for p, costo, precio in cotizados
+            ],
+        })
+
+class TiemposPedidosView(RespuestaCacheadaMixin, LecturaReplicaMixin, APIView):
+    """
+    Endpoint para Admins:
+    - GET: Cuánto duran los pedidos en cada etapa (SOLICITADO -> COTIZADO,
+      etc.), por sucursal, según el historial de estados (api/transiciones.py).
+    Acepta: ?sucursal_id=1&desde=2025-01-01&hasta=2025-01-31
+            (por defecto, los últimos 30 días)
+    """
+    permission_classes = [IsSuperUser]
+    cache_grupos = ('pedido',)
+    dias_por_defecto = 30
+
+    def get_sin_cache(self, request, format=None):
+        try:
+            desde, hasta = _rango_de_dias(request.query_params, self.dias_por_defecto)
+            sucursal_id = _sucursal_id(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        # Días completos: [desde 00:00, hasta+1 00:00)
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+        return Response({
+            "desde": desde,
+            "hasta": hasta,
+            "etapas": transiciones.duraciones(inicio, fin, sucursal_id=sucursal_id),
+        })
+
+# --- ANALÍTICA ---
+
+class AnaliticaPedidosView(RespuestaCacheadaMixin, LecturaReplicaMixin, APIView):
+    """
+    Endpoint para Admins:
+    - GET: Tendencias por sucursal (pedidos creados, completados y
+      cancelados, ingresos, costos, margen y toneladas) desde los
+      resúmenes diarios (api/resumenes.py), por día, semana o mes.
+    Acepta: ?granularidad=dia|semana|mes&sucursal_id=1
+            &desde=2024-01-01&hasta=2025-12-31 (por defecto, los últimos 90 días)
+    Los datos están al día hasta la última corrida de actualizar_resumenes.
+    """
+    permission_classes = [IsSuperUser]
+    cache_grupos = ('resumen',)
+    dias_por_defecto = 90
+
+    def get_sin_cache(self, request, format=None):
+        granularidad = request.query_params.get('granularidad', 'dia')
+        if granularidad not in resumenes.GRANULARIDADES:
+            return Response({"error": f"Granularidad no soportada: {granularidad}."}, status=400)
+        try:
+            desde, hasta = _rango_de_dias(request.query_params, self.dias_por_defecto)
+            sucursal_id = _sucursal_id(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response({
+            "desde": desde,
+            "hasta": hasta,
+            "granularidad": granularidad,
+            "serie": resumenes.serie(desde, hasta, granularidad, sucursal_id=sucursal_id),
+        })
+
+# --- BÚSQUEDA ---
+
+class BuscarView(LecturaReplicaMixin, APIView):
+    """
+    Endpoint para Admins:
+    - GET: Busca en pedidos, clientes, camiones y empleados con el índice
+      de texto completo (api/busqueda.py), los más relevantes primero.
+      Cada palabra se busca como prefijo ("osor reta" encuentra pedidos
+      Retail a Osorno).
+    Acepta: ?q=...&entidad=pedido,camion&sucursal_id=1&estado=EN_RUTA,CONFIRMADO&limite=20
+    """
+    permission_classes = [IsSuperUser]
+    limite_maximo = 100
+
+    def get(self, request, format=None):
+        params = request.query_params
+        entidades = params['entidad'].split(',') if params.get('entidad') else None
+        invalidas = set(entidades or ()) - set(busqueda.CODIGOS)
+        if invalidas:
+            return Response({"error": f"Entidad no soportada: {', '.join(sorted(invalidas))}."}, status=400)
+        limite = _entero(params.get('limite', 20))
+        if limite is None or not 1 <= limite <= self.limite_maximo:
+            return Response({"error": f"limite debe estar entre 1 y {self.limite_maximo}."}, status=400)
+        try:
+            sucursal_id = _sucursal_id(params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        resultados = busqueda.buscar(
+            params.get('q', ''),
+            entidades=entidades,
+            sucursal_id=sucursal_id,
+            estados=params['estado'].split(',') if params.get('estado') else None,
+            limite=limite,
+        )
+        return Response({"resultados": resultados})
+
+# --- EXPORTACIONES ---
+
+class ExportarView(APIView):
+    """
+    Endpoint para Admins:
+    - GET: Exporta pedidos, camiones o empleados como CSV o NDJSON en
+      streaming (memoria constante, sin importar la cantidad de filas),
+      tanto bajo WSGI como bajo ASGI.
+    Acepta: ?formato=csv|ndjson&sucursal_id=1&estado=COMPLETADO,CANCELADO
+            &desde=2025-01-01&hasta=2025-01-31 (fechas solo en pedidos)
+    """
+    permission_classes = [IsSuperUser]
+
+    def get(self, request, entidad, format=None):
+        if entidad not in EXPORTACIONES:
+            raise Http404
+        params = request.query_params
+        formato = params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({"error": f"Formato no soportado: {formato}."}, status=400)
+
+        fechas = {}
+        for nombre in ('desde', 'hasta'):
+            if params.get(nombre):
+                fechas[nombre] = parse_date(params[nombre])
+                if fechas[nombre] is None:
+                    return Response({"error": f"Fecha inválida en '{nombre}' (use AAAA-MM-DD)."}, status=400)
+
+        sucursal_id = None
+        if params.get('sucursal_id'):
+            sucursal_id = _entero(params['sucursal_id'])
+            if sucursal_id is None:
+                return Response({"error": "sucursal_id inválido."}, status=400)
+
+        queryset = filtrar(
+            entidad,
+            sucursal_id=sucursal_id,
+            estados=params['estado'].split(',') if params.get('estado') else None,
+            **fechas,
+        ).using(replica.alias_lectura(request.user))  # Se lee al enviar el cuerpo, fuera de la vista
+        generador, content_type = FORMATOS[formato]
+        contenido = generador(entidad, queryset)
+        if isinstance(request._request, ASGIRequest):
+            # Bajo ASGI (uvicorn) el cuerpo tiene que ser async para salir de a chunks
+            contenido = en_async(contenido)
+        response = StreamingHttpResponse(contenido, content_type=content_type)
+        nombre_archivo = f"{entidad}-{timezone.localdate():%Y%m%d}.{formato}"
+        response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+        return response
+
+# --- IMPORTACIONES (CSV) ---
+
+class ImportarBaseView(APIView):
+    """
+    Sube un CSV (campo 'archivo', multipart) y lo importa por lotes
+    (api/imports.py). ?simular=1 solo valida. Responde el reporte con los
+    errores de cada fila; las filas válidas se guardan igual.
+    """
+    parser_classes = [MultiPartParser]
+
+    def importar(self, request, entidad, cliente_id=None):
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({"error": "Falta el archivo CSV (campo 'archivo')."}, status=400)
+        simular = request.query_params.get('simular') in ('1', 'true')
+        # Se lee del archivo temporal línea a línea, sin cargarlo entero
+        lineas = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+        try:
+            reporte = importar(entidad, lineas, cliente_id=cliente_id, simular=simular)
+        except (ImportacionError, UnicodeDecodeError) as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({"simulado": simular, **reporte})
+
+class ImportarAdminView(ImportarBaseView):
+    """
+    Endpoint para Admins:
+    - POST: Importa camiones o pedidos. Los pedidos requieren ?cliente_id=
+    """
+    permission_classes = [IsSuperUser]
+
+    def post(self, request, entidad, format=None):
+        if entidad not in IMPORTACIONES:
+            raise Http404
+        cliente_id = None
+        if entidad == 'pedidos':
+            cliente_id = _entero(request.query_params.get('cliente_id'))
+            if cliente_id is None or not Cliente.objects.filter(pk=cliente_id).exists():
+                return Response({"error": "Indique un cliente_id válido."}, status=400)
+        return self.importar(request, entidad, cliente_id)
+
+class MisPedidosImportarView(ImportarBaseView):
+    """
+    Endpoint para Clientes:
+    - POST: Importa pedidos propios desde un CSV (mismas reglas que crear uno)
+    """
+    permission_classes = [IsCliente]
+
+    def post(self, request, format=None):
+        return self.importar(request, 'pedidos', request.user.cliente_id)
+
+# --- EVENTOS EN VIVO (SSE) ---
+
+async def _stream_eventos(request, canales_de):
+    """
+    Stream de Server-Sent Events (api/eventos.py) para las vistas async de
+    eventos: necesitan un servidor ASGI (acme_config/asgi.py) para mantener
+    muchas conexiones abiertas sin ocupar un hilo cada una. El JWT se
+    valida sin consultas. 'canales_de(usuario)' (async) devuelve los
+    canales que puede escuchar el usuario, o None si no tiene permiso.
+    Reanuda con el header Last-Event-ID (o ?ultimo_id=).
+    """
+    usuario = usuario_de_request(request)
+    if usuario is None:
+        return JsonResponse({"detail": "Token inválido o ausente."}, status=401)
+    canales = await canales_de(usuario)
+    if not canales:
+        return JsonResponse({"detail": "No tiene permiso para ver estos eventos."}, status=403)
+
+    ultimo_id = request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id')
+    response = StreamingHttpResponse(eventos.stream(canales, ultimo_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: enviar cada evento sin acumular
+    return response
+
+class EventosTicketView(APIView):
+    """
+    Endpoint para cualquier usuario autenticado:
+    - POST: Ticket de un solo uso para abrir un stream de eventos (?ticket=)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response({"ticket": emitir_ticket(request.auth)})
+
+class SucursalEventosView(View):
+    """
+    Endpoint para Admins (y empleados de la sucursal):
+    - GET: Cambios de pedidos, camiones y empleados de la sucursal (SSE)
+    """
+    async def get(self, request, pk):
+        async def canales_de(usuario):
+            if not (usuario.is_superuser or usuario.sucursal_id == pk):
+                return None
+            if not await Sucursal.objects.filter(pk=pk).aexists():
+                raise Http404
+            return {eventos.canal_sucursal(pk)}
+        return await _stream_eventos(request, canales_de)
+
+class MisPedidosEventosView(View):
+    """
+    Endpoint para Clientes:
+    - GET: Cambios de estado y cotizaciones de mis pedidos (SSE)
+    """
+    async def get(self, request):
+        async def canales_de(usuario):
+            return {eventos.canal_cliente(usuario.cliente_id)} if usuario.cliente_id else None
+        return await _stream_eventos(request, canales_de)
+
 # --- VISTAS PARA DROPDOWNS Y DATOS ---
 
-class SucursalListView(generics.ListAPIView):
+class SucursalListView(RespuestaCacheadaMixin, LecturaReplicaMixin, generics.ListAPIView):
     """ Endpoint (GET) para listar sucursales (para dropdowns) """
     permission_classes = [IsAuthenticated]
+    cache_grupos = ('sucursal',)
     queryset = Sucursal.objects.all()
     serializer_class = SucursalSerializer
 
-class SucursalDetailView(generics.RetrieveAPIView):
+class SucursalDetailView(RespuestaCacheadaMixin, LecturaReplicaMixin, generics.RetrieveAPIView):
     """ Endpoint (GET) para ver los detalles de una sucursal por ID """
     permission_classes = [IsAuthenticated]
+    cache_grupos = ('sucursal',)
     queryset = Sucursal.objects.all()
     serializer_class = SucursalSerializer
 
-class ConductorListView(generics.ListAPIView):
+class ConductorListView(RespuestaCacheadaMixin, LecturaReplicaMixin, generics.ListAPIView):
     """ Endpoint (GET) para listar empleados que son 'Conductores' """
     permission_classes = [IsAuthenticated]
-    # Filtramos por conductores 'Disponibles'
-    queryset = Empleado.objects.filter(cargo='CON', estado='DIS')
+    cache_grupos = ('empleado',)
+    # Filtramos por conductores 'Disponibles' (el serializer usa su 'user')
+    queryset = Empleado.objects.filter(cargo='CON', estado='DIS').select_related('user')
     serializer_class = ConductorSerializer
 
-class CamionDropdownListView(generics.ListAPIView):
+class CamionDropdownListView(RespuestaCacheadaMixin, LecturaReplicaMixin, generics.ListAPIView):
     """
     Endpoint (GET) para listar camiones para un dropdown.
+    Acepta filtros: ?sucursal_id=1&capacidad=GC y, para pedidos a futuro,
+    ?libre_desde=2030-01-10&libre_hasta=2030-01-12: solo camiones que (con
+    su conductor) no tienen reservas esos días (calendario de api/reservas.py).
     """
     permission_classes = [IsAuthenticated]
-    queryset = Camion.objects.select_related('conductor_asignado__user').all()
+    cache_grupos = ('camion', 'empleado', 'reserva')
     serializer_class = CamionDropdownSerializer
+
+    def get_sin_cache(self, request, *args, **kwargs):
+        params = request.query_params
+        self.dias_libre = None
+        try:
+            self.sucursal_id = _sucursal_id(params)
+            if params.get('libre_desde'):
+                desde, hasta = _rango_de_dias(
+                    {'desde': params['libre_desde'], 'hasta': params.get('libre_hasta') or params['libre_desde']}, 1)
+                self.dias_libre = (desde, hasta + timedelta(days=1))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return super().get_sin_cache(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = Camion.objects.select_related('conductor_asignado__user').all()
+        params = self.request.query_params
+        if self.sucursal_id is not None:
+            queryset = queryset.filter(sucursal_base_id=self.sucursal_id)
+        if params.get('capacidad'):
+            queryset = queryset.filter(capacidad=params['capacidad'])
+        if self.dias_libre is None:
+            return queryset
+        # Un calendario para toda la lista: búsquedas en memoria, no una consulta por camión
+        vigente = reservas.calendario()
+        return [camion for camion in queryset
+                if reservas.camion_libre(camion.id, camion.conductor_asignado_id, *self.dias_libre, vigente)]
     
 
 # --- ¡NUEVA VISTA DEL DASHBOARD! ---
@@ -230,72 +871,107 @@ def format_estado_camion(estado_key):
     estados = {'DIS': 'Disponible', 'RUT': 'En Ruta', 'MAN': 'En Mantención', 'REP': 'En Reparación'}
     return estados.get(estado_key, estado_key)
 
-class SucursalDashboardDataView(APIView):
+def datos_dashboard(sucursal_nombre, conteo):
+    """ JSON del dashboard a partir de contadores.por_sucursal() """
+    pedidos_counts = conteo['PED']
+    camiones_counts = conteo['CAM']
+    conductores_counts = conteo['CON']
+
+    # --- Métricas de Pedidos ---
+    grafico_pedidos = [
+        {"name": format_estado_pedido(key), "value": val} 
+        for key, val in pedidos_counts.items()
+    ]
+
+    # --- Métricas de Camiones ---
+    grafico_camiones = [{
+        "name": "Flota",
+        "Disponible": camiones_counts.get('DIS', 0),
+        "En Ruta": camiones_counts.get('RUT', 0),
+        "En Mantención": camiones_counts.get('MAN', 0),
+        "En Reparación": camiones_counts.get('REP', 0),
+    }]
+
+    return {
+        "sucursal_nombre": sucursal_nombre,
+        
+        "kpis": {
+            "camiones_disponibles": camiones_counts.get('DIS', 0),
+            "conductores_disponibles": conductores_counts.get('DIS', 0),
+            "pedidos_en_ruta": pedidos_counts.get('EN_RUTA', 0),
+            "pedidos_nuevos": pedidos_counts.get('SOLICITADO', 0),
+            "total_camiones": sum(camiones_counts.values()),
+            "total_conductores": sum(conductores_counts.values()),
+        },
+        
+        "grafico_pedidos": grafico_pedidos,
+        "grafico_camiones": grafico_camiones
+    }
+
+class SucursalDashboardDataView(RespuestaCacheadaMixin, LecturaReplicaMixin, APIView):
     """
     Entrega un JSON consolidado con todas las métricas
     necesarias para el dashboard de una sucursal específica.
+    Lee los contadores pre-calculados (api/contadores.py), así el costo
+    no depende de cuántos pedidos tenga la sucursal.
     """
     permission_classes = [IsSuperUser]
+    cache_grupos = ('sucursal', 'camion', 'empleado', 'pedido')
 
-    def get(self, request, pk, format=None):
+    def get_sin_cache(self, request, pk, format=None):
         try:
             # 1. Obtener la sucursal
             sucursal = Sucursal.objects.get(pk=pk)
             
-            # --- 2. Métricas de Pedidos ---
-            pedidos_data = Pedido.objects.filter(sucursal_origen_id=pk) \
-                                         .values('estado') \
-                                         .annotate(count=Count('estado'))
-            
-            pedidos_counts = {p['estado']: p['count'] for p in pedidos_data}
-            grafico_pedidos = [
-                {"name": format_estado_pedido(key), "value": val} 
-                for key, val in pedidos_counts.items()
-            ]
-
-            # --- 3. Métricas de Camiones ---
-            camiones_data = Camion.objects.filter(sucursal_base_id=pk) \
-                                          .values('estado') \
-                                          .annotate(count=Count('estado'))
-            
-            camiones_counts = {c['estado']: c['count'] for c in camiones_data}
-            
-            grafico_camiones = [{
-                "name": "Flota",
-                "Disponible": camiones_counts.get('DIS', 0),
-                "En Ruta": camiones_counts.get('RUT', 0),
-                "En Mantención": camiones_counts.get('MAN', 0),
-                "En Reparación": camiones_counts.get('REP', 0),
-            }]
-
-            # --- 4. Métricas de Empleados (Conductores) ---
-            conductores_data = Empleado.objects.filter(sucursal_id=pk, cargo='CON') \
-                                             .values('estado') \
-                                             .annotate(count=Count('estado'))
-            
-            conductores_counts = {e['estado']: e['count'] for e in conductores_data}
-
-            # --- 5. Consolidar el JSON de respuesta ---
-            data = {
-                "sucursal_nombre": sucursal.nombre,
-                
-                "kpis": {
-                    "camiones_disponibles": camiones_counts.get('DIS', 0),
-                    "conductores_disponibles": conductores_counts.get('DIS', 0),
-                    "pedidos_en_ruta": pedidos_counts.get('EN_RUTA', 0),
-                    "pedidos_nuevos": pedidos_counts.get('SOLICITADO', 0),
-                    "total_camiones": sum(camiones_counts.values()),
-                    "total_conductores": sum(conductores_counts.values()),
-                },
-                
-                "grafico_pedidos": grafico_pedidos,
-                "grafico_camiones": grafico_camiones
-            }
-            
-            return Response(data)
+            # 2. Contadores de pedidos, camiones y conductores (una consulta)
+            conteo = contadores.por_sucursal(pk)
+
+            # 3. Consolidar el JSON de respuesta
+            return Response(datos_dashboard(sucursal.nombre, conteo))
 
         except Sucursal.DoesNotExist:
             return Response({"error": "Sucursal no encontrada."}, status=404)
         except Exception as e:
             print(f"Error en SucursalDashboardDataView: {e}") 
-            return Response({"error": "Ocurrió un error al procesar los datos."}, status=500)
\ No newline at end of file
+            return Response({"error": "Ocurrió un error al procesar los datos."}, status=500)
+
+
+# --- Dashboard async (ASGI) ---
+
+class SucursalDashboardAsyncView(View):
+    """
+    Misma respuesta (y la misma cache con ETag) que SucursalDashboardDataView,
+    como vista async para ASGI: la sucursal y los contadores de cada entidad
+    se piden juntos con el ORM async, y el worker atiende otras requests
+    mientras tanto (las vistas sync, bajo ASGI, se ejecutan de a una en un
+    mismo hilo). Ojo: el ORM async de Django pasa cada consulta por un solo
+    hilo con la conexión sync, así que con SQLite se ejecutan una tras otra.
+    """
+    cache_grupos = SucursalDashboardDataView.cache_grupos
+
+    async def get(self, request, pk):
+        usuario = usuario_de_request(request)
+        if usuario is None:
+            return JsonResponse({"detail": "Token inválido o ausente."}, status=401)
+        if not usuario.is_superuser:
+            return JsonResponse({"detail": "Usted no tiene permiso para realizar esta acción."}, status=403)
+
+        etag, ultima_modificacion, data = await sync_to_async(cache.consultar)(request, self.cache_grupos)
+        if data is cache.NO_MODIFICADO:
+            return cache.marcar(HttpResponse(status=304), etag, ultima_modificacion)
+        if data is None:
+            # Como LecturaReplicaMixin (sync_to_async, y con él el ORM async, copia el contexto)
+            with replica.lectura(await sync_to_async(replica.alias_lectura)(usuario)):
+                try:
+                    sucursal, conteo = await asyncio.gather(
+                        Sucursal.objects.only('nombre').aget(pk=pk),
+                        contadores.apor_sucursal(pk),
+                    )
+                except Sucursal.DoesNotExist:
+                    return JsonResponse({"error": "Sucursal no encontrada."}, status=404)
+                data = datos_dashboard(sucursal.nombre, conteo)
+                if replica.al_dia(ultima_modificacion):
+                    await sync_to_async(cache.guardar)(etag, data)
+        # Mismo JSON que el JSONRenderer de DRF
+        response = JsonResponse(data, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+        return cache.marcar(response, etag, ultima_modificacion)
@@ -73,13 +73,14 @@ export default function PedidoAdminModal({ pedidoId, onClose, onSave }) {
       try {
         const [camionesRes, pedidosRes] = await Promise.all([
           axiosPrivate.get('/api/admin/camiones/'), 
-          axiosPrivate.get('/api/admin/pedidos/')  
+          // Solo los pedidos activos de la sucursal (la lista está paginada)
+          axiosPrivate.get(`/api/admin/pedidos/?sucursal_id=${currentPedido.sucursal_origen.id}&estado=CONFIRMADO,EN_RUTA&page_size=500`)
         ]);
 
         const camionesOcupadosIds = new Set(
-          pedidosRes.data
+          pedidosRes.data.results
             .filter(p => (p.estado === 'CONFIRMADO' || p.estado === 'EN_RUTA') && p.id !== currentPedido.id) 
-            .map(p => p.camion_asignado) 
+            .map(p => p.camion_asignado && p.camion_asignado.id)
             .filter(id => id != null)
         );
         
@@ -0,0 +1,77 @@
+// src/hooks/useEventos.js
+
+import { useEffect, useRef } from 'react';
+import { useAuth } from '../context/AuthContext';
+import useAxiosPrivate from './useAxiosPrivate';
+
+const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+const ESPERA_RECONEXION_MS = 3000;
+
+// Escucha un stream SSE de la API (ej: '/api/mis-pedidos/eventos/').
+// EventSource no permite headers, así que cada conexión usa un ticket de un
+// solo uso (POST /api/eventos/ticket/) en ?ticket=. Como el ticket no sirve
+// dos veces, al cortarse el stream pedimos uno nuevo y reanudamos desde el
+// último evento recibido (?ultimo_id=).
+// onEvento recibe {entidad, accion, id, sucursal_id, datos};
+// onReset se llama si el servidor perdió el hilo (hay que recargar la lista).
+const useEventos = (path, onEvento, onReset) => {
+  const { authTokens } = useAuth();
+  const axiosPrivate = useAxiosPrivate();
+  // Guardamos los callbacks en refs para no reabrir la conexión en cada render
+  const onEventoRef = useRef(onEvento);
+  const onResetRef = useRef(onReset);
+  onEventoRef.current = onEvento;
+  onResetRef.current = onReset;
+
+  useEffect(() => {
+    if (!path || !authTokens) return undefined;
+    let source = null;
+    let espera = null;
+    let ultimoId = null;
+    let cerrado = false;
+
+    const reintentar = () => {
+      if (!cerrado) espera = setTimeout(abrir, ESPERA_RECONEXION_MS);
+    };
+
+    const abrir = async () => {
+      let ticket;
+      try {
+        ({ data: { ticket } } = await axiosPrivate.post('/api/eventos/ticket/'));
+      } catch {
+        reintentar();
+        return;
+      }
+      if (cerrado) return;
+      const params = new URLSearchParams({ ticket });
+      if (ultimoId) params.set('ultimo_id', ultimoId);
+      source = new EventSource(`${API_BASE_URL}${path}?${params}`);
+
+      const recibir = (e) => {
+        if (e.lastEventId) ultimoId = e.lastEventId;
+      };
+      source.onmessage = (e) => {
+        recibir(e);
+        onEventoRef.current?.(JSON.parse(e.data));
+      };
+      source.addEventListener('reset', (e) => {
+        recibir(e);
+        onResetRef.current?.();
+      });
+      // La reconexión automática de EventSource reusaría el ticket: la hacemos nosotros
+      source.onerror = () => {
+        source.close();
+        reintentar();
+      };
+    };
+
+    abrir();
+    return () => {
+      cerrado = true;
+      clearTimeout(espera);
+      source?.close();
+    };
+  }, [path, authTokens, axiosPrivate]);
+};
+
+export default useEventos;
@@ -2,6 +2,7 @@
 
 import { useState, useEffect } from 'react';
 import useAxiosPrivate from '../hooks/useAxiosPrivate';
+import useEventos from '../hooks/useEventos';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { 
   faPaperPlane, faListAlt, faSpinner, faExclamationTriangle,
@@ -23,6 +24,7 @@ const initialState = {
 
 export default function MisPedidosPage() {
   const [solicitudes, setSolicitudes] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null); // Paginación por cursor
   const [sucursales, setSucursales] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -41,7 +43,8 @@ export default function MisPedidosPage() {
         axiosPrivate.get('/api/mis-pedidos/'),
         axiosPrivate.get('/api/data/sucursales/')
       ]);
-      setSolicitudes(solicitudesRes.data);
+      setSolicitudes(solicitudesRes.data.results);
+      setNextUrl(solicitudesRes.data.next);
       setSucursales(sucursalesRes.data);
       setError(null);
     } catch (err) {
@@ -56,16 +59,43 @@ export default function MisPedidosPage() {
   const fetchSolicitudes = async () => {
      try {
       const solicitudesRes = await axiosPrivate.get('/api/mis-pedidos/');
-      setSolicitudes(solicitudesRes.data);
+      setSolicitudes(solicitudesRes.data.results);
+      setNextUrl(solicitudesRes.data.next);
     } catch (err) {
       console.error("Error recargando solicitudes:", err);
     }
   };
 
+  // Cargar la página siguiente del historial
+  const fetchMasSolicitudes = async () => {
+    if (!nextUrl) return;
+    try {
+      const solicitudesRes = await axiosPrivate.get(nextUrl);
+      setSolicitudes(prev => [...prev, ...solicitudesRes.data.results]);
+      setNextUrl(solicitudesRes.data.next);
+    } catch (err) {
+      console.error("Error cargando más solicitudes:", err);
+    }
+  };
+
   useEffect(() => {
     fetchPageData();
   }, [axiosPrivate]);
 
+  // Cambios en vivo (cotizaciones, estados): actualizamos la fila sin recargar
+  useEventos('/api/mis-pedidos/eventos/', (evento) => {
+    if (evento.entidad !== 'pedido') return;
+    if (evento.accion === 'creado') {
+      fetchSolicitudes();
+    } else if (evento.accion === 'eliminado') {
+      setSolicitudes(prev => prev.filter(s => s.id !== evento.id));
+    } else {
+      const { camion_asignado_id, ...datos } = evento.datos;
+      const cambios = camion_asignado_id === undefined ? datos : { ...datos, camion_asignado: camion_asignado_id };
+      setSolicitudes(prev => prev.map(s => (s.id === evento.id ? { ...s, ...cambios } : s)));
+    }
+  }, fetchSolicitudes);
+
   const handleFormChange = (e) => {
     const { name, value } = e.target;
     setFormState(prev => ({ ...prev, [name]: value }));
@@ -273,6 +303,14 @@ export default function MisPedidosPage() {
                 <SolicitudCard key={sol.id} solicitud={sol} />
               ))
             )}
+            {nextUrl && (
+              <button
+                onClick={fetchMasSolicitudes}
+                className="w-full py-3 text-blue-600 hover:text-blue-800 font-medium"
+              >
+                Ver solicitudes anteriores
+              </button>
+            )}
           </div>
         </div>
         
@@ -4,6 +4,7 @@ import { useState, useEffect } from 'react';
 // ¡Importamos useSearchParams!
 import { useParams, useSearchParams } from 'react-router-dom';
 import useAxiosPrivate from '../../hooks/useAxiosPrivate';
+import useEventos from '../../hooks/useEventos';
 import PedidoAdminModal from '../../components/PedidoAdminModal.jsx'; 
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faBoxOpen, faFilter, faSearch, faSpinner } from '@fortawesome/free-solid-svg-icons';
@@ -12,6 +13,10 @@ import { faBoxOpen, faFilter, faSearch, faSpinner } from '@fortawesome/free-soli
 const ESTADO_CHOICES = [
   'SOLICITADO', 'COTIZADO', 'CONFIRMADO', 'EN_RUTA', 'COMPLETADO', 'CANCELADO'
 ];
+const ESTADO_DISPLAY = {
+  SOLICITADO: 'Solicitado', COTIZADO: 'Cotizado', CONFIRMADO: 'Confirmado',
+  EN_RUTA: 'En Ruta', COMPLETADO: 'Completado', CANCELADO: 'Cancelado',
+};
 
 export default function PedidosPage() {
   const { id: sucursalId } = useParams();
@@ -32,12 +37,17 @@ export default function PedidosPage() {
   const [filterSearch, setFilterSearch] = useState('');
   const [filteredPedidos, setFilteredPedidos] = useState([]);
 
-  // Cargar todos los pedidos
+  // --- Paginación por cursor: URL de la página siguiente (o null) ---
+  const [nextUrl, setNextUrl] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Cargar la primera página de pedidos
   const fetchPedidos = async () => {
     try {
       setLoading(true);
       const response = await axiosPrivate.get(`/api/admin/pedidos/?sucursal_id=${sucursalId}`);
-      setPedidos(response.data);
+      setPedidos(response.data.results);
+      setNextUrl(response.data.next);
       // setFilteredPedidos(response.data); // No es necesario, el useEffect de filtro se encargará
       setError(null);
     } catch (err) {
@@ -47,10 +57,53 @@ export default function PedidosPage() {
     }
   };
 
+  // Cargar la página siguiente y agregarla al final (scroll infinito)
+  const fetchMasPedidos = async () => {
+    if (!nextUrl) return;
+    try {
+      setLoadingMore(true);
+      const response = await axiosPrivate.get(nextUrl);
+      setPedidos(prev => [...prev, ...response.data.results]);
+      setNextUrl(response.data.next);
+    } catch (err) {
+      setError('No se pudieron cargar más pedidos.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchPedidos();
   }, [sucursalId, axiosPrivate]);
 
+  // Trae un pedido (mismo formato que la lista) y lo reemplaza o agrega arriba
+  const refrescarPedido = async (pedidoId) => {
+    try {
+      const { data } = await axiosPrivate.get(`/api/admin/pedidos/${pedidoId}/`);
+      setPedidos(prev => (prev.some(p => p.id === data.id)
+        ? prev.map(p => (p.id === data.id ? data : p))
+        : [data, ...prev]));
+    } catch (err) {
+      console.error("Error actualizando pedido:", err);
+    }
+  };
+
+  // Cambios en vivo de la sucursal: sin volver a pedir toda la lista
+  useEventos(`/api/admin/sucursales/${sucursalId}/eventos/`, (evento) => {
+    if (evento.entidad !== 'pedido') return;
+    const { datos } = evento;
+    if (evento.accion === 'eliminado') {
+      setPedidos(prev => prev.filter(p => p.id !== evento.id));
+    } else if (evento.accion === 'creado' || datos.camion_asignado_id !== undefined) {
+      // El camión se muestra con su conductor: pedimos el pedido completo
+      refrescarPedido(evento.id);
+    } else {
+      const cambios = { ...datos };
+      if (datos.estado) cambios.estado_display = ESTADO_DISPLAY[datos.estado];
+      setPedidos(prev => prev.map(p => (p.id === evento.id ? { ...p, ...cambios } : p)));
+    }
+  }, fetchPedidos);
+
   // useEffect para aplicar filtros
   useEffect(() => {
     let tempPedidos = [...pedidos];
@@ -86,6 +139,22 @@ export default function PedidosPage() {
     handleCloseModal();
   };
   
+  // Cotizar de una vez todas las solicitudes pendientes de la sucursal
+  const [cotizando, setCotizando] = useState(false);
+  const handleCotizarPendientes = async () => {
+    if (!window.confirm('¿Cotizar automáticamente todas las solicitudes pendientes de esta sucursal?')) return;
+    try {
+      setCotizando(true);
+      const response = await axiosPrivate.post(`/api/admin/sucursales/${sucursalId}/cotizar/`, {});
+      alert(`${response.data.cotizados} solicitudes cotizadas.`);
+      fetchPedidos();
+    } catch (err) {
+      setError('No se pudieron cotizar las solicitudes.');
+    } finally {
+      setCotizando(false);
+    }
+  };
+
   const formatEstado = (estado) => {
     if (!estado) return '';
     return estado.charAt(0).toUpperCase() + estado.slice(1).toLowerCase().replace('_', ' ');
@@ -93,7 +162,16 @@ export default function PedidosPage() {
 
   return (
     <div className="p-6 bg-gray-50 min-h-screen">
-      <h1 className="text-3xl font-bold mb-6 text-gray-800">Gestión de Solicitudes</h1>
+      <div className="flex justify-between items-center mb-6">
+        <h1 className="text-3xl font-bold text-gray-800">Gestión de Solicitudes</h1>
+        <button
+          onClick={handleCotizarPendientes}
+          disabled={cotizando}
+          className="bg-blue-600 text-white px-4 py-2 rounded-md shadow hover:bg-blue-700 disabled:opacity-50"
+        >
+          {cotizando ? <FontAwesomeIcon icon={faSpinner} spin /> : 'Cotizar pendientes'}
+        </button>
+      </div>
 
       {/* Barra de Filtros */}
       <div className="grid grid-cols-1 md:grid-cols-3 gap-4 mb-6 p-4 bg-white rounded-lg shadow">
@@ -175,6 +253,17 @@ export default function PedidosPage() {
             </tbody>
           </table>
         )}
+        {!loading && !error && nextUrl && (
+          <div className="p-4 text-center border-t border-gray-200">
+            <button
+              onClick={fetchMasPedidos}
+              disabled={loadingMore}
+              className="text-blue-600 hover:text-blue-800 font-medium disabled:text-gray-400"
+            >
+              {loadingMore ? <FontAwesomeIcon icon={faSpinner} className="animate-spin" /> : 'Cargar más solicitudes'}
+            </button>
+          </div>
+        )}
         {!loading && !error && filteredPedidos.length === 0 && (
           <div className="p-6 text-center text-gray-500">
             <FontAwesomeIcon icon={faBoxOpen} className="text-4xl text-gray-300 mb-3" />